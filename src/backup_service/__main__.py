@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Dịch vụ sao lưu chạy nền từ dòng lệnh (trong thư mục src):
+
+    python -m backup_service serve --config ..\\data\\backup\\scheduler.json --workers 4 --port 8765
+    python -m backup_service status
+    python -m backup_service run "MyDb:FULL" --wait
+    python -m backup_service reload
+
+- serve: chạy các lịch backup / verify / retention trong tiến trình tới khi Ctrl+C (có thể đăng ký làm Windows service
+  hoặc 1 task "At startup" duy nhất thay cho 3 task schtasks mỗi CSDL).
+- status / run / reload: gửi lệnh tới dịch vụ đang chạy qua cổng trạng thái 127.0.0.1.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+# Mở comment 3 dòng bên dưới mỗi khi test (Chạy trực tiếp hàm if __main__)
+import os
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+from backup_service.status_server import BACKUP_SERVICE_PORT, BACKUP_SERVICE_TOKEN_FILE, query_service
+
+
+def _fmt_time(epoch):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(epoch)) if epoch else "-"
+
+
+def _cmd_serve(args):
+    from backup_service.service import SERVICE_CONFIG_PATH, BackupService
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, filename=args.log_file,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    service = BackupService(config_path=args.config or SERVICE_CONFIG_PATH, workers=args.workers, port=args.port,
+                            listen=not args.no_status, token_file=args.token_file)
+    service.serve_forever()
+    return 0
+
+
+def _cmd_status(args):
+    response = query_service("status", port=args.port, token_file=args.token_file)
+    if not response.get("success"):
+        print(response.get("message"))
+        return 1
+    data = response["data"]
+    if args.json:
+        print(json.dumps(data, ensure_ascii=False, indent=2, default=str))
+        return 0
+    executor = data["executor"]
+    print(f"Dịch vụ pid {data['pid']}, chạy từ {_fmt_time(data['started_at'])}, cấu hình {data['config_path']}")
+    print(f"Đang chạy {len(executor['running'])}, đang chờ {len(executor['queued'])}, "
+          f"xong {executor['completed']}, lỗi {executor['failed']}")
+    print(f"\n{'Công việc':<32}{'CRON':<18}{'Kế tiếp':<18}{'Lần cuối':<18}{'Kết quả':<10}")
+    for job in data["jobs"]:
+        print(f"{job['id']:<32}{job['cron']:<18}{_fmt_time(job['next_run']):<18}{_fmt_time(job['last_run']):<18}"
+              f"{job['last_status'] or '-':<10}")
+    return 0
+
+
+def _cmd_run(args):
+    response = query_service("run", port=args.port, timeout=args.timeout if args.wait else 5.0,
+                             token_file=args.token_file, job_id=args.job_id, wait=args.wait)
+    print(response.get("message"))
+    return 0 if response.get("success") else 1
+
+
+def _cmd_reload(args):
+    response = query_service("reload", port=args.port, token_file=args.token_file)
+    print(response.get("message"))
+    return 0 if response.get("success") else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backup_service", description="Dịch vụ sao lưu SQL Server chạy nền")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Chạy dịch vụ (lịch backup/verify/retention trong tiến trình)")
+    serve.add_argument("--config", default=None, help="Tệp scheduler.json (mặc định data/backup/scheduler.json)")
+    serve.add_argument("--workers", type=int, default=None, help="Số công việc chạy đồng thời tối đa")
+    serve.add_argument("--port", type=int, default=None, help="Cổng trạng thái trên 127.0.0.1")
+    serve.add_argument("--no-status", action="store_true", help="Không mở cổng trạng thái")
+    serve.add_argument("--token-file", default=None, help="Tệp mã xác thực cổng trạng thái")
+    serve.add_argument("--log-file", default=None, help="Ghi log ra tệp thay vì màn hình")
+    serve.add_argument("--verbose", "-v", action="store_true")
+    serve.set_defaults(func=_cmd_serve)
+
+    status = subparsers.add_parser("status", help="Xem trạng thái dịch vụ đang chạy")
+    status.add_argument("--json", action="store_true", help="In toàn bộ trạng thái dạng JSON")
+    status.set_defaults(func=_cmd_status)
+
+    run = subparsers.add_parser("run", help="Chạy ngay 1 công việc, VD: MyDb:FULL")
+    run.add_argument("job_id")
+    run.add_argument("--wait", action="store_true", help="Chờ công việc chạy xong")
+    run.add_argument("--timeout", type=float, default=3600.0, help="Thời gian chờ tối đa khi --wait (giây)")
+    run.set_defaults(func=_cmd_run)
+
+    reload = subparsers.add_parser("reload", help="Đọc lại cấu hình và lên lịch lại")
+    reload.set_defaults(func=_cmd_reload)
+
+    for sub in (status, run, reload):
+        sub.add_argument("--port", type=int, default=BACKUP_SERVICE_PORT, help="Cổng trạng thái của dịch vụ")
+        sub.add_argument("--token-file", default=BACKUP_SERVICE_TOKEN_FILE, help="Tệp mã xác thực của dịch vụ")
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
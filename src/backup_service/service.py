@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+"""
+Dịch vụ sao lưu chạy nền không cần giao diện (thay cho PS1 + schtasks + sqlcmd mỗi lần chạy)
+- Đọc data/backup/scheduler.json (cùng tệp cấu hình với màn hình Backup), với mỗi DB trong "databases":
+    + backup FULL / DIFF / LOG theo per_db[DB].schedule (hoặc schedule chung), FULL được RESTORE VERIFYONLY ngay sau khi xong
+    + verify: kiểm tra bộ FULL gần nhất theo per_db[DB].schedule.verify (nếu có)
+    + retention: dọn tệp cũ theo per_db[DB].retention = {"keep_days": 14, "cron": "0 3 * * *"} (nếu có)
+  Thông số kết nối lấy từ per_db[DB].scheduler (instance, stripes, sql_user/sql_pass; không có thì dùng Windows Auth).
+- Lịch theo CRON chạy trong tiến trình (TimerScheduler), trạng thái lưu ở JobStore để chạy bù khi dịch vụ khởi động lại.
+- Công việc chạy trên ResourceExecutor: giới hạn FULL đồng thời mỗi instance / công việc mỗi ổ đích, LOG được ưu tiên.
+- Kết nối SQL được giữ trong ConnectionPool theo instance (không mở tiến trình / đăng nhập lại cho mỗi lần chạy).
+- Chạy ngay (run_now) cũng ghi kết quả vào JobStore như lượt chạy theo lịch (lần chạy kế tiếp giữ theo lịch).
+- Phần "service" (tuỳ chọn) của cấu hình: {"workers": 4, "port": 8765, "token_file": "...", "limits": {"disk:*": 1, ...}}.
+"""
+import logging
+import os
+import signal
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import pyodbc
+except ImportError:  # Máy không cài ODBC: chỉ chạy được công việc retention
+    pyodbc = None
+
+# Mở comment 3 dòng bên dưới mỗi khi test (Chạy trực tiếp hàm if __main__)
+import sys
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+from backup_service import sql_backup
+from backup_service.status_server import (BACKUP_SERVICE_HOST, BACKUP_SERVICE_PORT, BACKUP_SERVICE_TOKEN_FILE,
+                                           StatusServer, write_token_file)
+from schedule_work.job_store import JobStore
+from schedule_work.resource_executor import (BACKUP_PRIORITIES, DEFAULT_RESOURCE_LIMITS, PRIORITY_LOW, PRIORITY_NORMAL,
+                                             ResourceExecutor, backup_job_resources)
+from schedule_work.schedule_work import Schedule_Auto
+from schedule_work.timer_scheduler import TimerScheduler
+from services.backup_crypto import BackupCryptoError, encrypt_file, load_key_file, verify_file
+from services.connection_pool import ConnectionPool
+from utils.app_config import load_config
+
+logger = logging.getLogger(__name__)
+
+SERVICE_CONFIG_PATH = os.getenv("BACKUP_SERVICE_CONFIG", os.path.join(os.path.dirname(PROJECT_DIR), "data", "backup", "scheduler.json"))
+BACKUP_SERVICE_WORKERS = int(os.getenv("BACKUP_SERVICE_WORKERS", "4"))
+DEFAULT_INSTANCE = ".\\SQLEXPRESS"
+DEFAULT_RETENTION_CRON = "0 3 * * *"
+LOGIN_TIMEOUT_SECONDS = 8
+# Số lượt chạy gần nhất giữ lại để trả về qua cổng trạng thái
+HISTORY_SIZE = 50
+
+
+class BackupJobError(Exception):
+    """Công việc sao lưu thất bại (được ghi vào JobStore với trạng thái error)."""
+
+
+def build_connection_string(driver: str, instance: str, sql_user: Optional[str] = None, sql_pass: Optional[str] = None,
+                            timeout: int = LOGIN_TIMEOUT_SECONDS) -> str:
+    """Chuỗi kết nối tới master của instance: SQL Auth nếu có sql_user/sql_pass, ngược lại Windows Auth."""
+    auth = f"UID={sql_user};PWD={sql_pass};" if sql_user and sql_pass else "Trusted_Connection=Yes;"
+    return (
+        f"DRIVER={driver};"
+        f"SERVER={instance};"
+        "DATABASE=master;"
+        f"{auth}"
+        "TrustServerCertificate=yes;"
+        f"Connection Timeout={timeout};"
+    )
+
+
+class BackupService:
+    """
+    Dịch vụ sao lưu trong tiến trình.
+
+    :param config_path: tệp scheduler.json.
+    :param workers: số công việc chạy đồng thời tối đa.
+    :param port: cổng trạng thái trên 127.0.0.1 (mặc định service.port trong cấu hình hoặc BACKUP_SERVICE_PORT).
+    :param listen: False = không mở cổng trạng thái.
+    :param token_file: tệp mã xác thực cổng trạng thái (mặc định service.token_file trong cấu hình hoặc BACKUP_SERVICE_TOKEN_FILE).
+    :param store: JobStore (mặc định tệp scheduler_jobs.json).
+    :param driver: ODBC driver (mặc định connection.driver trong cấu hình hoặc driver SQL Server mới nhất đã cài).
+    """
+
+    def __init__(self, config_path: str = SERVICE_CONFIG_PATH, workers: Optional[int] = None, port: Optional[int] = None,
+                 listen: bool = True, store: Optional[JobStore] = None, driver: Optional[str] = None,
+                 token_file: Optional[str] = None):
+        self.config_path = config_path
+        self.config: Dict[str, Any] = load_config(config_path)
+        service_cfg = self.config.get("service") or {}
+        self.workers = workers or int(service_cfg.get("workers", BACKUP_SERVICE_WORKERS))
+        self.port = int(port or service_cfg.get("port") or BACKUP_SERVICE_PORT)
+        self.listen = listen
+        self.token_file = token_file or service_cfg.get("token_file") or BACKUP_SERVICE_TOKEN_FILE
+        self.driver = driver or (self.config.get("connection") or {}).get("driver")
+
+        limits = dict(DEFAULT_RESOURCE_LIMITS)
+        limits.update(service_cfg.get("limits") or {})
+        self.executor = ResourceExecutor(max_workers=self.workers, limits=limits, name="backup-job")
+        self.scheduler = TimerScheduler(executor=self.executor, name="backup-scheduler")
+        self.schedule = Schedule_Auto(scheduler=self.scheduler, store=store)
+
+        # jobs / _scheduled được thay cả khối khi reload (luồng cổng trạng thái) trong lúc luồng executor vẫn đọc
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._scheduled: Dict[str, tuple] = {}
+        self._jobs_lock = threading.RLock()
+        self._pools: Dict[tuple, ConnectionPool] = {}
+        self._pools_lock = threading.Lock()
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._server: Optional[StatusServer] = None
+        self._stop_event = threading.Event()
+        self.started_at: Optional[float] = None
+
+    # ----------------------------- Cấu hình -> công việc -----------------------------
+    def _db_settings(self, dbname: str) -> Dict[str, Any]:
+        per_db = (self.config.get("per_db") or {}).get(dbname) or {}
+        scheduler_cfg = per_db.get("scheduler") or {}
+        schedule = dict(self.config.get("schedule") or {})
+        schedule.update(per_db.get("schedule") or {})
+        return {
+            "backup_dir": per_db.get("backup_dir") or (self.config.get("storage") or {}).get("backup_dir"),
+            "instance": scheduler_cfg.get("instance") or (self.config.get("connection") or {}).get("server") or DEFAULT_INSTANCE,
+            "stripes": int(scheduler_cfg.get("stripes") or 1),
+            "sql_user": scheduler_cfg.get("sql_user") or None,
+            "sql_pass": scheduler_cfg.get("sql_pass") or None,
+            "schedule": schedule,
+            "encryption": per_db.get("encryption") or {},
+            "retention": per_db.get("retention") or {},
+        }
+
+    def plan_jobs(self) -> Dict[str, Dict[str, Any]]:
+        """Danh sách công việc theo cấu hình: {job_id: {db, kind, type, cron, resources, priority, settings}}."""
+        jobs: Dict[str, Dict[str, Any]] = {}
+        for dbname in self.config.get("databases") or []:
+            settings = self._db_settings(dbname)
+            if not settings["backup_dir"]:
+                logger.warning("Bỏ qua %s: chưa có thư mục lưu trữ", dbname)
+                continue
+            instance, backup_dir = settings["instance"], settings["backup_dir"]
+
+            for backup_type in ("FULL", "DIFF", "LOG"):
+                cron = (settings["schedule"].get(backup_type.lower()) or "").strip()
+                if cron:
+                    jobs[f"{dbname}:{backup_type}"] = {
+                        "db": dbname, "kind": "backup", "type": backup_type, "cron": cron, "settings": settings,
+                        "resources": backup_job_resources(instance, backup_dir, backup_type),
+                        "priority": BACKUP_PRIORITIES[backup_type],
+                    }
+            verify_cron = (settings["schedule"].get("verify") or "").strip()
+            if verify_cron:
+                jobs[f"{dbname}:VERIFY"] = {
+                    "db": dbname, "kind": "verify", "type": "FULL", "cron": verify_cron, "settings": settings,
+                    "resources": backup_job_resources(instance, backup_dir, "VERIFY"), "priority": PRIORITY_NORMAL,
+                }
+            if settings["retention"].get("keep_days") is not None:
+                jobs[f"{dbname}:RETENTION"] = {
+                    "db": dbname, "kind": "retention", "type": None, "settings": settings,
+                    "cron": (settings["retention"].get("cron") or DEFAULT_RETENTION_CRON).strip(),
+                    # Dọn dẹp chỉ dùng ổ đích (không cần kết nối SQL)
+                    "resources": backup_job_resources(instance, backup_dir, "RETENTION")[-1:], "priority": PRIORITY_LOW,
+                }
+        return jobs
+
+    # ----------------------------- Kết nối -----------------------------
+    def _default_driver(self) -> str:
+        if pyodbc is None:
+            raise BackupJobError("Chưa cài pyodbc, không thể kết nối SQL Server.")
+        if not self.driver:
+            from utils.utils import get_odbc_drivers_for_sql_server
+            drivers = get_odbc_drivers_for_sql_server()
+            if not drivers:
+                raise BackupJobError("Không phát hiện ODBC Driver for SQL Server trên máy này.")
+            self.driver = drivers[-1]
+        return self.driver
+
+    def _pool(self, settings: Dict[str, Any]) -> ConnectionPool:
+        """Pool kết nối theo (instance, tài khoản): dùng chung cho mọi công việc trên cùng instance."""
+        key = (settings["instance"].upper(), settings["sql_user"])
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                conn_str = build_connection_string(self._default_driver(), settings["instance"],
+                                                   settings["sql_user"], settings["sql_pass"])
+                pool = ConnectionPool(factory=lambda: pyodbc.connect(conn_str, autocommit=True), min_size=0,
+                                      max_size=self.workers, idle_timeout=600.0, name=f"backup-{settings['instance']}")
+                self._pools[key] = pool
+            return pool
+
+    # ----------------------------- Thực thi -----------------------------
+    def execute(self, job_id: str, job: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Chạy 1 công việc (trên luồng của executor); thất bại thì ném BackupJobError.
+        job: định nghĩa công việc chụp lại lúc lên lịch / xếp hàng (reload giữa chừng không làm mất công việc đang chờ).
+        """
+        if job is None:
+            with self._jobs_lock:
+                job = self.jobs.get(job_id)
+        if job is None:
+            raise BackupJobError(f"Không có công việc {job_id}")
+        started = time.time()
+        try:
+            if job["kind"] == "retention":
+                result = self._run_retention(job)
+            else:
+                with self._pool(job["settings"]).acquire() as conn:
+                    cur = conn.cursor()
+                    try:
+                        result = self._run_backup(cur, job) if job["kind"] == "backup" else self._run_verify(cur, job)
+                    finally:
+                        cur.close()
+        except Exception as e:
+            result = {"success": False, "message": f"{type(e).__name__}: {e}"}
+        self._history.appendleft({"job_id": job_id, "started_at": started, "duration_s": round(time.time() - started, 3),
+                                  "success": result["success"], "message": result["message"]})
+        (logger.info if result["success"] else logger.error)("[%s] %s", job_id, result["message"])
+        if not result["success"]:
+            raise BackupJobError(result["message"])
+        return result
+
+    def _run_backup(self, cur, job: Dict[str, Any]) -> Dict[str, Any]:
+        settings, dbname, backup_type = job["settings"], job["db"], job["type"]
+        result = sql_backup.run_backup(cur, dbname, backup_type, settings["backup_dir"], settings["stripes"])
+        targets = (result.get("data") or {}).get("targets") or []
+        if result["success"] and targets and backup_type == "FULL":
+            check = sql_backup.verify_backup(cur, targets)
+            if not check["success"]:
+                result = check
+        if result["success"] and targets and settings["encryption"].get("enabled"):
+            self._encrypt(targets, settings["encryption"])
+        if targets:
+            sql_backup.write_task_log(settings["backup_dir"], dbname, backup_type, result["success"], targets)
+        return result
+
+    def _run_verify(self, cur, job: Dict[str, Any]) -> Dict[str, Any]:
+        targets = sql_backup.latest_backup_files(cur, job["db"], job["type"])
+        return sql_backup.verify_backup(cur, targets)
+
+    def _run_retention(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        settings = job["settings"]
+        return sql_backup.cleanup_backups(settings["backup_dir"], job["db"], int(settings["retention"]["keep_days"]),
+                                          dry_run=bool(settings["retention"].get("dry_run")))
+
+    def _encrypt(self, targets: List[str], encryption: Dict[str, Any]):
+        """Mã hóa tệp backup như ScheduleFrame (chỉ khi máy chạy dịch vụ nhìn thấy tệp); lỗi chỉ ghi log."""
+        try:
+            key = load_key_file(encryption["key_file"])
+        except (KeyError, TypeError, OSError, BackupCryptoError) as e:
+            logger.error("Không đọc được tệp khóa mã hóa: %s", e)
+            return
+        for path in targets:
+            if not os.path.exists(path):
+                logger.warning("Máy này không nhìn thấy %s, không thể mã hóa", path)
+                continue
+            try:
+                stats = encrypt_file(path, key=key)
+                if not verify_file(stats["output"], key)["ok"]:
+                    raise BackupCryptoError(f"Kiểm tra tệp mã hóa {stats['output']} thất bại")
+                if encryption.get("delete_plain"):
+                    os.remove(path)
+            except (OSError, BackupCryptoError) as e:
+                logger.error("Mã hóa %s lỗi: %s", path, e)
+
+    def _task(self, job_id: str, job: Dict[str, Any]) -> Callable[[], Any]:
+        return lambda: self.execute(job_id, job)
+
+    # ----------------------------- Lịch -----------------------------
+    def _schedule_all(self):
+        with self._jobs_lock:
+            self.jobs = self.plan_jobs()
+            for job_id, job in self.jobs.items():
+                try:
+                    schedule_job, stop_event = self.schedule.schedule_persistent(
+                        job_id, self._task(job_id, job), job["cron"], resources=job["resources"], priority=job["priority"])
+                except ValueError as e:
+                    logger.error("Lịch %s không hợp lệ (%s): %s", job_id, job["cron"], e)
+                    continue
+                self.schedule.start_schedule(stop_event, schedule_job)
+                self._scheduled[job_id] = (schedule_job, stop_event)
+            logger.info("Đã lên lịch %s công việc cho %s CSDL", len(self._scheduled), len(self.config.get("databases") or []))
+
+    def _unschedule_all(self):
+        with self._jobs_lock:
+            for schedule_job, stop_event in self._scheduled.values():
+                self.schedule.stop_schedule(stop_event, schedule_job)
+            self._scheduled.clear()
+
+    def reload(self) -> Dict[str, Any]:
+        """
+        Đọc lại cấu hình và lên lịch lại (trạng thái chạy bù trong JobStore được giữ theo job_id).
+        Công việc đang chạy / đang chờ trong executor vẫn chạy theo định nghĩa cũ đã chụp lúc xếp hàng.
+        """
+        config = load_config(self.config_path)
+        with self._jobs_lock:
+            self.config = config
+            self._unschedule_all()
+            self._schedule_all()
+            count = len(self._scheduled)
+        return {"success": True, "message": f"Đã nạp lại cấu hình, {count} công việc."}
+
+    def run_now(self, job_id: str, wait: bool = False, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Chạy ngay 1 công việc (vẫn tuân theo giới hạn tài nguyên và độ ưu tiên)."""
+        with self._jobs_lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return {"success": False, "message": f"Không có công việc {job_id}"}
+        future = self.executor.submit_job(self._run_and_record, job_id, job, resources=job["resources"],
+                                          priority=job["priority"], name=job_id)
+        if not wait:
+            return {"success": True, "message": f"Đã xếp {job_id} vào hàng đợi."}
+        try:
+            return future.result(timeout)
+        except Exception as e:
+            return {"success": False, "message": str(e) or type(e).__name__}
+
+    def _run_and_record(self, job_id: str, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Chạy 1 công việc ngoài lịch và ghi kết quả vào JobStore (lần chạy kế tiếp vẫn theo lịch)."""
+        started = time.time()
+        status, error = "success", None
+        try:
+            return self.execute(job_id, job)
+        except Exception as e:
+            status, error = "error", f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            with self._jobs_lock:
+                scheduled = self._scheduled.get(job_id)
+            next_run = scheduled[0].next_run(time.time()) if scheduled else None
+            self.schedule.store.record_run(job_id, last_run=started, next_run=next_run, status=status, error=error)
+
+    # ----------------------------- Trạng thái -----------------------------
+    def status(self) -> Dict[str, Any]:
+        records = {record["id"]: record for record in self.schedule.store.records()}
+        with self._jobs_lock:
+            current, scheduled = dict(self.jobs), set(self._scheduled)
+        jobs = []
+        for job_id, job in current.items():
+            record = records.get(job_id, {})
+            jobs.append({"id": job_id, "db": job["db"], "kind": job["kind"], "cron": job["cron"],
+                         "scheduled": job_id in scheduled, "next_run": record.get("next_run"),
+                         "last_run": record.get("last_run"), "last_status": record.get("last_status"),
+                         "last_error": record.get("last_error"), "runs": record.get("runs", 0)})
+        with self._pools_lock:
+            pools = {pool.name: pool.stats() for pool in self._pools.values()}
+        return {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "config_path": self.config_path,
+            "jobs": jobs,
+            "executor": self.executor.stats(),
+            "scheduler": self.scheduler.stats(),
+            "pools": pools,
+            "history": list(self._history),
+        }
+
+    def handle_command(self, cmd: Optional[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        """Xử lý lệnh từ cổng trạng thái."""
+        if cmd == "status":
+            return {"success": True, "message": "OK", "data": self.status()}
+        if cmd == "run":
+            return self.run_now(str(params.get("job_id")), wait=bool(params.get("wait")), timeout=params.get("timeout"))
+        if cmd == "reload":
+            return self.reload()
+        if cmd == "ping":
+            return {"success": True, "message": "pong"}
+        return {"success": False, "message": f"Lệnh không hợp lệ: {cmd}"}
+
+    # ----------------------------- Vòng đời -----------------------------
+    def start(self) -> "BackupService":
+        self.started_at = time.time()
+        self._schedule_all()
+        if self.listen:
+            token = write_token_file(self.token_file)
+            self._server = StatusServer(self.handle_command, token, BACKUP_SERVICE_HOST, self.port).start()
+        return self
+
+    def stop(self, wait: bool = True):
+        """Dừng nhận lịch mới, chờ công việc đang chạy xong rồi đóng pool kết nối."""
+        self._stop_event.set()
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+            try:
+                os.remove(self.token_file)
+            except OSError:
+                pass
+        self._unschedule_all()
+        self.scheduler.shutdown(wait=wait)
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+        with self._pools_lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+        logger.info("Đã dừng dịch vụ sao lưu")
+
+    def serve_forever(self):
+        """Chạy tới khi nhận Ctrl+C / SIGTERM (hoặc gọi stop từ luồng khác)."""
+        self.start()
+        for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), lambda *_: self._stop_event.set())
+        logger.info("Dịch vụ sao lưu đang chạy lúc %s (pid %s)", datetime.now().isoformat(timespec="seconds"), os.getpid())
+        try:
+            while not self._stop_event.wait(1.0):
+                pass
+        finally:
+            self.stop()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Các bước sao lưu chạy trực tiếp trên 1 cursor pyodbc (không cần giao diện, không gọi powershell/sqlcmd)
+- run_backup: BACKUP DATABASE/LOG ra nhiều tệp stripe trong <base>\\<DB>\\<Full|Diff|Log>\\<YYYYMMDD>\\
+  (cùng cấu trúc thư mục và tên tệp với script PS1 / backup thủ công của ScheduleFrame).
+- verify_backup: RESTORE VERIFYONLY ... WITH CHECKSUM trên các tệp vừa tạo hoặc bộ backup gần nhất trong msdb.
+- cleanup_backups: xóa tệp backup quá số ngày giữ lại (luôn giữ bản FULL mới nhất và các tệp sau nó).
+- write_task_log: ghi 1 dòng "thời điểm|DB|Type|OK/FAIL|tệp;tệp" vào <base>\\_TaskLogs\\<DB>.log như script PS1.
+- Mọi hàm trả về {"success", "message", "data"}.
+"""
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Loại backup -> (thư mục con, phần mở rộng)
+BACKUP_TYPES = {"FULL": ("Full", "bak"), "DIFF": ("Diff", "dif"), "LOG": ("Log", "trn")}
+BACKUP_OPTIONS = "INIT, CHECKSUM, STATS = 5, MAXTRANSFERSIZE = 4194304, BUFFERCOUNT = 64"
+# Mã loại trong msdb.dbo.backupset
+MSDB_BACKUP_TYPES = {"FULL": "D", "DIFF": "I", "LOG": "L"}
+# Đuôi tệp được xem xét khi dọn dẹp
+RETENTION_PATTERNS = (".bak", ".dif", ".trn", ".enc")
+TASK_LOG_DIR = "_TaskLogs"
+# <DB>_FULL_<HHMMSS>_<i>.bak[.enc] -> tên bộ backup (bỏ số thứ tự stripe và phần mở rộng)
+FULL_STRIPE_RE = re.compile(r"^(.*?)(?:_\d+)?\.bak(?:\.enc)?$", re.IGNORECASE)
+
+
+def norm_win_path(path: str) -> str:
+    """Chuẩn hoá đường dẫn Windows: '/' -> '\\', gộp '\\\\' (giữ tiền tố UNC), thêm '\\' cuối."""
+    path = (path or "").strip().replace("/", "\\")
+    prefix = "\\\\" if path.startswith("\\\\") else ""
+    path = path[len(prefix):]
+    while "\\\\" in path:
+        path = path.replace("\\\\", "\\")
+    if path and not path.endswith("\\"):
+        path += "\\"
+    return prefix + path
+
+
+def quote_name(name: str) -> str:
+    return "[" + name.replace("]", "]]") + "]"
+
+
+def ensure_sql_folders(cur, folder: str):
+    """Tạo đủ các cấp thư mục trên MÁY SQL bằng xp_create_subdir (bỏ qua nếu đã tồn tại / không có quyền)."""
+    prefix = "\\\\" if folder.startswith("\\\\") else ""
+    parts = folder[len(prefix):].strip("\\").split("\\")
+    # Ổ đĩa (E:) hoặc \\server\share là gốc, không tạo
+    root_parts = 2 if prefix else 1
+    acc = prefix + "\\".join(parts[:root_parts])
+    for part in parts[root_parts:]:
+        acc = f"{acc}\\{part}"
+        try:
+            cur.execute("EXEC master..xp_create_subdir ?", (acc,))
+        except Exception:
+            pass
+
+
+def backup_targets(base: str, dbname: str, backup_type: str, stripes: int, now: Optional[datetime] = None) -> List[str]:
+    """Danh sách tệp stripe: <base>\\<DB>\\<Subdir>\\<YYYYMMDD>\\<DB>_<TYPE>_<HHMMSS>_<i>.<ext>."""
+    now = now or datetime.now()
+    subdir, ext = BACKUP_TYPES[backup_type]
+    folder = f"{norm_win_path(base)}{dbname}\\{subdir}\\{now:%Y%m%d}\\"
+    return [f"{folder}{dbname}_{backup_type}_{now:%H%M%S}_{i}.{ext}" for i in range(1, max(1, int(stripes or 1)) + 1)]
+
+
+def build_backup_sql(dbname: str, backup_type: str, count: int, name: str) -> str:
+    """Câu lệnh BACKUP có tham số (DISK = ? cho từng stripe)."""
+    disks = ", ".join(["DISK = ?"] * count)
+    label = name.replace("'", "''")
+    if backup_type == "LOG":
+        return f"BACKUP LOG {quote_name(dbname)} TO {disks} WITH {BACKUP_OPTIONS}, NAME = N'{label}';"
+    differential = "DIFFERENTIAL, " if backup_type == "DIFF" else ""
+    return f"BACKUP DATABASE {quote_name(dbname)} TO {disks} WITH {differential}{BACKUP_OPTIONS}, NAME = N'{label}';"
+
+
+def _drain(cur):
+    # BACKUP/RESTORE trả về nhiều tập kết quả (STATS), phải đọc hết thì lệnh mới chạy xong
+    while cur.nextset():
+        pass
+
+
+def log_backup_blocker(cur, dbname: str) -> Optional[str]:
+    """Lý do không thể backup LOG (recovery model SIMPLE / chưa có FULL), None nếu backup được."""
+    cur.execute("SELECT recovery_model_desc FROM sys.databases WHERE name = ?", (dbname,))
+    row = cur.fetchone()
+    if not row:
+        return f"Không tìm thấy DB '{dbname}'."
+    if (row[0] or "").upper() not in ("FULL", "BULK_LOGGED"):
+        return f"DB '{dbname}' đang ở recovery model {row[0]}, không backup LOG được."
+    cur.execute("SELECT TOP 1 1 FROM msdb.dbo.backupset WHERE database_name = ? AND type = 'D'", (dbname,))
+    if not cur.fetchone():
+        return f"DB '{dbname}' chưa có bản FULL nào, cần chạy FULL trước khi backup LOG."
+    return None
+
+
+def backup_in_progress(cur, dbname: str) -> bool:
+    cur.execute("SELECT COUNT(*) FROM sys.dm_exec_requests WHERE command IN ('BACKUP DATABASE', 'BACKUP LOG') "
+                "AND database_id = DB_ID(?)", (dbname,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def missing_files(cur, targets: List[str]) -> List[str]:
+    """
+    Các tệp không thấy trên máy SQL (xp_fileexist); không kiểm tra được thì coi như có.
+    xp_fileexist trả về (File Exists, File is a Directory, Parent Directory Exists) -> chỉ xét cột đầu.
+    """
+    missing = []
+    for path in targets:
+        try:
+            cur.execute("EXEC master..xp_fileexist ?", (path,))
+            row = cur.fetchone()
+            if row is not None and not row[0]:
+                missing.append(path)
+        except Exception:
+            pass
+    return missing
+
+
+def run_backup(cur, dbname: str, backup_type: str, backup_dir: str, stripes: int = 1,
+               now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Chạy 1 lần backup (cursor phải ở chế độ autocommit)."""
+    backup_type = backup_type.upper()
+    if backup_type not in BACKUP_TYPES:
+        return {"success": False, "message": f"Loại backup không hợp lệ: {backup_type}"}
+    now = now or datetime.now()
+
+    if backup_type == "LOG":
+        blocker = log_backup_blocker(cur, dbname)
+        if blocker:
+            return {"success": False, "message": blocker}
+        if backup_in_progress(cur, dbname):
+            return {"success": True, "message": f"[{dbname}] đang có backup khác chạy, bỏ qua lần backup LOG này.",
+                    "data": {"targets": [], "skipped": True}}
+
+    targets = backup_targets(backup_dir, dbname, backup_type, stripes, now)
+    ensure_sql_folders(cur, targets[0].rsplit("\\", 1)[0] + "\\")
+    started = time.perf_counter()
+    cur.execute(build_backup_sql(dbname, backup_type, len(targets), f"{dbname} {backup_type} {now:%Y%m%d_%H%M%S}"),
+                tuple(targets))
+    _drain(cur)
+    duration = round(time.perf_counter() - started, 3)
+
+    missing = missing_files(cur, targets)
+    if missing:
+        return {"success": False, "message": "BACKUP đã chạy nhưng không thấy tệp: " + "; ".join(missing),
+                "data": {"targets": targets, "duration_s": duration}}
+    return {"success": True, "message": f"[{dbname}] {backup_type} xong ({len(targets)} tệp, {duration}s).",
+            "data": {"targets": targets, "duration_s": duration, "skipped": False}}
+
+
+def latest_backup_files(cur, dbname: str, backup_type: str = "FULL") -> List[str]:
+    """Các tệp của bộ backup gần nhất (theo msdb) của DB."""
+    cur.execute("""
+        SELECT mf.physical_device_name
+        FROM msdb.dbo.backupmediafamily mf
+        WHERE mf.media_set_id = (
+            SELECT TOP 1 bs.media_set_id FROM msdb.dbo.backupset bs
+            WHERE bs.database_name = ? AND bs.type = ?
+            ORDER BY bs.backup_finish_date DESC)
+        ORDER BY mf.family_sequence_number
+    """, (dbname, MSDB_BACKUP_TYPES[backup_type.upper()]))
+    return [row[0] for row in cur.fetchall()]
+
+
+def verify_backup(cur, targets: List[str]) -> Dict[str, Any]:
+    """RESTORE VERIFYONLY ... WITH CHECKSUM trên 1 bộ tệp stripe."""
+    if not targets:
+        return {"success": False, "message": "Không có tệp backup để kiểm tra."}
+    started = time.perf_counter()
+    cur.execute(f"RESTORE VERIFYONLY FROM {', '.join(['DISK = ?'] * len(targets))} WITH CHECKSUM;", tuple(targets))
+    _drain(cur)
+    duration = round(time.perf_counter() - started, 3)
+    return {"success": True, "message": f"Bộ backup hợp lệ ({len(targets)} tệp, {duration}s).",
+            "data": {"targets": targets, "duration_s": duration}}
+
+
+def cleanup_backups(backup_dir: str, dbname: str, keep_days: int, patterns=RETENTION_PATTERNS,
+                    dry_run: bool = False, now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Xóa tệp backup của DB (<base>\\<DB>\\...) cũ hơn keep_days ngày trên máy đang chạy dịch vụ.
+    Bộ FULL mới nhất (mọi stripe) luôn được giữ cùng mọi tệp sau nó, để chuỗi khôi phục không bị cắt ngang.
+    """
+    root = os.path.join(backup_dir, dbname)
+    if not os.path.isdir(root):
+        return {"success": False, "message": f"Máy này không nhìn thấy thư mục {root}, bỏ qua dọn dẹp."}
+
+    files = []
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if name.lower().endswith(tuple(patterns)):
+                path = os.path.join(folder, name)
+                try:
+                    files.append((path, os.stat(path).st_mtime))
+                except OSError as e:
+                    logger.warning("Không đọc được %s: %s", path, e)
+
+    cutoff = (now or time.time()) - keep_days * 86400
+    # Gom các stripe FULL theo bộ; bộ mới nhất được bảo vệ từ stripe ghi xong sớm nhất của nó
+    full_sets: Dict[str, List[float]] = {}
+    for path, mtime in files:
+        match = FULL_STRIPE_RE.match(os.path.basename(path))
+        if match:
+            full_sets.setdefault(os.path.join(os.path.dirname(path), match.group(1)), []).append(mtime)
+    if full_sets:
+        newest = max(full_sets.values(), key=max)
+        cutoff = min(cutoff, min(newest))
+    candidates = [path for path, mtime in files if mtime < cutoff]
+
+    deleted, errors = [], []
+    if not dry_run:
+        for path in candidates:
+            try:
+                os.remove(path)
+                deleted.append(path)
+            except OSError as e:
+                errors.append(f"{path}: {e}")
+    return {"success": not errors,
+            "message": f"[{dbname}] {'sẽ xóa' if dry_run else 'đã xóa'} {len(candidates) if dry_run else len(deleted)}"
+                       f"/{len(files)} tệp (giữ {keep_days} ngày).",
+            "data": {"candidates": candidates, "deleted": deleted, "errors": errors}}
+
+
+def write_task_log(backup_dir: str, dbname: str, backup_type: str, ok: bool, targets: List[str]):
+    """Ghi nhật ký chạy theo định dạng của script PS1 (bỏ qua nếu máy này không ghi được)."""
+    try:
+        log_dir = os.path.join(backup_dir, TASK_LOG_DIR)
+        os.makedirs(log_dir, exist_ok=True)
+        line = f"{datetime.now():%Y-%m-%dT%H:%M:%S}|{dbname}|{backup_type.capitalize()}|{'OK' if ok else 'FAIL'}|{';'.join(targets)}\n"
+        with open(os.path.join(log_dir, f"{dbname}.log"), "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError as e:
+        logger.debug("Không ghi được nhật ký task của %s: %s", dbname, e)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Cổng trạng thái cục bộ của dịch vụ sao lưu (giao diện / dòng lệnh kết nối vào để xem và điều khiển)
+- TCP chỉ nghe trên 127.0.0.1 (BACKUP_SERVICE_PORT), mỗi dòng là 1 yêu cầu JSON, mỗi dòng trả về là 1 JSON:
+    {"cmd": "status", "token": "..."}                     -> {"success": true, "message": "...", "data": {...}}
+    {"cmd": "run", "job_id": "DB:FULL", "token": "..."}   -> chạy ngay 1 công việc
+    {"cmd": "reload", "token": "..."}                     -> đọc lại scheduler.json và lên lịch lại
+- Xác thực bằng mã bí mật: dịch vụ sinh mã mới mỗi lần khởi động, ghi ra BACKUP_SERVICE_TOKEN_FILE
+  (chỉ tài khoản chạy dịch vụ đọc được); yêu cầu sai mã bị từ chối và đóng kết nối.
+- Windows: cổng được giữ độc quyền (SO_EXCLUSIVEADDRUSE), tiến trình khác không chiếm lại được cổng đang nghe.
+- Lệnh được xử lý bởi hàm handler(cmd, params) -> dict do dịch vụ cung cấp.
+- query_service: hàm phía client (dùng trong GUI), không ném lỗi khi dịch vụ không chạy.
+"""
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import socketserver
+import subprocess
+import threading
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKUP_SERVICE_HOST = "127.0.0.1"
+BACKUP_SERVICE_PORT = int(os.getenv("BACKUP_SERVICE_PORT", "8765"))
+BACKUP_SERVICE_TOKEN_FILE = os.getenv(
+    "BACKUP_SERVICE_TOKEN_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "backup", "service.token"))
+# Kích thước tối đa 1 yêu cầu (byte)
+MAX_REQUEST_BYTES = 64 * 1024
+CLIENT_TIMEOUT_SECONDS = 5.0
+
+
+class _StatusHandler(socketserver.StreamRequestHandler):
+    timeout = 300
+
+    def handle(self):
+        while True:
+            try:
+                line = self.rfile.readline(MAX_REQUEST_BYTES + 1)
+            except (OSError, socket.timeout):
+                return
+            if not line:
+                return
+            if len(line) > MAX_REQUEST_BYTES:
+                self._reply({"success": False, "message": "Yêu cầu quá lớn."})
+                return
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("yêu cầu phải là object JSON")
+                if not hmac.compare_digest(str(request.pop("token", "")).encode("utf-8"),
+                                           self.server.token.encode("utf-8")):
+                    logger.warning("Từ chối yêu cầu trạng thái sai mã xác thực từ %s", self.client_address[0])
+                    self._reply({"success": False, "message": "Sai mã xác thực dịch vụ sao lưu."})
+                    return
+                cmd = request.pop("cmd", None)
+                response = self.server.handler(cmd, request)
+            except ValueError as e:
+                response = {"success": False, "message": f"Yêu cầu không hợp lệ: {e}"}
+            except Exception as e:
+                logger.exception("Lỗi khi xử lý yêu cầu trạng thái: %s", e)
+                response = {"success": False, "message": f"Lỗi dịch vụ: {e}"}
+            if not self._reply(response):
+                return
+
+    def _reply(self, response: Dict[str, Any]) -> bool:
+        try:
+            self.wfile.write(json.dumps(response, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+            return True
+        except OSError:
+            return False
+
+
+class StatusServer(socketserver.ThreadingTCPServer):
+    """Máy chủ trạng thái chạy trên luồng nền; port=0 để hệ điều hành chọn cổng trống, token là mã xác thực."""
+
+    daemon_threads = True
+    # Windows: SO_REUSEADDR cho phép tiến trình khác bind chồng lên cổng đang nghe -> dùng SO_EXCLUSIVEADDRUSE
+    allow_reuse_address = os.name != "nt"
+
+    def __init__(self, handler: Callable[[Optional[str], Dict[str, Any]], Dict[str, Any]], token: str,
+                 host: str = BACKUP_SERVICE_HOST, port: int = BACKUP_SERVICE_PORT):
+        if not token:
+            raise ValueError("Cổng trạng thái cần mã xác thực")
+        self.token = token
+        super().__init__((host, port), _StatusHandler)
+        self.handler = handler
+        self._thread: Optional[threading.Thread] = None
+
+    def server_bind(self):
+        if os.name == "nt" and hasattr(socket, "SO_EXCLUSIVEADDRUSE"):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        super().server_bind()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "StatusServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="backup-status", daemon=True)
+        self._thread.start()
+        logger.info("Cổng trạng thái dịch vụ sao lưu: %s:%s", *self.server_address[:2])
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def _restrict_to_current_user(path: str):
+    """Chỉ tài khoản đang chạy tiến trình đọc được tệp (POSIX: quyền 600; Windows: ACL riêng qua icacls)."""
+    if os.name != "nt":
+        os.chmod(path, 0o600)
+        return
+    # Lấy SID của tài khoản hiện tại (đúng cả khi dịch vụ chạy bằng LocalSystem / tài khoản dịch vụ)
+    proc = subprocess.run(["whoami", "/user", "/fo", "csv", "/nh"], capture_output=True, text=True, check=True)
+    sid = proc.stdout.strip().split(",")[-1].strip('"')
+    subprocess.run(["icacls", path, "/inheritance:r", "/grant:r", f"*{sid}:F"], capture_output=True, check=True)
+
+
+def write_token_file(path: str = BACKUP_SERVICE_TOKEN_FILE) -> str:
+    """Sinh mã xác thực mới và ghi ra tệp chỉ tài khoản chạy dịch vụ đọc được; trả về mã đã sinh."""
+    token = secrets.token_urlsafe(32)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    try:
+        _restrict_to_current_user(path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        os.remove(path)
+        raise OSError(f"Không giới hạn được quyền đọc tệp mã xác thực {path}: {e}") from e
+    return token
+
+
+def read_token_file(path: str = BACKUP_SERVICE_TOKEN_FILE) -> Optional[str]:
+    """Đọc mã xác thực của dịch vụ; không có tệp / không có quyền đọc thì trả về None."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def query_service(cmd: str = "status", host: str = BACKUP_SERVICE_HOST, port: int = BACKUP_SERVICE_PORT,
+                  timeout: float = CLIENT_TIMEOUT_SECONDS, token_file: str = BACKUP_SERVICE_TOKEN_FILE,
+                  **params) -> Dict[str, Any]:
+    """Gửi 1 lệnh tới dịch vụ sao lưu đang chạy; dịch vụ không chạy thì trả về success = False."""
+    token = read_token_file(token_file)
+    if token is None:
+        return {"success": False, "message": f"Không đọc được mã xác thực dịch vụ sao lưu ({token_file}): "
+                                             "dịch vụ chưa chạy hoặc tài khoản này không có quyền."}
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(json.dumps(dict(params, cmd=cmd, token=token)).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+    except OSError as e:
+        return {"success": False, "message": f"Không kết nối được dịch vụ sao lưu ({host}:{port}): {e}"}
+    if not line:
+        return {"success": False, "message": "Dịch vụ sao lưu đóng kết nối."}
+    try:
+        return json.loads(line)
+    except ValueError:
+        return {"success": False, "message": "Phản hồi không hợp lệ từ dịch vụ sao lưu."}
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Chạy benchmark từ dòng lệnh (trong thư mục src):
+
+    python -m benchmark auth --clients 16 --duration 30 --output auth_new.json
+    python -m benchmark email --messages 500 --attachment-mb 50 --fault-4xx 0.05 --output email_new.json
+    python -m benchmark smtp-sink --port 2525 --latency-ms 20
+    python -m benchmark compare auth_old.json auth_new.json --threshold 10
+
+- auth: benchmark đăng nhập/session/OTP/danh sách người dùng (mặc định trên SQLite, không cần SQL Server).
+- email: benchmark gửi email (plain/template/tệp đính kèm lớn) qua spool tới SMTP sink trong tiến trình.
+- smtp-sink: chạy riêng SMTP sink (trỏ SMTP_HOST/SMTP_PORT của ứng dụng vào đây để thử gửi email không cần máy chủ thật).
+- compare: so sánh 2 file kết quả, mã thoát 1 nếu có chỉ số hồi quy quá ngưỡng (dùng được trong CI).
+"""
+import argparse
+import logging
+import sys
+import time
+
+# Mở comment 3 dòng bên dưới mỗi khi test (Chạy trực tiếp hàm if __main__)
+import os
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+from benchmark.stats import compare_results, format_comparison, format_summary_table, load_results, write_results
+
+
+def _parse_mix(text):
+    """Chuỗi "password_login=50,session_login=30" -> dict."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def _cmd_auth(args):
+    from benchmark.auth_bench import DEFAULT_MIX, run_auth_benchmark
+
+    results = run_auth_benchmark(
+        backend=args.backend,
+        path=args.db_path,
+        clients=args.clients,
+        duration=args.duration,
+        warmup=args.warmup,
+        users=args.users,
+        mix=_parse_mix(args.mix) if args.mix else DEFAULT_MIX,
+        seed=args.seed,
+        use_cache=not args.no_cache,
+    )
+    print(format_summary_table(results["scenarios"]))
+    total = results["total"]
+    print(f"\nTổng: {total['count']} thao tác, {total['throughput_per_s']:.1f} op/s, "
+          f"p95 {total['p95_ms']} ms, lỗi {total['errors']}")
+    if args.output:
+        write_results(args.output, results)
+        print(f"Đã ghi kết quả: {args.output}")
+    return 0 if total["errors"] == 0 or args.allow_errors else 1
+
+
+def _sink_options(args):
+    return {"latency_ms": args.latency_ms, "data_latency_ms": args.data_latency_ms, "fault_4xx": args.fault_4xx,
+            "fault_5xx": args.fault_5xx, "fault_disconnect": args.fault_disconnect}
+
+
+def _cmd_email(args):
+    from benchmark.email_bench import run_email_benchmark
+
+    # Lỗi giả lập làm spool ghi log lỗi cho từng email, tắt để không làm chậm/nhiễu kết quả
+    logging.getLogger("services.mail_spool").setLevel(logging.CRITICAL)
+    results = run_email_benchmark(
+        scenarios=[name.strip() for name in args.scenarios.split(",") if name.strip()],
+        messages=args.messages,
+        attachment_messages=args.attachment_messages,
+        attachment_mb=args.attachment_mb,
+        concurrency=args.concurrency,
+        workers=args.workers,
+        max_attempts=args.max_attempts,
+        retry_delay=args.retry_delay,
+        seed=args.seed,
+        track_memory=not args.no_memory,
+        timeout=args.timeout,
+        **_sink_options(args),
+    )
+    scenarios = results["scenarios"]
+    print(format_summary_table(scenarios))
+    print()
+    for name, s in scenarios.items():
+        memory = "-" if s["peak_memory_mb"] is None else f"{s['peak_memory_mb']:.1f} MB"
+        print(f"{name:<18}bộ nhớ đỉnh {memory}, {s['sent_mb_per_s']:.1f} MB/s, "
+              f"{s['smtp_connections']} kết nối SMTP, gửi lại {s['spool']['retries']}"
+              + ("" if s["completed"] else " (HẾT THỜI GIAN CHỜ)"))
+    if args.output:
+        write_results(args.output, results)
+        print(f"Đã ghi kết quả: {args.output}")
+    errors = sum(s["errors"] for s in scenarios.values())
+    return 0 if errors == 0 or args.allow_errors else 1
+
+
+def _cmd_smtp_sink(args):
+    from benchmark.smtp_sink import SMTPSink
+
+    sink = SMTPSink(host=args.host, port=args.port, seed=args.seed, **_sink_options(args)).start()
+    print(f"SMTP sink lắng nghe tại {sink.host}:{sink.port} (Ctrl+C để dừng)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.stop()
+    print(sink.stats())
+    return 0
+
+
+def _add_fault_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Độ trễ trước mỗi phản hồi của SMTP sink (ms)")
+    parser.add_argument("--data-latency-ms", type=float, default=0.0, help="Độ trễ thêm trước khi nhận email (ms)")
+    parser.add_argument("--fault-4xx", type=float, default=0.0, help="Tỉ lệ email bị trả 451 (0..1)")
+    parser.add_argument("--fault-5xx", type=float, default=0.0, help="Tỉ lệ email bị trả 554 (0..1)")
+    parser.add_argument("--fault-disconnect", type=float, default=0.0, help="Tỉ lệ email bị trả 421 và ngắt kết nối (0..1)")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def _cmd_compare(args):
+    comparison = compare_results(load_results(args.baseline), load_results(args.current), args.threshold, args.min_delta_ms)
+    print(format_comparison(comparison))
+    return 1 if comparison["regressions"] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Benchmark hiệu năng ứng dụng")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    auth = subparsers.add_parser("auth", help="Benchmark dịch vụ xác thực/quản lý người dùng")
+    auth.add_argument("--backend", default="sqlite", choices=("sqlite", "sqlserver"))
+    auth.add_argument("--db-path", default=None, help="File SQLite (mặc định: file tạm, xóa sau khi chạy)")
+    auth.add_argument("--clients", type=int, default=8, help="Số client đồng thời")
+    auth.add_argument("--duration", type=float, default=10.0, help="Thời gian đo (giây)")
+    auth.add_argument("--warmup", type=float, default=1.0, help="Thời gian khởi động không tính kết quả (giây)")
+    auth.add_argument("--users", type=int, default=50, help="Số tài khoản mẫu")
+    auth.add_argument("--mix", default=None, help="Tỉ trọng kịch bản, VD: password_login=50,session_login=30")
+    auth.add_argument("--seed", type=int, default=42)
+    auth.add_argument("--no-cache", action="store_true", help="Tắt cache tra cứu người dùng")
+    auth.add_argument("--allow-errors", action="store_true", help="Không trả mã lỗi khi có thao tác thất bại")
+    auth.add_argument("--output", "-o", default=None, help="Ghi kết quả JSON ra file")
+    auth.set_defaults(func=_cmd_auth)
+
+    email = subparsers.add_parser("email", help="Benchmark gửi email qua spool tới SMTP sink trong tiến trình")
+    email.add_argument("--scenarios", default="plain,template,attachment", help="Các kịch bản, VD: plain,attachment")
+    email.add_argument("--messages", type=int, default=200, help="Số email mỗi kịch bản plain/template")
+    email.add_argument("--attachment-messages", type=int, default=5, help="Số email kịch bản attachment")
+    email.add_argument("--attachment-mb", type=float, default=20.0, help="Kích thước tệp đính kèm (MB)")
+    email.add_argument("--concurrency", type=int, default=8, help="Số email tối đa đang chờ cùng lúc")
+    email.add_argument("--workers", type=int, default=3, help="Số luồng gửi của spool")
+    email.add_argument("--max-attempts", type=int, default=3, help="Số lần gửi tối đa mỗi email")
+    email.add_argument("--retry-delay", type=float, default=0.05, help="Thời gian chờ gửi lại lần đầu (giây)")
+    email.add_argument("--timeout", type=float, default=300.0, help="Thời gian chờ tối đa mỗi kịch bản (giây)")
+    email.add_argument("--no-memory", action="store_true", help="Không đo bộ nhớ (tracemalloc làm chậm thông lượng)")
+    email.add_argument("--allow-errors", action="store_true", help="Không trả mã lỗi khi có email gửi thất bại")
+    email.add_argument("--output", "-o", default=None, help="Ghi kết quả JSON ra file")
+    _add_fault_arguments(email)
+    email.set_defaults(func=_cmd_email)
+
+    sink = subparsers.add_parser("smtp-sink", help="Chạy SMTP sink (nhận và bỏ email, có giả lập độ trễ/lỗi)")
+    sink.add_argument("--host", default="127.0.0.1")
+    sink.add_argument("--port", type=int, default=2525)
+    _add_fault_arguments(sink)
+    sink.set_defaults(func=_cmd_smtp_sink)
+
+    compare = subparsers.add_parser("compare", help="So sánh 2 file kết quả benchmark")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=10.0, help="Ngưỡng hồi quy (%%)")
+    compare.add_argument("--min-delta-ms", type=float, default=1.0, help="Độ trễ phải tăng ít nhất bấy nhiêu ms mới tính là hồi quy")
+    compare.set_defaults(func=_cmd_compare)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR, format="%(levelname)s %(name)s: %(message)s")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
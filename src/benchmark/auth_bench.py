@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark tải cho dịch vụ xác thực/quản lý người dùng
+- N client giả lập chạy đồng thời (mỗi client 1 luồng), mỗi vòng chọn ngẫu nhiên 1 kịch bản theo tỉ trọng:
+    + password_login: get_password_salt_password_privilege_user + kiểm tra mật khẩu (qua KDFExecutor)
+    + session_login: get_user_by_session (auto login bằng session token)
+    + otp_reset: cập nhật OTP, đọc lại OTP, đổi mật khẩu (giống luồng quên mật khẩu)
+    + admin_listing: đọc 2 trang danh sách người dùng (get_users_page)
+- Mặc định chạy trên backend SQLite (file tạm) nên không cần SQL Server.
+- Kết quả: p50/p95/p99, thông lượng, tỉ lệ lỗi theo kịch bản + số liệu truy vấn của My_Database.
+"""
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from services import database_service
+from services.database_service import create_database
+from services.kdf_executor import get_kdf_executor
+
+from benchmark.stats import summarize
+
+# Tỉ trọng mặc định của các kịch bản (tổng không cần bằng 100)
+DEFAULT_MIX = {
+    "password_login": 50,
+    "session_login": 30,
+    "otp_reset": 10,
+    "admin_listing": 10,
+}
+
+BENCH_PASSWORD = "Bench@123456"
+
+
+class AuthBenchmark:
+    """
+    Chạy benchmark xác thực trên 1 đối tượng CSDL (My_Database hoặc SQLiteDatabase).
+
+    :param database: đối tượng CSDL đã khởi tạo.
+    :param clients: số client chạy đồng thời.
+    :param duration: thời gian chạy (giây) sau giai đoạn khởi động.
+    :param warmup: thời gian khởi động (giây), kết quả trong giai đoạn này không được tính.
+    :param users: số tài khoản mẫu được tạo trước khi chạy.
+    :param mix: tỉ trọng các kịch bản.
+    :param seed: hạt giống ngẫu nhiên để các lần chạy có cùng chuỗi thao tác.
+    """
+
+    def __init__(self, database, clients: int = 8, duration: float = 10.0, warmup: float = 1.0,
+                 users: int = 50, mix: Optional[Dict[str, int]] = None, seed: int = 42):
+        self.db = database
+        self.clients = clients
+        self.duration = duration
+        self.warmup = warmup
+        self.users = users
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.seed = seed
+
+        self.emails: List[str] = []
+        self.sessions: List[str] = []
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = {name: [] for name in self.mix}
+        self._errors: Dict[str, int] = {name: 0 for name in self.mix}
+        self._scenarios: Dict[str, Callable[[random.Random], bool]] = {
+            "password_login": self.password_login,
+            "session_login": self.session_login,
+            "otp_reset": self.otp_reset,
+            "admin_listing": self.admin_listing,
+        }
+        unknown = set(self.mix) - set(self._scenarios)
+        if unknown:
+            raise ValueError(f"Kịch bản không hợp lệ: {', '.join(sorted(unknown))}")
+
+    # ----------------------------- Chuẩn bị dữ liệu -----------------------------
+    def seed_data(self):
+        """Tạo tài khoản mẫu (đã kích hoạt) và 1 session cho mỗi tài khoản."""
+        emails = [f"bench{i:05d}@example.com" for i in range(self.users)]
+
+        def _create(index_email):
+            index, email = index_email
+            if not self.db.get_username(email)["data"]:
+                result = self.db.create_new_user(f"Bench {index:05d}", email, BENCH_PASSWORD)
+                if not result["success"]:
+                    raise RuntimeError(result["message"])
+            session = self.db.create_session_by_email(email, days=1, device_info="benchmark")
+            if not session["success"]:
+                raise RuntimeError(session["message"])
+            return session["token"]
+
+        # Băm scrypt tốn CPU nhưng nhả GIL -> tạo song song cho nhanh
+        with ThreadPoolExecutor(max_workers=max(1, self.clients)) as executor:
+            self.sessions = list(executor.map(_create, enumerate(emails)))
+
+        result = self.db.activate_users(emails)
+        if not result["success"]:
+            raise RuntimeError(result["message"])
+        self.emails = emails
+
+    # ----------------------------- Kịch bản -----------------------------
+    def password_login(self, rng: random.Random) -> bool:
+        email = rng.choice(self.emails)
+        result = self.db.get_password_salt_password_privilege_user(email)
+        if not result["success"] or not result["data"]:
+            return False
+        row = result["data"][0]
+        return bool(get_kdf_executor().verify_password(row[1], row[0], BENCH_PASSWORD))
+
+    def session_login(self, rng: random.Random) -> bool:
+        result = self.db.get_user_by_session(rng.choice(self.sessions))
+        return bool(result["success"] and result["data"])
+
+    def otp_reset(self, rng: random.Random) -> bool:
+        email = rng.choice(self.emails)
+        otp = f"{rng.randrange(1000000):06d}"
+        updated = self.db.update_OTP_and_time_expired(email=email, OTP=otp, time_expired=datetime.now() + timedelta(minutes=10))
+        if not updated["success"]:
+            return False
+        stored = self.db.get_otp_and_expired_time(email=email)
+        if not stored["success"] or not stored["data"] or stored["data"][0][0] != otp:
+            return False
+        return bool(self.db.update_password_user(email=email, password=BENCH_PASSWORD)["success"])
+
+    def admin_listing(self, rng: random.Random) -> bool:
+        page = self.db.get_users_page(sort_column=rng.choice(("Email", "User_Name", "Privilege")), page_size=25)
+        if not page["success"]:
+            return False
+        if page["next_cursor"] is not None:
+            page = self.db.get_users_page(sort_column="Email", cursor=page["next_cursor"], page_size=25)
+        return bool(page["success"])
+
+    # ----------------------------- Chạy -----------------------------
+    def _client(self, client_id: int, start_at: float, measure_from: float, stop_at: float):
+        rng = random.Random(self.seed * 1000 + client_id)
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        while time.perf_counter() < start_at:
+            time.sleep(0.001)
+
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                return
+            name = rng.choices(names, weights)[0]
+            try:
+                ok = self._scenarios[name](rng)
+            except Exception:
+                ok = False
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            if started < measure_from:
+                continue
+            with self._lock:
+                self._samples[name].append(elapsed_ms)
+                if not ok:
+                    self._errors[name] += 1
+
+    def run(self) -> Dict[str, Any]:
+        """Chuẩn bị dữ liệu, chạy các client đồng thời và trả về kết quả dạng dict (ghi JSON được)."""
+        seed_started = time.perf_counter()
+        self.seed_data()
+        seed_seconds = time.perf_counter() - seed_started
+        self.db.metrics.reset()
+
+        start_at = time.perf_counter() + 0.05
+        measure_from = start_at + self.warmup
+        stop_at = measure_from + self.duration
+        threads = [
+            threading.Thread(target=self._client, args=(i, start_at, measure_from, stop_at), name=f"bench-client-{i}")
+            for i in range(self.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        elapsed = self.duration
+        scenarios = {name: summarize(self._samples[name], self._errors[name], elapsed) for name in self.mix}
+        all_samples = [value for samples in self._samples.values() for value in samples]
+        return {
+            "meta": {
+                "kind": "auth",
+                "started_at": datetime.now().isoformat(timespec="seconds"),
+                "backend": type(self.db).__name__,
+                "clients": self.clients,
+                "duration_s": self.duration,
+                "warmup_s": self.warmup,
+                "users": self.users,
+                "mix": self.mix,
+                "seed": self.seed,
+                "seed_data_s": round(seed_seconds, 3),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "scenarios": scenarios,
+            "total": summarize(all_samples, sum(self._errors.values()), elapsed),
+            "db_metrics": self.db.get_metrics_snapshot(),
+        }
+
+
+def run_auth_benchmark(backend: str = "sqlite", path: Optional[str] = None, clients: int = 8, duration: float = 10.0,
+                       warmup: float = 1.0, users: int = 50, mix: Optional[Dict[str, int]] = None, seed: int = 42,
+                       use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Tạo CSDL theo backend và chạy AuthBenchmark.
+    - backend "sqlite": path mặc định là 1 file tạm mới (bị xóa sau khi chạy).
+    - use_cache=False: tắt cache tra cứu người dùng để đo đúng chi phí truy vấn CSDL.
+    """
+    temp_dir = None
+    kwargs: Dict[str, Any] = {"pool_max_size": max(clients, 1)}
+    if backend == "sqlite":
+        if path is None:
+            temp_dir = tempfile.TemporaryDirectory(prefix="auth-bench-")
+            path = os.path.join(temp_dir.name, "bench.db")
+        kwargs["path"] = path
+
+    original_ttl = database_service._user_cache.ttl
+    if not use_cache:
+        # TTL = 0: mục vừa ghi đã hết hạn, mọi lần tra cứu đều xuống CSDL
+        database_service._user_cache.ttl = 0
+    database = create_database(backend, **kwargs)
+    try:
+        benchmark = AuthBenchmark(database, clients=clients, duration=duration, warmup=warmup,
+                                  users=users, mix=mix, seed=seed)
+        results = benchmark.run()
+        results["meta"]["user_cache"] = use_cache
+        return results
+    finally:
+        database.close()
+        database_service._user_cache.ttl = original_ttl
+        database_service._user_cache.clear()
+        if temp_dir is not None:
+            temp_dir.cleanup()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark đường gửi email (InternalEmailSender -> MailSpool -> SMTPSession) trên SMTP sink trong tiến trình
+- Không cần máy chủ SMTP_HOST thật: mỗi kịch bản chạy 1 SMTPSink mới (có thể giả lập độ trễ và lỗi 4xx/5xx/421).
+- Kịch bản:
+    + plain: email HTML ngắn qua send_email_async
+    + template: email tạo tài khoản (send_email_for_new_account, có chữ ký)
+    + attachment: email có tệp đính kèm lớn (gửi theo luồng qua services.mime_stream)
+- Vòng kín: tối đa `concurrency` email đang chờ, độ trễ = từ lúc xếp vào spool tới khi callback báo kết quả
+  (đã gồm thời gian chờ trong hàng đợi và các lần gửi lại).
+- Kết quả: thông lượng, p50/p95/p99, số lỗi, đỉnh bộ nhớ cấp phát (tracemalloc), số kết nối SMTP đã mở.
+"""
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from services.email_service import InternalEmailSender
+from services.mail_spool import MailSpool
+
+from benchmark.smtp_sink import SMTPSink
+from benchmark.stats import summarize
+
+DEFAULT_SCENARIOS = ("plain", "template", "attachment")
+
+BENCH_SENDER = "bench@bench.local"
+PLAIN_BODY = "<html><body><p>Email benchmark.</p></body></html>"
+ATTACHMENT_CHUNK_BYTES = 1024 * 1024
+
+
+def create_attachment(path: str, size_mb: float):
+    """Tạo tệp đính kèm ngẫu nhiên (không nén được) theo từng khối 1 MB."""
+    remaining = int(size_mb * 1024 * 1024)
+    with open(path, "wb") as f:
+        while remaining > 0:
+            chunk = min(remaining, ATTACHMENT_CHUNK_BYTES)
+            f.write(os.urandom(chunk))
+            remaining -= chunk
+
+
+class EmailBenchmark:
+    """
+    Chạy các kịch bản gửi email qua spool tới SMTPSink.
+
+    :param scenarios: các kịch bản cần chạy (plain, template, attachment).
+    :param messages: số email mỗi kịch bản plain/template.
+    :param attachment_messages: số email kịch bản attachment.
+    :param attachment_mb: kích thước tệp đính kèm (MB).
+    :param concurrency: số email tối đa đang chờ cùng lúc.
+    :param workers: số luồng gửi của spool (luồng đầu tiên chỉ gửi làn critical).
+    :param max_attempts, retry_delay: số lần gửi tối đa và thời gian chờ gửi lại lần đầu (giây) của spool.
+    :param sink_options: tham số cho SMTPSink (latency_ms, data_latency_ms, fault_4xx, fault_5xx, fault_disconnect, seed).
+    :param track_memory: đo đỉnh bộ nhớ bằng tracemalloc (làm chậm thông lượng đáng kể).
+    :param timeout: thời gian chờ tối đa cho mỗi kịch bản (giây).
+    """
+
+    def __init__(self, scenarios: Sequence[str] = DEFAULT_SCENARIOS, messages: int = 200, attachment_messages: int = 5,
+                 attachment_mb: float = 20.0, concurrency: int = 8, workers: int = 3, max_attempts: int = 3,
+                 retry_delay: float = 0.05, sink_options: Optional[Dict[str, Any]] = None, track_memory: bool = True,
+                 timeout: float = 300.0):
+        self._scenarios: Dict[str, Callable[[InternalEmailSender, int, Callable], Optional[str]]] = {
+            "plain": self.send_plain,
+            "template": self.send_template,
+            "attachment": self.send_attachment,
+        }
+        unknown = set(scenarios) - set(self._scenarios)
+        if unknown:
+            raise ValueError(f"Kịch bản không hợp lệ: {', '.join(sorted(unknown))}")
+        self.scenarios = list(scenarios)
+        self.messages = messages
+        self.attachment_messages = attachment_messages
+        self.attachment_mb = attachment_mb
+        self.concurrency = max(1, concurrency)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.sink_options = dict(sink_options or {})
+        self.track_memory = track_memory
+        self.timeout = timeout
+        self.attachment_path: Optional[str] = None
+
+    # ----------------------------- Kịch bản -----------------------------
+    @staticmethod
+    def _address(index: int) -> str:
+        return f"user{index}@bench.local"
+
+    def send_plain(self, sender: InternalEmailSender, index: int, callback: Callable) -> Optional[str]:
+        return sender.send_email_async(self._address(index), f"Benchmark #{index}", PLAIN_BODY, callback=callback)
+
+    def send_template(self, sender: InternalEmailSender, index: int, callback: Callable) -> Optional[str]:
+        return sender.send_email_for_new_account(self._address(index), f"Người dùng {index}", "Benchmark", callback=callback)
+
+    def send_attachment(self, sender: InternalEmailSender, index: int, callback: Callable) -> Optional[str]:
+        return sender.send_email_async(self._address(index), f"Benchmark #{index}", PLAIN_BODY,
+                                       signature=sender.signature_email, attachment_path=self.attachment_path,
+                                       callback=callback)
+
+    # ----------------------------- Chạy -----------------------------
+    def run_scenario(self, name: str, work_dir: str) -> Dict[str, Any]:
+        """Chạy 1 kịch bản trên 1 SMTPSink + MailSpool mới, trả về thống kê của kịch bản."""
+        count = self.attachment_messages if name == "attachment" else self.messages
+        submit = self._scenarios[name]
+
+        sink = SMTPSink(**self.sink_options).start()
+        spool = MailSpool(None, directory=os.path.join(work_dir, f"spool_{name}"), workers=self.workers,
+                          max_attempts=self.max_attempts, base_delay=self.retry_delay, start=False)
+        sender = InternalEmailSender(email=BENCH_SENDER, password="", smtp_host="127.0.0.1", smtp_port=sink.port,
+                                     email_service="internal", spool=spool)
+        spool.sender = sender
+
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(self.concurrency)
+        finished = threading.Event()
+        samples: List[float] = []
+        state = {"errors": 0, "done": 0}
+
+        def complete(started: float, ok: bool):
+            with lock:
+                samples.append((time.perf_counter() - started) * 1000.0)
+                if not ok:
+                    state["errors"] += 1
+                state["done"] += 1
+                if state["done"] >= count:
+                    finished.set()
+            slots.release()
+
+        if self.track_memory:
+            tracemalloc.start()
+        spool.start()
+        started_at = time.perf_counter()
+        try:
+            for index in range(count):
+                slots.acquire()
+                started = time.perf_counter()
+                # Địa chỉ không hợp lệ thì send_email_async gọi callback(False) ngay, slot vẫn được trả lại
+                submit(sender, index, lambda _email, ok, started=started: complete(started, ok))
+            completed = count == 0 or finished.wait(self.timeout)
+            elapsed = time.perf_counter() - started_at
+            peak_bytes = tracemalloc.get_traced_memory()[1] if self.track_memory else None
+        finally:
+            if self.track_memory:
+                tracemalloc.stop()
+            spool.shutdown(timeout=5)
+            sender.close()
+            sink.stop()
+
+        result = summarize(samples, state["errors"] + (count - state["done"]), elapsed)
+        sink_stats = sink.stats()
+        spool_stats = spool.stats()
+        result.update({
+            "messages": count,
+            "completed": completed,
+            "peak_memory_mb": None if peak_bytes is None else round(peak_bytes / (1024 * 1024), 3),
+            "sent_mb_per_s": round(sink_stats["bytes"] / (1024 * 1024) / elapsed, 3) if elapsed > 0 else 0.0,
+            "smtp_connections": sink_stats["connections"],
+            "sink": sink_stats,
+            "spool": {key: spool_stats[key] for key in ("sent", "failed", "retries")},
+        })
+        return result
+
+    def run(self) -> Dict[str, Any]:
+        """Chạy lần lượt các kịch bản và trả về kết quả dạng dict (ghi JSON được)."""
+        scenarios: Dict[str, Dict[str, Any]] = {}
+        with tempfile.TemporaryDirectory(prefix="email-bench-") as work_dir:
+            if "attachment" in self.scenarios:
+                self.attachment_path = os.path.join(work_dir, "attachment.bin")
+                create_attachment(self.attachment_path, self.attachment_mb)
+            for name in self.scenarios:
+                scenarios[name] = self.run_scenario(name, work_dir)
+            self.attachment_path = None
+
+        return {
+            "meta": {
+                "kind": "email",
+                "started_at": datetime.now().isoformat(timespec="seconds"),
+                "scenarios": self.scenarios,
+                "messages": self.messages,
+                "attachment_messages": self.attachment_messages,
+                "attachment_mb": self.attachment_mb,
+                "concurrency": self.concurrency,
+                "workers": self.workers,
+                "max_attempts": self.max_attempts,
+                "retry_delay_s": self.retry_delay,
+                "sink": self.sink_options,
+                "track_memory": self.track_memory,
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "scenarios": scenarios,
+        }
+
+
+def run_email_benchmark(scenarios: Sequence[str] = DEFAULT_SCENARIOS, messages: int = 200, attachment_messages: int = 5,
+                        attachment_mb: float = 20.0, concurrency: int = 8, workers: int = 3, max_attempts: int = 3,
+                        retry_delay: float = 0.05, latency_ms: float = 0.0, data_latency_ms: float = 0.0,
+                        fault_4xx: float = 0.0, fault_5xx: float = 0.0, fault_disconnect: float = 0.0, seed: int = 42,
+                        track_memory: bool = True, timeout: float = 300.0) -> Dict[str, Any]:
+    """Tạo EmailBenchmark từ các tham số dòng lệnh và chạy."""
+    sink_options = {"latency_ms": latency_ms, "data_latency_ms": data_latency_ms, "fault_4xx": fault_4xx,
+                    "fault_5xx": fault_5xx, "fault_disconnect": fault_disconnect, "seed": seed}
+    benchmark = EmailBenchmark(scenarios=scenarios, messages=messages, attachment_messages=attachment_messages,
+                               attachment_mb=attachment_mb, concurrency=concurrency, workers=workers,
+                               max_attempts=max_attempts, retry_delay=retry_delay, sink_options=sink_options,
+                               track_memory=track_memory, timeout=timeout)
+    return benchmark.run()
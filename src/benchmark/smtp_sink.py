@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Máy chủ SMTP giả lập chạy trong tiến trình (chỉ dùng socket, không cần thư viện ngoài)
+- Nhận email và bỏ đi (chỉ đếm số email, số byte): dùng để benchmark InternalEmailSender mà không cần SMTP_HOST thật.
+- Giả lập độ trễ mạng (mỗi phản hồi) và thời gian xử lý email (sau lệnh DATA).
+- Giả lập lỗi theo tỉ lệ: 4xx tạm thời (451), 5xx vĩnh viễn (554), 421 + ngắt kết nối.
+- Chạy riêng để thử giao diện: python -m benchmark smtp-sink --port 2525
+"""
+import logging
+import random
+import socket
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RECV_BYTES = 64 * 1024
+DATA_END = b"\r\n.\r\n"
+
+
+class _Connection:
+    """Đọc dòng lệnh / nội dung DATA từ socket qua bộ đệm."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.buffer = b""
+
+    def send(self, line: str):
+        self.sock.sendall(line.encode("ascii") + b"\r\n")
+
+    def readline(self) -> Optional[bytes]:
+        while b"\r\n" not in self.buffer:
+            data = self.sock.recv(RECV_BYTES)
+            if not data:
+                return None
+            self.buffer += data
+        line, _, self.buffer = self.buffer.partition(b"\r\n")
+        return line
+
+    def read_data(self) -> Optional[int]:
+        """Đọc tới dấu kết thúc DATA (<CRLF>.<CRLF>), trả về số byte nội dung (không giữ nội dung trong bộ nhớ)."""
+        # Dấu kết thúc có thể ngay đầu nội dung (email rỗng) nên coi như đã có CRLF phía trước
+        window = b"\r\n" + self.buffer
+        self.buffer = b""
+        size = -2
+        while True:
+            index = window.find(DATA_END)
+            if index >= 0:
+                self.buffer = window[index + len(DATA_END):]
+                return max(0, size + index)
+            # Giữ lại 4 byte cuối phòng dấu kết thúc nằm vắt qua 2 lần recv
+            keep = window[-4:]
+            size += len(window) - len(keep)
+            data = self.sock.recv(RECV_BYTES)
+            if not data:
+                return None
+            window = keep + data
+
+
+class SMTPSink:
+    """
+    Máy chủ SMTP tối giản (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT), mỗi kết nối 1 luồng.
+
+    :param host, port: địa chỉ lắng nghe (port=0: hệ điều hành tự chọn, xem self.port).
+    :param latency_ms: độ trễ trước mỗi phản hồi (giả lập thời gian khứ hồi mạng).
+    :param data_latency_ms: độ trễ thêm trước khi xác nhận nội dung email (giả lập máy chủ xử lý/quét virus).
+    :param fault_4xx: tỉ lệ email bị trả 451 (lỗi tạm thời, bên gửi nên gửi lại).
+    :param fault_5xx: tỉ lệ email bị trả 554 (lỗi vĩnh viễn).
+    :param fault_disconnect: tỉ lệ email bị trả 421 rồi ngắt kết nối.
+    :param seed: hạt giống ngẫu nhiên cho việc chọn lỗi (các lần chạy giống nhau).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, data_latency_ms: float = 0.0,
+                 fault_4xx: float = 0.0, fault_5xx: float = 0.0, fault_disconnect: float = 0.0, seed: int = 42):
+        if fault_4xx + fault_5xx + fault_disconnect > 1:
+            raise ValueError("Tổng tỉ lệ lỗi không được lớn hơn 1")
+        self.host = host
+        self.port = port
+        self.latency = latency_ms / 1000.0
+        self.data_latency = data_latency_ms / 1000.0
+        self.fault_4xx = fault_4xx
+        self.fault_5xx = fault_5xx
+        self.fault_disconnect = fault_disconnect
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._clients = set()
+        self._stats = {"connections": 0, "commands": 0, "messages": 0, "bytes": 0,
+                       "fault_4xx": 0, "fault_5xx": 0, "fault_disconnect": 0}
+
+    # ----------------------------- Khởi động / dừng -----------------------------
+    def start(self) -> "SMTPSink":
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, self.port))
+        server.listen(64)
+        self.port = server.getsockname()[1]
+        self._server = server
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._accept_loop, name="smtp-sink", daemon=True)
+        self._thread.start()
+        logger.info("SMTP sink lắng nghe tại %s:%s", self.host, self.port)
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._server is not None:
+            # close() không đánh thức accept() đang chờ trên Linux, shutdown() thì có
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._server.close()
+            self._server = None
+        with self._lock:
+            clients, self._clients = list(self._clients), set()
+        for client in clients:
+            try:
+                client.close()
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(2)
+            self._thread = None
+
+    def __enter__(self) -> "SMTPSink":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
+
+    # ----------------------------- Xử lý kết nối -----------------------------
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _accept_loop(self):
+        while not self._stopping.is_set():
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._clients.add(client)
+                self._stats["connections"] += 1
+            threading.Thread(target=self._serve, args=(client,), name="smtp-sink-client", daemon=True).start()
+
+    def _reply(self, conn: _Connection, line: str, delay: float = 0.0):
+        delay += self.latency
+        if delay > 0:
+            time.sleep(delay)
+        conn.send(line)
+
+    def _pick_fault(self) -> Optional[str]:
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.fault_4xx:
+            return "fault_4xx"
+        if roll < self.fault_4xx + self.fault_5xx:
+            return "fault_5xx"
+        if roll < self.fault_4xx + self.fault_5xx + self.fault_disconnect:
+            return "fault_disconnect"
+        return None
+
+    def _serve(self, client: socket.socket):
+        conn = _Connection(client)
+        try:
+            self._reply(conn, "220 smtp-sink ESMTP ready")
+            while True:
+                line = conn.readline()
+                if line is None:
+                    return
+                self._count("commands")
+                verb = line[:4].decode("ascii", "replace").upper()
+                if verb == "EHLO":
+                    self._reply(conn, "250-smtp-sink")
+                    conn.send("250-8BITMIME")
+                    conn.send("250 SIZE 0")
+                elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                    self._reply(conn, "250 OK")
+                elif verb == "DATA":
+                    self._reply(conn, "354 End data with <CR><LF>.<CR><LF>")
+                    size = conn.read_data()
+                    if size is None:
+                        return
+                    fault = self._pick_fault()
+                    if fault is not None:
+                        self._count(fault)
+                    if fault == "fault_4xx":
+                        self._reply(conn, "451 4.3.0 Temporary failure (injected)", self.data_latency)
+                    elif fault == "fault_5xx":
+                        self._reply(conn, "554 5.6.0 Message rejected (injected)", self.data_latency)
+                    elif fault == "fault_disconnect":
+                        self._reply(conn, "421 4.4.2 Closing connection (injected)", self.data_latency)
+                        return
+                    else:
+                        with self._lock:
+                            self._stats["messages"] += 1
+                            self._stats["bytes"] += size
+                        self._reply(conn, "250 2.0.0 Queued", self.data_latency)
+                elif verb == "QUIT":
+                    self._reply(conn, "221 Bye")
+                    return
+                else:
+                    self._reply(conn, "502 5.5.2 Command not implemented")
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._clients.discard(client)
+            client.close()
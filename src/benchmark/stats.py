@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Thống kê kết quả benchmark
+- Tổng hợp độ trễ (p50/p95/p99, trung bình, lớn nhất), số lỗi và thông lượng cho từng kịch bản.
+- Ghi/đọc kết quả dạng JSON để so sánh giữa các lần chạy.
+- So sánh 2 lần chạy: liệt kê các chỉ số xấu đi quá ngưỡng cho phép (phát hiện hồi quy hiệu năng).
+"""
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+# Các chỉ số độ trễ dùng để so sánh giữa 2 lần chạy (càng nhỏ càng tốt)
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> Optional[float]:
+    """Phân vị p (0..100) theo nội suy tuyến tính trên danh sách đã sắp xếp."""
+    if not sorted_values:
+        return None
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * p / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return sorted_values[low]
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(samples_ms: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Tổng hợp mẫu độ trễ (ms) của 1 kịch bản trong khoảng thời gian elapsed (giây)."""
+    values = sorted(samples_ms)
+    count = len(values)
+
+    def _r(value):
+        return None if value is None else round(value, 3)
+
+    return {
+        "count": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "throughput_per_s": round(count / elapsed, 3) if elapsed > 0 else 0.0,
+        "mean_ms": _r(sum(values) / count) if count else None,
+        "min_ms": _r(values[0]) if count else None,
+        "max_ms": _r(values[-1]) if count else None,
+        "p50_ms": _r(percentile(values, 50)),
+        "p95_ms": _r(percentile(values, 95)),
+        "p99_ms": _r(percentile(values, 99)),
+    }
+
+
+def write_results(path: str, results: Dict[str, Any]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, default=str)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold_pct: float = 10.0,
+                    min_delta_ms: float = 1.0) -> Dict[str, Any]:
+    """
+    So sánh 2 kết quả benchmark (cùng định dạng).
+    - Độ trễ tăng hoặc thông lượng giảm quá threshold_pct (%) được coi là hồi quy.
+    - Độ trễ chỉ bị coi là hồi quy khi tăng thêm ít nhất min_delta_ms (bỏ qua dao động của các thao tác dưới 1 ms).
+    - Tỉ lệ lỗi tăng luôn được coi là hồi quy.
+    Trả về {"rows": [...], "regressions": [...]}; mỗi dòng gồm kịch bản, chỉ số, giá trị cũ/mới và % thay đổi.
+    """
+    rows, regressions = [], []
+    base_scenarios = baseline.get("scenarios", {})
+    for name, cur in current.get("scenarios", {}).items():
+        base = base_scenarios.get(name)
+        if base is None:
+            continue
+        for key in LATENCY_KEYS + ("throughput_per_s", "error_rate"):
+            old, new = base.get(key), cur.get(key)
+            if old is None or new is None:
+                continue
+            change = ((new - old) / old * 100.0) if old else (0.0 if new == old else math.inf)
+            if key == "throughput_per_s":
+                regressed = change < -threshold_pct
+            elif key == "error_rate":
+                regressed = new > old
+            else:
+                regressed = change > threshold_pct and (new - old) >= min_delta_ms
+            row = {"scenario": name, "metric": key, "baseline": old, "current": new,
+                   "change_pct": round(change, 2) if math.isfinite(change) else None, "regressed": regressed}
+            rows.append(row)
+            if regressed:
+                regressions.append(row)
+    return {"threshold_pct": threshold_pct, "min_delta_ms": min_delta_ms, "rows": rows, "regressions": regressions}
+
+
+def format_summary_table(scenarios: Dict[str, Dict[str, Any]]) -> str:
+    """Bảng tóm tắt dạng text cho console."""
+    header = f"{'Kịch bản':<18}{'Lần':>8}{'Lỗi':>6}{'op/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    lines = [header, "-" * len(header)]
+
+    def _f(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    for name, s in scenarios.items():
+        lines.append(
+            f"{name:<18}{s['count']:>8}{s['errors']:>6}{s['throughput_per_s']:>10.1f}"
+            f"{_f(s['p50_ms']):>10}{_f(s['p95_ms']):>10}{_f(s['p99_ms']):>10}{_f(s['max_ms']):>10}"
+        )
+    return "\n".join(lines)
+
+
+def format_comparison(comparison: Dict[str, Any]) -> str:
+    """Bảng so sánh dạng text cho console, dòng hồi quy được đánh dấu '!!'."""
+    header = f"{'':<3}{'Kịch bản':<18}{'Chỉ số':<18}{'Trước':>12}{'Sau':>12}{'Thay đổi':>10}"
+    lines = [header, "-" * len(header)]
+    for row in comparison["rows"]:
+        change = "-" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+        mark = "!!" if row["regressed"] else ""
+        lines.append(
+            f"{mark:<3}{row['scenario']:<18}{row['metric']:<18}{row['baseline']:>12.3f}{row['current']:>12.3f}{change:>10}"
+        )
+    lines.append("")
+    lines.append(f"Số chỉ số hồi quy (ngưỡng {comparison['threshold_pct']}%): {len(comparison['regressions'])}")
+    return "\n".join(lines)
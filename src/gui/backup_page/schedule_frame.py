@@ -1,5 +1,4 @@
 import os
-import re
 import ctypes
 import tempfile
 import threading
@@ -8,148 +7,31 @@ import customtkinter as ctk
 from tkinter import messagebox, filedialog
 import pyodbc
 from typing import Dict, Any, Optional, Tuple, List
+from datetime import datetime
 
 from utils.modal_loading import ModalLoadingPopup
+from services.backup_crypto import BackupCryptoError, create_key_file, encrypt_file, load_key_file, verify_file
+from schedule_work.cron import CronExpression, cron_to_schtasks_args
+from backup_service.status_server import BACKUP_SERVICE_PORT, BACKUP_SERVICE_TOKEN_FILE, query_service
 
 
-# Regex để bắt 5 trường CRON( minute hour day-of-month month day-of-week), không cần phải hiểu, quá khó để hiểu mà lại ít dùng
-_CRON_RE = re.compile(r"^\s*([^\s]+)\s+([^\s]+)\s+([^\s]+)\s+([^\s]+)\s+([^\s]+)\s*$")
-# Tạo regex để bắt đúng 5 “trường” (mỗi trường là 1 chuỗi không chứa khoảng trắng).
-# ^\s*        : cho phép khoảng trắng đầu chuỗi
-# ([^\s]+)    : 1 trường bất kỳ (không chứa whitespace) – lặp 5 lần, ngăn cách bởi \s+
-# \s*$        : cho phép khoảng trắng cuối chuỗi
+# Số lần chạy kế tiếp hiển thị trong phần xem trước lịch CRON
+CRON_PREVIEW_COUNT = 5
+_VN_WEEKDAYS = ("T2", "T3", "T4", "T5", "T6", "T7", "CN")
 
 
-def _parse_cron(expr: str) -> Tuple[str, str, str, str, str]:
-    """
-    Tách 5 trường từ chuỗi CRON: phút, giờ, ngày-tháng, tháng, thứ.  
-    Báo lỗi nếu không đúng định dạng
-    """
-    # Dùng regex để kiểm tra và “bắt” (capture) 5 nhóm.
-    m = _CRON_RE.match(expr or "")
-    if not m:
-        raise ValueError("Chuỗi CRON không hợp lệ (phải có 5 trường).")
-    # Trả về 5 nhóm: minute, hour, day-of-month (DOM), month (MON), day-of-week (DOW).
-    return m.group(1), m.group(2), m.group(3), m.group(4), m.group(5)
-
-def _dow_to_names(dow_field: str) -> List[str]:
-    """
-    Chuyển trường 'thứ' của CRON thành danh sách tên viết tắt MON..SUN.
-    Hỗ trợ số (0..7), tên (MON..SUN), dải (MON-FRI), danh sách (MON,WED,FRI).
-    """
-    # Bản đồ số->tên: CRON cho phép 0 hoặc 7 đều là Chủ nhật.
-    num_map = {0: "SUN", 7: "SUN", 1: "MON", 2: "TUE", 3: "WED", 4: "THU", 5: "FRI", 6: "SAT"}
-
-    names = []
-    field = (dow_field or "").strip().upper() # Chuẩn hóa: None -> "", bỏ khoảng trắng, viết hoa để xử lý đồng nhất.
-    
-    # "*" hoặc "?" nghĩa là “mọi thứ”/“không chỉ định” ⇒ không lọc theo thứ ⇒ trả [].
-    if field in ("*", "?"):
-        return []
-    # Bỏ khoảng trắng, tách theo dấu phẩy.
-    parts = [p.strip() for p in field.replace(" ", "").split(",") if p.strip()]
-
-    # Mảng thứ theo thứ tự tuần để duyệt dải bằng tên (MON-FRI, v.v.).
-    order = ["SUN","MON","TUE","WED","THU","FRI","SAT"]
-
-    for p in parts:
-        if "-" in p:
-            # Dải: ví dụ "MON-FRI" hoặc "1-5" (số).
-            a, b = p.split("-", 1)
-            
-            if a.isalpha():
-                # Dải theo chữ: lấy chỉ số trong order theo 3 ký tự đầu (MON->"MON").
-                ia = order.index(a[:3]); ib = order.index(b[:3])
-                # Nếu dải “quấn tuần” (vd SUN-THU với a> b), ghép đuôi + đầu.
-                if ia <= ib: names.extend(order[ia:ib+1])
-                else: names.extend(order[ia:] + order[:ib+1])
-            else:
-                # Dải theo số (vd "5-1"): tạo range; nếu quấn tuần thì ghép 2 đoạn.
-                ia = int(a); ib = int(b)
-                rng = range(ia, ib+1) if ia <= ib else list(range(ia, 7)) + list(range(0, ib+1))
-                for n in rng: names.append(num_map.get(n, ""))
-        else:
-            # Không phải dải: 1 giá trị đơn lẻ.
-            if p.isalpha(): names.append(p[:3])  # Tên (MON, TUE, ...)
-            else: names.append(num_map.get(int(p), "")) # Số (0..7) → tên
-
-    out = []
-    for n in names:
-        # Loại trùng và bỏ rỗng (“” có thể do số ngoài 0..7).
-        if n and n not in out: out.append(n)
-    return out
-
-def _safe_time(minute: str, hour: str) -> str:
-    """Chuẩn hoá giờ/phút → 'HH:MM' cho schtasks /ST (nếu '*' thì 00)."""
-    # ép về biên [0..hi], tránh nhập quá giới hạn.
-    def norm_int(x: str, hi: int) -> int:
-        v = int(x)
-        return 0 if v < 0 else hi if v > hi else v
-    
-    # Nếu hour là "*", chọn 00. Ngược lại clamp 0..23.
-    h = 0 if hour == "*" else norm_int(hour, 23)
-    # minute là "*" hoặc kiểu mỗi-N-phút (“*/N”) thì chọn 00; còn lại clamp 0..59.
-    m = 0 if minute == "*" or minute.startswith("*/") else norm_int(minute, 59)
-
-    # Trả về dạng 2 chữ số: "HH:MM".
-    return f"{h:02d}:{m:02d}"
-
-def cron_to_schtasks_args(expr: str) -> Dict[str, str]:
-    """
-    Ánh xạ CRON (5 trường) sang tham số schtasks:
-      - Mỗi N phút:  */N * * * *  → /SC MINUTE /MO N /DU 24:00 /ST 00:01
-      - Hằng ngày   :   M H * * *  → /SC DAILY  /ST H:M
-      - Hằng tuần   :   M H * * D  → /SC WEEKLY /D Dlist /ST H:M
-      - Hàng tháng  :   M H DOM * * → /SC MONTHLY /D DOM /ST H:M (chỉ 1 ngày)
-    """
-    # Tách 5 trường.
-    minute, hour, dom, mon, dow = _parse_cron(expr)
-
-    # Mỗi N phút:  Chỉ hỗ trợ mẫu đúng “*/N * * * *”.
-    if minute.startswith("*/") and hour == "*" and dom == "*" and mon == "*" and dow == "*":
-        try:
-            n = int(minute[2:])
-            if n <= 0: raise ValueError
-        except Exception:
-            raise ValueError("CRON không hợp lệ: '*/N * * * *' yêu cầu N > 0.")
-        
-        # schtasks: /SC MINUTE /MO N /DU 24:00 /ST 00:01 (bắt đầu 00:01 để tránh trùng mốc 00:00).
-        return {"type": "MINUTE", "st": "00:01", "mo": str(n), "du": "24:00"}
-
-    # Hằng tuần
-    dnames = _dow_to_names(dow)
-    # Điều kiện: có chỉ định DOW; không chỉ định DOM, MON; có HOUR cố định; MINUTE không phải “*/N”.
-    if dnames and dom == "*" and mon == "*" and hour != "*" and not minute.startswith("*/"):
-        st = _safe_time(minute, hour)
-
-        # schtasks: /SC WEEKLY /D MON,WED,FRI /ST HH:MM
-        return {"type": "WEEKLY", "st": st, "dlist": ",".join(dnames)}
-
-    # Hằng ngày: Không chỉ định DOM, MON, DOW (hoặc “?”), giờ cố định, phút không phải “*/N”.
-    if dom == "*" and mon == "*" and dow in ("*", "?") and hour != "*" and not minute.startswith("*/"):
-        st = _safe_time(minute, hour)
-
-        # schtasks: /SC DAILY /ST HH:MM
-        return {"type": "DAILY", "st": st}
-
-    # Hàng tháng (DOM = 1..31)
-    if mon in ("*",) and dow in ("*", "?") and hour != "*" and dom not in ("*", "?",):
-        # Yêu cầu: MON = *, DOW = *|?, giờ cố định, DOM là 1 con số duy nhất
-        if "," in dom or "-" in dom:
-            # Đơn giản hóa: chỉ hỗ trợ **1 ngày cố định** trong tháng.
-            raise ValueError("CRON hàng tháng chỉ hỗ trợ 1 ngày cố định (vd: '0 2 1 * *').")
-        try:
-            day_num = int(dom)
-            if not (1 <= day_num <= 31): raise ValueError
-        except Exception:
-            raise ValueError("Giá trị ngày-tháng (DOM) không hợp lệ 1..31.")
-        st = _safe_time(minute, hour)
-
-        # schtasks: /SC MONTHLY /D <DOM> /ST HH:MM
-        return {"type": "MONTHLY", "st": st, "dom": str(day_num)}
-
-    # Các mẫu CRON phức tạp hơn (ví dụ: đồng thời ràng buộc DOM + DOW, bước ở giờ/phút khác, “L”, “#”, v.v.) chưa được hỗ trợ ở đây.
-    raise ValueError("CRON chưa hỗ trợ ánh xạ sang schtasks (mẫu quá phức tạp).")
+def cron_preview(expr: str, count: int = CRON_PREVIEW_COUNT, after: Optional[datetime] = None) -> str:
+    """Chuỗi mô tả count lần chạy kế tiếp của CRON (hoặc lỗi) để hiển thị trên giao diện."""
+    try:
+        fires = CronExpression(expr).next_fires(count, after)
+    except ValueError as e:
+        return f"⚠ {e}"
+    text = ", ".join(f"{_VN_WEEKDAYS[d.weekday()]} {d:%d/%m %H:%M}" for d in fires)
+    try:
+        cron_to_schtasks_args(expr)
+    except ValueError as e:
+        text += f"\n    ⚠ Task Scheduler: {e}"
+    return text
 
 
 class ScheduleFrame(ctk.CTkFrame):
@@ -265,6 +147,13 @@ class ScheduleFrame(ctk.CTkFrame):
         ctk.CTkButton(wrap, text="💾 Lưu lịch", command=self._save_schedule)\
             .grid(row=3, column=1, padx=8, pady=(6, 8), sticky="w")
 
+        # Xem trước các lần chạy kế tiếp, cập nhật khi gõ CRON
+        self._cron_preview_job = None
+        for ent in (self.ent_full, self.ent_diff, self.ent_log):
+            ent.bind("<KeyRelease>", lambda _e: self._schedule_cron_preview())
+        self.lbl_cron_preview = ctk.CTkLabel(wrap, text="", justify="left", anchor="w")
+        self.lbl_cron_preview.grid(row=4, column=0, columnspan=3, padx=12, pady=(0, 8), sticky="ew")
+
         # Ghi chú ví dụ CRON
         cron_note = (
             "CRON 5 trường: phút giờ ngày-tháng tháng thứ\n"
@@ -277,6 +166,21 @@ class ScheduleFrame(ctk.CTkFrame):
         ctk.CTkLabel(wrap, text=cron_note, justify="left", anchor="nw")\
             .grid(row=0, column=2, rowspan=4, padx=12, pady=6, sticky="nsew")
 
+    def _schedule_cron_preview(self, delay_ms: int = 300):
+        """Hẹn cập nhật phần xem trước (gộp các lần gõ phím liên tiếp)."""
+        if self._cron_preview_job is not None:
+            self.after_cancel(self._cron_preview_job)
+        self._cron_preview_job = self.after(delay_ms, self._update_cron_preview)
+
+    def _update_cron_preview(self):
+        """Hiển thị các lần chạy kế tiếp của 3 lịch FULL/DIFF/LOG."""
+        self._cron_preview_job = None
+        lines = [f"{CRON_PREVIEW_COUNT} lần chạy kế tiếp:"]
+        for name, ent in (("FULL", self.ent_full), ("DIFF", self.ent_diff), ("LOG", self.ent_log)):
+            expr = ent.get().strip()
+            lines.append(f"  {name}: " + (cron_preview(expr) if expr else "-"))
+        self.lbl_cron_preview.configure(text="\n".join(lines))
+
     # --------------------- Khối UI: backup thủ công ---------------------
 
     def _build_manual_backup(self, row: int):
@@ -298,6 +202,24 @@ class ScheduleFrame(ctk.CTkFrame):
         ctk.CTkButton(wrap, text="Chạy backup", command=self._run_manual_backup)\
             .grid(row=1, column=2, padx=8, pady=6, sticky="w")
 
+        # Mã hóa tệp backup sau khi tạo (AES-256-GCM, chỉ áp dụng khi máy này nhìn thấy thư mục backup)
+        self.chk_encrypt_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(wrap, text="Mã hóa tệp backup (AES-GCM)", variable=self.chk_encrypt_var,
+                        command=self._persist_encryption)\
+            .grid(row=2, column=0, padx=12, pady=6, sticky="w")
+
+        self.ent_key_file = ctk.CTkEntry(wrap, width=360, placeholder_text=r"Tệp khóa, VD: C:\Keys\backup.key")
+        self.ent_key_file.grid(row=2, column=1, padx=8, pady=6, sticky="w")
+        self.ent_key_file.bind("<FocusOut>", lambda _: self._persist_encryption())
+
+        ctk.CTkButton(wrap, text="Chọn/Tạo khóa", width=120, command=self._choose_key_file)\
+            .grid(row=2, column=2, padx=8, pady=6, sticky="w")
+
+        self.chk_delete_plain_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(wrap, text="Xóa tệp gốc sau khi mã hóa & kiểm tra", variable=self.chk_delete_plain_var,
+                        command=self._persist_encryption)\
+            .grid(row=3, column=1, padx=8, pady=(0, 10), sticky="w")
+
     # --------------------- Khối UI: Task Scheduler ---------------------
 
     def _build_task_scheduler(self, row: int):
@@ -361,6 +283,9 @@ class ScheduleFrame(ctk.CTkFrame):
             .grid(row=rowb+1, column=1, padx=8, pady=(0, 8), sticky="w")
         ctk.CTkButton(wrap, text="🗑️ Xóa task (yêu cầu quyền Admin)", command=self._delete_tasks_elevated)\
             .grid(row=rowb+1, column=2, padx=8, pady=(0, 8), sticky="w")
+        # Dịch vụ nền (python -m backup_service serve) thay cho PS1 + schtasks
+        ctk.CTkButton(wrap, text="📡 Trạng thái dịch vụ nền", command=self._show_service_status)\
+            .grid(row=rowb+1, column=3, padx=8, pady=(0, 8), sticky="w")
 
     # ============================ DB selection ============================
 
@@ -426,6 +351,7 @@ class ScheduleFrame(ctk.CTkFrame):
         self.ent_full.delete(0, "end"); self.ent_full.insert(0, sch.get("full", "0 0 * * 0"))
         self.ent_diff.delete(0, "end"); self.ent_diff.insert(0, sch.get("diff", "30 0 * * 1-6"))
         self.ent_log.delete(0, "end");  self.ent_log.insert(0,  sch.get("log",  "*/15 * * * *"))
+        self._update_cron_preview()
 
         # Scheduler
         s2 = db_cfg.get("scheduler", {})
@@ -444,16 +370,24 @@ class ScheduleFrame(ctk.CTkFrame):
         self.ent_sql_user.delete(0, "end"); self.ent_sql_user.insert(0, s2.get("sql_user", ""))
         self.ent_sql_pass.delete(0, "end"); self.ent_sql_pass.insert(0, s2.get("sql_pass", ""))
 
+        # Mã hóa tệp backup
+        enc = db_cfg.get("encryption", {})
+        self.chk_encrypt_var.set(bool(enc.get("enabled", False)))
+        self.ent_key_file.delete(0, "end"); self.ent_key_file.insert(0, enc.get("key_file") or "")
+        self.chk_delete_plain_var.set(bool(enc.get("delete_plain", False)))
+
     def _clear_form(self):
         """
         Xoá nội dung UI khi chưa có DB.
         """
         self.ent_dir.delete(0, "end")
         self.ent_full.delete(0, "end"); self.ent_diff.delete(0, "end"); self.ent_log.delete(0, "end")
+        self._update_cron_preview()
         self.ent_instance.delete(0, "end"); self.spn_stripes.delete(0, "end"); self.ent_ps1.delete(0, "end")
         self.chk_run_always_var.set(True)
         self.ent_user.delete(0, "end"); self.ent_pass.delete(0, "end")
         self.ent_sql_user.delete(0, "end"); self.ent_sql_pass.delete(0, "end")
+        self.chk_encrypt_var.set(False); self.ent_key_file.delete(0, "end"); self.chk_delete_plain_var.set(False)
 
     def _persist_for_current_db(self):
         """
@@ -465,6 +399,40 @@ class ScheduleFrame(ctk.CTkFrame):
         self.owner.save_config(silent=True)
         self._log(f"• Đã lưu thư mục lưu trữ cho [{self.current_db}]")
 
+    def _persist_encryption(self):
+        """
+        Lưu cấu hình mã hóa tệp backup cho DB hiện tại.
+        """
+        if not self.current_db: return
+        self.owner.config.setdefault("per_db", {}).setdefault(self.current_db, {})["encryption"] = {
+            "enabled": bool(self.chk_encrypt_var.get()),
+            "key_file": self.ent_key_file.get().strip() or None,
+            "delete_plain": bool(self.chk_delete_plain_var.get()),
+        }
+        self.owner.save_config(silent=True)
+
+    def _choose_key_file(self):
+        """
+        Chọn tệp khóa đã có, hoặc nhập tên tệp mới để tạo khóa ngẫu nhiên 32 byte.
+        LƯU Ý: mất tệp khóa = không thể giải mã các bản backup đã mã hóa.
+        """
+        path = filedialog.asksaveasfilename(title="Chọn hoặc tạo tệp khóa", defaultextension=".key",
+                                            filetypes=[("Key", "*.key"), ("All", "*.*")], confirmoverwrite=False)
+        if not path:
+            return
+        try:
+            if os.path.exists(path):
+                load_key_file(path)
+                self._log(f"• Dùng tệp khóa: {path}")
+            else:
+                create_key_file(path)
+                self._log(f"• Đã tạo tệp khóa mới: {path}\n  Hãy sao lưu tệp khóa ở nơi an toàn, mất khóa sẽ không thể khôi phục backup.")
+        except (OSError, BackupCryptoError) as e:
+            messagebox.showerror("Tệp khóa", f"{e}")
+            return
+        self.ent_key_file.delete(0, "end"); self.ent_key_file.insert(0, path)
+        self._persist_encryption()
+
     # ============================ Storage actions ============================
 
     def _choose_local_dir(self):
@@ -588,10 +556,12 @@ class ScheduleFrame(ctk.CTkFrame):
         diff = self.ent_diff.get().strip()
         log  = self.ent_log.get().strip()
 
-        # kiểm tra từng CRON với REGEX xem đúng định dạng chưa
+        # Phân tích từng CRON (đúng 5 trường, giá trị trong giới hạn, có lần chạy)
         for s, nm in ((full,"FULL"),(diff,"DIFF"),(log,"LOG")):
-            if not _CRON_RE.match(s or ""):
-                messagebox.showwarning("CRON không hợp lệ", f"Lịch {nm} chưa đúng định dạng (5 trường).");
+            try:
+                CronExpression(s)
+            except ValueError as e:
+                messagebox.showwarning("CRON không hợp lệ", f"Lịch {nm}: {e}");
                 return
         
         # Nếu đúng định dạng, hợp lệ thì lưu vào tệp cấu hình config
@@ -628,10 +598,19 @@ class ScheduleFrame(ctk.CTkFrame):
         btype = self.cbo_type.get().strip().upper()
         stripes = 4
 
+        # Cấu hình mã hóa (đọc trên luồng giao diện, truyền sang luồng backup)
+        encryption = None
+        if self.chk_encrypt_var.get():
+            key_file = self.ent_key_file.get().strip()
+            if not key_file or not os.path.exists(key_file):
+                messagebox.showwarning("Thiếu thông tin", "Chưa chọn tệp khóa để mã hóa tệp backup.");
+                return
+            encryption = {"key_file": key_file, "delete_plain": bool(self.chk_delete_plain_var.get())}
+
         # Hiển thị popup
         self.loading.show()
         # Chạy backup trong luồng riêng
-        threading.Thread(target=self.backup_manual_in_thread, args=(btype, bdir, stripes), daemon=True).start()
+        threading.Thread(target=self.backup_manual_in_thread, args=(btype, bdir, stripes, encryption), daemon=True).start()
 
     def _norm_win_path(self, p: str) -> str:
         """Chuẩn hoá đường dẫn: đổi '/' -> '\\', gộp '\\\\' -> '\\', thêm '\\' cuối."""
@@ -691,12 +670,14 @@ class ScheduleFrame(ctk.CTkFrame):
                 out.append(ch)
         return "".join(out)
     
-    def backup_manual_in_thread(self, type_backup: str, backup_dir: str, strip_file: int):
+    def backup_manual_in_thread(self, type_backup: str, backup_dir: str, strip_file: int,
+                                encryption: Optional[Dict[str, Any]] = None):
         """
         Thực hiện backup thủ công trong một luồng riêng.
         - Chỉ nhận 1 base path (máy SQL phải nhìn thấy & có quyền).
         - FULL/DIFF: nhiều stripes trong cùng thư mục.
         - LOG: kiểm tra recovery model + yêu cầu có FULL backup trước.
+        - encryption = {"key_file", "delete_plain"}: mã hóa các tệp vừa tạo (xem _encrypt_backup_files).
         """
 
         try:
@@ -845,6 +826,8 @@ class ScheduleFrame(ctk.CTkFrame):
                 ))
             else:
                 self.after(0, lambda: self._log("   ✓ Hoàn tất. Đã xác minh thấy các file backup."))
+                if encryption:
+                    self._encrypt_backup_files(targets, encryption)
 
         except Exception as e:
             # Gợi ý nhanh nếu là lỗi đường dẫn/quyền
@@ -871,6 +854,36 @@ class ScheduleFrame(ctk.CTkFrame):
                 self.conn.close()
             except: pass
 
+    def _encrypt_backup_files(self, targets: List[str], encryption: Dict[str, Any]):
+        """
+        Mã hóa các tệp backup vừa tạo thành <tệp>.enc (chạy trong luồng backup).
+        - Chỉ mã hóa được khi máy chạy ứng dụng nhìn thấy đường dẫn (cùng máy SQL hoặc thư mục chia sẻ).
+        - Kiểm tra lại toàn bộ khối của tệp .enc trước khi xóa tệp gốc (nếu bật delete_plain).
+        """
+        try:
+            key = load_key_file(encryption["key_file"])
+        except (OSError, BackupCryptoError) as e:
+            self.after(0, lambda err=e: self._log(f"[LỖI] Không đọc được tệp khóa: {err}", clear=False))
+            return
+
+        for tpath in targets:
+            if not os.path.exists(tpath):
+                self.after(0, lambda p=tpath: self._log(
+                    f"   [BỎ QUA] Máy này không nhìn thấy {p}, không thể mã hóa.", clear=False))
+                continue
+            try:
+                self.after(0, lambda p=tpath: self._log(f"   … Đang mã hóa {p}", clear=False))
+                stats = encrypt_file(tpath, key=key)
+                check = verify_file(stats["output"], key)
+                if not check["ok"]:
+                    raise BackupCryptoError(f"Kiểm tra tệp mã hóa thất bại, khối lỗi: {check['bad_chunks']}")
+                if encryption.get("delete_plain"):
+                    os.remove(tpath)
+                self.after(0, lambda st=stats: self._log(
+                    f"   ✓ {st['output']} ({st['bytes'] / (1024 * 1024):.1f} MB, {st['mb_per_s']} MB/s)", clear=False))
+            except (OSError, BackupCryptoError) as e:
+                self.after(0, lambda p=tpath, err=e: self._log(f"   [LỖI] Mã hóa {p}: {err}", clear=False))
+
     # ============================ Task Scheduler ============================
 
     def _choose_ps1_path(self):
@@ -1062,34 +1075,22 @@ catch {{
         args = cron_to_schtasks_args(cron_expr)
         base = f'schtasks /Create /TN "{task_name}" /RL HIGHEST /F /RU "{user}" /RP "{pwd}" '
 
-        if args["type"] == "MINUTE":
-
-            # Chạy mỗi N giờ → dùng /SC HOURLY /MO N /ST HH:MM /DU 24:00 (Chạy 1 lần/ngày nhưng lặp lại mỗi N giờ suốt ngày)
-            # Chạy mỗi N phút → dùng /SC MINUTE /MO N /ST HH:MM /DU 24:00 (Chạy 1 lần/ngày nhưng lặp lại mỗi N phút suốt ngày)
-            # return (base + f'/SC MINUTE /MO {args["mo"]} /ST {args["st"]} /DU {args["du"]} '
-            #         + f'/TR "{ps_base_exec} -Type {task_type}"')
-
-            # Chạy mỗi N phút trong 1 ngày, tuy nhiên lặp lại mỗi ngày (ngày sau lại bắt đầu từ đầu)
-            return (base + f'/SC DAILY /ST {args["st"]} /RI {args["mo"]} /DU {args["du"]} '
-                    + f'/TR "{ps_base_exec} -Type {task_type}"')
-
-        if args["type"] == "DAILY":
-            return (base + f'/SC DAILY /ST {args["st"]} '
-                    + f'/TR "{ps_base_exec} -Type {task_type}"')
-
         if args["type"] == "WEEKLY":
             dlist = args.get("dlist", "")
             if not dlist:
                 raise ValueError("CRON tuần cần danh sách thứ (MON,TUE,...).")
-            return (base + f'/SC WEEKLY /D {dlist} /ST {args["st"]} '
-                    + f'/TR "{ps_base_exec} -Type {task_type}"')
-
-        if args["type"] == "MONTHLY":
-            dom = args.get("dom", "")
-            return (base + f'/SC MONTHLY /D {dom} /ST {args["st"]} '
-                    + f'/TR "{ps_base_exec} -Type {task_type}"')
+            schedule = f'/SC WEEKLY /D {dlist} '
+        elif args["type"] == "MONTHLY":
+            schedule = f'/SC MONTHLY /D {args["dom"]} ' + (f'/M {args["months"]} ' if args.get("months") else "")
+        elif args["type"] == "DAILY":
+            schedule = '/SC DAILY '
+        else:
+            raise ValueError("Không hỗ trợ loại CRON này.")
 
-        raise ValueError("Không hỗ trợ loại CRON này.")
+        # Nhiều mốc trong ngày: chạy từ /ST, lặp lại mỗi /RI phút trong /DU (ngày sau lại bắt đầu từ đầu)
+        repeat = f'/RI {args["ri"]} /DU {args["du"]} ' if args.get("ri") else ""
+        return (base + schedule + f'/ST {args["st"]} ' + repeat
+                + f'/TR "{ps_base_exec} -Type {task_type}"')
 
     def _build_schtasks_cmds(self) -> Optional[Dict[str, str]]:
         """
@@ -1246,6 +1247,34 @@ catch {{
                             "Các lệnh đã hiển thị trong ô trạng thái phía dưới.\n"
                             "Hãy mở PowerShell/Command Prompt 'Run as Administrator' và copy chạy.")
 
+    def _show_service_status(self):
+        """Hỏi trạng thái dịch vụ sao lưu nền qua cổng trạng thái cục bộ (chạy trong luồng riêng)."""
+        # Cổng / tệp mã xác thực theo phần "service" của scheduler.json (giống dịch vụ)
+        service_cfg = self.owner.config.get("service") or {}
+        port = int(service_cfg.get("port") or BACKUP_SERVICE_PORT)
+        token_file = service_cfg.get("token_file") or BACKUP_SERVICE_TOKEN_FILE
+
+        def worker():
+            response = query_service("status", port=port, token_file=token_file)
+            self.after(0, lambda: self._render_service_status(response))
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _render_service_status(self, response: Dict[str, Any]):
+        if not response.get("success"):
+            self._log(f"[DỊCH VỤ] {response.get('message')}\n"
+                      "• Chạy dịch vụ: cd src && python -m backup_service serve")
+            return
+        data = response["data"]
+        fmt = lambda t: datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M") if t else "-"
+        self._log(f"=== Dịch vụ sao lưu (pid {data['pid']}, chạy từ {fmt(data['started_at'])}) ===")
+        for job in data["jobs"]:
+            self._log(f"• {job['id']:<28} CRON '{job['cron']}'  kế tiếp {fmt(job['next_run'])}  "
+                      f"lần cuối {fmt(job['last_run'])} [{job['last_status'] or '-'}]", clear=False)
+            if job.get("last_error"):
+                self._log(f"   ↳ {job['last_error']}", clear=False)
+        executor = data["executor"]
+        self._log(f"Đang chạy {len(executor['running'])}, đang chờ {len(executor['queued'])}", clear=False)
+
     # ================================ Utils ================================
 
     def _log(self, s: str, clear: bool = True):
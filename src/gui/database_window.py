@@ -83,6 +83,13 @@ class DatabasePage(ctk.CTkFrame):
         # Mặc định mở Dashboard khi vào màn hình chính
         self.show_page("Connection")
 
+    def destroy(self):
+        """
+        Gửi nốt các cảnh báo đang gom và đóng phiên SMTP khi trang bị hủy (thoát ứng dụng)
+        """
+        self.email_sender.close()
+        super().destroy()
+
     def _connect(self):
         """Hàm kết nối đến DB với connection pooling."""
         # kiểm tr xem có chuỗi kết nối
@@ -1,7 +1,5 @@
 import customtkinter
 from tkinter import ttk, messagebox
-import threading
-import queue
 import logging
 from ctypes import windll
 
@@ -10,7 +8,9 @@ import os,sys
 PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(PROJECT_DIR)
 
-from services.database_service import My_Database
+from services.database_service import create_database
+from services.async_database import AsyncDatabase, TkDispatcher
+from gui.query_metrics_window import QueryMetricsWindow
 from services.email_service import InternalEmailSender
 
 from utils.constants import *
@@ -24,6 +24,15 @@ from schedule_work.schedule_work import Schedule_Auto
 
 logger = logging.getLogger(__name__)
 
+# Các lựa chọn sắp xếp danh sách người dùng: nhãn hiển thị -> (cột sắp xếp, giảm dần)
+USER_SORT_OPTIONS = [
+    ("Email (A-Z)", ("Email", False)),
+    ("Email (Z-A)", ("Email", True)),
+    ("Tên (A-Z)", ("User_Name", False)),
+    ("Tên (Z-A)", ("User_Name", True)),
+    ("Quyền hạn", ("Privilege", False)),
+]
+
 def get_screen_dpi():
     """
     Tính toán DPI của màn hình thiết bị Windows
@@ -64,10 +73,17 @@ class HomePage(customtkinter.CTkFrame):
 
         # Khởi tạo lớp gửi email và kết nối đến CSDL
         self.email_sender = InternalEmailSender()
-        self.db = My_Database() 
-
-        # Khởi tạo hàng đợi (queue) để nhận kết quả từ luồng thực thi khác
-        self.data_user_queue= queue.Queue()
+        self.db = create_database()  # SQL Server hoặc SQLite theo biến môi trường DB_BACKEND
+        # Truy vấn CSDL không chặn giao diện, kết quả trả về main thread qua dispatcher
+        self.async_db = AsyncDatabase(self.db, dispatcher=TkDispatcher(self))
+
+        # Trạng thái phân trang danh sách người dùng
+        self.number_user_loaded = 0         # Số người dùng đã hiển thị trên treeview
+        self.user_page_cursor = None        # Keyset của dòng cuối trang đã tải
+        self.user_page_has_more = False     # Còn trang tiếp theo hay không
+        self.user_page_loading = False      # Đang tải 1 trang
+        self.user_page_request_id = 0       # Tăng mỗi lần tải lại từ đầu để bỏ qua kết quả cũ
+        self.filter_user_after_id = None    # Hẹn giờ chống gọi liên tục khi gõ ô tìm kiếm
 
         # Đếm số lần thử lại
         self.count_retry = 1
@@ -80,12 +96,24 @@ class HomePage(customtkinter.CTkFrame):
 
         self.loading = ModalLoadingPopup(parent)  # truyền frame làm parent
 
+        # Danh sách (tên người dùng, email) đang được chọn trên Treeview
+        self.selected_users = []
+
         # set grid layout 1x2
         # self.grid_rowconfigure(0, weight=1)
         # self.grid_columnconfigure(1, weight=1)
         self.treeview_account = self.create_treeview_account_login_frame(row= 0, column= 0, rowspan = 2, title= "Thông tin tài khoản")
         self.create_setting_account_login_frame(row= 0, column= 1, rowspan = 2, title= "Cài đặt tài khoản")
 
+    def destroy(self):
+        """
+        Gửi nốt các cảnh báo đang gom, đóng phiên SMTP và pool kết nối CSDL khi trang bị hủy (thoát ứng dụng)
+        Pool được đóng trên luồng CSDL, sau các truy vấn trang đã gửi trước đó (kết nối đang mượn sẽ đóng khi được trả).
+        """
+        self.email_sender.close()
+        super().destroy()
+        self.async_db.submit("close")
+
     def create_treeview_account_login_frame(self, row, column, rowspan = 1, columnspan = 1, title = "Tiêu đề của bảng"):
         """"
         Tạo frame bao gồm hàng đầu tiên là tiêu đề và hàng thứ hai là Treeview để hiển thị danh sách 
@@ -104,17 +132,39 @@ class HomePage(customtkinter.CTkFrame):
         label_treeview = customtkinter.CTkLabel(frame_configure, bg_color="transparent", anchor= "center", text= title, font=customtkinter.CTkFont(size=20, weight="bold"))
         label_treeview.grid(row = 0, column = 0, columnspan = 2, sticky = "n")
 
-        # Tạo treeview table đưa vào frame
-        treeview = self.create_treeview_table(parent= frame_configure, number_value = 10)
+        # Tạo treeview table đưa vào frame, cuộn gần cuối danh sách thì tải trang tiếp theo
+        treeview = self.create_treeview_table(parent= frame_configure, number_value = 10, on_scroll= self.on_treeview_scroll)
 
         # Lắng nghe sự kiện click vào dòng trong Treeview
         treeview.bind("<ButtonRelease-1>", self.on_treeview_select)
 
+        # Thanh lọc/sắp xếp danh sách người dùng (truy vấn phân trang phía server)
+        toolbar = customtkinter.CTkFrame(frame_configure, fg_color="transparent")
+        toolbar.grid(row = 2, column = 0, columnspan = 2, padx = 5, pady = (0, 5), sticky = "ew")
+        toolbar.grid_columnconfigure(0, weight=1)
+
+        self.filter_user_entry = customtkinter.CTkEntry(toolbar, placeholder_text="Tìm theo tên hoặc email (bắt đầu bằng...)")
+        self.filter_user_entry.grid(row = 0, column = 0, padx = (0, 5), sticky = "ew")
+        self.filter_user_entry.bind("<KeyRelease>", self.on_filter_user_changed)
+
+        self.sort_user_column = customtkinter.StringVar(value=USER_SORT_OPTIONS[0][0])
+        customtkinter.CTkOptionMenu(
+            toolbar,
+            values=[label for label, _ in USER_SORT_OPTIONS],
+            variable=self.sort_user_column,
+            command=lambda _: self.load_user_page(reset=True),
+            width=160
+        ).grid(row = 0, column = 1, padx = 5)
+
+        self.user_page_status_label = customtkinter.CTkLabel(toolbar, text="", anchor="e")
+        self.user_page_status_label.grid(row = 0, column = 2, padx = (5, 0))
+
         return treeview
     
-    def create_treeview_table(self, parent, number_value):
+    def create_treeview_table(self, parent, number_value, on_scroll = None):
         """
         Tạo treeview để hiển thị danh sách dữ liệu theo bảng
+        on_scroll(first, last): được gọi mỗi khi vị trí cuộn thay đổi (tỉ lệ 0..1)
         """
         # Tính toán kích thước font dựa trên DPI của thiết bị
         font_size, row_hight = get_screen_dpi()
@@ -153,6 +203,7 @@ class HomePage(customtkinter.CTkFrame):
             columns=("Tên người dùng", "Email đăng nhập", "Ngày kích hoạt", "Quyền hạn"),
             show="headings",
             height=number_value, ## Số hàng muốn hiển thị
+            selectmode="extended", ## Cho phép chọn nhiều dòng (Ctrl/Shift + click) để thao tác hàng loạt
         )
         # Tạo tên cho các cột
         treeview.heading("Tên người dùng", text="Tên người dùng")
@@ -172,18 +223,32 @@ class HomePage(customtkinter.CTkFrame):
 
         # Thêm scrollbar
         scrollbar = ttk.Scrollbar(parent, orient="vertical", command=treeview.yview)
-        treeview.configure(yscrollcommand=scrollbar.set)
+
+        def on_yscroll(first, last):
+            scrollbar.set(first, last)
+            if on_scroll is not None:
+                on_scroll(float(first), float(last))
+
+        treeview.configure(yscrollcommand=on_yscroll)
         scrollbar.grid(row=1, column=1, sticky="ns", pady=10)
 
         return treeview
 
     def on_treeview_select(self, event):
         """
-        Xử lý sự kiện click vào dòng trong Treeview
+        Xử lý sự kiện click vào dòng trong Treeview (hỗ trợ chọn nhiều dòng)
         """
-        selected_item = self.treeview_account.focus()  # Lấy ID của dòng đã chọn
+        selected_items = self.treeview_account.selection()  # Lấy ID các dòng đã chọn
 
-        if selected_item:
+        # Danh sách (tên người dùng, email) của các dòng đang chọn để thao tác hàng loạt
+        self.selected_users = []
+        for item in selected_items:
+            values = self.treeview_account.item(item, 'values')
+            self.selected_users.append((values[0], values[1]))
+
+        selected_item = self.treeview_account.focus()  # Dòng đang focus (dùng cho thao tác 1 người dùng)
+
+        if selected_item and self.selected_users:
             values = self.treeview_account.item(selected_item, 'values')  # Lấy giá trị của dòng đó
             self.username_user_current = values[0]  # Tên người dùng
             self.email_user_current = values[1]  # Email đăng nhập
@@ -195,7 +260,31 @@ class HomePage(customtkinter.CTkFrame):
             self.disable_account_button.configure(state="normal")
             self.delete_account_button.configure(state="normal")
             self.change_role_account_button.configure(state="normal")
-            self.change_password_account_button.configure(state="normal")
+            # Đổi mật khẩu chỉ áp dụng cho 1 người dùng
+            self.change_password_account_button.configure(state="normal" if len(self.selected_users) == 1 else "disabled")
+
+    def describe_selected_users(self):
+        """
+        Mô tả ngắn danh sách người dùng đang chọn để hiển thị trong hộp thoại xác nhận
+        """
+        names = [username for username, _ in self.selected_users]
+        if len(names) <= 5:
+            return ", ".join(names)
+        return f"{', '.join(names[:5])} và {len(names) - 5} người dùng khác"
+
+    def show_bulk_result(self, result, success_message):
+        """
+        Hiển thị kết quả thao tác hàng loạt: thông báo thành công hoặc liệt kê các tài khoản thất bại
+        """
+        failed = [row for row in result.get("data", []) if not row["success"]]
+        if not failed:
+            messagebox.showinfo("Thành công", f"{success_message}\n{result['message']}")
+            return
+
+        detail = "\n".join(f"- {row['email']}: {row['message']}" for row in failed[:10])
+        if len(failed) > 10:
+            detail += f"\n... và {len(failed) - 10} tài khoản khác"
+        messagebox.showwarning("Hoàn tất một phần", f"{result['message']}\nCác tài khoản không thực hiện được:\n{detail}")
 
     def create_setting_account_login_frame(self, row, column, rowspan, title):
         """
@@ -251,6 +340,20 @@ class HomePage(customtkinter.CTkFrame):
         )
         optionmenu.grid(row=4, column=1, padx=5, pady= 10, sticky="w")
 
+        # Mở bảng thống kê hiệu năng truy vấn CSDL
+        query_metrics_button = customtkinter.CTkButton(frame_configure, text="Thống kê truy vấn", anchor="center", fg_color=COLOR["INFO_BUTTON_COLOR"],
+                                                       command= self.open_query_metrics_window)
+        query_metrics_button.grid(row = 7, column = 0, columnspan = 2, padx = 5, pady = 10)
+
+    def open_query_metrics_window(self):
+        """
+        Mở cửa sổ thống kê truy vấn (chỉ mở 1 cửa sổ tại 1 thời điểm)
+        """
+        if getattr(self, "query_metrics_window", None) is not None and self.query_metrics_window.winfo_exists():
+            self.query_metrics_window.focus()
+            return
+        self.query_metrics_window = QueryMetricsWindow(self, database= self.db)
+
     def not_available(self):
         messagebox.showinfo("Thông báo", "Chức năng đang trong chế độ bảo trì! \nVui lòng thử lại sau.")
         return
@@ -258,90 +361,108 @@ class HomePage(customtkinter.CTkFrame):
     def get_infor_all_user(self):
         """
         Nút bấm lấy thông tin tài khoản người dùng và hiển thị lên treeview
+        Chỉ tải trang đầu tiên, các trang sau được tải khi cuộn xuống cuối danh sách
         """
         # Hiện popup loading
-        # self.show_loading_popup()
         self.loading.show()
-        
+        self.load_user_page(reset= True)
 
-        # Tạo luồng mới để cập nhật dữ liệu vào CSDL
-        threading.Thread(target=self.get_all_infor_user_in_thread, daemon= True).start()
-    
-    def get_all_infor_user_in_thread(self):
+    def load_user_page(self, reset = False):
         """
-        Truy vấn thông tin người dùng trong một luồng riêng
+        Tải 1 trang người dùng theo bộ lọc/sắp xếp hiện tại
+        reset = True: xóa danh sách và tải lại từ trang đầu (khi đổi bộ lọc/sắp xếp)
         """
-        try:
-            # Truy vấn thông tin tất cả người dùng
-            results = self.db.get_information_all_user()
-            
-            # Nếu là False thì sẽ là lỗi trong khi truy vấn
-            if results["success"] is False:
-                # Đóng popup và hiển thị messagebox
-                # self.after(0, self.hide_loading_popup)
-                self.loading.schedule_hide()
-                self.after(0, lambda: messagebox.showerror("Lỗi truy vấn", "Không thể truy vấn dữ liệu người dùng từ CSDL."))
-                return
-            
-            # Đưa dữ liệu vào Queue để xử lý
-            self.data_user_queue.put(results["data"])
-            # Gọi hàm xử lý giao diện chính
-            self.after(0, self.process_data_all_user)
+        if reset:
+            self.user_page_request_id += 1
+            self.user_page_cursor = None
+            self.user_page_has_more = True
+            self.number_user_loaded = 0
+            self.prepare_treeview(treeview= self.treeview_account, column_data= ACCOUNT_TABLE_COLUMN_LIST)
+            self.disable_account_action_buttons()
+        elif self.user_page_loading or not self.user_page_has_more:
+            return
 
-        except Exception as e:
-            self.after(0, self.hide_loading_popup)
-            self.after(0, lambda err=e: messagebox.showerror("Lỗi truy vấn", f"Xảy ra lỗi: {str(err)}. \nVui lòng thử lại sau."))
-            logger.error(f"Xảy ra lỗi trong lúc truy vấn thông tin người dùng từ CSDL: {e}")
+        self.user_page_loading = True
+        self.user_page_status_label.configure(text="Đang tải...")
+
+        sort_column, descending = dict(USER_SORT_OPTIONS)[self.sort_user_column.get()]
+        request_id = self.user_page_request_id
+
+        # Truy vấn trên executor của AsyncDatabase, kết quả xử lý ở luồng chính
+        self.async_db.submit(
+            "get_users_page",
+            filter_text=self.filter_user_entry.get(),
+            sort_column=sort_column,
+            descending=descending,
+            cursor=self.user_page_cursor,
+            callback=lambda result: self.on_user_page_loaded(result, request_id),
+            error_callback=lambda error: self.on_user_page_error(error, request_id)
+        )
 
-    def process_data_all_user(self):
+    def on_user_page_loaded(self, result, request_id):
         """
-        Hiển thị dữ liệu từ người dùng lên treeview
+        Nhận 1 trang người dùng (đang ở luồng chính)
         """
-        data = self.data_user_queue.get()
-        
-        if data:
-            # List lưu trữ dữ liệu sau khi đã xử lý
-            processed_rows = []
-            # Duyệt qua từng hàng dữ liệu
-            for i, row in enumerate(data):
-                processed_row = []  # Danh sách mới để lưu giá trị đã xử lý cho mỗi hàng
-
-                # Xử lý từng cột giá trị trong 1 hàng dữ liệu
-                for index, value in enumerate(row):
-                    # Kiểm tra và thay thế giá trị None cho cột "Bo Phan"
-                    if ACCOUNT_TABLE_COLUMN_LIST[index] == "Mã OTP" and value is None:
-                        processed_row.append("JP")  # Thay thế None ở cột "BoPhan" bằng "JP"
-                    # Kiểm tra và thay thế giá trị None cho các cột khác
-                    # elif value is None:
-                    #     processed_row.append(0)  # Thay thế None ở các cột khác bằng 0
-                    else:
-                        processed_row.append(value)  # Nếu không phải None, giữ nguyên giá trị
-
-                # Thêm hàng đã xử lý vào danh sách processed_rows
-                processed_rows.append(tuple(processed_row))  # Thêm processed_row dưới dạng tuple vào processed_rows
-        
-            # Hiển thị dữ liệu lên treeview
-            self.insert_data_to_treeview(treeview= self.treeview_account, data= data, column_data= ACCOUNT_TABLE_COLUMN_LIST)
-
-            # Đóng các nút thao tác
-            self.activate_account_button.configure(state="disabled")
-            self.disable_account_button.configure(state="disabled")
-            self.delete_account_button.configure(state="disabled")
-            self.change_role_account_button.configure(state="disabled")
-            
-            # Đóng popup
-            # self.hide_loading_popup()
-            self.loading.hide()
+        # Kết quả của lần tải trước khi đổi bộ lọc/sắp xếp -> bỏ qua
+        if request_id != self.user_page_request_id:
+            return
+
+        self.user_page_loading = False
+        self.loading.hide()
+
+        if result["success"] is False:
+            self.user_page_has_more = False
+            self.user_page_status_label.configure(text="")
+            messagebox.showerror("Lỗi truy vấn", f"Không thể truy vấn dữ liệu người dùng từ CSDL: {result['message']}")
+            return
+
+        self.append_rows_to_treeview(treeview= self.treeview_account, data= result["data"])
+        self.number_user_loaded += len(result["data"])
+        self.user_page_cursor = result["next_cursor"]
+        self.user_page_has_more = result["next_cursor"] is not None
+
+        if self.number_user_loaded == 0:
+            self.user_page_status_label.configure(text="Không tìm thấy người dùng")
         else:
-            # Nếu không có dữ liệu thì hiển thị thông báo
-            self.hide_loading_popup()
-            messagebox.showwarning("Không có dữ liệu", "Không tìm thấy dữ liệu về người dùng.")
-            
+            more = "+" if self.user_page_has_more else ""
+            self.user_page_status_label.configure(text=f"Đã tải {self.number_user_loaded}{more} người dùng")
+
+    def on_user_page_error(self, error, request_id):
+        """
+        Nhận lỗi phát sinh khi tải 1 trang người dùng (đang ở luồng chính)
+        """
+        if request_id != self.user_page_request_id:
             return
-        
-    def insert_data_to_treeview(self, treeview: ttk.Treeview, data:list, column_data: list):
+
+        self.user_page_loading = False
+        self.user_page_has_more = False
+        self.loading.hide()
+        self.user_page_status_label.configure(text="")
+        messagebox.showerror("Lỗi truy vấn", f"Xảy ra lỗi: {str(error)}. \nVui lòng thử lại sau.")
+        logger.error(f"Xảy ra lỗi trong lúc truy vấn thông tin người dùng từ CSDL: {error}")
+
+    def on_treeview_scroll(self, first, last):
         """
-        Hiển thị dữ liệu lên treeview tương ứng với dữ liệu thô thu đươc từ CSDL
+        Cuộn tới gần cuối danh sách thì tải trang tiếp theo
+        """
+        if last >= 0.9 and self.user_page_has_more and not self.user_page_loading:
+            self.load_user_page()
+
+    def on_filter_user_changed(self, event = None):
+        """
+        Gõ ô tìm kiếm: chờ người dùng ngừng gõ một chút rồi mới tải lại từ trang đầu
+        """
+        if self.filter_user_after_id is not None:
+            self.after_cancel(self.filter_user_after_id)
+        self.filter_user_after_id = self.after(350, self.on_filter_user_timeout)
+
+    def on_filter_user_timeout(self):
+        self.filter_user_after_id = None
+        self.load_user_page(reset= True)
+
+    def prepare_treeview(self, treeview: ttk.Treeview, column_data: list):
+        """
+        Đặt tiêu đề cột và xóa các hàng cũ trong Treeview
         """
         # Đặt tiêu đề cột cho Treeview
         treeview["columns"] = column_data  # Cập nhật các cột trong Treeview
@@ -350,187 +471,190 @@ class HomePage(customtkinter.CTkFrame):
             treeview.column(col, width=50, anchor="center", stretch=True)  # Cấu hình chiều rộng cột
 
         # Xóa các hàng cũ trong Treeview
-        for row in treeview.get_children():
-            treeview.delete(row)
-
-        # Chèn dữ liệu từ cơ sở dữ liệu vào Treeview
-        number_data = len(data)
-        for i, row in enumerate(data):
+        treeview.delete(*treeview.get_children())
 
+    def append_rows_to_treeview(self, treeview: ttk.Treeview, data: list):
+        """
+        Thêm các dòng dữ liệu thô thu được từ CSDL vào cuối Treeview
+        """
+        for row in data:
             row_tag = ''  # Mặc định không có tag
-            for value in row:
-                if value is None:  # Kiểm tra nếu giá trị là None trong từng dòng dữ liệu
-                    row_tag = 'missing'  # Gán tag 'missing' cho dòng này
+            if any(value is None for value in row):  # Kiểm tra nếu giá trị là None trong từng dòng dữ liệu
+                row_tag = 'missing'  # Gán tag 'missing' cho dòng này
 
             # Chèn dữ liệu từng dòng vào tương ứng với từng cột trong treeview
             treeview.insert("", "end", values=list(row), tags=(row_tag,))
 
+    def insert_data_to_treeview(self, treeview: ttk.Treeview, data:list, column_data: list):
+        """
+        Hiển thị dữ liệu lên treeview tương ứng với dữ liệu thô thu đươc từ CSDL
+        """
+        self.prepare_treeview(treeview= treeview, column_data= column_data)
+        self.append_rows_to_treeview(treeview= treeview, data= data)
+
     def activate_account_user(self, activate = True):
         """
-        Nút bấm kích hoạt tài khoản người dùng để cho phép hoạt động
+        Nút bấm kích hoạt/ khóa các tài khoản người dùng đang chọn
         """
         # Hiển popup xác nhận lại yêu cầu kích hoạt với người dùng
-        result = messagebox.askokcancel("Kích hoạt/ khóa tài khoản", f"Bạn có chắc chắn muốn kích hoạt hoặc khóa tài khoản người dùng: {self.username_user_current}")
+        result = messagebox.askokcancel("Kích hoạt/ khóa tài khoản", f"Bạn có chắc chắn muốn kích hoạt hoặc khóa tài khoản người dùng: {self.describe_selected_users()}")
 
         if result:
-            logger.info("Sử dụng chức năng kích hoạt tài khoản với người dùng: %s", self.username_user_current)
+            logger.info("Sử dụng chức năng kích hoạt tài khoản với %s người dùng: %s", len(self.selected_users), self.describe_selected_users())
             self.show_loading_popup()
-            # Tạo luồng mới để cập nhật dữ liệu vào CSDL
-            threading.Thread(target=self.activate_account_user_in_thread, args=(activate, ), daemon= True).start()
+            # Tên người dùng theo email, dùng cho email thông báo kích hoạt
+            names = {email.lower(): name for name, email in self.selected_users}
+            # Cập nhật CSDL trên executor của AsyncDatabase (1 transaction cho cả danh sách), kết quả xử lý ở luồng chính
+            self.async_db.submit(
+                "activate_users",
+                emails=[email for _, email in self.selected_users],
+                activate=activate,
+                callback=lambda result: self.on_activate_account_user_done(result, activate, names),
+                error_callback=self.on_activate_account_user_error
+            )
+
+    def on_activate_account_user_done(self, result, activate=False, names=None):
+        """
+        Nhận kết quả kích hoạt/ khóa tài khoản người dùng (đang ở luồng chính)
+        """
+        self.hide_loading_popup()
+        # Hủy kích hoạt nút
+        self.disable_account_action_buttons()
+
+        if result["success"]:
+            self.show_bulk_result(result, "Các tài khoản đã được kích hoạt/ khóa tài khoản thành công")
+            logger.info("Kích hoạt/ khóa tài khoản: %s", result["message"])
+
+            # Gửi email thông báo cho các tài khoản vừa được kích hoạt (dùng chung 1 phiên SMTP)
+            if activate:
+                self.send_activation_emails(result.get("data", []), names or {})
+
+            # Cập nhật lại dữ liệu trên Treeview
+            self.get_infor_all_user()
+        else:
+            messagebox.showerror("Lỗi kết nối", f"{result['message']}.\nVui lòng thử lại sau.")
 
-    def activate_account_user_in_thread(self, activate):
+    def send_activation_emails(self, rows, names):
         """
-        Kích hoạt tài khoản người dùng trong 1 luồng riêng
+        Gửi email thông báo kích hoạt cho các tài khoản đã kích hoạt thành công
         """
-        try:
-            result = self.db.activate_user(email= self.email_user_current, activate= activate)
+        for row in rows:
+            if not row["success"]:
+                continue
+            name = names.get(row["email"].lower(), row["email"])
+            self.email_sender.send_mail_for_activate_account(to_email=row["email"], name=name, website_name=APP_NAME_SYSTEM,
+                                                             username=name, email=row["email"])
 
-            if result["success"]:
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showinfo("Thành công", f"Tài khoản {self.username_user_current} đã được kích hoạt/ khóa tài khoản thành công"))
-
-                # Hủy kích hoạt nút
-                self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
-                logger.info("Đã kích hoạt/ khóa tài khoản: %s thành công", self.username_user_current)
+    def on_activate_account_user_error(self, error):
+        """
+        Nhận lỗi phát sinh khi kích hoạt/ khóa tài khoản người dùng (đang ở luồng chính)
+        """
+        self.hide_loading_popup()
+        messagebox.showerror("Lỗi kết nối", f"Không thể kích hoạt/ khóa tài khoản người dùng:{str(error)}.\nThử lại sau.")
+        logger.error(f"Xảy ra lỗi trong lúc kích hoạt/ khóa tài khoản người dùng: {error}") 
+        # Hủy kích hoạt nút
+        self.disable_account_action_buttons()
 
-                # Cập nhật lại dữ liệu trên Treeview
-                self.after(0, self.get_infor_all_user)
-            
-            else:
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showerror("Lỗi kết nối", f"{result["message"]}.\nVui lòng thử lại sau."))
-                # Hủy kích hoạt nút
-                self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
-
-        except Exception as e:
-            self.after(0, self.hide_loading_popup)
-            self.after(0, lambda err = e: messagebox.showerror("Lỗi kết nối", f"Không thể kích hoạt/ khóa tài khoản người dùng:{str(err)}.\nThử lại sau."))
-            logger.error(f"Xảy ra lỗi trong lúc kích hoạt/ khóa tài khoản người dùng: {e}") 
-            # Hủy kích hoạt nút
-            self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
+    def disable_account_action_buttons(self):
+        """
+        Vô hiệu hóa các nút thao tác với tài khoản (sau khi thực hiện xong 1 thao tác)
+        """
+        self.activate_account_button.configure(state="disabled")
+        self.disable_account_button.configure(state="disabled")
+        self.delete_account_button.configure(state="disabled")
+        self.change_password_account_button.configure(state="disabled")
+        self.change_role_account_button.configure(state="disabled")
 
     def delete_account_user(self):
         """
-        Nút bấm xóa tài khoản người dùng
+        Nút bấm xóa các tài khoản người dùng đang chọn
         """
-        # Hiển popup xác nhận lại yêu cầu kích hoạt với người dùng
-        result = messagebox.askokcancel("Xóa tài khoản người dùng", f"Bạn có chắc chắn muốn xóa tài khoản người dùng: {self.username_user_current}")
+        # Hiển popup xác nhận lại yêu cầu xóa với người dùng
+        result = messagebox.askokcancel("Xóa tài khoản", f"Bạn có chắc chắn muốn xóa tài khoản người dùng: {self.describe_selected_users()}")
 
         if result:
-            logger.info("Sử dụng chức năng xóa tài khoản với người dùng: %s", self.username_user_current)
+            logger.info("Sử dụng chức năng xóa tài khoản với %s người dùng: %s", len(self.selected_users), self.describe_selected_users())
             self.show_loading_popup()
-            # Tạo luồng mới để cập nhật dữ liệu vào CSDL
-            threading.Thread(target=self.delete_account_user_in_thread, daemon= True).start()
+            # Xóa trong 1 transaction cho cả danh sách
+            self.async_db.submit(
+                "delete_account_users",
+                emails=[email for _, email in self.selected_users],
+                callback=self.on_delete_account_user_done,
+                error_callback=self.on_delete_account_user_error
+            )
 
-    def delete_account_user_in_thread(self):
+    def on_delete_account_user_done(self, result):
         """
-        Xóa tài khoản người dùng trong luồng riêng
+        Nhận kết quả xóa tài khoản người dùng (đang ở luồng chính)
         """
-        try:
-            result = self.db.delete_account_user(email= self.email_user_current)
+        self.hide_loading_popup()
+        # Hủy kích hoạt nút
+        self.disable_account_action_buttons()
 
-            if result["success"]:
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showinfo("Thành công", f"Tài khoản {self.username_user_current} đã được xóa khỏi CSDL."))
+        if result["success"]:
+            self.show_bulk_result(result, "Đã xóa các tài khoản đã chọn.")
+            logger.info("Xóa tài khoản: %s", result["message"])
 
-                # Hủy kích hoạt nút
-                self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
+            # Cập nhật lại dữ liệu trên Treeview
+            self.get_infor_all_user()
+        else:
+            messagebox.showerror("Lỗi kết nối", f"{result['message']}.\n Vui lòng thử lại sau.")
 
-                # Cập nhật lại dữ liệu trên Treeview
-                self.after(0, self.get_infor_all_user)
-            
-            else:
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showerror("Lỗi kết nối", f"{result["message"]}.\n Vui lòng thử lại sau."))
-                # Hủy kích hoạt nút
-                self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
-
-        except Exception as e:
-            self.after(0, self.hide_loading_popup)
-            self.after(0, lambda err = e: messagebox.showerror("Lỗi kết nối", f"Không thể xóa tài khoản người dùng: {str(err)}.\nVui lòng thử lại sau."))
-            logger.error(f"Xảy ra lỗi trong lúc xóa tài khoản người dùng: {e}") 
-            # Hủy kích hoạt nút
-            self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
+    def on_delete_account_user_error(self, error):
+        """
+        Nhận lỗi phát sinh khi xóa tài khoản người dùng (đang ở luồng chính)
+        """
+        self.hide_loading_popup()
+        messagebox.showerror("Lỗi kết nối", f"Không thể xóa tài khoản người dùng: {str(error)}.\nVui lòng thử lại sau.")
+        logger.error(f"Xảy ra lỗi trong lúc xóa tài khoản người dùng: {error}") 
+        # Hủy kích hoạt nút
+        self.disable_account_action_buttons()
 
     def change_role_user(self):
         """
-        Nút bấm thay đổi quyền hạn người dùng
+        Nút bấm thay đổi quyền hạn các người dùng đang chọn
         """
         # Hiển popup xác nhận lại yêu cầu kích hoạt với người dùng
-        result = messagebox.askokcancel("Thay đổi quyền hạn", f"Bạn có chắc chắn muốn thay đổi quyền hạn người dùng: {self.username_user_current}")
+        result = messagebox.askokcancel("Thay đổi quyền hạn", f"Bạn có chắc chắn muốn thay đổi quyền hạn người dùng: {self.describe_selected_users()}")
 
         if result:
             privilege = self.optionmenue_privilege_user.get()
-            logger.info("Sử dụng chức năng thay đổi quyền hạn người dùng: %s", self.username_user_current)
+            logger.info("Sử dụng chức năng thay đổi quyền hạn %s cho %s người dùng: %s", privilege, len(self.selected_users), self.describe_selected_users())
             self.show_loading_popup()
-            # Tạo luồng mới để cập nhật dữ liệu vào CSDL
-            threading.Thread(target=self.change_role_user_in_thread, args=(privilege,), daemon= True).start()
+            # Cập nhật quyền trong 1 transaction cho cả danh sách
+            self.async_db.submit(
+                "change_role_users",
+                email_privilege_pairs=[(email, privilege) for _, email in self.selected_users],
+                callback=self.on_change_role_user_done,
+                error_callback=self.on_change_role_user_error
+            )
 
-    def change_role_user_in_thread(self, privilege):
+    def on_change_role_user_done(self, result):
         """
-        Thay đổi quyền hạn người dùng trong 1 luồng riêng
+        Nhận kết quả thay đổi quyền hạn (đang ở luồng chính)
         """
-        try:
-            result = self.db.change_role_user(email= self.email_user_current, privilege= privilege)
+        self.hide_loading_popup()
+        # Hủy kích hoạt nút
+        self.disable_account_action_buttons()
 
-            if result["success"]:
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showinfo("Thành công", f"Đã thay đổi quyền hạn {self.username_user_current}."))
+        if result["success"]:
+            self.show_bulk_result(result, "Đã thay đổi quyền hạn các tài khoản đã chọn.")
+            logger.info("Thay đổi quyền hạn: %s", result["message"])
 
-                # Hủy kích hoạt nút
-                self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
+            # Cập nhật lại dữ liệu trên Treeview
+            self.get_infor_all_user()
+        else:
+            messagebox.showerror("Lỗi kết nối", f"{result['message']}.\nVui lòng thử lại sau.")
 
-                # Cập nhật lại dữ liệu trên Treeview
-                self.after(0, self.get_infor_all_user)
-            
-            else:
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showerror("Lỗi kết nối", f"{result["message"]}.\nVui lòng thử lại sau."))
-                # Hủy kích hoạt nút
-                self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
-
-        except Exception as e:
-            self.after(0, self.hide_loading_popup)
-            self.after(0, lambda err=e: messagebox.showerror("Lỗi kết nối", f"Không thể kích hoạt/ khóa tài khoản người dùng: {str(err)}.\nThử lại sau."))
-            logger.error(f"Xảy ra lỗi trong lúc xóa tài khoản người dùng: {e}") 
-            # Hủy kích hoạt nút
-            self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
+    def on_change_role_user_error(self, error):
+        """
+        Nhận lỗi phát sinh khi thay đổi quyền hạn (đang ở luồng chính)
+        """
+        self.hide_loading_popup()
+        messagebox.showerror("Lỗi kết nối", f"Không thể thay đổi quyền hạn người dùng: {str(error)}.\nThử lại sau.")
+        logger.error(f"Xảy ra lỗi trong lúc thay đổi quyền hạn người dùng: {error}") 
+        # Hủy kích hoạt nút
+        self.disable_account_action_buttons()
 
     def change_password_user(self):
         """
@@ -555,53 +679,40 @@ class HomePage(customtkinter.CTkFrame):
             
             logger.info("Sử dụng chức năng thay đổi mật khẩu người dùng: %s", self.username_user_current)
             self.show_loading_popup()
-            # Tạo luồng mới để cập nhật dữ liệu vào CSDL
-            threading.Thread(target=self.change_password_user_in_thread, args=(new_password,), daemon= True).start()
-    
-    def change_password_user_in_thread(self, new_password):
+            # Cập nhật mật khẩu trên executor của AsyncDatabase, kết quả xử lý ở luồng chính
+            self.async_db.submit(
+                "update_password_user",
+                email=self.email_user_current,
+                password=new_password,
+                callback=self.on_change_password_user_done,
+                error_callback=self.on_change_password_user_error
+            )
+
+    def on_change_password_user_done(self, result):
         """
-        Thay đổi mật khẩu người dùng trong 1 luồng riêng
+        Nhận kết quả thay đổi mật khẩu người dùng (đang ở luồng chính)
         """
-        try:
-            result = self.db.update_password_user(email= self.email_user_current, password= new_password)
+        self.hide_loading_popup()
+        # Hủy kích hoạt nút
+        self.disable_account_action_buttons()
 
-            # Nếu kết quả là True thì cập nhật thành công
-            if result["success"]:
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showinfo("Thành công", f"Đã thay đổi mật khẩu cho tài khoản {self.username_user_current}."))
+        if result["success"]:
+            messagebox.showinfo("Thành công", f"Đã thay đổi mật khẩu cho tài khoản {self.username_user_current}.")
 
-                # Hủy kích hoạt nút
-                self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
+            # Cập nhật lại dữ liệu trên Treeview
+            self.get_infor_all_user()
+        else:
+            messagebox.showerror("Lỗi kết nối", f"{result['message']}.\nVui lòng thử lại sau.")
 
-                # Cập nhật lại dữ liệu trên Treeview
-                self.after(0, self.get_infor_all_user)
-            
-            else:
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showerror("Lỗi kết nối", f"{result["message"]}.\nVui lòng thử lại sau."))
-                
-                # Hủy kích hoạt nút
-                self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-                self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
-
-        except Exception as e:
-            self.after(0, self.hide_loading_popup)
-            self.after(0, lambda err=e: messagebox.showerror("Lỗi kết nối", f"Không thể thay đổi mật khẩu tài khoản người dùng: {str(err)}.\nThử lại sau."))
-            logger.error(f"Xảy ra lỗi trong lúc thay đổi mật khẩu người dùng: {e}") 
-            
-            # Hủy kích hoạt nút
-            self.after(0, lambda: self.activate_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.disable_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.delete_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.change_password_account_button.configure(state="disabled"))
-            self.after(0, lambda: self.change_role_account_button.configure(state="disabled"))
+    def on_change_password_user_error(self, error):
+        """
+        Nhận lỗi phát sinh khi thay đổi mật khẩu người dùng (đang ở luồng chính)
+        """
+        self.hide_loading_popup()
+        messagebox.showerror("Lỗi kết nối", f"Không thể thay đổi mật khẩu tài khoản người dùng: {str(error)}.\nThử lại sau.")
+        logger.error(f"Xảy ra lỗi trong lúc thay đổi mật khẩu người dùng: {error}") 
+        # Hủy kích hoạt nút
+        self.disable_account_action_buttons()
 
     def show_loading_popup(self):
         """
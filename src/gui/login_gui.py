@@ -1,6 +1,5 @@
 import customtkinter as ctk
 from PIL import Image
-import threading
 import queue
 import re
 import string
@@ -18,9 +17,11 @@ sys.path.append(PROJECT_DIR)
 
 # Các thư viện tự tạo import từ đây
 from services.email_service import InternalEmailSender
-from services.database_service import My_Database
+from services.database_service import create_database
+from services.async_database import AsyncDatabase, TkDispatcher
 from utils.resource import resource_path
 from services.hash import Hash
+from services.kdf_executor import KDFBusyError, get_kdf_executor
 from utils.loading_gif import LoadingGifLabel
 from utils.constants import FILE_PATH
 from auth.google_auth import GoogleAuthService
@@ -58,6 +59,10 @@ FACEBOOK_REDIRECT_URI = f"http://localhost:{FACEBOOK_REDIRECT_PORT}{FACEBOOK_RED
 # Scope cần thiết (email + profile)
 FACEBOOK_SCOPES = ["email", "public_profile"]
 
+# Chu kỳ hỏi trạng thái email trong spool và thời gian chờ tối đa (ms)
+EMAIL_STATUS_POLL_MS = 500
+EMAIL_STATUS_POLL_TIMEOUT_MS = 120 * 1000
+
 class LoginWindow(ctk.CTkToplevel):
 
     """
@@ -100,7 +105,11 @@ class LoginWindow(ctk.CTkToplevel):
             redirect_path=FACEBOOK_REDIRECT_PATH
         )
         # CSDL
-        self.database = My_Database()
+        self.database = create_database()  # SQL Server hoặc SQLite theo biến môi trường DB_BACKEND
+        # Truy vấn CSDL không chặn giao diện, kết quả trả về main thread qua dispatcher
+        self.async_db = AsyncDatabase(self.database, dispatcher=TkDispatcher(self))
+        # Việc nâng cấp mã hóa mật khẩu chạy nền sau đăng nhập (đóng pool phải chờ nó xong)
+        self.rehash_future = None
         # Khởi tạo hàng đợi (queue) để nhận kết quả từ luồng
         self.result_queue = queue.Queue()
 
@@ -253,6 +262,29 @@ class LoginWindow(ctk.CTkToplevel):
                                   fg_color= "transparent", hover_color= "#D9D9D9", command=self.back_to_login_frame)
         back_btn.grid(row=6, column=0, columnspan = 2, pady=5)
     
+    def poll_email_status(self, job_id, to_email, callback=None, waited_ms=0):
+        """
+        Hỏi định kỳ trạng thái email trong spool (đang ở luồng chính), khi gửi xong/thất bại thì gọi
+        callback(to_email, success) - mặc định là email_callback. Quá EMAIL_STATUS_POLL_TIMEOUT_MS thì coi như lỗi (success = None).
+        """
+        callback = callback or self.email_callback
+        if job_id is None:
+            callback(to_email, False)
+            return
+
+        status = self.email_sender.spool.status(job_id)
+        state = status["status"] if status else None
+        if state == "sent":
+            callback(to_email, True)
+        elif state == "failed":
+            logger.warning("Gửi mail tới %s thất bại sau %s lần: %s", to_email, status["attempts"], status["last_error"])
+            callback(to_email, False)
+        elif state is None or waited_ms >= EMAIL_STATUS_POLL_TIMEOUT_MS:
+            callback(to_email, None)
+        else:
+            self.after(EMAIL_STATUS_POLL_MS, lambda: self.poll_email_status(job_id, to_email, callback,
+                                                                            waited_ms + EMAIL_STATUS_POLL_MS))
+
     # Định nghĩa hàm callback để xử lý kết quả sau khi gửi email
     def email_callback(self, to_email, success):
         """
@@ -287,51 +319,63 @@ class LoginWindow(ctk.CTkToplevel):
         current_time = datetime.now()
         expired_OTP_time = current_time + timedelta(minutes=10)
 
-        # Tạo luồng mới để cập nhật thông tin OTP về CSDL
+        # Kiểm tra email, lưu OTP vào CSDL và gửi email trên event loop nền của AsyncDatabase
         self.show_loading_popup()
-        threading.Thread(target=self.get_OTP_for_reset_password_in_thread, args=(gen_OTP, expired_OTP_time, email ), daemon= True).start()
+        self.async_db.run(
+            self.save_OTP_and_send_email(gen_OTP, expired_OTP_time, email),
+            callback=lambda results: self.on_save_OTP_done(results, email),
+            error_callback=self.on_save_OTP_error
+        )
 
-    def get_OTP_for_reset_password_in_thread(self, OTP, expired_OTP_time, email):
+    async def save_OTP_and_send_email(self, OTP, expired_OTP_time, email):
         """
-        Lưu mã OTP vào CSDL và gửi nó đến email người dùng trong 1 luồng riêng
+        Kiểm tra email, lưu mã OTP vào CSDL và xếp email OTP vào spool
+        Trả về (kết quả kiểm tra email, kết quả cập nhật OTP, job_id email); bước chưa chạy thì là None
         """
-        try:
-            # Kiểm tra email đã tồn tại hay chưa
-            check_mail_result = self.database.get_username(email= email)
-
-            # Nếu truy vấn thành công
-            if check_mail_result["success"]:
-                # Kiểm tra xem có tồn tại kết quả trả về không
-                if not check_mail_result["data"]:
-                    self.after(0, self.hide_loading_popup)
-                    self.after(0, lambda: messagebox.showinfo("Thông báo", f"Tài khoản {email} chưa được đăng ký trên CSDL.", parent= self))
-                    return
-                
-            else:
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showerror("Lỗi kết nối", f"Xảy ra lỗi: {check_mail_result["message"]}. \nVui lòng liên hệ bộ phận IT"))
-                return
-
-            # Cập nhật mã OTP lên CSDL
-            update_otp_result = self.database.update_OTP_and_time_expired(OTP= OTP, time_expired= expired_OTP_time, email= email)
-            if update_otp_result["success"]:
-                # Gửi email có chứa mã OTP
-                self.email_sender.send_email_for_password_reset(to_email= email, name= check_mail_result["data"][0][0], website_name= self.software_name,
-                                                                 OTP= OTP, callback= self.callback_send_otp_to_user)
-                self.after(0, self.hide_loading_popup)
-
-            else:
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showwarning("Lỗi cập nhật OTP", f"{update_otp_result["message"]}. \nHãy thử lại sau."))
-
-            # Ẩn nút getOTP và mở lại sau 30s
-            self.after(0, lambda: self.get_OTP_button.configure(state = "disabled"))
-            self.after(1000*30, lambda: self.get_OTP_button.configure(state = "normal"))
+        # Kiểm tra email đã tồn tại hay chưa
+        check_mail_result = await self.async_db.call("get_username", email= email)
+        if not check_mail_result["success"] or not check_mail_result["data"]:
+            return check_mail_result, None, None
 
-        except Exception as e:
-            self.after(0, self.hide_loading_popup)
-            # Tham chiếu biến e vào biến err để sử dụng cho hàm after, vì biến e chỉ tồn tại trong phạm vi exception, còn after là ngoài exception rồi
-            self.after(0, lambda err=e: messagebox.showerror("Lỗi OTP", f"Xảy ra lỗi: {str(err)}. \nHãy thử lại sau."))
+        # Cập nhật mã OTP lên CSDL
+        update_otp_result = await self.async_db.call("update_OTP_and_time_expired", OTP= OTP, time_expired= expired_OTP_time, email= email)
+        job_id = None
+        if update_otp_result["success"]:
+            # Gửi email có chứa mã OTP (làn ưu tiên cao của spool)
+            job_id = await self.async_db.call(self.email_sender.send_email_for_password_reset, to_email= email,
+                                              name= check_mail_result["data"][0][0], website_name= self.software_name, OTP= OTP)
+        return check_mail_result, update_otp_result, job_id
+
+    def on_save_OTP_done(self, results, email):
+        """
+        Nhận kết quả lưu và gửi mã OTP (đang ở luồng chính)
+        """
+        check_mail_result, update_otp_result, job_id = results
+        self.hide_loading_popup()
+
+        if not check_mail_result["success"]:
+            messagebox.showerror("Lỗi kết nối", f"Xảy ra lỗi: {check_mail_result['message']}. \nVui lòng liên hệ bộ phận IT")
+            return
+        if not check_mail_result["data"]:
+            messagebox.showinfo("Thông báo", f"Tài khoản {email} chưa được đăng ký trên CSDL.", parent= self)
+            return
+
+        if update_otp_result["success"]:
+            # Giao diện hỏi trạng thái email định kỳ
+            self.poll_email_status(job_id, email, self.callback_send_otp_to_user)
+        else:
+            messagebox.showwarning("Lỗi cập nhật OTP", f"{update_otp_result['message']}. \nHãy thử lại sau.")
+
+        # Ẩn nút getOTP và mở lại sau 30s
+        self.get_OTP_button.configure(state = "disabled")
+        self.after(1000*30, lambda: self.get_OTP_button.configure(state = "normal"))
+
+    def on_save_OTP_error(self, error):
+        """
+        Nhận lỗi phát sinh khi lưu và gửi mã OTP (đang ở luồng chính)
+        """
+        self.hide_loading_popup()
+        messagebox.showerror("Lỗi OTP", f"Xảy ra lỗi: {str(error)}. \nHãy thử lại sau.")
 
     def callback_send_otp_to_user(self, to_email, success):
         """
@@ -374,71 +418,73 @@ class LoginWindow(ctk.CTkToplevel):
             messagebox.showwarning("Cảnh báo","Mật khẩu bạn nhập không trùng nhau, hãy kiểm tra lại!")
             return
         
-        # Mở một luồng mới kiểm tra OTP và cập nhật mật khẩu mới cho người dùng
+        # Kiểm tra OTP và cập nhật mật khẩu mới trên event loop nền của AsyncDatabase
         self.show_loading_popup()
-        # Tạo luồng mới để cập nhật dữ liệu vào CSDL
-        threading.Thread(target=self.update_password_for_user_in_thread, args=(email, otp_code, password), daemon= True).start()
+        self.async_db.run(
+            self.verify_OTP_and_update_password(email, otp_code, password),
+            callback=self.on_update_password_done,
+            error_callback=self.on_update_password_error
+        )
 
-    def update_password_for_user_in_thread(self, email, otp_code, password):
+    async def verify_OTP_and_update_password(self, email, otp_code, password):
         """
-        Kiểm tra thông tin mật khẩu, OTP và cập nhật mật khẩu trong 1 luồng riêng
+        Kiểm tra thông tin mật khẩu, OTP và cập nhật mật khẩu
+        Trả về (trạng thái, kết quả CSDL của bước cuối cùng đã chạy), trạng thái là 1 trong:
+        check_failed, no_otp, otp_mismatch, otp_expired, updated
         """
         # Kiểm tra email đã tồn tại trong CSDL chưa, đã tồn tại thì mới tiến hành cập nhật mật khẩu
-        check_user = self.database.get_username(email= email)
+        check_user = await self.async_db.call("get_username", email= email)
+        if not check_user["success"]:
+            return "check_failed", check_user
 
-        if check_user["success"]:
-            try:
-                # Lấy mã OTP và thời gian hết hạn của nó
-                get_otp = self.database.get_otp_and_expired_time(email= email)
-
-                # Kiểm tra kết quả trả về
-                if get_otp["success"]:
-
-                    if get_otp["data"]:
-                        otp_server = get_otp["data"][0][0]
-                        expired_time_otp_server = get_otp["data"][0][1]
-
-                        # So sánh mã OTP
-                        if otp_code != otp_server:
-                            self.after(0, self.hide_loading_popup)
-                            self.after(0, lambda: messagebox.showwarning("Mã OTP không khớp", "Mã OTP bạn nhập không đúng. Hãy thử lại sau 10 phút."))
-                            return
-                        
-                        # Kiểm tra xem mã OTP có hết hạn chưa
-                        current_time = datetime.now()
-                        if current_time > expired_time_otp_server:
-                            self.after(0, self.hide_loading_popup)
-                            self.after(0, lambda: messagebox.showwarning("Mã OTP hết hạn", "Mã OTP của bạn đã hết hạn. Hãy thử lại với mã OTP mới hơn."))
-                            return
-
-                        # Nếu OTP đúng và chưa hết hạn, tiến hành thay đổi mật khẩu
-                        confirm_change_pw = self.database.update_password_user(email=email, password=password)
-
-                        # Thông báo thành công
-                        if confirm_change_pw["success"]:
-                            self.after(0, self.hide_loading_popup)
-                            self.after(0, lambda: messagebox.showinfo("Thành công", "Mật khẩu của bạn đã được cập nhật thành công!"))   
-
-                        else:           
-                            self.after(0, self.hide_loading_popup)
-                            self.after(0, lambda: messagebox.showerror("Thất bại", f"{confirm_change_pw["message"]}, vui lòng thử lại."))              
-                    
-                    else:
-                        self.after(0, self.hide_loading_popup)
-                        self.after(0, lambda: messagebox.showwarning("Không có mã OTP", f"{get_otp["message"]}. Không thể cập nhật mật khẩu \nLiên hệ bộ phận IT để xử lý."))
-                        return
+        # Lấy mã OTP và thời gian hết hạn của nó
+        get_otp = await self.async_db.call("get_otp_and_expired_time", email= email)
+        if not get_otp["success"] or not get_otp["data"]:
+            return "no_otp", get_otp
 
-            except Exception as e:
-                logger.error("Xảy ra lỗi trong quá trình cập nhật mật khẩu cho người dùng: %s", e)
+        otp_server = get_otp["data"][0][0]
+        expired_time_otp_server = get_otp["data"][0][1]
+
+        # So sánh mã OTP
+        if otp_code != otp_server:
+            return "otp_mismatch", get_otp
+
+        # Kiểm tra xem mã OTP có hết hạn chưa
+        if datetime.now() > expired_time_otp_server:
+            return "otp_expired", get_otp
 
-                self.after(0, self.hide_loading_popup)
-                # Tham chiếu biến e vào biến err để sử dụng cho hàm after, vì biến e chỉ tồn tại trong phạm vi exception, còn after là ngoài exception rồi
-                self.after(0, lambda err=e: messagebox.showerror("Lỗi đổi mật khẩu", f"Xảy ra lỗi: {str(err)}. \nHãy thử lại sau.")) 
+        # Nếu OTP đúng và chưa hết hạn, tiến hành thay đổi mật khẩu
+        confirm_change_pw = await self.async_db.call("update_password_user", email= email, password= password)
+        return "updated", confirm_change_pw
 
+    def on_update_password_done(self, results):
+        """
+        Nhận kết quả đặt lại mật khẩu (đang ở luồng chính)
+        """
+        status, result = results
+        self.hide_loading_popup()
+
+        if status == "check_failed":
+            messagebox.showwarning("Không thể thay đổi mật khẩu", f"{result['message']} \nVui lòng thử lại sau.")
+        elif status == "no_otp":
+            messagebox.showwarning("Không có mã OTP", f"{result['message']}. Không thể cập nhật mật khẩu \nLiên hệ bộ phận IT để xử lý.")
+        elif status == "otp_mismatch":
+            messagebox.showwarning("Mã OTP không khớp", "Mã OTP bạn nhập không đúng. Hãy thử lại sau 10 phút.")
+        elif status == "otp_expired":
+            messagebox.showwarning("Mã OTP hết hạn", "Mã OTP của bạn đã hết hạn. Hãy thử lại với mã OTP mới hơn.")
+        elif result["success"]:
+            messagebox.showinfo("Thành công", "Mật khẩu của bạn đã được cập nhật thành công!")
         else:
-            self.after(0, self.hide_loading_popup)
-            self.after(0, lambda: messagebox.showwarning("Không thể thay đổi mật khẩu", f"{check_user["message"]} \nVui lòng thử lại sau."))
-    
+            messagebox.showerror("Thất bại", f"{result['message']}, vui lòng thử lại.")
+
+    def on_update_password_error(self, error):
+        """
+        Nhận lỗi phát sinh khi đặt lại mật khẩu (đang ở luồng chính)
+        """
+        logger.error("Xảy ra lỗi trong quá trình cập nhật mật khẩu cho người dùng: %s", error)
+        self.hide_loading_popup()
+        messagebox.showerror("Lỗi đổi mật khẩu", f"Xảy ra lỗi: {str(error)}. \nHãy thử lại sau.")
+
     def generate_random_OTP(self):
         """
         Tạo OTP (One Time Password) ngẫu nhiên bằng thư viện secrets và string
@@ -533,56 +579,60 @@ class LoginWindow(ctk.CTkToplevel):
         # Hiển thị popup thông báo đang tạo tài khoản mới
         self.show_loading_popup()
 
-        # Tạo luồng mới để lưu thông tin tài khoản mới vào CSDL
+        # Lưu thông tin tài khoản mới vào CSDL trên event loop nền của AsyncDatabase
         new_account = {"email": email, "username": username, "password": password}
-        threading.Thread(target=self.create_new_account_login_in_thread, args=(new_account,), daemon=True).start()
-        
-    def create_new_account_login_in_thread(self, new_account):
+        self.async_db.run(
+            self.save_new_account(new_account),
+            callback=lambda results: self.on_create_new_account_done(results, new_account),
+            error_callback=self.on_create_new_account_error
+        )
+
+    async def save_new_account(self, new_account):
         """
-        Lưu thông tin tài khoản mới vào tệp cấu hình trong một luồng riêng
+        Kiểm tra email và lưu tài khoản mới vào CSDL, tạo xong thì gửi email thông báo
+        Trả về (kết quả kiểm tra email, kết quả tạo tài khoản); bước chưa chạy thì là None
         """
-        # Thêm thông tin người dùng mới vào CSDL
-        try:
-            # Kiểm tra email đã tồn tại trong CSDL chưa
-            check_user = self.database.get_username(email= new_account["email"])
-            # Kiểm tra kết quả trả về
-            if check_user["success"]:
-                if check_user["data"]:
-
-                    # Hủy cửa sổ loading
-                    self.after(0, self.hide_loading_popup)
-
-                    # Nếu có dữ liệu trả về thì email đã tồn tại trong CSDL
-                    self.after(0, lambda: messagebox.showwarning("Email đã tồn tại", f"Email {new_account['email']} đã được đăng ký. \nVui lòng sử dụng email khác."))
-                    return
-            else:
-                # Hủy cửa sổ loading
-                self.after(0, self.hide_loading_popup)
-                # Nếu có lỗi xảy ra trong quá trình kiểm tra email, thông báo lỗi
-                self.after(0, lambda: messagebox.showwarning("Lỗi kiểm tra email", f"Có lỗi xảy ra: {check_user['message']} \nVui lòng thử lại sau."))
-                return
-
-            # Lưu thông tin tài khoản mới vào CSDL
-            create_new_user_result = self.database.create_new_user(username= new_account["username"], email= new_account["email"], password= new_account["password"])
-            if create_new_user_result["success"]:
-                # Gửi email thông báo đã tạo tài khoản thành công
-                self.email_sender.send_email_for_new_account(to_email= new_account["email"], name= new_account["username"], website_name= self.software_name)
-                # Đóng cửa sổ loading
-                self.after(0, self.hide_loading_popup)
-                self.after(0, lambda: messagebox.showinfo("Tạo tài khoản thành công", f"Bạn đã tao tài khoản thành công với email: {new_account['email']}. \nHãy đăng nhập để sử dụng phần mềm."))
-                return
-            else:
-                # Hủy cửa sổ loading
-                self.after(0, self.hide_loading_popup)
-                # Nếu có lỗi xảy ra trong quá trình tạo tài khoản, thông báo lỗi    
-                self.after(0, lambda: messagebox.showerror("Lỗi tạo tài khoản", f"{create_new_user_result['message']} \nVui lòng thử lại sau."))
-                return
+        # Kiểm tra email đã tồn tại trong CSDL chưa
+        check_user = await self.async_db.call("get_username", email= new_account["email"])
+        if not check_user["success"] or check_user["data"]:
+            return check_user, None
 
-        except Exception as e:
-            # Hủy cửa sổ loading
-            self.after(0, self.hide_loading_popup)
+        # Lưu thông tin tài khoản mới vào CSDL
+        create_new_user_result = await self.async_db.call("create_new_user", username= new_account["username"],
+                                                          email= new_account["email"], password= new_account["password"])
+        if create_new_user_result["success"]:
+            # Gửi email thông báo đã tạo tài khoản thành công
+            await self.async_db.call(self.email_sender.send_email_for_new_account, to_email= new_account["email"],
+                                     name= new_account["username"], website_name= self.software_name)
+        return check_user, create_new_user_result
+
+    def on_create_new_account_done(self, results, new_account):
+        """
+        Nhận kết quả tạo tài khoản mới (đang ở luồng chính)
+        """
+        check_user, create_new_user_result = results
+        # Hủy cửa sổ loading
+        self.hide_loading_popup()
+
+        if not check_user["success"]:
+            # Nếu có lỗi xảy ra trong quá trình kiểm tra email, thông báo lỗi
+            messagebox.showwarning("Lỗi kiểm tra email", f"Có lỗi xảy ra: {check_user['message']} \nVui lòng thử lại sau.")
+        elif check_user["data"]:
+            # Nếu có dữ liệu trả về thì email đã tồn tại trong CSDL
+            messagebox.showwarning("Email đã tồn tại", f"Email {new_account['email']} đã được đăng ký. \nVui lòng sử dụng email khác.")
+        elif create_new_user_result["success"]:
+            messagebox.showinfo("Tạo tài khoản thành công", f"Bạn đã tao tài khoản thành công với email: {new_account['email']}. \nHãy đăng nhập để sử dụng phần mềm.")
+        else:
             # Nếu có lỗi xảy ra trong quá trình tạo tài khoản, thông báo lỗi
-            self.after(0, lambda err=e: messagebox.showerror("Lỗi tạo tài khoản", f"Xảy ra lỗi: {str(err)}. \nHãy thử lại sau."))
+            messagebox.showerror("Lỗi tạo tài khoản", f"{create_new_user_result['message']} \nVui lòng thử lại sau.")
+
+    def on_create_new_account_error(self, error):
+        """
+        Nhận lỗi phát sinh khi tạo tài khoản mới (đang ở luồng chính)
+        """
+        # Hủy cửa sổ loading
+        self.hide_loading_popup()
+        messagebox.showerror("Lỗi tạo tài khoản", f"Xảy ra lỗi: {str(error)}. \nHãy thử lại sau.")
 
     def back_to_login_frame(self):
         """
@@ -603,6 +653,20 @@ class LoginWindow(ctk.CTkToplevel):
         logger.info("Đã đóng cửa sổ đăng nhập trước khi đăng nhập vào chương trình")
         self.on_close()
 
+    def destroy(self):
+        """
+        Hủy cửa sổ đăng nhập và đóng pool kết nối của nó (kết nối nhàn rỗi + luồng dọn dẹp),
+        ứng dụng chính dùng pool riêng nên pool của cửa sổ đăng nhập không còn cần sau khi đăng nhập.
+        Email đã xếp vào spool vẫn được gửi; chỉ phiên SMTP của cửa sổ này bị đóng.
+        """
+        self.email_sender.close()
+        super().destroy()
+        if self.rehash_future is not None and not self.rehash_future.done():
+            # Còn đang nâng cấp mã hóa mật khẩu: đóng pool khi việc đó xong
+            self.rehash_future.add_done_callback(lambda _: self.database.close())
+        else:
+            self.database.close()
+
     def toggle_password(self, pwd_entry: ctk.CTkEntry, show_password_var: ctk.BooleanVar):
         """
         Hiển thị mật khẩu khi người dùng chọn chức năng hiển thị mật khẩu
@@ -647,9 +711,9 @@ class LoginWindow(ctk.CTkToplevel):
     def _handle_google_userinfo_with_remember(self, user_info: dict):
         """
         Xử lý user_info Google + remember 30 ngày.
-        Nếu lần đầu đăng nhập mà DB chưa có:
-        - Tạo Users
-        - Tạo UserExternalLogin
+        Toàn bộ phần CSDL chạy trong 1 lần gọi social_login:
+        - Nếu lần đầu đăng nhập mà DB chưa có: tạo Users + UserExternalLogin
+        - Tạo session (nếu tick remember) và cập nhật LastLoginAt
         - Đăng nhập như bình thường
         """
         # Đảm bảo đóng popup loading trước khi show messagebox
@@ -667,68 +731,48 @@ class LoginWindow(ctk.CTkToplevel):
 
         logger.info("Google user: %s - %s", google_email, google_name)
 
-        # Tìm user nội bộ theo Google
-        result = self.database.get_user_by_google(
-            google_id=google_id,
-            email=google_email
+        # Tìm/tạo user, link Google, tạo session và cập nhật LastLoginAt trong 1 lần gọi CSDL
+        self.start_social_login(
+            provider="google",
+            provider_user_id=google_id,
+            email=google_email,
+            user_name=google_name,
+            device_info="HR Desktop App (Google)"
         )
 
-        # Nếu DB báo lỗi hệ thống
-        if not result.get("success"):
-            messagebox.showerror("Lỗi", result.get("message", "Lỗi truy vấn DB."), parent= self)
-            return
-
-        # Lấy danh sách rows
-        data = result.get("data") or []
-
-        # =========================================================
-        # NẾU CHƯA CÓ DỮ LIỆU → LẦN ĐẦU ĐĂNG NHẬP → TẠO TÀI KHOẢN MỚI
-        # =========================================================
-        if not data:
-            # Tạo user nội bộ nếu chưa có
-            create_user_res = self.database.create_user_if_not_exists_google(
-                user_name=google_name,
-                email=google_email
-            )
-
-            # Nếu tạo user thất bại thì thông báo
-            if not create_user_res.get("success") or not create_user_res.get("data"):
-                messagebox.showerror(
-                    "Lỗi",
-                    create_user_res.get("message", "Không thể tạo tài khoản mới."),
-                    parent= self
-                )
-                return
-
-            # Tạo mapping Google → Users
-            link_res = self.database.link_google_login_if_not_exists(
-                user_email=google_email,
-                google_id=google_id,
-                provider_email=google_email
-            )
-
-            # Link lỗi thì vẫn cho login tiếp, vì user nội bộ đã được tạo rồi
-            # Log lại để phân tích lỗi
-            if not link_res.get("success"):
-                logger.warning("Link Google login thất bại: %s", link_res.get("message"))
-
-            # Query lại để lấy row theo format usp_GetUserByGoogle
-            result = self.database.get_user_by_google(
-                google_id=google_id,
-                email=google_email
-            )
+    def start_social_login(self, provider, provider_user_id, email, user_name, device_info):
+        """
+        Gửi yêu cầu đăng nhập Google/Facebook tới CSDL (chạy nền), kết quả xử lý tại _handle_social_login_result
+        """
+        self.show_loading_popup()
+        self.async_db.submit(
+            "social_login",
+            provider=provider,
+            provider_user_id=provider_user_id,
+            email=email,
+            user_name=user_name,
+            remember=bool(self.remember_var.get()),
+            days=30,
+            device_info=device_info,
+            callback=lambda result: self._handle_social_login_result(result, provider),
+            error_callback=self._handle_social_login_error
+        )
 
-            # Nếu vẫn không lấy được
-            if not result.get("success") or not result.get("data"):
-                messagebox.showerror("Lỗi", "Tạo tài khoản xong nhưng không lấy lại được dữ liệu.", parent= self)
-                return
+    def _handle_social_login_result(self, result, provider):
+        """
+        Xử lý kết quả đăng nhập Google/Facebook (đang ở luồng chính)
+        """
+        self.hide_loading_popup()
 
-            data = result["data"]
+        # Nếu DB báo lỗi hệ thống hoặc không lấy được dữ liệu
+        if not result.get("success") or not result.get("data"):
+            messagebox.showerror("Lỗi", result.get("message", "Lỗi truy vấn DB."), parent= self)
+            return
 
         # Lấy row đầu tiên
-        row = data[0]
+        row = result["data"][0]
 
-        # row theo usp_GetUserByGoogle:
+        # row theo usp_GetUserByGoogle / usp_GetUserByFacebook:
         # User_Name, Email, IsActive, Privilege, Status, Provider, ProviderUserId, ProviderEmail
         db_email = row[1]
         is_active = row[2]
@@ -740,36 +784,30 @@ class LoginWindow(ctk.CTkToplevel):
             messagebox.showinfo("Thông báo", "Tài khoản chưa được kích hoạt.", parent= self)
             return
 
-        # Nếu tick remember → tạo session theo Email
-        session_token = None
-        if self.remember_var.get():
-            s = self.database.create_session_by_email(
-                email=db_email,
-                days=30,
-                device_info="HR Desktop App (Google)"
-            )
-            if s.get("success"):
-                session_token = s.get("token")
-
-        # Lưu config local
+        # Lưu config local (không lưu password), session_token có thể None nếu không tick remember
         encoded_email = base64.b64encode(db_email.encode("utf-8")).decode("utf-8")
 
         new_account = {
             "email": encoded_email,
             "password": None,
-            "provider": "google",
-            "session_token": session_token,
+            "provider": provider,
+            "session_token": result.get("token"),
             "last_login_ts": datetime.now().isoformat()
         }
         self.save_or_update_account_login(new_account)
 
-        # Cập nhật last login để audit
-        self.database.update_last_login_at(db_email)
-
         # Đóng login window và mở main
         self.destroy()
         self.on_success(permission=permission)
 
+    def _handle_social_login_error(self, error):
+        """
+        Lỗi khi đăng nhập Google/Facebook với CSDL (đang ở luồng chính)
+        """
+        self.hide_loading_popup()
+        logger.error("Lỗi đăng nhập bằng tài khoản ngoài: %s", str(error))
+        messagebox.showerror("Lỗi", f"Xảy ra lỗi: {str(error)}. \nVui lòng thử lại sau.", parent= self)
+
     def try_auto_login_from_session(self):
         """
         Thử auto login nếu tồn tại session_token trong config.
@@ -817,19 +855,13 @@ class LoginWindow(ctk.CTkToplevel):
         # Hiện loading trong lúc kiểm tra session với DB
         self.show_loading_popup()
 
-        # Hàm chạy trong luồng nền
-        def _worker():
-            try:
-                # Gọi DB kiểm tra session còn hạn không
-                result = self.database.get_user_by_session(session_token)
-                # Trả kết quả về UI thread
-                self.after(0, lambda r=result: self._handle_auto_login_result(r))
-            except Exception as e:
-                # Trả lỗi về UI thread
-                self.after(0, lambda err=e: self._handle_auto_login_error(err))
-
-        # Chạy worker ở thread nền
-        threading.Thread(target=_worker, daemon=True).start()
+        # Gọi DB kiểm tra session còn hạn không, kết quả trả về UI thread qua dispatcher
+        self.async_db.submit(
+            "get_user_by_session",
+            session_token,
+            callback=self._handle_auto_login_result,
+            error_callback=self._handle_auto_login_error
+        )
 
     def _handle_auto_login_result(self, result):
         """
@@ -1029,16 +1061,12 @@ class LoginWindow(ctk.CTkToplevel):
         FULL FLOW giống Google:
 
         1) Nhận user_info: id, name, email (nếu Facebook trả)
-        2) Tìm user nội bộ theo facebook_id/email
-        3) Nếu chưa có:
-        - Tạo Users
-        - Link UserExternalLogin
-        - Query lại
-        4) Nếu tick remember:
-        - create_session_by_email(30 ngày)
-        5) update LastLoginAt
-        6) Lưu config
-        7) Đăng nhập vào app
+        2) Gọi social_login (1 lần gọi CSDL):
+        - Nếu chưa có: tạo Users + link UserExternalLogin
+        - Nếu tick remember: tạo session 30 ngày
+        - update LastLoginAt
+        3) Lưu config
+        4) Đăng nhập vào app
         """
         # Đóng popup loading trước khi show messagebox
         self.hide_loading_popup()
@@ -1072,109 +1100,15 @@ class LoginWindow(ctk.CTkToplevel):
 
         logger.info("Facebook user: %s - %s", facebook_email, facebook_name)
 
-        # Tìm user nội bộ theo facebook
-        result = self.database.get_user_by_facebook(
-            facebook_id=facebook_id,
-            email=facebook_email
+        # Tìm/tạo user, link Facebook, tạo session và cập nhật LastLoginAt trong 1 lần gọi CSDL
+        self.start_social_login(
+            provider="facebook",
+            provider_user_id=facebook_id,
+            email=facebook_email,
+            user_name=facebook_name,
+            device_info="HR Desktop App (Facebook)"
         )
 
-        # Nếu DB lỗi
-        if not result.get("success"):
-            messagebox.showerror("Lỗi", result.get("message", "Lỗi truy vấn DB."), parent= self)
-            return
-
-        data = result.get("data") or []
-
-        # =========================================================
-        # NẾU CHƯA CÓ DỮ LIỆU → TẠO TÀI KHOẢN MỚI
-        # =========================================================
-        if not data:
-            # Tạo user nội bộ nếu chưa có
-            create_user_res = self.database.create_user_if_not_exists_external(
-                user_name=facebook_name,
-                email=facebook_email
-            )
-
-            # Nếu tạo user thất bại
-            if not create_user_res.get("success") or not create_user_res.get("data"):
-                messagebox.showerror(
-                    "Lỗi",
-                    create_user_res.get("message", "Không thể tạo tài khoản mới."),
-                    parent= self
-                )
-                return
-
-            # Link Facebook → Users
-            link_res = self.database.link_facebook_login_if_not_exists(
-                user_email=facebook_email,
-                facebook_id=facebook_id,
-                provider_email=facebook_email
-            )
-
-            # Link lỗi không chặn login, nhưng log để kiểm tra
-            if not link_res.get("success"):
-                logger.warning("Link Facebook login thất bại: %s", link_res.get("message"))
-
-            # Query lại để lấy row theo usp_GetUserByFacebook
-            result = self.database.get_user_by_facebook(
-                facebook_id=facebook_id,
-                email=facebook_email
-            )
-
-            if not result.get("success") or not result.get("data"):
-                messagebox.showerror("Lỗi", "Tạo tài khoản xong nhưng không lấy lại được dữ liệu.", parent= self)
-                return
-
-            data = result["data"]
-
-        # Lấy row đầu tiên
-        row = data[0]
-
-        # row theo usp_GetUserByFacebook:
-        # User_Name, Email, IsActive, Privilege, Status, Provider, ProviderUserId, ProviderEmail
-        db_email = row[1]
-        is_active = row[2]
-        permission = row[3]
-
-        #  Nếu user chưa active
-        # Với auto-create, SP đã set IsActive=1
-        if not is_active:
-            messagebox.showinfo("Thông báo", "Tài khoản chưa được kích hoạt.", parent= self)
-            return
-
-        # Nếu tick remember → tạo session theo Email
-        session_token = None
-        if self.remember_var.get():
-            s = self.database.create_session_by_email(
-                email=db_email,
-                days=30,
-                device_info="HR Desktop App (Facebook)"
-            )
-            if s.get("success"):
-                session_token = s.get("token")
-
-        # Update LastLoginAt
-        # Không quan trọng success/fail, nhưng nên log nếu lỗi
-        upd = self.database.update_last_login_at(db_email)
-        if not upd.get("success"):
-            logger.warning("Update LastLoginAt thất bại: %s", upd.get("message"))
-
-        # Lưu config local (không lưu password)
-        encoded_email = base64.b64encode(db_email.encode("utf-8")).decode("utf-8")
-
-        new_account = {
-            "email": encoded_email,
-            "password": None,
-            "provider": "facebook",
-            "session_token": session_token,
-            "last_login_ts": datetime.now().isoformat()
-        }
-        self.save_or_update_account_login(new_account)
-
-        # Đóng login window và mở main
-        self.destroy()
-        self.on_success(permission=permission)
-
     def check_login(self):
         """
         Đăng nhập vào phần mềm
@@ -1211,35 +1145,43 @@ class LoginWindow(ctk.CTkToplevel):
         # Tạo popup loading và đặt giữa chương trình
         self.show_loading_popup()
 
-        # Tạo luồng mới để truy vấn CSDL để đăng nhập
-        threading.Thread(target=self.query_database, args=(email,), daemon= True).start()
+        # Truy vấn CSDL để đăng nhập (chạy trên executor của AsyncDatabase)
+        self.query_database(email)
     
     def query_database(self, email):
         """
-        Hàm để thực hiện truy vấn CSDL trong một luồng riêng
+        Gửi truy vấn thông tin đăng nhập tới AsyncDatabase.
+        Kết quả được xử lý trên luồng chính tại on_query_database_done/on_query_database_error
         """
-        try:
-            # Thực hiện truy vấn để lấy thông tin người dùng
-            get_information_login = self.database.get_password_salt_password_privilege_user(email=email)
-
-            # Kiểm tra kết quả trả về
-            if get_information_login["success"]:
-                # Đưa kết quả vào queue để lấy kết quả từ luồng chính
-                self.result_queue.put(get_information_login["data"])
-
-                # Gọi hàm để xử lý kết quả trong luồng chính
-                self.after(0, self.process_login_result)
-            else:
-                # Đóng cửa sổ loading
-                self.hide_loading_popup()
-                # Nếu có lỗi xảy ra trong quá trình truy vấn, thông báo lỗi
-                self.after(0, messagebox.showerror("Lỗi đăng nhập", f"{get_information_login["message"]} \nVui lòng thử lại sau."))
+        self.async_db.submit(
+            "get_password_salt_password_privilege_user",
+            email=email,
+            callback=self.on_query_database_done,
+            error_callback=self.on_query_database_error
+        )
 
-        except Exception as e:
-            # Hủy cửa sổ loading
+    def on_query_database_done(self, get_information_login):
+        """
+        Nhận kết quả truy vấn đăng nhập (đang ở luồng chính)
+        """
+        # Kiểm tra kết quả trả về
+        if get_information_login["success"]:
+            # Đưa kết quả vào queue để hàm xử lý đăng nhập lấy ra
+            self.result_queue.put(get_information_login["data"])
+            self.process_login_result()
+        else:
+            # Đóng cửa sổ loading
             self.hide_loading_popup()
             # Nếu có lỗi xảy ra trong quá trình truy vấn, thông báo lỗi
-            self.after(0, lambda err=e: messagebox.showerror("Lỗi đăng nhập", f"Xảy ra lỗi: {str(err)}. \nVui lòng thử lại sau."))
+            messagebox.showerror("Lỗi đăng nhập", f"{get_information_login['message']} \nVui lòng thử lại sau.")
+
+    def on_query_database_error(self, error):
+        """
+        Nhận lỗi phát sinh khi truy vấn đăng nhập (đang ở luồng chính)
+        """
+        # Hủy cửa sổ loading
+        self.hide_loading_popup()
+        messagebox.showerror("Lỗi đăng nhập", f"Xảy ra lỗi: {str(error)}. \nVui lòng thử lại sau.")
     
     def process_login_result(self):
         """
@@ -1272,84 +1214,113 @@ class LoginWindow(ctk.CTkToplevel):
             return
 
         # Verify mật khẩu người dùng nhập với hash + salt lưu trong DB
+        # Băm scrypt chạy trên executor riêng (giới hạn bộ nhớ), kết quả trả về giao diện qua on_password_verified
         input_password = self.passwd_entry.get()  # Lấy mật khẩu user vừa gõ
+        email = self.email_login.get()
 
-        check_password = Hash.verify(
-            stored_salt=stored_salt,
-            stored_hashed_password=stored_hash,
-            input_password=input_password
+        try:
+            future = get_kdf_executor().submit_verify(
+                stored_salt=stored_salt,
+                stored_hashed_password=stored_hash,
+                input_password=input_password
+            )
+        except KDFBusyError as e:
+            self.hide_loading_popup()
+            messagebox.showerror("Lỗi đăng nhập", f"{e}", parent= self)
+            return
+
+        self.async_db.watch(
+            future,
+            callback=lambda check_password: self.on_password_verified(check_password, email, privilege,
+                                                                      stored_hash, input_password),
+            error_callback=self.on_query_database_error
         )
 
+    def on_password_verified(self, check_password, email, privilege, stored_hash=None, input_password=None):
+        """
+        Nhận kết quả kiểm tra mật khẩu (đang ở luồng chính)
+        """
         if check_password:
+            # Mật khẩu lưu theo định dạng cũ/tham số yếu hơn hiện hành -> băm lại ở luồng nền (không chặn đăng nhập)
+            if input_password is not None and Hash.needs_rehash(stored_hash):
+                self.rehash_future = self.async_db.submit(
+                    self.database.upgrade_password_hash, email, input_password, stored_hash,
+                    callback=lambda r: logger.info("Nâng cấp mã hóa mật khẩu %s: %s", email, r.get("message")),
+                    error_callback=lambda e: logger.warning("Không thể nâng cấp mã hóa mật khẩu %s: %s", email, e)
+                )
 
-            # Lấy thông tin email đăng nhập
-            email = self.email_login.get()
-            # Nếu có checkbox "Nhớ đăng nhập 30 ngày" (self.remember_var)
-            session_token = None
+            # Tạo session remember-me và cập nhật LastLoginAt trên event loop nền (vẫn hiện loading popup)
+            remember = bool(getattr(self, "remember_var", None) and self.remember_var.get())
+            self.async_db.run(
+                self.record_login(email, remember),
+                callback=lambda session_token: self.on_login_recorded(session_token, email, privilege),
+                error_callback=lambda e: self.on_login_recorded(None, email, privilege, error=e)
+            )
+        else:
+            # Hủy cửa sổ loading
+            self.hide_loading_popup()
+            logger.warning("Đăng nhập không thành công với tài khoản: %s", self.email_login.get())
+            messagebox.showinfo("Thông báo", f"Mật khẩu không chính xác, vui lòng thử lại.", parent= self)
+            return
+   
+    async def record_login(self, email, remember):
+        """
+        Ghi nhận lần đăng nhập thành công: tạo session 30 ngày (nếu nhớ đăng nhập) và cập nhật LastLoginAt.
+        Lỗi ở bước nào cũng không chặn đăng nhập, chỉ ghi log. Trả về raw token (None nếu không tạo session).
+        """
+        session_token = None
+        if remember:
             try:
-                if getattr(self, "remember_var", None) and self.remember_var.get():
-                    # Gọi DB tạo session 30 ngày cho email này
-                    s = self.database.create_session_by_email(
-                        email=email,
-                        days=30,
-                        device_info="My app Desktop App (Local)"
-                    )
-
-                    if s.get("success"):
-                        session_token = s.get("token")  # Raw token trả về
-                    else:
-                        # Nếu tạo session lỗi thì vẫn cho login bình thường, chỉ log cảnh báo
-                        logger.warning(
-                            "Tạo session remember-me thất bại cho %s: %s",
-                            email,
-                            s.get("message")
-                        )
+                s = await self.async_db.call("create_session_by_email", email=email, days=30,
+                                             device_info="My app Desktop App (Local)")
+                if s.get("success"):
+                    session_token = s.get("token")  # Raw token trả về
+                else:
+                    # Nếu tạo session lỗi thì vẫn cho login bình thường, chỉ log cảnh báo
+                    logger.warning("Tạo session remember-me thất bại cho %s: %s", email, s.get("message"))
             except Exception as ex:
-                # Bất kỳ lỗi nào khi tạo session cũng không chặn login
                 logger.error("Lỗi khi tạo session remember-me: %s", str(ex))
 
-            # Cập nhật LastLoginAt trong DB (không chặn login nếu lỗi)
-            try:
-                upd = self.database.update_last_login_at(email)
-                if not upd.get("success"):
-                    logger.warning(
-                        "Update LastLoginAt thất bại cho %s: %s",
-                        email,
-                        upd.get("message")
-                    )
-            except Exception as ex:
-                logger.error("Lỗi update LastLoginAt: %s", str(ex))
+        # Cập nhật LastLoginAt trong DB (không chặn login nếu lỗi)
+        try:
+            upd = await self.async_db.call("update_last_login_at", email)
+            if not upd.get("success"):
+                logger.warning("Update LastLoginAt thất bại cho %s: %s", email, upd.get("message"))
+        except Exception as ex:
+            logger.error("Lỗi update LastLoginAt: %s", str(ex))
+        return session_token
 
-            # Hủy cửa sổ loading
-            self.hide_loading_popup()
-            logger.info("Đăng nhập thành công với tài khoản: %s cùng quyền truy cập: %s", self.email_login.get(), data_login[0][3])
+    def on_login_recorded(self, session_token, email, privilege, error=None):
+        """
+        Nhận kết quả record_login (đang ở luồng chính): lưu tài khoản vào config, đóng cửa sổ login và mở app chính
+        """
+        if error is not None:
+            logger.error("Lỗi khi ghi nhận đăng nhập của %s: %s", email, error)
+
+        # Hủy cửa sổ loading
+        self.hide_loading_popup()
+        logger.info("Đăng nhập thành công với tài khoản: %s cùng quyền truy cập: %s", email, privilege)
 
-            # Chuẩn bị dữ liệu lưu vào file config
-            #      - Mã hoá email để tránh lộ plain text (ở mức nhẹ)
-            #      - Không lưu mật khẩu
-            encoded_email = base64.b64encode(email.encode('utf-8')).decode('utf-8')
+        # Chuẩn bị dữ liệu lưu vào file config
+        #      - Mã hoá email để tránh lộ plain text (ở mức nhẹ)
+        #      - Không lưu mật khẩu
+        encoded_email = base64.b64encode(email.encode('utf-8')).decode('utf-8')
 
-            new_account = {
-                "email": encoded_email,
-                "password": None,                   # Không lưu password nữa
-                "provider": "local",                # Đánh dấu provider là local
-                "session_token": session_token,     # Có thể None nếu không tick remember
-                "last_login_ts": datetime.now().isoformat()  # Thời điểm đăng nhập gần nhất
-            }
+        new_account = {
+            "email": encoded_email,
+            "password": None,                   # Không lưu password nữa
+            "provider": "local",                # Đánh dấu provider là local
+            "session_token": session_token,     # Có thể None nếu không tick remember
+            "last_login_ts": datetime.now().isoformat()  # Thời điểm đăng nhập gần nhất
+        }
 
-            # Lưu / cập nhật account trong file config
-            self.save_or_update_account_login(new_account=new_account)
+        # Lưu / cập nhật account trong file config
+        self.save_or_update_account_login(new_account=new_account)
+
+        # Đóng login window và mở app chính với quyền lấy từ DB
+        self.destroy()
+        self.on_success(permission=privilege)
 
-            # Đóng login window và mở app chính với quyền lấy từ DB
-            self.destroy()
-            self.on_success(permission=privilege)
-        else:
-            # Hủy cửa sổ loading
-            self.hide_loading_popup()
-            logger.warning("Đăng nhập không thành công với tài khoản: %s", self.email_login.get())
-            messagebox.showinfo("Thông báo", f"Mật khẩu không chính xác, vui lòng thử lại.", parent= self)
-            return
-   
     def load_account_login(self):
         """
         Tải thông tin CSDL đã đăng nhập trước đây theo thứ tự thời gian đăng nhập gần nhất từ tệp JSON.
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+QueryMetricsWindow — bảng theo dõi hiệu năng truy vấn CSDL
+-----------------------------------------------------------
+- Hiển thị các câu lệnh/stored procedure theo tổng thời gian (chiếm nhiều thời gian nhất ở trên cùng)
+- Thời gian mượn kết nối, thống kê pool và cache
+- Làm mới tự động, đặt lại số liệu, lưu snapshot JSON ra file
+"""
+import json
+import logging
+from tkinter import filedialog, messagebox
+
+import customtkinter as ctk
+
+# Mở comment 3 dòng bên dưới mỗi khi test (Chạy trực tiếp hàm if __main__)
+import os,sys
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+logger = logging.getLogger(__name__)
+
+# Chu kỳ tự làm mới (ms)
+REFRESH_INTERVAL_MS = 2000
+
+
+def _fmt_ms(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+class QueryMetricsWindow(ctk.CTkToplevel):
+    """
+    Cửa sổ nhỏ hiển thị snapshot của My_Database.get_metrics_snapshot().
+    """
+
+    def __init__(self, master, database):
+        super().__init__(master)
+        self.database = database
+        self.title("Thống kê truy vấn CSDL")
+        self.geometry("900x520")
+        self._after_id = None
+
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        toolbar = ctk.CTkFrame(self)
+        toolbar.grid(row=0, column=0, padx=10, pady=(10, 6), sticky="ew")
+        toolbar.grid_columnconfigure(4, weight=1)
+
+        ctk.CTkButton(toolbar, text="Làm mới", width=100, command=self.refresh).grid(row=0, column=0, padx=6, pady=6)
+        ctk.CTkButton(toolbar, text="Đặt lại số liệu", width=120, fg_color="#b9770e",
+                      command=self.reset_metrics).grid(row=0, column=1, padx=6, pady=6)
+        ctk.CTkButton(toolbar, text="Lưu JSON…", width=100, command=self.export_json).grid(row=0, column=2, padx=6, pady=6)
+
+        self.auto_refresh = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(toolbar, text="Tự làm mới", variable=self.auto_refresh,
+                        command=self._schedule_refresh).grid(row=0, column=3, padx=6, pady=6)
+
+        self.summary_label = ctk.CTkLabel(toolbar, text="", anchor="e")
+        self.summary_label.grid(row=0, column=4, padx=6, pady=6, sticky="e")
+
+        self.textbox = ctk.CTkTextbox(self, font=ctk.CTkFont(family="Consolas", size=12), wrap="none")
+        self.textbox.grid(row=1, column=0, padx=10, pady=(0, 10), sticky="nsew")
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.refresh()
+
+    def refresh(self):
+        """Lấy snapshot mới và hiển thị dạng bảng."""
+        try:
+            snapshot = self.database.get_metrics_snapshot()
+        except Exception as e:
+            logger.error(f"Không lấy được số liệu truy vấn: {e}")
+            return
+
+        lines = [f"{'Câu lệnh':<48}{'Lần':>7}{'Lỗi':>6}{'Chậm':>6}{'TB ms':>9}{'p95 ms':>9}{'Max ms':>9}{'Tổng ms':>11}{'Dòng':>8}"]
+        lines.append("-" * len(lines[0]))
+        for name, stats in snapshot["statements"].items():
+            errors = sum(stats["errors"].values())
+            lines.append(
+                f"{name[:47]:<48}{stats['count']:>7}{errors:>6}{stats['slow']:>6}"
+                f"{_fmt_ms(stats['avg_ms']):>9}{_fmt_ms(stats['p95_ms']):>9}{_fmt_ms(stats['max_ms']):>9}"
+                f"{_fmt_ms(stats['total_ms']):>11}{stats['rows_total']:>8}"
+            )
+
+        acquire = snapshot["connection_acquire"]
+        pool = snapshot.get("pool") or {}
+        cache = snapshot.get("cache") or {}
+        circuit = snapshot.get("circuit") or {}
+        prepared = snapshot.get("statements_cache") or {}
+        kdf = snapshot.get("kdf") or {}
+        lines += [
+            "",
+            f"Mượn kết nối: {acquire['count']} lần, TB {_fmt_ms(acquire['avg_ms'])} ms, "
+            f"p95 {_fmt_ms(acquire['p95_ms'])} ms, max {_fmt_ms(acquire['max_ms'])} ms, lỗi {acquire['errors']}",
+            f"Pool: {json.dumps(pool, ensure_ascii=False)}",
+            f"Cache: {json.dumps(cache, ensure_ascii=False)}",
+            f"Mạch kết nối: {circuit.get('state', '-')}, lỗi liên tiếp {circuit.get('consecutive_failures', 0)}, "
+            f"số lần mở mạch {circuit.get('trips', 0)}, bị từ chối {circuit.get('rejected', 0)}",
+            f"Cursor đã prepare: {prepared.get('cursors', 0)} cursor, prepare {prepared.get('prepares', 0)} lần, "
+            f"dùng lại {prepared.get('reuses', 0)} lần (tỉ lệ {prepared.get('reuse_ratio', 0.0):.1%})",
+            f"Băm mật khẩu: {kdf.get('workers', 0)} luồng, đang xử lý {kdf.get('in_flight', 0)} "
+            f"(chờ {kdf.get('queued', 0)}), xong {kdf.get('completed', 0)}, bị từ chối {kdf.get('rejected', 0)}, "
+            f"TB {kdf.get('run_time_avg', 0.0) * 1000:.1f} ms",
+            "",
+            "Lỗi theo câu lệnh:",
+        ]
+        for name, stats in snapshot["statements"].items():
+            if stats["errors"]:
+                lines.append(f"  {name}: {stats['errors']}")
+
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("end", "\n".join(lines))
+        self.textbox.configure(state="disabled")
+
+        self.summary_label.configure(
+            text=f"Từ {snapshot['since']} — ngưỡng chậm {snapshot['slow_threshold_ms']} ms"
+        )
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+        if self.auto_refresh.get():
+            self._after_id = self.after(REFRESH_INTERVAL_MS, self.refresh)
+
+    def reset_metrics(self):
+        if messagebox.askokcancel("Đặt lại", "Xóa toàn bộ số liệu đo đạc hiện tại?", parent=self):
+            self.database.metrics.reset()
+            self.refresh()
+
+    def export_json(self):
+        path = filedialog.asksaveasfilename(
+            parent=self, title="Lưu snapshot", defaultextension=".json",
+            filetypes=[("JSON", "*.json")], initialfile="query_metrics.json"
+        )
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.database.get_metrics_snapshot(), f, ensure_ascii=False, indent=2, default=str)
+        except Exception as e:
+            messagebox.showerror("Lỗi", f"Không thể lưu file: {e}", parent=self)
+
+    def on_close(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self.destroy()
@@ -38,6 +38,7 @@ from utils.constants import *
 from utils.resource import resource_path
 from logger.logger import *
 from utils.check_running import check_if_running
+from services.hash import Hash
 
 
 
@@ -174,6 +175,9 @@ class App(ctk.CTk):
         self.check_log_expire = True
         self.check_new_log()
 
+        # Nạp tham số băm mật khẩu đã hiệu chỉnh cho máy này (lần đầu chạy sẽ tự hiệu chỉnh ở luồng nền)
+        threading.Thread(target=Hash.load_params, daemon=True).start()
+
         # Mở cửa sổ đăng nhập
         self.open_window_login()
 
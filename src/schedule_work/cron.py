@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Bộ phân tích và tính lịch CRON 5 trường (phút giờ ngày-tháng tháng thứ)
+- Mỗi trường được phân tích 1 lần thành bitset (int): bit i bật nghĩa là giá trị i được phép.
+- Hỗ trợ: *, ?, giá trị đơn, dải (1-5), bước (*/15, 0-30/10, 5/20), danh sách (1,15,30),
+  tên tháng/thứ (JAN..DEC, SUN..SAT), thứ 7 = Chủ nhật, dải thứ quấn tuần (FRI-MON),
+  các bí danh @yearly @annually @monthly @weekly @daily @midnight @hourly.
+- Ngày-tháng và thứ theo quy ước cron: nếu cả 2 trường đều bị giới hạn thì chỉ cần khớp 1 trong 2 (OR),
+  nếu 1 trường là * thì chỉ xét trường còn lại.
+- Tính lần chạy kế tiếp bằng phép tìm bit (không duyệt từng phút): mỗi bước nhảy thẳng tới tháng/ngày/giờ/phút
+  hợp lệ kế tiếp của từng trường.
+- Dùng chung cho bộ hẹn giờ trong ứng dụng (Schedule_Auto) và bộ sinh lệnh schtasks (ScheduleFrame).
+- cron_to_schtasks_args: ánh xạ CRON sang tham số schtasks (/SC, /ST, /RI, /DU, /D, /M) cho Task Scheduler của Windows.
+"""
+import calendar
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Tên tháng / thứ viết tắt theo cron
+MONTH_NAMES = {name.upper(): i for i, name in enumerate(calendar.month_abbr) if name}
+DOW_NAMES = {"SUN": 0, "MON": 1, "TUE": 2, "WED": 3, "THU": 4, "FRI": 5, "SAT": 6}
+DOW_ORDER = ("SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT")
+
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+# (tên trường, nhỏ nhất, lớn nhất, bảng tên)
+FIELDS = (
+    ("phút", 0, 59, None),
+    ("giờ", 0, 23, None),
+    ("ngày-tháng", 1, 31, None),
+    ("tháng", 1, 12, MONTH_NAMES),
+    ("thứ", 0, 7, DOW_NAMES),
+)
+
+# Số năm tối đa tìm lần chạy kế tiếp (đủ để gặp ngày 29/02 của năm nhuận)
+MAX_SEARCH_YEARS = 8
+
+
+class CronError(ValueError):
+    """Chuỗi CRON không hợp lệ hoặc không bao giờ tới lượt chạy."""
+
+
+def _full_mask(low: int, high: int) -> int:
+    return ((1 << (high + 1)) - 1) ^ ((1 << low) - 1)
+
+
+def _next_bit(mask: int, start: int) -> Optional[int]:
+    """Giá trị nhỏ nhất >= start có bit bật trong mask, None nếu không có."""
+    rest = mask >> start
+    if not rest:
+        return None
+    return start + (rest & -rest).bit_length() - 1
+
+
+def bits_to_values(mask: int) -> List[int]:
+    values = []
+    while mask:
+        low = mask & -mask
+        values.append(low.bit_length() - 1)
+        mask ^= low
+    return values
+
+
+def _parse_value(text: str, names) -> int:
+    key = text.upper()
+    if names and key[:3] in names and key.isalpha():
+        return names[key[:3]]
+    if not text.isdigit():
+        raise ValueError(text)
+    return int(text)
+
+
+def _parse_field(text: str, index: int) -> Tuple[int, bool]:
+    """Phân tích 1 trường thành (bitset, là_dấu_sao)."""
+    name, low, high, names = FIELDS[index]
+    if text in ("*", "?"):
+        mask = _full_mask(low, high)
+        return (mask & 0x7F if index == 4 else mask), True
+
+    mask = 0
+    for part in text.split(","):
+        if not part:
+            raise CronError(f"Trường {name} có phần tử rỗng: '{text}'")
+        try:
+            base, _, step_text = part.partition("/")
+            step = int(step_text) if step_text else 1
+            if step <= 0:
+                raise ValueError(step_text)
+            if base in ("*", "?"):
+                start, end = low, high
+            elif "-" in base:
+                a, b = base.split("-", 1)
+                start, end = _parse_value(a, names), _parse_value(b, names)
+            else:
+                start = _parse_value(base, names)
+                # "5/20" nghĩa là từ 5 tới hết, bước 20
+                end = high if step_text else start
+        except ValueError:
+            raise CronError(f"Giá trị trường {name} không hợp lệ: '{part}'") from None
+
+        for value in (start, end):
+            if not low <= value <= high:
+                raise CronError(f"Trường {name} phải nằm trong {low}..{high}: '{part}'")
+        if start <= end:
+            values = range(start, end + 1, step)
+        elif index == 4:
+            # Dải thứ quấn tuần, VD: FRI-MON
+            values = [v % 7 for v in range(start, end + 8, step)]
+        else:
+            raise CronError(f"Dải trường {name} không hợp lệ: '{part}'")
+        for value in values:
+            mask |= 1 << value
+
+    if index == 4 and mask & (1 << 7):
+        # 7 cũng là Chủ nhật
+        mask = (mask | 1) & 0x7F
+    return mask, False
+
+
+class CronExpression:
+    """
+    Chuỗi CRON đã phân tích.
+
+    minutes/hours/doms/months/dows là bitset; dom_any/dow_any cho biết trường đó là * (không giới hạn).
+    Thứ theo quy ước cron: 0 = Chủ nhật ... 6 = Thứ bảy.
+    """
+
+    __slots__ = ("expr", "minutes", "hours", "doms", "months", "dows", "dom_any", "dow_any")
+
+    def __init__(self, expr: str):
+        text = (expr or "").strip()
+        text = ALIASES.get(text.lower(), text)
+        parts = text.split()
+        if len(parts) != 5:
+            raise CronError("Chuỗi CRON không hợp lệ (phải có 5 trường: phút giờ ngày-tháng tháng thứ).")
+        self.expr = " ".join(parts)
+        self.minutes, _ = _parse_field(parts[0], 0)
+        self.hours, _ = _parse_field(parts[1], 1)
+        self.doms, self.dom_any = _parse_field(parts[2], 2)
+        self.months, _ = _parse_field(parts[3], 3)
+        self.dows, self.dow_any = _parse_field(parts[4], 4)
+        if not self._has_valid_day():
+            raise CronError(f"CRON '{self.expr}' không bao giờ tới lượt chạy (ngày không tồn tại trong các tháng đã chọn).")
+
+    def _has_valid_day(self) -> bool:
+        if not self.dow_any or self.dom_any:
+            return True
+        # Chỉ giới hạn ngày-tháng: ít nhất 1 ngày phải tồn tại trong 1 tháng đã chọn (tính cả năm nhuận)
+        return any(_next_bit(self.doms, 1) <= calendar.monthrange(2024, month)[1]
+                   for month in bits_to_values(self.months))
+
+    def __repr__(self):
+        return f"CronExpression({self.expr!r})"
+
+    # ----------------------------- So khớp -----------------------------
+    @staticmethod
+    def cron_weekday(dt: datetime) -> int:
+        """datetime.weekday() (0 = Thứ hai) -> thứ theo cron (0 = Chủ nhật)."""
+        return (dt.weekday() + 1) % 7
+
+    def day_matches(self, dt: datetime) -> bool:
+        dom_ok = bool(self.doms >> dt.day & 1)
+        dow_ok = bool(self.dows >> self.cron_weekday(dt) & 1)
+        if self.dom_any:
+            return dow_ok
+        if self.dow_any:
+            return dom_ok
+        return dom_ok or dow_ok
+
+    def matches(self, dt: datetime) -> bool:
+        return (bool(self.minutes >> dt.minute & 1) and bool(self.hours >> dt.hour & 1)
+                and bool(self.months >> dt.month & 1) and self.day_matches(dt))
+
+    # ----------------------------- Lần chạy kế tiếp -----------------------------
+    def _next_day(self, dt: datetime) -> Optional[int]:
+        """Ngày hợp lệ nhỏ nhất >= dt.day trong tháng của dt (theo quy ước DOM/DOW), None nếu hết tháng."""
+        days_in_month = calendar.monthrange(dt.year, dt.month)[1]
+        candidates = []
+        if not self.dom_any or self.dow_any:
+            day = _next_bit(self.doms, dt.day)
+            if day is not None:
+                candidates.append(day)
+        if not self.dow_any:
+            weekday = self.cron_weekday(dt)
+            # Xoay bitset thứ để tìm số ngày tới thứ hợp lệ kế tiếp
+            rotated = (self.dows >> weekday) | (self.dows << (7 - weekday))
+            candidates.append(dt.day + _next_bit(rotated & 0x7F, 0))
+        day = min(candidates) if candidates else None
+        return day if day is not None and day <= days_in_month else None
+
+    def next_fire(self, after: Optional[datetime] = None) -> datetime:
+        """Lần chạy kế tiếp (giờ địa phương, không có tzinfo) sau thời điểm after (mặc định: bây giờ)."""
+        after = after or datetime.now()
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit_year = t.year + MAX_SEARCH_YEARS
+        while t.year <= limit_year:
+            month = _next_bit(self.months, t.month)
+            if month is None:
+                t = datetime(t.year + 1, 1, 1)
+                continue
+            if month != t.month:
+                t = datetime(t.year, month, 1)
+
+            day = self._next_day(t)
+            if day is None:
+                t = datetime(t.year + 1, 1, 1) if t.month == 12 else datetime(t.year, t.month + 1, 1)
+                continue
+            if day != t.day:
+                t = t.replace(day=day, hour=0, minute=0)
+
+            hour = _next_bit(self.hours, t.hour)
+            if hour is None:
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if hour != t.hour:
+                t = t.replace(hour=hour, minute=0)
+
+            minute = _next_bit(self.minutes, t.minute)
+            if minute is None:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            return t.replace(minute=minute)
+        raise CronError(f"CRON '{self.expr}' không có lần chạy nào trong {MAX_SEARCH_YEARS} năm tới.")
+
+    def next_fires(self, count: int, after: Optional[datetime] = None) -> List[datetime]:
+        """count lần chạy kế tiếp sau thời điểm after."""
+        fires = []
+        current = after or datetime.now()
+        for _ in range(count):
+            current = self.next_fire(current)
+            fires.append(current)
+        return fires
+
+    def next_timestamp(self, after: Optional[float] = None) -> float:
+        """Như next_fire nhưng dùng epoch (dùng làm next_fire của TimerScheduler)."""
+        return self.next_fire(None if after is None else datetime.fromtimestamp(after)).timestamp()
+
+    # ----------------------------- Thông tin các trường -----------------------------
+    def values(self) -> dict:
+        """Danh sách giá trị của từng trường (dùng để ánh xạ sang định dạng lịch khác, VD schtasks)."""
+        return {
+            "minutes": bits_to_values(self.minutes),
+            "hours": bits_to_values(self.hours),
+            "doms": bits_to_values(self.doms),
+            "months": bits_to_values(self.months),
+            "dows": bits_to_values(self.dows),
+            "dom_any": self.dom_any,
+            "dow_any": self.dow_any,
+        }
+
+    @property
+    def every_month(self) -> bool:
+        return self.months == _full_mask(1, 12)
+
+
+def parse_cron(expr: str) -> CronExpression:
+    return CronExpression(expr)
+
+
+# ----------------------------- CRON -> schtasks -----------------------------
+def _fmt_minutes(total: int) -> str:
+    """Số phút -> 'HH:MM' cho schtasks /ST, /DU."""
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+
+def cron_to_schtasks_args(expr: str) -> Dict[str, str]:
+    """
+    Ánh xạ CRON (5 trường) sang tham số schtasks:
+      - Các lần chạy trong ngày: 1 mốc → /ST H:M; nhiều mốc cách đều N phút → /ST mốc đầu /RI N /DU thời lượng
+        (VD: */15 * * * *, 0 8-17 * * *, 0 */2 * * 1-5)
+      - Mọi ngày                  : * * *      → /SC DAILY
+      - Theo thứ                  : * * D      → /SC WEEKLY /D Dlist
+      - 1 ngày trong tháng (+tháng): DOM M *    → /SC MONTHLY /D DOM [/M Mlist]
+    Các mẫu không biểu diễn được bằng 1 trigger schtasks (mốc giờ không cách đều, ràng buộc đồng thời ngày-tháng và thứ,
+    nhiều ngày trong tháng...) sẽ báo lỗi; lịch chạy trong ứng dụng (Schedule_Auto) vẫn hỗ trợ đầy đủ các mẫu này.
+    """
+    cron = CronExpression(expr)
+    values = cron.values()
+
+    # Các mốc chạy trong ngày (phút kể từ 00:00)
+    times = sorted(h * 60 + m for h in values["hours"] for m in values["minutes"])
+    args = {"st": _fmt_minutes(times[0])}
+    if len(times) > 1:
+        step = times[1] - times[0]
+        if any(b - a != step for a, b in zip(times, times[1:])):
+            raise ValueError("CRON chưa hỗ trợ ánh xạ sang schtasks: các mốc chạy trong ngày không cách đều nhau.")
+        args["ri"] = str(step)
+        # Lặp kín cả ngày thì dùng 24:00 như trước, còn lại chỉ lặp tới mốc cuối
+        args["du"] = "24:00" if times[-1] + step >= 24 * 60 + times[0] else _fmt_minutes(times[-1] - times[0] + 1)
+
+    if not values["dom_any"] and not values["dow_any"]:
+        raise ValueError("CRON chưa hỗ trợ ánh xạ sang schtasks: ràng buộc đồng thời ngày-tháng và thứ.")
+
+    if not values["dow_any"]:
+        if not cron.every_month:
+            raise ValueError("CRON chưa hỗ trợ ánh xạ sang schtasks: lịch theo thứ chỉ áp dụng cho mọi tháng.")
+        # schtasks: /SC WEEKLY /D MON,WED,FRI
+        args.update({"type": "WEEKLY", "dlist": ",".join(DOW_ORDER[d] for d in values["dows"])})
+        return args
+
+    if not values["dom_any"]:
+        if len(values["doms"]) != 1:
+            # schtasks MONTHLY chỉ nhận 1 ngày cố định trong tháng.
+            raise ValueError("CRON hàng tháng chỉ hỗ trợ 1 ngày cố định (vd: '0 2 1 * *').")
+        # schtasks: /SC MONTHLY /D <DOM> [/M JAN,JUL]
+        args.update({"type": "MONTHLY", "dom": str(values["doms"][0])})
+        if not cron.every_month:
+            args["months"] = ",".join(calendar.month_abbr[m].upper() for m in values["months"])
+        return args
+
+    if not cron.every_month:
+        raise ValueError("CRON chưa hỗ trợ ánh xạ sang schtasks: chạy mọi ngày nhưng chỉ trong 1 số tháng.")
+    # schtasks: /SC DAILY
+    args["type"] = "DAILY"
+    return args
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Lưu trạng thái các lịch chạy (job store) ra đĩa, cạnh data/backup/scheduler.json
+- Mỗi công việc (theo job_id) lưu: chuỗi CRON, lần chạy gần nhất, lần chạy kế tiếp, số lần chạy, kết quả lần cuối,
+  chính sách chạy bù (misfire) và cửa sổ chạy bù (grace).
+- Ứng dụng khởi động lại hoặc máy ngủ qua giờ hẹn: các lần đã lỡ được xử lý theo chính sách
+    + run_once: chạy bù 1 lần (gộp các lần đã lỡ)
+    + run_all : chạy bù từng lần đã lỡ (tối đa MAX_CATCHUP_RUNS)
+    + skip    : không chạy bù, chỉ chạy lần đúng giờ
+  Lần lỡ cũ hơn grace_seconds thì bỏ qua hẳn (grace_seconds = None: không giới hạn).
+- Ghi tệp nguyên tử (ghi tệp tạm rồi os.replace) để mất điện giữa chừng không làm hỏng tệp.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Mở comment 3 dòng bên dưới mỗi khi test (Chạy trực tiếp hàm if __main__)
+import sys
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+logger = logging.getLogger(__name__)
+
+# Tệp lưu trạng thái lịch
+JOB_STORE_PATH = os.getenv("SCHEDULER_JOB_STORE", os.path.join(os.path.dirname(PROJECT_DIR), "data", "backup", "scheduler_jobs.json"))
+
+MISFIRE_RUN_ONCE = "run_once"
+MISFIRE_RUN_ALL = "run_all"
+MISFIRE_SKIP = "skip"
+MISFIRE_POLICIES = (MISFIRE_RUN_ONCE, MISFIRE_RUN_ALL, MISFIRE_SKIP)
+
+# Chính sách và cửa sổ chạy bù mặc định (giây)
+SCHEDULE_MISFIRE_POLICY = os.getenv("SCHEDULE_MISFIRE_POLICY", MISFIRE_RUN_ONCE)
+SCHEDULE_MISFIRE_GRACE = float(os.getenv("SCHEDULE_MISFIRE_GRACE", str(24 * 3600)))
+# Trễ không quá số giây này vẫn được coi là chạy đúng giờ
+ON_TIME_SECONDS = 60.0
+# Số lần chạy bù tối đa với run_all
+MAX_CATCHUP_RUNS = 100
+
+
+def due_runs(cron, scheduled: Optional[float], now: float, policy: str = SCHEDULE_MISFIRE_POLICY,
+             grace_seconds: Optional[float] = SCHEDULE_MISFIRE_GRACE) -> List[float]:
+    """
+    Các thời điểm cần chạy (epoch) khi công việc lẽ ra chạy lúc scheduled mà bây giờ mới tới lượt.
+
+    :param cron: CronExpression của công việc.
+    :param scheduled: lần chạy kế tiếp đã lưu (None: chưa từng lên lịch -> không có gì để chạy bù).
+    """
+    if scheduled is None or scheduled > now:
+        return []
+    if policy not in MISFIRE_POLICIES:
+        raise ValueError(f"Chính sách chạy bù không hợp lệ: {policy}")
+
+    start = scheduled
+    if grace_seconds is not None and now - start > grace_seconds:
+        # Bỏ các lần quá cửa sổ chạy bù, tìm lần đầu tiên còn trong cửa sổ
+        start = cron.next_timestamp(now - grace_seconds - 1e-6)
+    fires: List[float] = []
+    t = start
+    while t <= now:
+        fires.append(t)
+        if len(fires) > MAX_CATCHUP_RUNS:
+            fires.pop(0)
+        t = cron.next_timestamp(t)
+    if not fires:
+        return []
+
+    if policy == MISFIRE_RUN_ALL:
+        return fires
+    if policy == MISFIRE_RUN_ONCE:
+        return fires[-1:]
+    # skip: chỉ chạy nếu lần gần nhất vẫn đúng giờ
+    return fires[-1:] if now - fires[-1] <= ON_TIME_SECONDS else []
+
+
+class JobStore:
+    """
+    Kho trạng thái lịch dạng JSON: {"version": 1, "jobs": {job_id: {...}}}.
+    Đọc tệp 1 lần khi khởi tạo; mọi thay đổi được ghi lại ngay (nguyên tử).
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = self._load()
+
+    # ----------------------------- Đọc / ghi tệp -----------------------------
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            jobs = data.get("jobs", {})
+            if not isinstance(jobs, dict):
+                raise ValueError("'jobs' phải là object")
+            return jobs
+        except Exception as e:
+            logger.error("Không đọc được tệp trạng thái lịch %s (%s), bắt đầu lại từ đầu", self.path, e)
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "jobs": self._jobs}, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    # ----------------------------- API -----------------------------
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record is not None else None
+
+    def records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(record, id=job_id) for job_id, record in self._jobs.items()]
+
+    def upsert(self, job_id: str, **fields) -> Dict[str, Any]:
+        with self._lock:
+            record = self._jobs.setdefault(job_id, {"runs": 0, "last_run": None, "last_status": None, "last_error": None})
+            record.update(fields)
+            record["updated_at"] = time.time()
+            self._save()
+            return dict(record)
+
+    def remove(self, job_id: str) -> bool:
+        with self._lock:
+            if self._jobs.pop(job_id, None) is None:
+                return False
+            self._save()
+            return True
+
+    def record_run(self, job_id: str, last_run: float, next_run: Optional[float], status: str,
+                   error: Optional[str] = None, runs: int = 1, skipped: int = 0):
+        """Ghi kết quả 1 lượt chạy (runs lần chạy thực tế, skipped lần lỡ bị bỏ qua)."""
+        with self._lock:
+            record = self._jobs.setdefault(job_id, {"runs": 0})
+            record["last_run"] = last_run
+            record["next_run"] = next_run
+            record["last_status"] = status
+            record["last_error"] = error
+            record["runs"] = record.get("runs", 0) + runs
+            record["skipped"] = record.get("skipped", 0) + skipped
+            record["updated_at"] = time.time()
+            self._save()
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Bộ thực thi công việc theo tài nguyên và độ ưu tiên
+- Mỗi công việc khai báo các tài nguyên cần dùng (chuỗi tên, VD: "instance:SRV\\SQLEXPRESS", "disk:D:",
+  "full@instance:SRV\\SQLEXPRESS"); mỗi tài nguyên có giới hạn số công việc chạy đồng thời (semaphore theo tên).
+  Giới hạn được khai báo theo tên chính xác hoặc mẫu (fnmatch), VD: {"full@instance:*": 2, "disk:*": 1}.
+- Công việc chỉ bắt đầu khi giữ được TẤT CẢ tài nguyên cùng lúc (lấy trọn gói dưới 1 khóa -> không deadlock).
+- Hàng đợi theo lớp ưu tiên (số nhỏ chạy trước): LOG trước DIFF trước FULL đang chờ.
+- Chống đói: ưu tiên hiệu dụng tăng 1 bậc sau mỗi aging_seconds chờ; công việc chờ quá starvation_seconds
+  được giữ chỗ các tài nguyên nó cần (công việc xếp sau không được lấy các tài nguyên đó).
+- Là 1 concurrent.futures.Executor: submit() thông thường = ưu tiên NORMAL, không tài nguyên.
+"""
+import fnmatch
+import itertools
+import logging
+import ntpath
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Các lớp ưu tiên (số nhỏ = ưu tiên cao)
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+# Ưu tiên theo loại backup: LOG giữ RPO ngắn nên luôn được chạy trước FULL/DIFF đang chờ
+BACKUP_PRIORITIES = {"LOG": PRIORITY_HIGH, "DIFF": PRIORITY_NORMAL, "FULL": PRIORITY_LOW}
+
+# Sau mỗi khoảng thời gian chờ này (giây), ưu tiên hiệu dụng tăng 1 bậc
+RESOURCE_AGING_SECONDS = float(os.getenv("RESOURCE_AGING_SECONDS", "120"))
+# Chờ quá số giây này thì công việc được giữ chỗ tài nguyên
+RESOURCE_STARVATION_SECONDS = float(os.getenv("RESOURCE_STARVATION_SECONDS", "600"))
+
+# Giới hạn mặc định cho backup: tối đa N bản FULL đồng thời trên 1 instance, tối đa M công việc trên 1 ổ đích
+BACKUP_FULL_PER_INSTANCE = int(os.getenv("BACKUP_FULL_PER_INSTANCE", "2"))
+BACKUP_JOBS_PER_DISK = int(os.getenv("BACKUP_JOBS_PER_DISK", "1"))
+DEFAULT_RESOURCE_LIMITS = {
+    "full@instance:*": BACKUP_FULL_PER_INSTANCE,
+    "disk:*": BACKUP_JOBS_PER_DISK,
+}
+
+
+def backup_job_resources(instance: str, backup_dir: Optional[str], backup_type: str) -> Tuple[str, ...]:
+    """
+    Tài nguyên của 1 công việc backup: instance SQL, loại backup trên instance đó và ổ/thư mục chia sẻ đích.
+    backup_dir là đường dẫn trên máy SQL Server (Windows: D:\\Backup hoặc \\\\server\\share\\...).
+    """
+    instance = (instance or "").strip().upper()
+    resources = [f"instance:{instance}", f"{backup_type.lower()}@instance:{instance}"]
+    if backup_dir:
+        drive = ntpath.splitdrive(backup_dir)[0] or ntpath.normpath(backup_dir).split("\\")[0] or backup_dir
+        resources.append(f"disk:{drive.upper()}")
+    return tuple(resources)
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future", "resources", "priority", "name", "seq", "enqueued_at")
+
+    def __init__(self, fn, args, kwargs, resources, priority, name, seq):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.resources = resources
+        self.priority = priority
+        self.name = name
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+
+
+class ResourceExecutor(Executor):
+    """
+    Nhóm luồng chạy công việc có giới hạn tài nguyên theo tên và lớp ưu tiên.
+
+    :param max_workers: số luồng chạy công việc.
+    :param limits: {tên hoặc mẫu tài nguyên: số công việc đồng thời tối đa}.
+    :param default_limit: giới hạn cho tài nguyên không khớp mẫu nào (None = không giới hạn).
+    :param aging_seconds: thời gian chờ để tăng 1 bậc ưu tiên.
+    :param starvation_seconds: thời gian chờ để được giữ chỗ tài nguyên.
+    """
+
+    def __init__(self, max_workers: int = 4, limits: Optional[Dict[str, int]] = None, default_limit: Optional[int] = None,
+                 aging_seconds: float = RESOURCE_AGING_SECONDS, starvation_seconds: float = RESOURCE_STARVATION_SECONDS,
+                 name: str = "resource-executor"):
+        self.max_workers = max(1, max_workers)
+        self.limits = dict(DEFAULT_RESOURCE_LIMITS if limits is None else limits)
+        self.default_limit = default_limit
+        self.aging_seconds = aging_seconds
+        self.starvation_seconds = starvation_seconds
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._queue: List[_Job] = []
+        self._in_use: Dict[str, int] = {}
+        self._running: Dict[int, _Job] = {}
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._shutdown = False
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "aged_dispatches": 0,
+                       "max_wait_s": 0.0}
+
+    # ----------------------------- Giới hạn tài nguyên -----------------------------
+    def set_limit(self, resource: str, limit: Optional[int]):
+        """Đổi giới hạn của 1 tài nguyên/mẫu (None = bỏ giới hạn riêng)."""
+        with self._cond:
+            if limit is None:
+                self.limits.pop(resource, None)
+            else:
+                self.limits[resource] = max(1, int(limit))
+            self._cond.notify_all()
+
+    def limit_of(self, resource: str) -> Optional[int]:
+        if resource in self.limits:
+            return self.limits[resource]
+        for pattern, limit in self.limits.items():
+            if fnmatch.fnmatchcase(resource, pattern):
+                return limit
+        return self.default_limit
+
+    def _fits(self, job: _Job) -> bool:
+        for resource in job.resources:
+            limit = self.limit_of(resource)
+            if limit is not None and self._in_use.get(resource, 0) >= limit:
+                return False
+        return True
+
+    # ----------------------------- Gửi công việc -----------------------------
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        return self.submit_job(fn, *args, **kwargs)
+
+    def submit_job(self, fn: Callable, *args, resources: Iterable[str] = (), priority: int = PRIORITY_NORMAL,
+                   name: Optional[str] = None, **kwargs) -> Future:
+        """Xếp công việc vào hàng đợi; chạy khi tới lượt ưu tiên và giữ được mọi tài nguyên trong resources."""
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("ResourceExecutor đã dừng")
+            job = _Job(fn, args, kwargs, tuple(sorted(set(resources))), priority,
+                       name or getattr(fn, "__name__", "job"), next(self._seq))
+            self._queue.append(job)
+            self._stats["submitted"] += 1
+            self._start_workers()
+            self._cond.notify_all()
+        return job.future
+
+    def _start_workers(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(target=self._worker, name=f"{self.name}-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # ----------------------------- Điều phối -----------------------------
+    def _effective_priority(self, job: _Job, now: float) -> float:
+        if self.aging_seconds <= 0:
+            return job.priority
+        return job.priority - int((now - job.enqueued_at) / self.aging_seconds)
+
+    def _pick(self) -> Optional[_Job]:
+        """Chọn công việc ưu tiên nhất chạy được ngay (O(n) theo số công việc đang chờ)."""
+        now = time.monotonic()
+        # Bỏ các công việc đã bị hủy khi còn chờ
+        alive = []
+        for job in self._queue:
+            if job.future.cancelled():
+                self._stats["cancelled"] += 1
+            else:
+                alive.append(job)
+        self._queue = alive
+
+        reserved = set()
+        for job in sorted(self._queue, key=lambda j: (self._effective_priority(j, now), j.seq)):
+            if self._fits(job) and not reserved.intersection(job.resources):
+                if self._effective_priority(job, now) < job.priority:
+                    self._stats["aged_dispatches"] += 1
+                return job
+            if now - job.enqueued_at >= self.starvation_seconds:
+                # Công việc chờ quá lâu: giữ chỗ tài nguyên của nó, không cho công việc xếp sau lấy
+                reserved.update(job.resources)
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._shutdown and not self._queue:
+                        return
+                    job = self._pick()
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                self._queue.remove(job)
+                for resource in job.resources:
+                    self._in_use[resource] = self._in_use.get(resource, 0) + 1
+                self._running[job.seq] = job
+                waited = time.monotonic() - job.enqueued_at
+                self._stats["max_wait_s"] = max(self._stats["max_wait_s"], round(waited, 3))
+
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        result = job.fn(*job.args, **job.kwargs)
+                    except BaseException as e:
+                        job.future.set_exception(e)
+                        with self._cond:
+                            self._stats["failed"] += 1
+                        logger.error("Công việc %s lỗi: %s", job.name, e)
+                    else:
+                        job.future.set_result(result)
+                        with self._cond:
+                            self._stats["completed"] += 1
+            finally:
+                with self._cond:
+                    self._running.pop(job.seq, None)
+                    for resource in job.resources:
+                        remaining = self._in_use.get(resource, 0) - 1
+                        if remaining > 0:
+                            self._in_use[resource] = remaining
+                        else:
+                            self._in_use.pop(resource, None)
+                    self._cond.notify_all()
+
+    # ----------------------------- Trạng thái / dừng -----------------------------
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._cond:
+            data = dict(self._stats)
+            data["queued"] = [{"name": j.name, "priority": j.priority, "resources": list(j.resources),
+                               "waiting_s": round(now - j.enqueued_at, 3)} for j in self._queue]
+            data["running"] = [{"name": j.name, "priority": j.priority, "resources": list(j.resources)}
+                               for j in self._running.values()]
+            data["in_use"] = dict(self._in_use)
+        return data
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._cond:
+            self._shutdown = True
+            if cancel_futures:
+                for job in self._queue:
+                    job.future.cancel()
+                    self._stats["cancelled"] += 1
+                self._queue = []
+            self._cond.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
@@ -1,105 +1,248 @@
-import schedule  #pip install schedule
 import time
 import logging
 import threading
 
+# Mở comment 3 dòng bên dưới mỗi khi test (Chạy trực tiếp hàm if __main__)
+import os, sys
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+from schedule_work.cron import CronExpression
+from schedule_work.job_store import (MISFIRE_POLICIES, MISFIRE_RUN_ALL, ON_TIME_SECONDS, SCHEDULE_MISFIRE_GRACE,
+                                     SCHEDULE_MISFIRE_POLICY, JobStore, due_runs)
+from schedule_work.resource_executor import PRIORITY_NORMAL
+from schedule_work.timer_scheduler import TimerHandle, get_timer_scheduler
 
 
 logger = logging.getLogger(__name__)
 
+
+def daily_cron(hour, minute, day=None):
+    """Chuỗi CRON tương ứng lịch hằng ngày hh:mm, hoặc hằng tháng vào ngày day."""
+    return f"{int(minute)} {int(hour)} {int(day) if day is not None else '*'} * *"
+
+
+def next_run_time(hour, minute, day=None, after=None):
+    """
+    Thời điểm chạy kế tiếp (epoch) sau thời điểm after (mặc định: bây giờ) của lịch hằng ngày hh:mm,
+    hoặc hằng tháng vào ngày day (tháng không có ngày đó thì bỏ qua, VD: ngày 31).
+    """
+    return CronExpression(daily_cron(hour, minute, day)).next_timestamp(after)
+
+
+class ScheduleJob:
+    """
+    Lịch của 1 nhiệm vụ (hằng ngày, hằng tháng hoặc theo chuỗi CRON),
+    handle là công việc trong bộ hẹn giờ chung khi đang chạy.
+    job_id khác None: trạng thái lịch được lưu trong JobStore và các lần lỡ được chạy bù theo misfire_policy/grace_seconds.
+    resources/priority: tài nguyên và lớp ưu tiên khi chạy trên ResourceExecutor (VD: backup_job_resources, BACKUP_PRIORITIES).
+    """
+    def __init__(self, task, day=None, hour=None, minute=None, cron=None, job_id=None,
+                 misfire_policy=SCHEDULE_MISFIRE_POLICY, grace_seconds=SCHEDULE_MISFIRE_GRACE,
+                 resources=(), priority=PRIORITY_NORMAL):
+        if misfire_policy not in MISFIRE_POLICIES:
+            raise ValueError(f"Chính sách chạy bù không hợp lệ: {misfire_policy}")
+        self.task = task
+        self.day = day
+        self.hour = hour
+        self.minute = minute
+        self.cron = CronExpression(cron or daily_cron(hour, minute, day))
+        self.job_id = job_id
+        self.misfire_policy = misfire_policy
+        self.grace_seconds = grace_seconds
+        self.resources = tuple(resources)
+        self.priority = priority
+        self.handle: TimerHandle = None
+
+    @property
+    def executor_options(self):
+        return {"resources": self.resources, "priority": self.priority}
+
+    def next_run(self, after=None):
+        return self.cron.next_timestamp(after)
+
+    def __repr__(self):
+        name = self.job_id or getattr(self.task, '__name__', 'task')
+        return f"<ScheduleJob {name} '{self.cron.expr}'>"
+
+
 class Schedule_Auto:
     """
     Tự động thực hiện một công việc được lập lịch theo thời gian cho trước
+    Tất cả lịch dùng chung 1 luồng hẹn giờ (schedule_work.timer_scheduler), không còn 1 luồng kiểm tra mỗi giây cho mỗi lịch.
+    Lịch có job_id (schedule_persistent / rehydrate) được lưu trong JobStore để chạy bù khi ứng dụng tắt hoặc máy ngủ qua giờ hẹn.
     """
-    def __init__(self):
-        pass
+    def __init__(self, scheduler=None, store=None):
+        self.scheduler = scheduler or get_timer_scheduler()
+        self._store = store
+
+    @property
+    def store(self) -> JobStore:
+        """Kho trạng thái lịch (chỉ đọc tệp khi lần đầu cần tới)."""
+        if self._store is None:
+            self._store = JobStore()
+        return self._store
     
     def schedule_daily(self, task, day = None, hour = None, minute = None):
         """
         Lên lịch làm 1 nhiệm vụ vào 1 thời điểm trong ngày, hoặc 1 thời điểm trong tháng
+        Lịch chỉ bắt đầu chạy khi gọi start_schedule.
         """
         # Kiểm tra nếu có tham số ngày thì sẽ lập lịch nó theo 1 thời gian hằng tháng
         if day is not None:
             logger.info("Đã lên lịch 1 nhiệm vụ hằng tháng vào %s:%s ngày %s mỗi tháng", hour, minute, day)
-            schedule_job = schedule.Scheduler()
-            # schedule_job.every(3).seconds.do(task)   # Hàm test theo từng giây
-            schedule_job.every().day.at(f"{hour}:{minute}").do(self.check_monthly_task, day=day, task=task)
-
-            # Tạo biến để lưu giá trị dừng lịch trình
-            stop_event = threading.Event()
 
         # Nếu không truyền tham số ngày vào thì thực hiện lập lịch hằng ngày
         else:
             logger.info("Đã lên lịch 1 nhiệm vụ hằng ngày vào thời gian: %s:%s", hour, minute)
-            schedule_job = schedule.Scheduler()
-            # schedule_job.every(3).seconds.do(task)   # Hàm test theo từng giây
-            schedule_job.every().day.at(f"{hour}:{minute}").do(task)  # Hằng ngày tại giờ phút chỉ định
 
-            # Tạo biến để lưu giá trị dừng lịch trình
-            stop_event = threading.Event()
+        # Giờ phút không hợp lệ sẽ báo lỗi ngay khi lên lịch
+        schedule_job = ScheduleJob(task, day, hour, minute)
+
+        # Tạo biến để lưu giá trị dừng lịch trình
+        stop_event = threading.Event()
 
         return schedule_job, stop_event
-        
 
-    def check_monthly_task(self, day, task):
+    def schedule_cron(self, task, cron):
         """
-        Kiểm tra xem hôm nay có phải là ngày đã lên lịch không, nếu có thì thực thi tác vụ
+        Lên lịch 1 nhiệm vụ theo chuỗi CRON 5 trường (VD: "*/15 8-17 * * MON-FRI").
+        Báo lỗi CronError (ValueError) nếu chuỗi không hợp lệ. Lịch chỉ bắt đầu chạy khi gọi start_schedule.
         """
-        today = time.localtime()
-        logger.debug("Kiểm tra thời gian, local time: %s - time schedule: %s", today, day)
-        if today.tm_mday == int(day):
-            logger.info(f"Đã đến thời gian được lập lịch ngày {day} hàng tháng.")
-            task()  # Thực thi tác vụ
+        schedule_job = ScheduleJob(task, cron=cron)
+        logger.info("Đã lên lịch 1 nhiệm vụ theo CRON: %s", schedule_job.cron.expr)
+        return schedule_job, threading.Event()
 
-    def check_schedule(self, stop_event: threading.Event, schedule_job: schedule):
+    def schedule_persistent(self, job_id, task, cron, misfire_policy=SCHEDULE_MISFIRE_POLICY, grace_seconds=SCHEDULE_MISFIRE_GRACE,
+                            resources=(), priority=PRIORITY_NORMAL):
         """
-        Kiểm tra công việc đã lên lịch mỗi giây để không bỏ qua công việc đã lên lịch
+        Lên lịch 1 nhiệm vụ theo CRON và lưu trạng thái (lần chạy gần nhất / kế tiếp) vào JobStore theo job_id.
+        misfire_policy: run_once | run_all | skip; grace_seconds: lần lỡ cũ hơn số giây này thì bỏ qua (None: không giới hạn).
+        resources/priority: khi nhiều lịch tới giờ cùng lúc, lịch chỉ chạy khi giữ được các tài nguyên và theo thứ tự ưu tiên.
+        Lịch chỉ bắt đầu chạy khi gọi start_schedule.
         """
-        while not stop_event.is_set():  # Kiểm tra sự kiện dừng
-            schedule_job.run_pending()  # Kiểm tra và thực thi công việc
-            time.sleep(1)  # Đợi 1 giây trước khi kiểm tra lại
+        schedule_job = ScheduleJob(task, cron=cron, job_id=job_id, misfire_policy=misfire_policy, grace_seconds=grace_seconds,
+                                   resources=resources, priority=priority)
+        logger.info("Đã lên lịch nhiệm vụ %s theo CRON: %s (chạy bù: %s)", job_id, schedule_job.cron.expr, misfire_policy)
+        return schedule_job, threading.Event()
 
-    def start_schedule(self, stop_event: threading.Event, schedule_job: schedule):
+    def rehydrate(self, tasks, options=None):
+        """
+        Khôi phục các lịch đã lưu khi khởi động (đọc JobStore 1 lần): tasks = {job_id: hàm thực thi},
+        options = {job_id: {"resources": ..., "priority": ...}} (không lưu trong JobStore).
+        Các lần đã lỡ trong lúc ứng dụng tắt được chạy bù ngay theo chính sách của từng lịch.
+        Trả về {job_id: (schedule_job, stop_event)}; lịch đã lưu nhưng không có trong tasks được giữ nguyên.
         """
-        Tạo 1 luồng kiểm tra lịch trình để không gây ảnh hưởng đến giao diện chính
+        restored = {}
+        for record in self.store.records():
+            task = tasks.get(record["id"])
+            if task is None or not record.get("cron"):
+                continue
+            try:
+                schedule_job, stop_event = self.schedule_persistent(
+                    record["id"], task, record["cron"],
+                    misfire_policy=record.get("misfire_policy", SCHEDULE_MISFIRE_POLICY),
+                    grace_seconds=record.get("grace_seconds", SCHEDULE_MISFIRE_GRACE),
+                    **(options or {}).get(record["id"], {}))
+            except ValueError as e:
+                logger.error("Không khôi phục được lịch %s: %s", record["id"], e)
+                continue
+            self.start_schedule(stop_event, schedule_job)
+            restored[record["id"]] = (schedule_job, stop_event)
+        logger.info("Đã khôi phục %s/%s lịch đã lưu", len(restored), len(tasks))
+        return restored
+
+    def _prepare_persistent(self, schedule_job: ScheduleJob) -> float:
+        """Ghi lịch vào JobStore và trả về thời điểm chạy đầu tiên (có thể đã qua -> chạy bù ngay)."""
+        now = time.time()
+        record = self.store.get(schedule_job.job_id)
+        if record and record.get("cron") == schedule_job.cron.expr and record.get("next_run"):
+            first_run = record["next_run"]
+        else:
+            # Lịch mới hoặc đã đổi CRON: không chạy bù theo lịch cũ
+            first_run = schedule_job.next_run(now)
+        self.store.upsert(schedule_job.job_id, cron=schedule_job.cron.expr, next_run=first_run,
+                          misfire_policy=schedule_job.misfire_policy, grace_seconds=schedule_job.grace_seconds)
+        if first_run <= now:
+            logger.info("Lịch %s đã lỡ lần chạy lúc %s", schedule_job.job_id, time.strftime("%Y-%m-%d %H:%M", time.localtime(first_run)))
+        return first_run
+
+    def _run_persistent(self, schedule_job: ScheduleJob):
+        """Chạy nhiệm vụ của lịch có lưu trạng thái: áp dụng chính sách chạy bù rồi ghi kết quả vào JobStore."""
+        now = time.time()
+        record = self.store.get(schedule_job.job_id) or {}
+        scheduled = record.get("next_run") or now
+        runs = due_runs(schedule_job.cron, scheduled, now, schedule_job.misfire_policy, schedule_job.grace_seconds)
+        missed = len(due_runs(schedule_job.cron, scheduled, now, MISFIRE_RUN_ALL, schedule_job.grace_seconds))
+        if len(runs) > 1 or (runs and now - runs[-1] > ON_TIME_SECONDS):
+            logger.info("Lịch %s chạy bù %s lần", schedule_job.job_id, len(runs))
+        elif not runs:
+            logger.info("Lịch %s bỏ qua các lần đã lỡ (chính sách %s)", schedule_job.job_id, schedule_job.misfire_policy)
+
+        status, error = "skipped" if not runs else "success", None
+        for _ in runs:
+            try:
+                schedule_job.task()
+            except Exception as e:
+                status, error = "error", f"{type(e).__name__}: {e}"
+                logger.exception("Lỗi khi chạy lịch %s: %s", schedule_job.job_id, e)
+        self.store.record_run(schedule_job.job_id, last_run=now, next_run=schedule_job.next_run(now),
+                              status=status, error=error, runs=len(runs), skipped=max(0, missed - len(runs)))
+
+    def start_schedule(self, stop_event: threading.Event, schedule_job: ScheduleJob):
+        """
+        Đưa lịch vào bộ hẹn giờ chung (chạy trên luồng riêng nên không ảnh hưởng đến giao diện chính)
+        Trả về luồng hẹn giờ chung.
         """
         stop_event.clear()  # Đảm bảo sự kiện dừng không được set
-        # Tạo luồng thực thi
-        start_schedule_in_thread = threading.Thread(target=self.check_schedule, args=(stop_event, schedule_job))
-        start_schedule_in_thread.daemon = True  # Luồng này sẽ tự động kết thúc khi chương trình chính kết thúc
-        start_schedule_in_thread.start()
-        logger.debug("Luồng kiểm tra lịch trình đã được khởi động.")
+        if schedule_job.handle is not None:
+            self.scheduler.cancel(schedule_job.handle)
+        if schedule_job.job_id is not None:
+            # Lịch có lưu trạng thái: lần đầu lấy từ JobStore, mỗi lượt chạy áp dụng chính sách chạy bù
+            schedule_job.handle = self.scheduler.call_at(self._prepare_persistent(schedule_job), self._run_persistent, schedule_job,
+                                                         next_fire=schedule_job.next_run, name=repr(schedule_job),
+                                                         executor_options=schedule_job.executor_options)
+        else:
+            schedule_job.handle = self.scheduler.call_at(schedule_job.next_run(), schedule_job.task,
+                                                         next_fire=schedule_job.next_run, name=repr(schedule_job),
+                                                         executor_options=schedule_job.executor_options)
+        logger.debug("Đã đưa lịch trình vào bộ hẹn giờ: %s", schedule_job.handle)
 
-        return start_schedule_in_thread
+        return self.scheduler.thread
     
-    def stop_schedule(self, stop_event: threading.Event, schedule_job: schedule.Scheduler, start_schedule_in_thread: threading.Thread):
+    def stop_schedule(self, stop_event: threading.Event, schedule_job: ScheduleJob, start_schedule_in_thread: threading.Thread = None):
         """
-        Dừng luồng kiểm tra lịch trình một cách an toàn
+        Dừng lịch trình một cách an toàn (luồng hẹn giờ chung vẫn chạy cho các lịch khác)
         """
         # Hủy lịch trình
-        schedule.cancel_job(schedule_job)
-        stop_event.set()  # Gửi tín hiệu dừng cho luồng kiểm tra lịch trình
-
-        # Đảm bảo luồng kiểm tra đã dừng
-        if start_schedule_in_thread.is_alive():
-            start_schedule_in_thread.join()  # Chờ luồng kiểm tra kết thúc
+        self.scheduler.cancel(schedule_job.handle)
+        schedule_job.handle = None
+        stop_event.set()  # Gửi tín hiệu dừng lịch trình
         logger.info("Đã kết thúc lịch trình: %s", schedule_job)
 
-    def restart_schedule(self, task, day=None, hour=None, minute=None, stop_event=None, schedule_job=None, start_schedule_in_thread=None):
+    def restart_schedule(self, task, day=None, hour=None, minute=None, stop_event=None, schedule_job=None, start_schedule_in_thread=None,
+                         cron=None):
         """
-        Khởi động lại một quá trình lập lịch với thời gian mới.
+        Khởi động lại một quá trình lập lịch với thời gian mới (cron: lịch mới theo chuỗi CRON thay cho day/hour/minute).
         """
         # Dừng lịch hiện tại (nếu có)
         if schedule_job:
             self.stop_schedule(stop_event, schedule_job, start_schedule_in_thread)
         
-        # Lên lịch lại tác vụ với thời gian mới
-        new_schedule_job, new_stop_event = self.schedule_daily(task, day, hour, minute)
+        # Lên lịch lại tác vụ với thời gian mới (lịch có lưu trạng thái giữ nguyên job_id và chính sách chạy bù)
+        if schedule_job is not None and schedule_job.job_id is not None:
+            new_schedule_job, new_stop_event = self.schedule_persistent(
+                schedule_job.job_id, task, cron or daily_cron(hour, minute, day),
+                schedule_job.misfire_policy, schedule_job.grace_seconds, schedule_job.resources, schedule_job.priority)
+        elif cron:
+            new_schedule_job, new_stop_event = self.schedule_cron(task, cron)
+        else:
+            new_schedule_job, new_stop_event = self.schedule_daily(task, day, hour, minute)
         
         # Khởi động lại kiểm tra lịch trình với thời gian mới
         new_thread = self.start_schedule(new_stop_event, new_schedule_job)
         
-        logger.info("Quá trình lập lịch đã được khởi động lại với thời gian mới: %s:%s, %s mỗi tháng" % (hour, minute, day if day else "hằng ngày"))
+        logger.info("Quá trình lập lịch đã được khởi động lại với thời gian mới: %s", new_schedule_job.cron.expr)
         
         return new_schedule_job, new_stop_event, new_thread
 
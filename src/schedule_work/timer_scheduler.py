@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Bộ hẹn giờ dùng chung cho toàn bộ ứng dụng (1 luồng duy nhất)
+- Các công việc được lưu trong min-heap theo thời điểm chạy kế tiếp (có chỉ số vị trí trong heap):
+  thêm / hủy / đổi lịch đều O(log n).
+- Luồng hẹn giờ ngủ đúng tới hạn gần nhất (không kiểm tra mỗi giây), được đánh thức sớm qua Condition
+  khi có thêm / hủy / đổi lịch công việc -> gần như không tốn CPU khi rảnh.
+- Tác vụ được chạy trên ResourceExecutor riêng để 1 tác vụ lâu (VD: sao lưu) không làm trễ các công việc khác;
+  công việc có thể khai báo tài nguyên / độ ưu tiên (executor_options) để giới hạn số công việc nặng chạy đồng thời.
+- Thời điểm là epoch (time.time()) để lịch theo giờ trong ngày đúng với đồng hồ hệ thống;
+  mỗi lần ngủ tối đa MAX_SLEEP_SECONDS để kịp nhận ra khi đồng hồ hệ thống bị chỉnh.
+"""
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional
+
+from schedule_work.resource_executor import ResourceExecutor
+
+logger = logging.getLogger(__name__)
+
+# Thời gian ngủ tối đa mỗi lần (giây), dùng để phát hiện đồng hồ hệ thống thay đổi
+MAX_SLEEP_SECONDS = 60.0
+# Số luồng chạy tác vụ mặc định
+TIMER_TASK_WORKERS = 4
+
+
+class TimerHandle:
+    """
+    1 công việc đã lên lịch. Giữ handle để hủy (cancel) hoặc đổi lịch (reschedule).
+
+    next_fire(last_fire_at) -> thời điểm chạy kế tiếp (epoch) hoặc None để dừng lặp; None = chỉ chạy 1 lần.
+    executor_options: tham số cho ResourceExecutor.submit_job (resources, priority).
+    """
+
+    __slots__ = ("id", "when", "callback", "args", "kwargs", "next_fire", "name", "index", "seq", "runs", "cancelled",
+                 "executor_options")
+
+    def __init__(self, job_id: int, when: float, callback: Callable, args, kwargs,
+                 next_fire: Optional[Callable[[float], Optional[float]]], name: str,
+                 executor_options: Optional[Dict[str, Any]] = None):
+        self.id = job_id
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.next_fire = next_fire
+        self.name = name
+        self.index = -1      # vị trí trong heap, -1 = không nằm trong heap
+        self.seq = 0         # thứ tự thêm vào, dùng khi 2 công việc cùng thời điểm
+        self.runs = 0
+        self.cancelled = False
+        self.executor_options = executor_options or {}
+
+    @property
+    def scheduled(self) -> bool:
+        return self.index >= 0
+
+    def _key(self):
+        return self.when, self.seq
+
+    def __repr__(self):
+        return f"<TimerHandle {self.id} {self.name!r} at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.when))}>"
+
+
+class TimerScheduler:
+    """
+    Bộ hẹn giờ 1 luồng dựa trên min-heap có chỉ số.
+
+    :param executor: nơi chạy tác vụ (mặc định ResourceExecutor TIMER_TASK_WORKERS luồng).
+    :param name: tên luồng hẹn giờ.
+    """
+
+    def __init__(self, executor: Optional[Executor] = None, name: str = "timer-scheduler"):
+        self.name = name
+        self._executor = executor
+        self._own_executor = executor is None
+        self._heap: List[TimerHandle] = []
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stats = {"added": 0, "cancelled": 0, "rescheduled": 0, "fired": 0, "errors": 0, "wakeups": 0}
+
+    # ----------------------------- Heap có chỉ số -----------------------------
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        heap[i].index = i
+        heap[j].index = j
+
+    def _sift_up(self, i: int):
+        while i > 0:
+            parent = (i - 1) >> 1
+            if self._heap[i]._key() >= self._heap[parent]._key():
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        size = len(self._heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and self._heap[child]._key() < self._heap[smallest]._key():
+                    smallest = child
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
+
+    def _push(self, handle: TimerHandle):
+        handle.seq = next(self._seq)
+        handle.index = len(self._heap)
+        self._heap.append(handle)
+        self._sift_up(handle.index)
+
+    def _remove(self, handle: TimerHandle):
+        i = handle.index
+        last = len(self._heap) - 1
+        if i != last:
+            self._swap(i, last)
+        self._heap.pop()
+        handle.index = -1
+        if i < len(self._heap):
+            # Phần tử cuối được đưa vào vị trí i: có thể cần đi lên hoặc đi xuống
+            moved = self._heap[i]
+            self._sift_up(i)
+            self._sift_down(moved.index)
+
+    # ----------------------------- API -----------------------------
+    def call_at(self, when: float, callback: Callable, *args,
+                next_fire: Optional[Callable[[float], Optional[float]]] = None, name: str = "",
+                executor_options: Optional[Dict[str, Any]] = None, **kwargs) -> TimerHandle:
+        """
+        Lên lịch callback(*args, **kwargs) vào thời điểm when (epoch); next_fire để lặp lại.
+        executor_options (VD: {"resources": [...], "priority": PRIORITY_LOW}) chỉ có tác dụng với ResourceExecutor.
+        """
+        with self._cond:
+            handle = TimerHandle(next(self._ids), when, callback, args, kwargs, next_fire,
+                                 name or getattr(callback, "__name__", "task"), executor_options)
+            self._push(handle)
+            self._stats["added"] += 1
+            self._wake(handle)
+        self.start()
+        return handle
+
+    def call_later(self, delay: float, callback: Callable, *args, **kwargs) -> TimerHandle:
+        return self.call_at(time.time() + delay, callback, *args, **kwargs)
+
+    def call_every(self, interval: float, callback: Callable, *args, **kwargs) -> TimerHandle:
+        """Chạy callback mỗi interval giây (tính từ thời điểm dự kiến, không trôi theo thời gian chạy tác vụ)."""
+        if interval <= 0:
+            raise ValueError("interval phải lớn hơn 0")
+        return self.call_at(time.time() + interval, callback, *args,
+                            next_fire=lambda last: last + interval, **kwargs)
+
+    def cancel(self, handle: Optional[TimerHandle]) -> bool:
+        """Hủy công việc; trả về False nếu công việc không còn trong lịch (đã chạy xong / đã hủy)."""
+        if handle is None:
+            return False
+        with self._cond:
+            handle.cancelled = True
+            if not handle.scheduled:
+                return False
+            was_first = handle.index == 0
+            self._remove(handle)
+            self._stats["cancelled"] += 1
+            if was_first:
+                self._cond.notify()
+        return True
+
+    def reschedule(self, handle: TimerHandle, when: float) -> bool:
+        """Đổi thời điểm chạy kế tiếp của công việc (kể cả công việc đã chạy xong 1 lần nhưng chưa hủy)."""
+        with self._cond:
+            if handle.cancelled:
+                return False
+            handle.when = when
+            if handle.scheduled:
+                self._sift_up(handle.index)
+                self._sift_down(handle.index)
+            else:
+                self._push(handle)
+            self._stats["rescheduled"] += 1
+            self._wake(handle)
+        self.start()
+        return True
+
+    def _wake(self, handle: TimerHandle):
+        # Chỉ cần đánh thức luồng hẹn giờ khi hạn gần nhất thay đổi
+        if handle.index == 0:
+            self._cond.notify()
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            handles = sorted(self._heap, key=TimerHandle._key)
+        return [{"id": h.id, "name": h.name, "next_run": h.when, "repeat": h.next_fire is not None, "runs": h.runs}
+                for h in handles]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            data = dict(self._stats)
+            data["scheduled"] = len(self._heap)
+            data["next_run"] = self._heap[0].when if self._heap else None
+        return data
+
+    # ----------------------------- Luồng hẹn giờ -----------------------------
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            if self._executor is None:
+                self._executor = ResourceExecutor(max_workers=TIMER_TASK_WORKERS, name=f"{self.name}-task")
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    @property
+    def executor(self) -> Optional[Executor]:
+        return self._executor
+
+    @property
+    def thread(self) -> Optional[threading.Thread]:
+        return self._thread
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    if not self._heap:
+                        self._cond.wait()
+                    else:
+                        delay = self._heap[0].when - time.time()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(min(delay, MAX_SLEEP_SECONDS))
+                    self._stats["wakeups"] += 1
+                handle = self._heap[0]
+                fired_at = handle.when
+                self._remove(handle)
+                handle.runs += 1
+                # Công việc lặp: xếp lại lịch ngay (trước khi chạy) để tác vụ chạy lâu không làm lệch lịch
+                if handle.next_fire is not None:
+                    next_when = self._next_when(handle, fired_at)
+                    if next_when is not None:
+                        handle.when = next_when
+                        self._push(handle)
+                self._stats["fired"] += 1
+            try:
+                submit_job = getattr(self._executor, "submit_job", None)
+                if submit_job is not None:
+                    submit_job(self._execute, handle, name=handle.name, **handle.executor_options)
+                else:
+                    self._executor.submit(self._execute, handle)
+            except RuntimeError as e:
+                # Executor đã đóng (ứng dụng đang thoát)
+                logger.warning("Không thể chạy công việc %s: %s", handle.name, e)
+
+    def _next_when(self, handle: TimerHandle, fired_at: float) -> Optional[float]:
+        """Lần chạy kế tiếp sau thời điểm hiện tại; None = dừng lặp (kể cả khi next_fire lỗi hoặc không tăng)."""
+        now = time.time()
+        previous = fired_at
+        try:
+            while True:
+                next_when = handle.next_fire(previous)
+                if next_when is None:
+                    return None
+                if next_when <= previous:
+                    raise ValueError(f"lần kế tiếp {next_when} không sau lần trước {previous}")
+                if next_when > now:
+                    return next_when
+                # Máy ngủ/treo lâu: bỏ qua các lần đã lỡ thay vì chạy dồn liên tiếp
+                previous = next_when
+        except Exception as e:
+            logger.error("Không tính được lần chạy kế tiếp của %s: %s", handle.name, e)
+            return None
+
+    def _execute(self, handle: TimerHandle):
+        if handle.cancelled:
+            return
+        try:
+            handle.callback(*handle.args, **handle.kwargs)
+        except Exception as e:
+            with self._cond:
+                self._stats["errors"] += 1
+            logger.exception("Lỗi khi chạy công việc đã lên lịch %s: %s", handle.name, e)
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """Dừng luồng hẹn giờ (các công việc còn trong lịch bị bỏ)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread = self._thread
+        if wait and thread is not None:
+            thread.join(timeout)
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+_shared_lock = threading.Lock()
+_shared_scheduler: Optional[TimerScheduler] = None
+
+
+def get_timer_scheduler() -> TimerScheduler:
+    """Bộ hẹn giờ dùng chung cho toàn bộ ứng dụng."""
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = TimerScheduler()
+        return _shared_scheduler
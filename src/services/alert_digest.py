@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Gom cảnh báo (send_mail_alert) thành email tổng hợp
+- Mỗi sự kiện chặn IP không còn là 1 email riêng: sự kiện được gom trong 1 cửa sổ thời gian (window giây)
+  hoặc tới khi đủ max_events sự kiện, rồi gửi 1 email tổng hợp theo nhóm (lý do hoặc IP).
+- Bộ nhớ có giới hạn: mỗi nhóm chỉ giữ số đếm, danh sách IP và tối đa SAMPLES_PER_GROUP sự kiện mẫu.
+- Mức độ nghiêm trọng nằm trong critical_severities thì gửi ngay, không chờ gom.
+- Cửa sổ = 0 thì tắt chế độ gom (gửi từng email như trước).
+"""
+import html
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Thời gian gom cảnh báo (giây), 0 = tắt
+ALERT_DIGEST_WINDOW = float(os.getenv("ALERT_DIGEST_WINDOW", "60"))
+# Số sự kiện tối đa trong 1 cửa sổ, đủ thì gửi ngay
+ALERT_DIGEST_MAX_EVENTS = int(os.getenv("ALERT_DIGEST_MAX_EVENTS", "200"))
+# Gom nhóm theo "reason" hoặc "ip"
+ALERT_DIGEST_GROUP_BY = os.getenv("ALERT_DIGEST_GROUP_BY", "reason")
+# Các mức độ luôn gửi ngay
+ALERT_CRITICAL_SEVERITIES = {s.strip().lower() for s in os.getenv("ALERT_CRITICAL_SEVERITIES", "critical").split(",") if s.strip()}
+
+# Số sự kiện mẫu giữ lại cho mỗi nhóm và số IP liệt kê tối đa trong email
+SAMPLES_PER_GROUP = 5
+MAX_IPS_LISTED = 20
+
+SEVERITY_WARNING = "warning"
+SEVERITY_CRITICAL = "critical"
+
+
+class _Window:
+    """Các sự kiện đang gom cho 1 người nhận."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.count = 0
+        self.groups: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.callbacks: List[Callable] = []
+        self.subject = ""
+        self.timer: Optional[threading.Timer] = None
+
+
+class AlertDigest:
+    """
+    Bộ gom cảnh báo đứng trước InternalEmailSender.send_mail_alert.
+
+    :param sender: InternalEmailSender dùng để gửi email tổng hợp / cảnh báo khẩn.
+    :param window: thời gian gom (giây), 0 = gửi từng email.
+    :param max_events: đủ số sự kiện này thì gửi ngay không chờ hết cửa sổ.
+    :param group_by: "reason" hoặc "ip".
+    :param critical_severities: các mức độ gửi ngay.
+    """
+
+    def __init__(self, sender, window: float = ALERT_DIGEST_WINDOW, max_events: int = ALERT_DIGEST_MAX_EVENTS,
+                 group_by: str = ALERT_DIGEST_GROUP_BY, critical_severities=None):
+        if group_by not in ("reason", "ip"):
+            raise ValueError("group_by phải là 'reason' hoặc 'ip'")
+        self.sender = sender
+        self.window = window
+        self.max_events = max(1, max_events)
+        self.group_by = group_by
+        self.critical_severities = set(ALERT_CRITICAL_SEVERITIES if critical_severities is None else critical_severities)
+
+        self._lock = threading.Lock()
+        self._windows: Dict[str, _Window] = {}
+        self._stats = {"events": 0, "digests": 0, "immediate": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def is_critical(self, severity: Optional[str]) -> bool:
+        return (severity or SEVERITY_WARNING).lower() in self.critical_severities
+
+    # ----------------------------- Thêm sự kiện -----------------------------
+    def add(self, to_email: str, subject: str, event: Dict[str, Any], callback: Optional[Callable] = None):
+        """
+        Thêm 1 sự kiện (ip, reason, path_api, user_agent, time_ban, at) vào cửa sổ của người nhận.
+        Gửi email tổng hợp khi đủ max_events; nếu không thì hẹn giờ gửi khi hết cửa sổ.
+        callback(to_email, success) được gọi khi email tổng hợp chứa sự kiện này gửi xong.
+        """
+        flush_now = None
+        with self._lock:
+            self._stats["events"] += 1
+            win = self._windows.get(to_email)
+            if win is None:
+                win = self._windows[to_email] = _Window()
+                win.subject = subject
+                win.timer = threading.Timer(self.window, self._expire, args=(to_email, win))
+                win.timer.daemon = True
+                win.timer.start()
+
+            key = str(event.get(self.group_by) or "-")
+            group = win.groups.get(key)
+            if group is None:
+                group = win.groups[key] = {"count": 0, "ips": OrderedDict(), "samples": [],
+                                           "first_seen": event["at"], "last_seen": event["at"]}
+            group["count"] += 1
+            group["last_seen"] = event["at"]
+            ip = event.get("ip") or "-"
+            group["ips"][ip] = group["ips"].get(ip, 0) + 1
+            if len(group["samples"]) < SAMPLES_PER_GROUP:
+                group["samples"].append(event)
+            if callback is not None:
+                win.callbacks.append(callback)
+            win.count += 1
+
+            if win.count >= self.max_events:
+                flush_now = self._windows.pop(to_email)
+        if flush_now is not None:
+            self._send(to_email, flush_now)
+
+    def flush(self, to_email: Optional[str] = None):
+        """Gửi ngay email tổng hợp của 1 người nhận (hoặc tất cả khi to_email = None)."""
+        with self._lock:
+            keys = list(self._windows) if to_email is None else [to_email]
+            windows = [(key, self._windows.pop(key)) for key in keys if key in self._windows]
+        for key, win in windows:
+            self._send(key, win)
+
+    def _expire(self, to_email: str, win: _Window):
+        """
+        Hết cửa sổ gom (chạy trên luồng Timer): chỉ gửi đúng cửa sổ đã hẹn giờ.
+        Timer đã chạy nhưng còn chờ lock có thể tới sau khi cửa sổ đó đã được gửi (đủ max_events / flush)
+        và 1 cửa sổ mới đã mở cho cùng người nhận -> bỏ qua, cửa sổ mới có Timer riêng.
+        """
+        with self._lock:
+            if self._windows.get(to_email) is not win:
+                return
+            del self._windows[to_email]
+        self._send(to_email, win)
+
+    def record_immediate(self):
+        with self._lock:
+            self._stats["immediate"] += 1
+
+    # ----------------------------- Gửi -----------------------------
+    def _send(self, to_email: str, win: _Window):
+        if win.timer is not None:
+            win.timer.cancel()
+        if not win.count:
+            return
+        with self._lock:
+            self._stats["digests"] += 1
+        subject = f"[Tổng hợp {win.count} cảnh báo] {win.subject}"
+        body = self.render(win)
+        callbacks = win.callbacks
+
+        def on_done(email, success):
+            for callback in callbacks:
+                try:
+                    callback(email, success)
+                except Exception as e:
+                    logger.error("Lỗi callback email tổng hợp cảnh báo: %s", e)
+
+        logger.info("Gửi email tổng hợp %s cảnh báo (%s nhóm) tới %s", win.count, len(win.groups), to_email)
+        self.sender.send_email_async(to_email=to_email, subject=subject, body=body, signature=self.sender.signature_email,
+                                     callback=on_done if callbacks else None,
+                                     dedupe_key=f"alert_digest:{to_email.lower()}:{win.started_at:.3f}")
+
+    def render(self, win: _Window) -> str:
+        """Nội dung HTML của email tổng hợp: 1 dòng cho mỗi nhóm + vài sự kiện mẫu."""
+        def fmt(ts):
+            return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+        label = "Lý do" if self.group_by == "reason" else "IP"
+        rows = []
+        for key, group in sorted(win.groups.items(), key=lambda item: -item[1]["count"]):
+            ips = list(group["ips"].items())
+            ip_text = ", ".join(f"{html.escape(ip)} ({n})" for ip, n in ips[:MAX_IPS_LISTED])
+            if len(ips) > MAX_IPS_LISTED:
+                ip_text += f", ... và {len(ips) - MAX_IPS_LISTED} IP khác"
+            samples = "<br>".join(
+                f"{fmt(e['at'])} - {html.escape(str(e.get('path_api') or '-'))} - {html.escape(str(e.get('user_agent') or '-'))}"
+                f" - chặn {html.escape(str(e.get('time_ban')))} giây"
+                for e in group["samples"]
+            )
+            rows.append(
+                f"<tr><td>{html.escape(key)}</td><td style='text-align:right'>{group['count']}</td>"
+                f"<td>{ip_text}</td><td>{fmt(group['first_seen'])}<br>{fmt(group['last_seen'])}</td>"
+                f"<td style='font-size:12px'>{samples}</td></tr>"
+            )
+        return f"""
+        <html>
+            <body style="font-family: Arial, sans-serif; color: #333;">
+                <p>Thông báo từ hệ thống,</p>
+                <p>Từ {fmt(win.started_at)} hệ thống đã ngăn chặn <strong>{win.count}</strong> lượt truy cập, gom theo {label.lower()}:</p>
+                <table border="1" cellpadding="4" cellspacing="0" style="border-collapse: collapse; font-size: 13px;">
+                    <tr><th>{label}</th><th>Số lượt</th><th>IP (số lượt)</th><th>Lần đầu / lần cuối</th><th>Sự kiện mẫu</th></tr>
+                    {''.join(rows)}
+                </table>
+                <br>
+                <p>Đây là mail tự động, vui lòng không phản hồi mail này!</p>
+            </body>
+        </html>
+        """
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data = dict(self._stats)
+            data["pending_events"] = sum(win.count for win in self._windows.values())
+        return data
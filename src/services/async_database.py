@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Lớp bọc bất đồng bộ (asyncio) cho My_Database
+- Các lệnh pyodbc (blocking) chạy trên 1 ThreadPoolExecutor giới hạn số luồng, dùng chung toàn tiến trình.
+- Cung cấp cả Future (submit) lẫn coroutine (call/gather/run) để chạy song song các truy vấn độc lập.
+- Kết quả được chuyển về Tk main loop qua 1 điểm duy nhất (TkDispatcher) nên callback được phép thao tác giao diện.
+"""
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Số luồng tối đa chạy truy vấn CSDL cho toàn bộ ứng dụng
+DB_EXECUTOR_MAX_WORKERS = 4
+
+_shared_lock = threading.Lock()
+_shared_executor: Optional[ThreadPoolExecutor] = None
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_shared_executor() -> ThreadPoolExecutor:
+    """Executor dùng chung: giới hạn tổng số luồng truy vấn CSDL trong tiến trình."""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_MAX_WORKERS, thread_name_prefix="db-worker")
+        return _shared_executor
+
+
+def get_shared_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop asyncio chạy trên 1 luồng nền riêng.
+    Tk đã chiếm main thread (mainloop) nên coroutine được chạy trên loop này.
+    """
+    global _shared_loop
+    with _shared_lock:
+        if _shared_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="db-asyncio-loop", daemon=True).start()
+            _shared_loop = loop
+        return _shared_loop
+
+
+class TkDispatcher:
+    """
+    Điểm chuyển giao duy nhất từ luồng nền về Tk main loop.
+    - Luồng nền gọi post(): callback được đưa vào hàng đợi.
+    - Chỉ 1 lệnh widget.after(0, ...) được hẹn tại 1 thời điểm, lần chạy đó xử lý hết hàng đợi theo lô.
+    - Widget đã bị hủy thì các callback còn lại bị bỏ qua (không ném lỗi Tcl).
+    """
+
+    def __init__(self, widget, batch_limit: int = 50):
+        self.widget = widget
+        self.batch_limit = batch_limit
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def post(self, fn: Callable, *args, **kwargs):
+        """Đưa callback vào hàng đợi để chạy trên main thread (gọi được từ bất kỳ luồng nào)."""
+        with self._lock:
+            self._queue.put((fn, args, kwargs))
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._schedule_drain()
+
+    def _schedule_drain(self):
+        try:
+            self.widget.after(0, self._drain)
+        except Exception as e:
+            # Widget đã bị hủy (đóng cửa sổ) -> bỏ qua các callback còn lại
+            logger.debug(f"Không thể chuyển kết quả về giao diện: {e}")
+            with self._lock:
+                self._scheduled = False
+
+    def _drain(self):
+        """Chạy trên main thread: xử lý tối đa batch_limit callback rồi nhường lại cho Tk."""
+        for _ in range(self.batch_limit):
+            try:
+                fn, args, kwargs = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                logger.exception(f"Lỗi khi chạy callback trên giao diện: {e}")
+
+        with self._lock:
+            if self._queue.empty():
+                self._scheduled = False
+                return
+        # Vẫn còn callback: hẹn lượt tiếp theo để giao diện không bị đơ
+        self._schedule_drain()
+
+
+class AsyncDatabase:
+    """
+    Bọc My_Database để gọi không chặn giao diện.
+
+    Cách dùng:
+    - Future + callback trên giao diện:
+        adb.submit("get_username", email, callback=self.on_done, error_callback=self.on_error)
+    - Coroutine (chạy song song với gather):
+        async def load():
+            users, stats = await adb.gather(adb.call("get_information_all_user"), adb.call("get_pool_stats"))
+        adb.run(load(), callback=self.on_loaded)
+    """
+
+    def __init__(self, database, dispatcher: Optional[TkDispatcher] = None, executor: Optional[ThreadPoolExecutor] = None):
+        self.database = database
+        self.dispatcher = dispatcher
+        self._executor = executor or get_shared_executor()
+
+    def _resolve(self, method) -> Callable:
+        """Nhận tên hàm của My_Database hoặc 1 callable bất kỳ."""
+        if isinstance(method, str):
+            return getattr(self.database, method)
+        return method
+
+    # ----------------------------- Future API -----------------------------
+    def submit(self, method, *args, callback: Optional[Callable[[Any], None]] = None,
+               error_callback: Optional[Callable[[BaseException], None]] = None, **kwargs) -> Future:
+        """
+        Chạy method trên executor, trả về concurrent.futures.Future.
+        callback(result) / error_callback(exception) được gọi trên Tk main loop (nếu có dispatcher).
+        """
+        future = self._executor.submit(self._resolve(method), *args, **kwargs)
+        if callback is not None or error_callback is not None:
+            future.add_done_callback(partial(self._deliver, callback=callback, error_callback=error_callback))
+        return future
+
+    def stream(self, method, *args, chunk_callback: Callable[[Any], None],
+               callback: Optional[Callable[[int], None]] = None,
+               error_callback: Optional[Callable[[BaseException], None]] = None, **kwargs) -> Future:
+        """
+        Chạy 1 hàm trả về generator (VD: stream_information_all_user) trên executor.
+        - Mỗi khối dữ liệu được chuyển về giao diện ngay qua chunk_callback(khối).
+        - Đọc xong gọi callback(tổng số khối); lỗi gọi error_callback(exception).
+        """
+        def _consume():
+            count = 0
+            for chunk in self._resolve(method)(*args, **kwargs):
+                count += 1
+                self._post(chunk_callback, chunk)
+            return count
+
+        return self.submit(_consume, callback=callback, error_callback=error_callback)
+
+    def watch(self, future: Future, callback: Optional[Callable[[Any], None]] = None,
+              error_callback: Optional[Callable[[BaseException], None]] = None) -> Future:
+        """Chuyển kết quả của 1 Future bất kỳ (VD: từ KDFExecutor) về giao diện qua callback/error_callback."""
+        future.add_done_callback(partial(self._deliver, callback=callback, error_callback=error_callback))
+        return future
+
+    # ----------------------------- Coroutine API -----------------------------
+    async def call(self, method, *args, **kwargs) -> Any:
+        """Coroutine: chạy method trên executor và chờ kết quả."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self._resolve(method), *args, **kwargs))
+
+    async def gather(self, *coros, return_exceptions: bool = False):
+        """Chạy song song nhiều coroutine (VD: nhiều lệnh call độc lập)."""
+        return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+
+    def run(self, coro, callback: Optional[Callable[[Any], None]] = None,
+            error_callback: Optional[Callable[[BaseException], None]] = None) -> Future:
+        """Chạy coroutine trên event loop nền, kết quả trả về giao diện qua callback."""
+        future = asyncio.run_coroutine_threadsafe(coro, get_shared_loop())
+        if callback is not None or error_callback is not None:
+            future.add_done_callback(partial(self._deliver, callback=callback, error_callback=error_callback))
+        return future
+
+    # ----------------------------- Nội bộ -----------------------------
+    def _deliver(self, future: Future, callback=None, error_callback=None):
+        """Chuyển kết quả (hoặc lỗi) của future về giao diện qua dispatcher."""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            if error_callback is None:
+                logger.error(f"Lỗi khi thực thi truy vấn bất đồng bộ: {error}")
+                return
+            target, value = error_callback, error
+        else:
+            if callback is None:
+                return
+            target, value = callback, future.result()
+
+        self._post(target, value)
+
+    def _post(self, target: Callable, value: Any):
+        """Gọi target(value) trên giao diện nếu có dispatcher, ngược lại gọi trực tiếp."""
+        if self.dispatcher is not None:
+            self.dispatcher.post(target, value)
+        else:
+            target(value)
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+Mã hóa/giải mã tệp backup (.bak/.dif/.trn) dạng luồng bằng AES-256-GCM chia khối
+- Tệp được chia thành các khối cố định (mặc định 4 MB), mỗi khối được mã hóa + xác thực riêng (tag 16 byte).
+- Nonce mỗi khối = nonce_prefix (8 byte ngẫu nhiên của tệp) + số thứ tự khối -> không thể tráo đổi thứ tự khối.
+- Header (kích thước gốc, kích thước khối, tham số khóa) nằm trong AAD của mọi khối; khối cuối được đánh dấu
+  trong AAD -> phát hiện sửa header, cắt cụt hoặc nối thêm dữ liệu.
+- Vị trí khối i tính trực tiếp từ header -> kiểm tra ngẫu nhiên 1 vài khối (verify_file(sample=...)) mà không đọc cả tệp.
+- Nhiều khối được xử lý song song (pycryptodome gọi thư viện C và nhả GIL), số khối đang xử lý có giới hạn
+  -> bộ nhớ tối đa khoảng (workers * 2) * chunk_size bất kể tệp lớn bao nhiêu.
+- Khóa: 32 byte (tệp khóa) hoặc passphrase (dẫn xuất bằng scrypt, salt + tham số lưu trong header).
+
+Định dạng tệp (.enc):
+    header  : magic "TBKENC" | version u8 | kdf u8 | chunk_size u32 | plaintext_size u64 | nonce_prefix 8B
+              | salt 16B | ln u8 | r u8 | p u8 | reserved u8                       (48 byte, little-endian)
+    khối i  : ciphertext (chunk_size byte, khối cuối có thể ngắn hơn) | tag 16 byte
+"""
+import hashlib
+import logging
+import os
+import random
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+from Crypto.Cipher import AES   # pip install pycryptodome
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TBKENC"
+FORMAT_VERSION = 1
+HEADER_STRUCT = struct.Struct("<6sBBIQ8s16sBBBx")
+HEADER_SIZE = HEADER_STRUCT.size
+TAG_SIZE = 16
+KEY_SIZE = 32
+
+# Cách lấy khóa ghi trong header
+KDF_RAW_KEY = 0       # Khóa 32 byte (tệp khóa)
+KDF_SCRYPT = 1        # Passphrase -> scrypt
+
+# Kích thước khối mặc định (bằng MAXTRANSFERSIZE của lệnh BACKUP) và giới hạn hợp lệ
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Tham số scrypt cho passphrase (chỉ chạy 1 lần mỗi tệp nên có thể mạnh hơn băm mật khẩu đăng nhập)
+PASSPHRASE_SCRYPT_LN = 15
+PASSPHRASE_SCRYPT_R = 8
+PASSPHRASE_SCRYPT_P = 1
+
+ENCRYPTED_SUFFIX = ".enc"
+
+KeyLike = Union[bytes, str]
+
+
+class BackupCryptoError(Exception):
+    """Tệp mã hóa không hợp lệ, sai khóa hoặc dữ liệu đã bị sửa đổi."""
+
+
+# ----------------------------- Khóa -----------------------------
+def generate_key() -> bytes:
+    """Tạo khóa AES-256 ngẫu nhiên."""
+    return os.urandom(KEY_SIZE)
+
+
+def create_key_file(path: str) -> bytes:
+    """Tạo tệp khóa mới (hex, 64 ký tự). Không ghi đè tệp đã có."""
+    key = generate_key()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "x", encoding="ascii") as f:
+        f.write(key.hex())
+    return key
+
+
+def load_key_file(path: str) -> bytes:
+    """Đọc tệp khóa (hex hoặc 32 byte nhị phân)."""
+    with open(path, "rb") as f:
+        data = f.read().strip()
+    if len(data) == KEY_SIZE:
+        return data
+    try:
+        key = bytes.fromhex(data.decode("ascii"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise BackupCryptoError(f"Tệp khóa không hợp lệ: {path}") from e
+    if len(key) != KEY_SIZE:
+        raise BackupCryptoError(f"Tệp khóa phải chứa {KEY_SIZE} byte: {path}")
+    return key
+
+
+def _derive_key(passphrase: str, salt: bytes, ln: int, r: int, p: int) -> bytes:
+    n = 1 << ln
+    return hashlib.scrypt(passphrase.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=KEY_SIZE,
+                          maxmem=128 * r * (n + p + 2) + 1024 * 1024)
+
+
+# ----------------------------- Header -----------------------------
+class ContainerHeader:
+    """Thông tin header của tệp mã hóa + các phép tính vị trí khối."""
+
+    def __init__(self, chunk_size: int, plaintext_size: int, nonce_prefix: bytes, kdf: int = KDF_RAW_KEY,
+                 salt: bytes = b"\x00" * 16, ln: int = 0, r: int = 0, p: int = 0, version: int = FORMAT_VERSION):
+        self.version = version
+        self.kdf = kdf
+        self.chunk_size = chunk_size
+        self.plaintext_size = plaintext_size
+        self.nonce_prefix = nonce_prefix
+        self.salt = salt
+        self.ln, self.r, self.p = ln, r, p
+
+    def pack(self) -> bytes:
+        return HEADER_STRUCT.pack(MAGIC, self.version, self.kdf, self.chunk_size, self.plaintext_size,
+                                  self.nonce_prefix, self.salt, self.ln, self.r, self.p)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "ContainerHeader":
+        if len(data) < HEADER_SIZE:
+            raise BackupCryptoError("Tệp quá ngắn, không phải tệp backup đã mã hóa.")
+        magic, version, kdf, chunk_size, size, nonce_prefix, salt, ln, r, p = HEADER_STRUCT.unpack(data[:HEADER_SIZE])
+        if magic != MAGIC:
+            raise BackupCryptoError("Sai định dạng: không phải tệp backup đã mã hóa.")
+        if version != FORMAT_VERSION:
+            raise BackupCryptoError(f"Phiên bản định dạng không hỗ trợ: {version}")
+        if kdf not in (KDF_RAW_KEY, KDF_SCRYPT) or not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise BackupCryptoError("Header không hợp lệ.")
+        return cls(chunk_size, size, nonce_prefix, kdf, salt, ln, r, p, version)
+
+    @property
+    def chunk_count(self) -> int:
+        # Luôn có ít nhất 1 khối (có thể rỗng) để header của tệp rỗng cũng được xác thực
+        return max(1, -(-self.plaintext_size // self.chunk_size))
+
+    def plain_length(self, index: int) -> int:
+        if index == self.chunk_count - 1:
+            return self.plaintext_size - index * self.chunk_size
+        return self.chunk_size
+
+    def chunk_offset(self, index: int) -> int:
+        return HEADER_SIZE + index * (self.chunk_size + TAG_SIZE)
+
+    @property
+    def container_size(self) -> int:
+        return HEADER_SIZE + self.plaintext_size + self.chunk_count * TAG_SIZE
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "kdf": "scrypt" if self.kdf == KDF_SCRYPT else "raw",
+            "chunk_size": self.chunk_size,
+            "plaintext_size": self.plaintext_size,
+            "chunk_count": self.chunk_count,
+        }
+
+
+def read_header(path: str) -> ContainerHeader:
+    with open(path, "rb") as f:
+        return ContainerHeader.unpack(f.read(HEADER_SIZE))
+
+
+def _resolve_key(key: KeyLike, header: ContainerHeader) -> bytes:
+    if header.kdf == KDF_SCRYPT:
+        if not isinstance(key, str):
+            raise BackupCryptoError("Tệp được mã hóa bằng passphrase, cần truyền passphrase (str).")
+        return _derive_key(key, header.salt, header.ln, header.r, header.p)
+    if not isinstance(key, (bytes, bytearray)) or len(key) != KEY_SIZE:
+        raise BackupCryptoError(f"Tệp được mã hóa bằng khóa {KEY_SIZE} byte, cần truyền khóa (bytes).")
+    return bytes(key)
+
+
+# ----------------------------- Xử lý từng khối -----------------------------
+def _nonce(header: ContainerHeader, index: int) -> bytes:
+    return header.nonce_prefix + struct.pack("<I", index)
+
+
+def _aad(header_bytes: bytes, index: int, is_last: bool) -> bytes:
+    return header_bytes + struct.pack("<QB", index, 1 if is_last else 0)
+
+
+def _encrypt_chunk(key: bytes, header: ContainerHeader, header_bytes: bytes, index: int, data: bytes) -> bytes:
+    cipher = AES.new(key, AES.MODE_GCM, nonce=_nonce(header, index))
+    cipher.update(_aad(header_bytes, index, index == header.chunk_count - 1))
+    ciphertext, tag = cipher.encrypt_and_digest(data)
+    return ciphertext + tag
+
+
+def _decrypt_chunk(key: bytes, header: ContainerHeader, header_bytes: bytes, index: int, blob: bytes) -> bytes:
+    cipher = AES.new(key, AES.MODE_GCM, nonce=_nonce(header, index))
+    cipher.update(_aad(header_bytes, index, index == header.chunk_count - 1))
+    try:
+        return cipher.decrypt_and_verify(blob[:-TAG_SIZE], blob[-TAG_SIZE:])
+    except ValueError as e:
+        raise BackupCryptoError(f"Khối {index} không hợp lệ (sai khóa hoặc dữ liệu đã bị sửa đổi).") from e
+
+
+def _read_exact(f, length: int, what: str) -> bytes:
+    data = f.read(length)
+    if len(data) != length:
+        raise BackupCryptoError(f"Tệp bị cắt cụt khi đọc {what} (cần {length} byte, đọc được {len(data)}).")
+    return data
+
+
+def _pipeline(read_chunk: Callable[[int], bytes], work: Callable[[int, bytes], bytes], count: int,
+              workers: int, sink: Callable[[int, bytes], None], progress: Optional[Callable[[int, int], None]]):
+    """
+    Đọc tuần tự -> xử lý song song -> ghi tuần tự theo đúng thứ tự khối.
+    Tối đa workers * 2 khối đang nằm trong bộ nhớ cùng lúc.
+    """
+    window = max(1, workers) * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="backup-crypto") as executor:
+        for index in range(count):
+            if len(pending) >= window:
+                done_index, future = pending.popleft()
+                sink(done_index, future.result())
+                if progress:
+                    progress(done_index + 1, count)
+            pending.append((index, executor.submit(work, index, read_chunk(index))))
+        while pending:
+            done_index, future = pending.popleft()
+            sink(done_index, future.result())
+            if progress:
+                progress(done_index + 1, count)
+
+
+def _default_workers(workers: Optional[int]) -> int:
+    return max(1, workers or min(8, os.cpu_count() or 1))
+
+
+# ----------------------------- API -----------------------------
+def encrypt_file(src: str, dst: Optional[str] = None, key: KeyLike = b"", chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 workers: Optional[int] = None, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Mã hóa tệp src -> dst (mặc định src + ".enc").
+    - key: 32 byte hoặc passphrase (str).
+    - Ghi ra tệp tạm dst + ".part" rồi đổi tên -> không để lại tệp mã hóa dở dang nếu lỗi giữa chừng.
+    - progress(số khối xong, tổng số khối) được gọi trên luồng đang chạy hàm này.
+    Trả về thống kê: kích thước, số khối, thời gian, thông lượng MB/s.
+    """
+    if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"chunk_size phải trong khoảng {MIN_CHUNK_SIZE}..{MAX_CHUNK_SIZE}")
+    dst = dst or src + ENCRYPTED_SUFFIX
+    workers = _default_workers(workers)
+    size = os.path.getsize(src)
+
+    if isinstance(key, str):
+        header = ContainerHeader(chunk_size, size, os.urandom(8), KDF_SCRYPT, os.urandom(16),
+                                 PASSPHRASE_SCRYPT_LN, PASSPHRASE_SCRYPT_R, PASSPHRASE_SCRYPT_P)
+    else:
+        header = ContainerHeader(chunk_size, size, os.urandom(8))
+    raw_key = _resolve_key(key, header)
+    header_bytes = header.pack()
+
+    started = time.perf_counter()
+    part = dst + ".part"
+    try:
+        with open(src, "rb") as fin, open(part, "wb") as fout:
+            fout.write(header_bytes)
+
+            def read_chunk(index):
+                return _read_exact(fin, header.plain_length(index), f"khối {index} của {src}")
+
+            _pipeline(read_chunk, lambda i, data: _encrypt_chunk(raw_key, header, header_bytes, i, data),
+                      header.chunk_count, workers, lambda i, blob: fout.write(blob), progress)
+            if fin.read(1):
+                raise BackupCryptoError(f"Tệp {src} thay đổi kích thước trong khi mã hóa.")
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.replace(part, dst)
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "source": src,
+        "output": dst,
+        "bytes": size,
+        "chunks": header.chunk_count,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(size / (1024 * 1024) / elapsed, 1) if elapsed > 0 else None,
+    }
+    logger.info("Đã mã hóa %s -> %s (%s byte, %s khối, %.1f s)", src, dst, size, header.chunk_count, elapsed)
+    return stats
+
+
+def decrypt_file(src: str, dst: str, key: KeyLike, workers: Optional[int] = None,
+                 progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Giải mã tệp src -> dst. Mọi khối đều được xác thực trước khi ghi; lỗi ở bất kỳ khối nào
+    sẽ xóa tệp tạm và ném BackupCryptoError (không để lại tệp giải mã dở dang).
+    """
+    workers = _default_workers(workers)
+    started = time.perf_counter()
+    part = dst + ".part"
+    try:
+        with open(src, "rb") as fin, open(part, "wb") as fout:
+            header_bytes = _read_exact(fin, HEADER_SIZE, "header")
+            header = ContainerHeader.unpack(header_bytes)
+            raw_key = _resolve_key(key, header)
+
+            def read_chunk(index):
+                return _read_exact(fin, header.plain_length(index) + TAG_SIZE, f"khối {index}")
+
+            _pipeline(read_chunk, lambda i, blob: _decrypt_chunk(raw_key, header, header_bytes, i, blob),
+                      header.chunk_count, workers, lambda i, data: fout.write(data), progress)
+            if fin.read(1):
+                raise BackupCryptoError("Có dữ liệu thừa sau khối cuối (tệp bị nối thêm).")
+        os.replace(part, dst)
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+
+    elapsed = time.perf_counter() - started
+    return {
+        "source": src,
+        "output": dst,
+        "bytes": header.plaintext_size,
+        "chunks": header.chunk_count,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(header.plaintext_size / (1024 * 1024) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def verify_file(path: str, key: KeyLike, chunks: Optional[Iterable[int]] = None, sample: Optional[int] = None,
+                workers: Optional[int] = None, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Kiểm tra tính toàn vẹn tệp mã hóa mà không ghi dữ liệu giải mã ra đĩa.
+    - Mặc định kiểm tra mọi khối.
+    - chunks=[...]: chỉ kiểm tra các khối chỉ định; sample=k: kiểm tra ngẫu nhiên k khối (luôn gồm khối cuối).
+    Trả về {"ok", "checked", "chunk_count", "bad_chunks", "size_ok", ...}; không ném lỗi khi khối hỏng.
+    """
+    workers = _default_workers(workers)
+    header = read_header(path)
+    with open(path, "rb") as f:
+        header_bytes = f.read(HEADER_SIZE)
+    raw_key = _resolve_key(key, header)
+    count = header.chunk_count
+
+    if chunks is not None:
+        indices = sorted({i for i in chunks if 0 <= i < count})
+    elif sample is not None and sample < count:
+        indices = sorted(set(random.sample(range(count - 1), max(0, sample - 1))) | {count - 1})
+    else:
+        indices = list(range(count))
+
+    actual_size = os.path.getsize(path)
+    bad = []
+
+    def check(position, blob):
+        index = indices[position]
+        try:
+            _decrypt_chunk(raw_key, header, header_bytes, index, blob)
+            return None
+        except BackupCryptoError:
+            return index
+
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        def read_chunk(position):
+            index = indices[position]
+            f.seek(header.chunk_offset(index))
+            return f.read(header.plain_length(index) + TAG_SIZE)
+
+        _pipeline(read_chunk, check, len(indices), workers,
+                  lambda _, result: result is not None and bad.append(result), progress)
+
+    size_ok = actual_size == header.container_size
+    return {
+        "path": path,
+        "ok": not bad and size_ok,
+        "size_ok": size_ok,
+        "checked": len(indices),
+        "chunk_count": count,
+        "bad_chunks": bad,
+        "seconds": round(time.perf_counter() - started, 3),
+        **header.to_dict(),
+    }
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Bộ nhớ đệm (cache) trong tiến trình cho các truy vấn đọc lặp lại
+- Mỗi mục có thời gian sống (TTL), hết hạn thì coi như không có.
+- Giới hạn số mục theo LRU: vượt maxsize thì bỏ mục ít được dùng nhất.
+- Gắn tag cho mục (VD: email) để xóa hàng loạt các mục liên quan khi dữ liệu thay đổi.
+- An toàn đa luồng, có bộ đếm hit/miss để tinh chỉnh TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache LRU có thời gian sống cho từng mục.
+
+    :param maxsize: số mục tối đa giữ trong cache.
+    :param ttl: thời gian sống mặc định (giây) của 1 mục.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        if maxsize < 1:
+            raise ValueError("maxsize phải >= 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (giá trị, thời điểm hết hạn theo monotonic, tags)
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, Tuple[Hashable, ...]]]" = OrderedDict()
+        # tag -> tập key gắn với tag đó
+        self._tags: Dict[Hashable, set] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Lấy giá trị còn hạn; không có hoặc hết hạn thì trả default (tính là miss)."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self._stats["misses"] += 1
+                return default
+            value, expires_at, _ = item
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return default
+            # Đánh dấu vừa được dùng (đưa về cuối danh sách LRU)
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, tags: Iterable[Hashable] = ()):
+        """Ghi giá trị vào cache kèm TTL và các tag dùng để xóa hàng loạt."""
+        ttl = self.ttl if ttl is None else ttl
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.monotonic() + ttl, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            # Vượt kích thước -> bỏ các mục ít dùng nhất (đầu danh sách)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Xóa 1 key. Trả về True nếu key có trong cache."""
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._remove(key)
+            self._stats["invalidations"] += 1
+            return True
+
+    def invalidate_tag(self, tag: Hashable) -> int:
+        """Xóa toàn bộ các key gắn với tag. Trả về số key đã xóa."""
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """Xóa toàn bộ cache (giữ nguyên bộ đếm)."""
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Bộ đếm hit/miss/expired/evictions và tỉ lệ hit hiện tại."""
+        with self._lock:
+            data = dict(self._stats)
+            data["size"] = len(self._data)
+        data["maxsize"] = self.maxsize
+        data["ttl"] = self.ttl
+        lookups = data["hits"] + data["misses"]
+        data["hit_ratio"] = round(data["hits"] / lookups, 4) if lookups else 0.0
+        return data
+
+    def _remove(self, key: Hashable):
+        """Xóa key và các liên kết tag của nó (gọi khi đang giữ lock)."""
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Circuit breaker cho kết nối CSDL
+- Sau N lần kết nối thất bại liên tiếp, mạch "mở": mọi lời gọi bị từ chối ngay thay vì chờ hết login timeout của ODBC.
+- Khi mạch mở, 1 luồng nền thử kết nối lại (half-open) theo chu kỳ tăng dần có jitter; thành công thì mạch "đóng" lại.
+- Thử lại với backoff lũy thừa + jitter chỉ áp dụng cho lỗi tạm thời (deadlock, mất kết nối giữa chừng, Azure throttling...).
+- Registry dùng chung theo khóa (chuỗi kết nối) để mọi đối tượng My_Database cùng biết CSDL đang ngừng hoạt động.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE được coi là tạm thời (thử lại có thể thành công):
+# - 40001: bị chọn làm nạn nhân deadlock / xung đột serialization
+# - 08S01: mất liên kết giữa chừng (VD: server vừa khởi động lại, kết nối cũ trong pool bị đứt)
+# HYT00 (login/query timeout) KHÔNG nằm trong danh sách: lỗi này đã tốn trọn thời gian chờ, thử lại chỉ làm treo lâu hơn.
+TRANSIENT_SQLSTATES = frozenset({"40001", "08S01"})
+
+# Mã lỗi native của SQL Server được coi là tạm thời (deadlock, Azure SQL bận/đang chuyển node)
+TRANSIENT_NATIVE_ERRORS = frozenset({1205, 40197, 40501, 40613, 49918, 49919, 49920})
+
+_NATIVE_ERROR_RE = re.compile(r"\((\d{3,5})\)")
+
+# Trạng thái mạch
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ConnectionError):
+    """Mạch đang mở: CSDL được coi là không khả dụng, lời gọi bị từ chối ngay."""
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """
+    Lỗi có phải tạm thời hay không.
+    pyodbc.Error: args[0] là SQLSTATE, args[1] là thông báo có chứa mã native dạng "(1205)".
+    """
+    args = getattr(exc, "args", None) or ()
+    if not args or not isinstance(args[0], str):
+        return False
+    if args[0] in TRANSIENT_SQLSTATES:
+        return True
+    message = args[1] if len(args) > 1 and isinstance(args[1], str) else ""
+    return any(int(code) in TRANSIENT_NATIVE_ERRORS for code in _NATIVE_ERROR_RE.findall(message))
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Thời gian chờ trước lần thử lại thứ attempt (tính từ 0): full jitter trong [0, min(max, base * 2^attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_with_backoff(fn: Callable[[], Any], retries: int = 2, base_delay: float = 0.2, max_delay: float = 2.0,
+                       is_retryable: Callable[[BaseException], bool] = is_transient_error,
+                       sleep: Callable[[float], None] = time.sleep) -> Any:
+    """
+    Gọi fn(), gặp lỗi tạm thời thì thử lại tối đa retries lần với backoff lũy thừa có jitter.
+    Lỗi không tạm thời (hoặc hết lượt thử) được ném ra ngay.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"Lỗi tạm thời, thử lại lần {attempt + 1}/{retries} sau {delay:.2f}s: {e}")
+            sleep(delay)
+            attempt += 1
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker 3 trạng thái: closed -> open -> half_open -> closed.
+
+    :param name: tên hiển thị trong log/thống kê.
+    :param probe: hàm thử kết nối (ném lỗi nếu CSDL chưa sẵn sàng), chạy ở luồng nền khi mạch mở.
+    :param failure_threshold: số lần thất bại liên tiếp để mở mạch.
+    :param probe_interval: chu kỳ thử lại đầu tiên (giây), nhân đôi sau mỗi lần thử thất bại.
+    :param max_probe_interval: chu kỳ thử lại tối đa (giây).
+    """
+
+    def __init__(self, name: str, probe: Callable[[], Any], failure_threshold: int = 3,
+                 probe_interval: float = 2.0, max_probe_interval: float = 30.0):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold phải >= 1")
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._last_error: Optional[str] = None
+        self._opened_at: Optional[datetime] = None
+        self._next_probe_at: Optional[float] = None
+        self._probe_thread: Optional[threading.Thread] = None
+        self._stats = {"trips": 0, "rejected": 0, "probes": 0, "probe_failures": 0}
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        """True nếu được phép gọi CSDL; mạch mở/đang thử thì từ chối ngay (chỉ luồng probe được gọi)."""
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Gọi fn() qua mạch: bị từ chối thì ném CircuitOpenError, thất bại/thành công được ghi nhận."""
+        if not self.allow():
+            raise CircuitOpenError(self.status_message())
+        try:
+            result = fn()
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def record_success(self):
+        """Thao tác với CSDL thành công: đặt lại bộ đếm lỗi liên tiếp."""
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        """Ghi nhận 1 lần thất bại kết nối; đủ ngưỡng thì mở mạch và bắt đầu thử lại ở luồng nền."""
+        with self._lock:
+            self._failures += 1
+            if error is not None:
+                self._last_error = str(error)
+            if self._state != STATE_CLOSED or self._failures < self.failure_threshold:
+                return
+            self._state = STATE_OPEN
+            self._opened_at = datetime.now()
+            self._next_probe_at = time.monotonic() + self.probe_interval
+            self._stats["trips"] += 1
+            self._stop_event.clear()
+            self._probe_thread = threading.Thread(target=self._probe_loop, name=f"{self.name}-probe", daemon=True)
+            self._probe_thread.start()
+
+        logger.error(f"Mở mạch {self.name} sau {self.failure_threshold} lần kết nối thất bại liên tiếp: {self._last_error}")
+
+    def _probe_loop(self):
+        """Luồng nền: thử kết nối (half-open) theo chu kỳ tăng dần cho tới khi thành công hoặc bị dừng."""
+        interval = self.probe_interval
+        while not self._stop_event.wait(interval):
+            with self._lock:
+                self._state = STATE_HALF_OPEN
+                self._stats["probes"] += 1
+            try:
+                self.probe()
+            except Exception as e:
+                interval = min(self.max_probe_interval, interval * 2) * random.uniform(0.8, 1.2)
+                with self._lock:
+                    self._state = STATE_OPEN
+                    self._last_error = str(e)
+                    self._next_probe_at = time.monotonic() + interval
+                    self._stats["probe_failures"] += 1
+                logger.debug(f"Thử kết nối lại {self.name} thất bại, lần sau sau {interval:.1f}s: {e}")
+                continue
+
+            with self._lock:
+                self._state = STATE_CLOSED
+                self._failures = 0
+                self._opened_at = None
+                self._next_probe_at = None
+            logger.info(f"CSDL {self.name} đã hoạt động trở lại, đóng mạch.")
+            return
+
+    def status(self) -> Dict[str, Any]:
+        """Trạng thái hiện tại của mạch (hiển thị trên giao diện/thống kê)."""
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "opened_at": self._opened_at.isoformat(timespec="seconds") if self._opened_at else None,
+                "next_probe_in": (round(max(0.0, self._next_probe_at - time.monotonic()), 1)
+                                  if self._next_probe_at is not None else None),
+                "last_error": self._last_error,
+            })
+        return data
+
+    def status_message(self) -> str:
+        """Thông báo ngắn gọn cho người dùng khi mạch đang mở."""
+        status = self.status()
+        if status["state"] == STATE_CLOSED:
+            return "Kết nối CSDL bình thường."
+        retry_in = status["next_probe_in"]
+        retry_text = f", tự động thử lại sau khoảng {retry_in:.0f}s" if retry_in is not None else ""
+        return f"CSDL tạm thời không khả dụng (mất kết nối từ {status['opened_at']}{retry_text})."
+
+    def close(self):
+        """Dừng luồng thử kết nối lại (nếu đang chạy)."""
+        self._stop_event.set()
+
+
+_registry_lock = threading.Lock()
+_registry: Dict[Hashable, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(key: Hashable, name: str, probe: Callable[[], Any], **kwargs) -> CircuitBreaker:
+    """
+    Lấy circuit breaker dùng chung theo khóa (VD: chuỗi kết nối).
+    Lần đầu gọi sẽ tạo mới với name/probe/kwargs; các lần sau trả về đối tượng đã có.
+    """
+    with _registry_lock:
+        breaker = _registry.get(key)
+        if breaker is None:
+            breaker = _registry[key] = CircuitBreaker(name, probe, **kwargs)
+        return breaker
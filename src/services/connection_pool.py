@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Connection pool dùng chung cho My_Database
+- Giới hạn số kết nối tối thiểu/tối đa, mượn (acquire) có timeout, trả (release) về pool thay vì đóng.
+- Kiểm tra nhanh kết nối khi mượn: chỉ chạy câu lệnh kiểm tra nếu kết nối đã nằm im quá lâu.
+- Luồng nền đóng bớt các kết nối nhàn rỗi quá hạn (vẫn giữ tối thiểu min_size).
+- Bộ đếm hit/miss/thời gian chờ để theo dõi hiệu năng.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE nhóm 08 là lỗi kết nối (mất kết nối, không mở được kết nối...)
+_CONNECTION_ERROR_SQLSTATE_PREFIX = "08"
+
+
+class PoolTimeoutError(Exception):
+    """Hết thời gian chờ mượn kết nối từ pool (pool đã dùng hết max_size)."""
+
+
+class PoolClosedError(Exception):
+    """Pool đã đóng, không thể mượn thêm kết nối."""
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """
+    Kiểm tra lỗi có phải do kết nối bị hỏng hay không (SQLSTATE 08xxx).
+    pyodbc.Error lưu SQLSTATE ở args[0].
+    """
+    args = getattr(exc, "args", None) or ()
+    return bool(args) and isinstance(args[0], str) and args[0].startswith(_CONNECTION_ERROR_SQLSTATE_PREFIX)
+
+
+class PooledConnection:
+    """
+    Lớp bọc kết nối được mượn từ pool.
+    - close() KHÔNG đóng kết nối thật mà trả nó về pool, nhờ vậy code cũ (conn.close() trong finally) vẫn dùng được.
+    - rollback() không ném lỗi ra ngoài: nếu rollback thất bại thì kết nối bị đánh dấu hỏng và bị loại khỏi pool.
+    - Các thuộc tính khác được chuyển tiếp tới kết nối thật (cursor, commit, autocommit, ...).
+    """
+
+    def __init__(self, pool: "ConnectionPool", raw_connection: Any):
+        self._pool = pool
+        self._raw = raw_connection
+        self._broken = False
+        self._released = False
+
+    @property
+    def raw(self) -> Any:
+        """Kết nối pyodbc thật bên dưới."""
+        return self._raw
+
+    def cursor(self):
+        return self._raw.cursor()
+
+    def commit(self):
+        return self._raw.commit()
+
+    def rollback(self):
+        try:
+            self._raw.rollback()
+        except Exception as e:
+            logger.warning(f"Rollback thất bại, loại bỏ kết nối khỏi pool: {e}")
+            self._broken = True
+
+    def invalidate(self):
+        """Đánh dấu kết nối hỏng để pool đóng hẳn thay vì tái sử dụng."""
+        self._broken = True
+
+    def discard_if_broken(self, exc: BaseException):
+        """Đánh dấu hỏng nếu lỗi xảy ra là lỗi kết nối."""
+        if is_connection_error(exc):
+            self._broken = True
+
+    def close(self):
+        """Trả kết nối về pool (gọi nhiều lần không sao)."""
+        if self._released:
+            return
+        self._released = True
+        self._pool.release(self._raw, broken=self._broken)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.discard_if_broken(exc)
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool kết nối có giới hạn, an toàn đa luồng.
+
+    :param factory: hàm tạo kết nối thật mới (VD: lambda: pyodbc.connect(conn_str)).
+    :param min_size: số kết nối tối thiểu được giữ lại (không bị đóng do nhàn rỗi).
+    :param max_size: số kết nối tối đa (đang mượn + nhàn rỗi).
+    :param borrow_timeout: số giây tối đa chờ mượn khi pool đã đầy.
+    :param idle_timeout: kết nối nhàn rỗi quá số giây này sẽ bị đóng bởi luồng dọn dẹp.
+    :param validate_after: kết nối nằm im quá số giây này sẽ được kiểm tra bằng validation_query khi mượn.
+    :param evict_interval: chu kỳ (giây) luồng dọn dẹp chạy.
+    :param on_discard: hàm được gọi với kết nối thật ngay trước khi nó bị đóng hẳn (VD: dọn cursor đã cache).
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        borrow_timeout: float = 10.0,
+        idle_timeout: float = 300.0,
+        validate_after: float = 30.0,
+        evict_interval: float = 60.0,
+        validation_query: str = "SELECT 1",
+        name: str = "pool",
+        on_discard: Optional[Callable[[Any], None]] = None,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size phải >= 1")
+        if min_size < 0 or min_size > max_size:
+            raise ValueError("min_size phải nằm trong khoảng [0, max_size]")
+
+        self.name = name
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.borrow_timeout = borrow_timeout
+        self.idle_timeout = idle_timeout
+        self.validate_after = validate_after
+        self.evict_interval = evict_interval
+        self.validation_query = validation_query
+        self.on_discard = on_discard
+
+        # Danh sách kết nối nhàn rỗi: (kết nối, thời điểm trả về theo monotonic)
+        # Lấy ra ở bên phải (LIFO) để kết nối "nóng" được dùng lại, kết nối "nguội" dồn về bên trái và bị dọn.
+        self._idle = deque()
+        self._size = 0                # tổng số kết nối đang mở (đang mượn + nhàn rỗi + đang tạo)
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        # Bộ đếm thống kê
+        self._stats = {
+            "hits": 0,                 # mượn được kết nối có sẵn
+            "misses": 0,               # phải tạo kết nối mới
+            "waits": 0,                # số lần phải chờ vì pool đầy
+            "wait_time_total": 0.0,    # tổng thời gian chờ (giây)
+            "wait_time_max": 0.0,      # thời gian chờ lâu nhất (giây)
+            "timeouts": 0,             # số lần hết thời gian chờ
+            "created": 0,              # số kết nối thật đã tạo
+            "closed": 0,               # số kết nối thật đã đóng
+            "evicted": 0,              # số kết nối bị đóng do nhàn rỗi quá lâu
+            "validation_failures": 0,  # số kết nối hỏng phát hiện khi mượn
+            "connect_errors": 0,       # số lần tạo kết nối thất bại
+        }
+
+        # Luồng dọn dẹp kết nối nhàn rỗi (daemon để không giữ tiến trình khi thoát)
+        self._stop_event = threading.Event()
+        self._evictor = threading.Thread(target=self._evict_loop, name=f"{name}-evictor", daemon=True)
+        self._evictor.start()
+
+    # ------------------------------------------------------------------
+    # Mượn / trả kết nối
+    # ------------------------------------------------------------------
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """
+        Mượn 1 kết nối.
+        - Ưu tiên kết nối nhàn rỗi (hit), nếu chưa đạt max_size thì tạo mới (miss), nếu đầy thì chờ.
+        - Ném PoolTimeoutError nếu chờ quá timeout (mặc định borrow_timeout).
+        """
+        timeout = self.borrow_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        wait_started = None
+
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosedError(f"Pool {self.name} đã đóng.")
+                    if self._idle:
+                        raw, returned_at = self._idle.pop()
+                        create_new = False
+                        break
+                    if self._size < self.max_size:
+                        # Giữ chỗ trước rồi mới tạo kết nối bên ngoài lock
+                        self._size += 1
+                        raw, returned_at = None, None
+                        create_new = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        self._record_wait(wait_started)
+                        raise PoolTimeoutError(
+                            f"Hết thời gian chờ ({timeout:.1f}s) mượn kết nối từ pool {self.name} "
+                            f"(tối đa {self.max_size} kết nối)."
+                        )
+                    if wait_started is None:
+                        wait_started = time.monotonic()
+                        self._stats["waits"] += 1
+                    self._cond.wait(remaining)
+                self._record_wait(wait_started)
+                wait_started = None
+
+            if create_new:
+                raw = self._create()
+                with self._cond:
+                    self._stats["misses"] += 1
+                return PooledConnection(self, raw)
+
+            # Kết nối lấy từ danh sách nhàn rỗi: kiểm tra trước khi giao
+            if self._validate(raw, time.monotonic() - returned_at):
+                with self._cond:
+                    self._stats["hits"] += 1
+                return PooledConnection(self, raw)
+
+            with self._cond:
+                self._stats["validation_failures"] += 1
+            self._discard(raw)
+            # Thử lại vòng lặp: lấy kết nối khác hoặc tạo mới
+
+    def release(self, raw: Any, broken: bool = False):
+        """Trả kết nối thật về pool. Kết nối hỏng hoặc pool đã đóng thì đóng hẳn."""
+        if not broken:
+            try:
+                # Đảm bảo không còn transaction dở dang trước khi cho người khác mượn
+                raw.rollback()
+            except Exception as e:
+                logger.debug(f"Rollback khi trả kết nối thất bại: {e}")
+                broken = True
+
+        with self._cond:
+            if not broken and not self._closed:
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+                return
+
+        self._discard(raw)
+
+    # ------------------------------------------------------------------
+    # Nội bộ
+    # ------------------------------------------------------------------
+    def _record_wait(self, wait_started: Optional[float]):
+        """Cộng dồn thời gian chờ (gọi khi đang giữ lock)."""
+        if wait_started is None:
+            return
+        waited = time.monotonic() - wait_started
+        self._stats["wait_time_total"] += waited
+        if waited > self._stats["wait_time_max"]:
+            self._stats["wait_time_max"] = waited
+
+    def _create(self) -> Any:
+        """Tạo kết nối thật; nếu lỗi thì trả lại chỗ đã giữ trong pool."""
+        try:
+            raw = self._factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._stats["connect_errors"] += 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return raw
+
+    def _discard(self, raw: Any, evicted: bool = False):
+        """Đóng hẳn kết nối thật và giải phóng 1 chỗ trong pool."""
+        if self.on_discard is not None:
+            try:
+                self.on_discard(raw)
+            except Exception as e:
+                logger.debug(f"Hook on_discard của pool {self.name} bị lỗi: {e}")
+        try:
+            raw.close()
+        except Exception as e:
+            logger.debug(f"Đóng kết nối thất bại: {e}")
+        with self._cond:
+            self._size -= 1
+            self._stats["closed"] += 1
+            if evicted:
+                self._stats["evicted"] += 1
+            self._cond.notify()
+
+    def _validate(self, raw: Any, idle_for: float) -> bool:
+        """
+        Kiểm tra kết nối trước khi giao cho người mượn.
+        - Kết nối vừa được trả gần đây: chỉ kiểm tra cờ closed (gần như không tốn chi phí).
+        - Kết nối nằm im lâu: chạy validation_query để chắc chắn server còn giữ phiên.
+        """
+        if getattr(raw, "closed", False):
+            return False
+        if idle_for < self.validate_after or not self.validation_query:
+            return True
+        try:
+            cursor = raw.cursor()
+            try:
+                cursor.execute(self.validation_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Kết nối trong pool {self.name} không còn dùng được: {e}")
+            return False
+
+    def _evict_loop(self):
+        """Luồng nền: làm ấm pool tới min_size rồi định kỳ đóng các kết nối nhàn rỗi quá hạn."""
+        self._warm_up()
+        while not self._stop_event.wait(self.evict_interval):
+            self.evict_idle()
+
+    def _warm_up(self):
+        """Mở sẵn min_size kết nối (chạy ở luồng nền để không chặn giao diện)."""
+        while not self._stop_event.is_set():
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                raw = self._create()
+            except Exception as e:
+                logger.warning(f"Không thể làm ấm pool {self.name}: {e}")
+                return
+            self.release(raw)
+
+    def evict_idle(self) -> int:
+        """Đóng các kết nối nhàn rỗi quá idle_timeout (giữ lại tối thiểu min_size). Trả về số kết nối đã đóng."""
+        now = time.monotonic()
+        victims = []
+        with self._cond:
+            # Kết nối cũ nhất nằm bên trái deque
+            while self._idle and (self._size - len(victims)) > self.min_size:
+                raw, returned_at = self._idle[0]
+                if now - returned_at < self.idle_timeout:
+                    break
+                self._idle.popleft()
+                victims.append(raw)
+
+        for raw in victims:
+            self._discard(raw, evicted=True)
+        if victims:
+            logger.debug(f"Pool {self.name}: đã đóng {len(victims)} kết nối nhàn rỗi.")
+        return len(victims)
+
+    # ------------------------------------------------------------------
+    # Thống kê / đóng pool
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        """Trả về bản sao các bộ đếm và trạng thái hiện tại của pool."""
+        with self._cond:
+            data = dict(self._stats)
+            data["size"] = self._size
+            data["idle"] = len(self._idle)
+            data["in_use"] = self._size - len(self._idle)
+            data["min_size"] = self.min_size
+            data["max_size"] = self.max_size
+        borrows = data["hits"] + data["misses"]
+        data["hit_ratio"] = round(data["hits"] / borrows, 4) if borrows else 0.0
+        data["wait_time_avg"] = round(data["wait_time_total"] / data["waits"], 6) if data["waits"] else 0.0
+        return data
+
+    def close(self):
+        """Đóng pool: dừng luồng dọn dẹp và đóng toàn bộ kết nối nhàn rỗi (kết nối đang mượn sẽ đóng khi được trả)."""
+        self._stop_event.set()
+        with self._cond:
+            self._closed = True
+            victims = [raw for raw, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for raw in victims:
+            self._discard(raw)
@@ -1,8 +1,14 @@
-import pyodbc
 import logging
 import re
 import hashlib
 import secrets
+import sqlite3
+import time
+
+try:
+    import pyodbc
+except ImportError:  # Máy không cài ODBC (VD: chạy backend SQLite để benchmark trên Linux)
+    pyodbc = None
 
 
 # Mở comment 3 dòng bên dưới mỗi khi test (Chạy trực tiếp hàm if __main__)
@@ -10,17 +16,72 @@ import os,sys
 PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(PROJECT_DIR)
 
-from services.hash import Hash
+from services.kdf_executor import KDFBusyError, get_kdf_executor
+from services.connection_pool import ConnectionPool, PoolTimeoutError, is_connection_error
+from services.circuit_breaker import STATE_CLOSED, get_circuit_breaker, retry_with_backoff
+from services.cache import TTLCache
+from services.statement_cache import StatementCache
+from services.db_metrics import DB_METRICS
 from utils.constants import *
 
-pyodbc.pooling = True  # Enable connection pooling for better performance
+if pyodbc is not None:
+    pyodbc.pooling = True  # Enable connection pooling for better performance
 logger = logging.getLogger(__name__)
 
+# Các lỗi CSDL được bắt riêng (lỗi của driver SQL Server và của backend SQLite)
+DB_ERRORS = (pyodbc.Error, sqlite3.Error) if pyodbc is not None else (sqlite3.Error,)
+
+# Backend CSDL: "sqlserver" (mặc định) hoặc "sqlite" (CSDL cục bộ để chạy thử/benchmark, không cần SQL Server)
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlserver")
+
+# Cache đọc cho các truy vấn tra cứu người dùng (dùng chung cho mọi đối tượng My_Database trong tiến trình)
+USER_CACHE_TTL = 30            # Thời gian sống của 1 mục (giây)
+USER_CACHE_MAX_SIZE = 1024     # Số mục tối đa
+_user_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL)
+
+# Số dòng lấy mỗi lần khi đọc kết quả theo luồng (fetchmany)
+QUERY_CHUNK_SIZE = 500
+
+# Stored procedure tương ứng từng nhà cung cấp đăng nhập ngoài (dùng trong social_login)
+SOCIAL_LOGIN_PROVIDERS = {
+    "google": {
+        "lookup": "EXEC usp_GetUserByGoogle @GoogleId = @ProviderUserId, @Email = @Email;",
+        "create": "EXEC usp_CreateUserIfNotExists_Google @UserName = @UserName, @Email = @Email;",
+    },
+    "facebook": {
+        "lookup": "EXEC usp_GetUserByFacebook @FacebookId = @ProviderUserId, @Email = @Email;",
+        "create": "EXEC usp_CreateUserIfNotExists_External @UserName = @UserName, @Email = @Email;",
+    },
+}
+
+# Circuit breaker: số lần kết nối thất bại liên tiếp để coi CSDL là ngừng hoạt động và chu kỳ thử kết nối lại (giây)
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_PROBE_INTERVAL = 2.0
+CIRCUIT_MAX_PROBE_INTERVAL = 30.0
+# Login timeout (giây) cho kết nối thử ở luồng nền
+CIRCUIT_PROBE_LOGIN_TIMEOUT = 5
+# Số lần thử lại truy vấn đọc / mở kết nối khi gặp lỗi tạm thời (deadlock, mất kết nối giữa chừng...)
+TRANSIENT_RETRIES = 2
+
+# Câu lệnh xác thực được gọi nhiều nhất: giữ cursor đã prepare trên từng kết nối để dùng lại
+SQL_GET_USER_BY_SESSION = "EXEC usp_GetUserBySession @TokenHash = ?"
+SQL_GET_LOGIN_INFO = "SELECT PasswordHash, PasswordSalt, IsActive, ActivatedAt, Privilege FROM Users WHERE Email = ?"
+SQL_GET_USERNAME = "SELECT User_Name FROM Users WHERE Email = ?"
+HOT_STATEMENTS = (SQL_GET_USER_BY_SESSION, SQL_GET_LOGIN_INFO, SQL_GET_USERNAME)
+
+# Phân trang danh sách người dùng
+USER_PAGE_SIZE = 200
+# Các cột được phép sắp xếp (whitelist, không đưa trực tiếp chuỗi người dùng nhập vào câu SQL)
+USER_SORT_COLUMNS = ("Email", "User_Name", "Privilege")
+
 
 def get_odbc_drivers_for_sql_server():
     """
     Lấy danh sách các ODBC Driver đã cài trên máy tính
     """
+    if pyodbc is None:
+        return []
+
     # Lấy danh sách tất cả các ODBC drivers cài đặt trên hệ thống
     drivers = pyodbc.drivers()
 
@@ -34,12 +95,20 @@ def get_odbc_drivers_for_sql_server():
 
 class My_Database:
     # def __init__(self, server_name="10.239.1.162", database_name="DB_QLNS_HR_APP", user_name="quannd", password="quannd"):
-    def __init__(self, server_name="localhost", database_name="DucQuanApp", user_name="ducquan_user", password="123456789"):
+    def __init__(self, server_name="localhost", database_name="DucQuanApp", user_name="ducquan_user", password="123456789",
+                 pool_min_size=1, pool_max_size=10, pool_timeout=10.0, pool_idle_timeout=300.0):
         """
         Khởi tạo đối tượng kết nối đến cơ sở dữ liệu với chuỗi kết nối.
+        - Các kết nối được quản lý bởi ConnectionPool: mượn khi cần, trả về pool sau khi dùng.
         """
         # Tải danh sách ODBC Driver cho SQL Server
         self.database_name = database_name
+        self.pool = None
+        self.breaker = None
+        # Cursor đã prepare cho các câu lệnh nóng, theo từng kết nối của pool
+        self.statements = StatementCache(HOT_STATEMENTS)
+        # Số liệu đo đạc truy vấn (dùng chung toàn tiến trình)
+        self.metrics = DB_METRICS
         odbc_drivers = get_odbc_drivers_for_sql_server()
         if odbc_drivers is None or not odbc_drivers:
             logger.error("Không phát hiện driver ODBC để kết nối tới CSDL")
@@ -54,16 +123,168 @@ class My_Database:
             "TrustServerCertificate=yes;"
         )
 
+        # Circuit breaker dùng chung theo chuỗi kết nối: CSDL ngừng hoạt động thì mọi cửa sổ cùng báo lỗi ngay
+        self.breaker = get_circuit_breaker(
+            self.connection_string,
+            name=f"db-{database_name}",
+            probe=self._probe_connection,
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            probe_interval=CIRCUIT_PROBE_INTERVAL,
+            max_probe_interval=CIRCUIT_MAX_PROBE_INTERVAL,
+        )
+
+        # Pool kết nối dùng chung cho mọi truy vấn của đối tượng này
+        # Kết nối mới được mở qua circuit breaker (thử lại nếu lỗi tạm thời)
+        self.pool = ConnectionPool(
+            factory=lambda: self.breaker.call(
+                lambda: retry_with_backoff(lambda: pyodbc.connect(self.connection_string), retries=TRANSIENT_RETRIES)
+            ),
+            min_size=pool_min_size,
+            max_size=pool_max_size,
+            borrow_timeout=pool_timeout,
+            idle_timeout=pool_idle_timeout,
+            name=f"db-{database_name}",
+            on_discard=self.statements.discard_connection,
+        )
+
     def _connect(self):
-        """Hàm kết nối đến DB với connection pooling."""
+        """
+        Mượn 1 kết nối từ pool.
+        Kết nối trả về có close() để trả lại pool, nên cách dùng conn.close() trong finally vẫn giữ nguyên.
+        """
+        if self.pool is None:
+            logger.error("Chưa khởi tạo pool kết nối (thiếu ODBC Driver).")
+            return None
+        # CSDL đang ngừng hoạt động -> từ chối ngay, không chờ login timeout
+        if not self.breaker.allow():
+            logger.warning(self.breaker.status_message())
+            return None
+        started = time.perf_counter()
         try:
-            conn = pyodbc.connect(self.connection_string)
-            logger.debug("Kết nối đến cơ sở dữ liệu thành công.")
+            conn = self.pool.acquire()
+            self.metrics.record_acquire(time.perf_counter() - started)
+            logger.debug("Mượn kết nối từ pool thành công.")
             return conn
+        except PoolTimeoutError as e:
+            self.metrics.record_acquire(time.perf_counter() - started, e)
+            logger.error(f"Pool kết nối đang quá tải: {e}")
+            return None
         except Exception as e:
+            self.metrics.record_acquire(time.perf_counter() - started, e)
             logger.error(f"Không thể kết nối đến cơ sở dữ liệu: {e}")
             return None
 
+    def _probe_connection(self):
+        """
+        Thử mở 1 kết nối mới (chạy ở luồng nền của circuit breaker khi CSDL đang ngừng hoạt động).
+        """
+        conn = pyodbc.connect(self.connection_string, timeout=CIRCUIT_PROBE_LOGIN_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+    def _discard_if_broken(self, conn, error):
+        """
+        Lỗi do mất kết nối: loại kết nối khỏi pool và báo cho circuit breaker.
+        """
+        conn.discard_if_broken(error)
+        if self.breaker is not None and is_connection_error(error):
+            self.breaker.record_failure(error)
+
+    def connection_unavailable_message(self):
+        """
+        Thông báo khi không mượn được kết nối: phân biệt CSDL đang ngừng hoạt động (mạch mở) với lỗi kết nối thông thường.
+        """
+        if self.breaker is not None and self.breaker.state != STATE_CLOSED:
+            return self.breaker.status_message()
+        return "Không thể kết nối tới CSDL."
+
+    def get_connection_status(self):
+        """
+        Trạng thái circuit breaker: closed (bình thường), open (CSDL ngừng hoạt động), half_open (đang thử lại).
+        """
+        if self.breaker is None:
+            return {}
+        return self.breaker.status()
+
+    def _timed_execute(self, cursor, query, params=None, statement=None):
+        """
+        cursor.execute có đo thời gian: ghi nhận độ trễ, số dòng bị tác động và lỗi vào self.metrics.
+        statement: tên hiển thị trong thống kê (mặc định chuẩn hóa từ câu lệnh).
+        """
+        with self.metrics.track(query, params, statement) as tracker:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            tracker.rows = cursor.rowcount
+        return cursor
+
+    def get_pool_stats(self):
+        """
+        Thống kê pool kết nối: hit/miss, thời gian chờ, số kết nối đang mượn/nhàn rỗi.
+        """
+        if self.pool is None:
+            return {}
+        return self.pool.stats()
+
+    def get_metrics_snapshot(self):
+        """
+        Số liệu đo đạc truy vấn (độ trễ theo câu lệnh, thời gian mượn kết nối, lỗi) kèm thống kê pool và cache.
+        """
+        snapshot = self.metrics.snapshot()
+        snapshot["pool"] = self.get_pool_stats()
+        snapshot["cache"] = self.get_cache_stats()
+        snapshot["circuit"] = self.get_connection_status()
+        snapshot["statements_cache"] = self.get_statement_cache_stats()
+        snapshot["kdf"] = get_kdf_executor().stats()
+        return snapshot
+
+    def close(self):
+        """
+        Đóng pool và toàn bộ kết nối nhàn rỗi (gọi khi thoát ứng dụng).
+        """
+        if self.pool is not None:
+            self.pool.close()
+
+    # ---------------- Cache tra cứu người dùng ----------------
+
+    def _email_tag(self, email):
+        """
+        Tag cache theo email (không phân biệt hoa thường) để xóa mọi mục liên quan 1 người dùng.
+        """
+        return (self.database_name, "email", (email or "").strip().lower())
+
+    def _cached_query(self, kind, email, query, params):
+        """
+        Truy vấn đọc có cache: có trong cache thì trả luôn, không thì truy vấn CSDL và lưu lại kết quả thành công.
+        """
+        key = (self.database_name, kind, (email or "").strip().lower())
+        cached = _user_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+
+        result = self._execute_query(query, params)
+        if result["success"]:
+            _user_cache.set(key, result, tags=(self._email_tag(email),))
+        return dict(result)
+
+    def invalidate_user_cache(self, email):
+        """
+        Xóa các mục cache của 1 người dùng (gọi sau khi dữ liệu người dùng thay đổi).
+        """
+        _user_cache.invalidate_tag(self._email_tag(email))
+
+    def get_cache_stats(self):
+        """
+        Thống kê cache tra cứu người dùng: hit/miss, số mục, tỉ lệ hit.
+        """
+        return _user_cache.stats()
+
     def _check_connection(self):
         """Kiểm tra kết nối đến DB trước khi thực hiện các truy vấn hoặc cập nhật."""
         conn = self._connect()
@@ -75,7 +296,11 @@ class My_Database:
 
     def _execute_query(self, query, params=None):
         """
-        Thực thi câu lệnh SELECT với kiểm soát lỗi, bảo mật và kết quả rõ ràng.
+        Thực thi câu lệnh trả về dòng dữ liệu (SELECT hoặc SP) với kiểm soát lỗi, bảo mật và kết quả rõ ràng.
+        - Lỗi tạm thời (deadlock, kết nối cũ bị đứt...) được thử lại với backoff, nên câu lệnh đi qua hàm này
+          phải chạy lại được nhiều lần mà không đổi kết quả: SELECT, hoặc SP ghi dạng "nếu chưa có thì tạo"
+          (usp_CreateUserIfNotExists_*, usp_LinkExternalLoginIfNotExists) - lần chạy lại chỉ trả về bản ghi đã tạo.
+        - Câu lệnh ghi không lặp lại an toàn (INSERT/UPDATE thường, tăng bộ đếm...) không được dùng hàm này.
         """
         response = {
             "success": False,
@@ -83,37 +308,88 @@ class My_Database:
             "data": None
         }
 
+        try:
+            rows = retry_with_backoff(lambda: self._fetch_all(query, params), retries=TRANSIENT_RETRIES)
+
+            # Trả kết quả vào json
+            response["data"] = rows if rows else []
+            response["success"] = True
+            response["message"] = "Truy vấn thành công." if rows else "Không có dữ liệu trả về."
+
+        except ConnectionError as e:
+            response["message"] = str(e)
+
+        except Exception as e:
+            response["message"] = f"Lỗi truy vấn cơ sở dữ liệu: {str(e)}."
+
+        # Trả về kết quả cuối cùng
+        return response
+
+    def _fetch_all(self, query, params=None):
+        """
+        Mượn kết nối, thực thi câu lệnh SELECT và trả về toàn bộ dòng (ném lỗi nếu thất bại).
+        """
         conn = self._connect()
-        if conn:
-            try:
-                with conn.cursor() as cursor:
-                    # Sử dụng parameterized query để tránh SQL Injection
-                    if params:
-                        cursor.execute(query, params)
-                    else:
-                        cursor.execute(query)
+        if conn is None:
+            raise ConnectionError(self.connection_unavailable_message())
 
-                    # Lấy tất cả kết quả trả về
-                    rows = cursor.fetchall()
+        # Câu lệnh nóng: dùng lại cursor đã prepare của kết nối này
+        if self.statements.is_hot(query):
+            return self._fetch_all_prepared(conn, query, params)
 
-                    # Trả kết quả vào json
-                    response["data"] = rows if rows else []
-                    response["success"] = True
-                    response["message"] = "Truy vấn thành công." if rows else "Không có dữ liệu trả về."
+        try:
+            with conn.cursor() as cursor, self.metrics.track(query, params) as tracker:
+                # Sử dụng parameterized query để tránh SQL Injection
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
 
-            except pyodbc.Error as e:
-                response["message"] = f"Lỗi truy vấn cơ sở dữ liệu: {str(e)}."
+                # Lấy tất cả kết quả trả về
+                rows = cursor.fetchall()
+                tracker.rows = len(rows)
+                return rows
 
-            except Exception as e:
-                response["message"] = f"Lỗi truy vấn cơ sở dữ liệu: {str(e)}."
+        except DB_ERRORS as e:
+            self._discard_if_broken(conn, e)
+            raise
 
-            finally:
-                conn.close()
-        else:
-            response["message"] = "Không thể kết nối tới CSDL."
+        finally:
+            conn.close()
 
-        # Trả về kết quả cuối cùng
-        return response
+    def _fetch_all_prepared(self, conn, query, params=None):
+        """
+        Giống _fetch_all nhưng dùng cursor được giữ lại trên kết nối cho câu lệnh đã đăng ký.
+        pyodbc bỏ qua bước prepare khi cursor thực thi lại đúng câu lệnh SQL trước đó, chỉ gửi tham số mới.
+        """
+        try:
+            # Tạo cursor nằm trong try: nếu raw.cursor() lỗi (kết nối đã chết) kết nối vẫn được trả/loại khỏi pool
+            cursor, _ = self.statements.cursor_for(conn.raw, query)
+            with self.metrics.track(query, params) as tracker:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                rows = cursor.fetchall()
+                tracker.rows = len(rows)
+            # Kết thúc transaction đọc ngay (cursor không dùng with nên không tự commit)
+            conn.commit()
+            return rows
+
+        except DB_ERRORS as e:
+            # Cursor có thể ở trạng thái lỗi -> bỏ để lần sau prepare lại
+            self.statements.discard_cursor(conn.raw, query)
+            self._discard_if_broken(conn, e)
+            raise
+
+        finally:
+            conn.close()
+
+    def get_statement_cache_stats(self):
+        """
+        Thống kê cursor đã prepare: số lần prepare/dùng lại và tỉ lệ dùng lại.
+        """
+        return self.statements.stats()
     
     def _execute_non_query(self, query, params=None):
         """
@@ -128,24 +404,96 @@ class My_Database:
         if conn:
             try:
                 with conn.cursor() as cursor:                  # Tạo cursor
-                    if params:
-                        cursor.execute(query, params)          # Thực thi có tham số
-                    else:
-                        cursor.execute(query)                  # Thực thi không tham số
+                    self._timed_execute(cursor, query, params) # Thực thi (có đo thời gian)
 
                     conn.commit()                              # Ghi thay đổi
 
                 response["success"] = True                     # Đánh dấu thành công
                 response["message"] = "Thực thi thành công."
             except Exception as e:
+                self._discard_if_broken(conn, e)               # Loại kết nối hỏng khỏi pool
                 response["message"] = f"Lỗi non-query: {str(e)}."
             finally:
-                conn.close()                                   # Luôn đóng kết nối
+                conn.close()                                   # Luôn trả kết nối về pool
         else:
-            response["message"] = "Không thể kết nối tới CSDL."
+            response["message"] = self.connection_unavailable_message()
 
         return response
     
+    def iter_query_chunks(self, query, params=None, chunk_size=QUERY_CHUNK_SIZE):
+        """
+        Đọc kết quả SELECT theo từng khối bằng fetchmany thay vì fetchall.
+        - Là generator: mỗi lần trả về (danh sách tên cột, danh sách tối đa chunk_size dòng).
+        - Bộ nhớ chỉ giữ 1 khối tại 1 thời điểm, kết nối được giữ tới khi đọc hết hoặc generator bị đóng.
+        - Lỗi kết nối/truy vấn được ném ra dưới dạng exception (ConnectionError, DB_ERRORS).
+        """
+        conn = self._connect()
+        if conn is None:
+            raise ConnectionError(self.connection_unavailable_message())
+
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.arraysize = chunk_size
+                self._timed_execute(cursor, query, params)
+
+                columns = [column[0] for column in cursor.description] if cursor.description else []
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield columns, rows
+            finally:
+                cursor.close()
+        except DB_ERRORS as e:
+            self._discard_if_broken(conn, e)
+            raise
+        finally:
+            conn.close()
+
+    def iter_query(self, query, params=None, chunk_size=QUERY_CHUNK_SIZE):
+        """
+        Giống iter_query_chunks nhưng chỉ trả về danh sách dòng của từng khối.
+        """
+        for _, rows in self.iter_query_chunks(query, params, chunk_size):
+            yield rows
+
+    def iter_query_columns(self, query, params=None, chunk_size=QUERY_CHUNK_SIZE, output="numpy"):
+        """
+        Đọc kết quả theo khối ở dạng cột (dành cho thống kê/phân tích).
+        - output="numpy": mỗi khối là dict {tên cột: numpy.ndarray}
+        - output="pandas": mỗi khối là 1 pandas.DataFrame
+        """
+        if output not in ("numpy", "pandas"):
+            raise ValueError("output chỉ nhận 'numpy' hoặc 'pandas'")
+
+        # Chỉ import khi cần để không làm chậm khởi động giao diện
+        if output == "pandas":
+            import pandas as pd
+        else:
+            import numpy as np
+
+        for columns, rows in self.iter_query_chunks(query, params, chunk_size):
+            if output == "pandas":
+                yield pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns)
+            else:
+                yield {name: np.array([row[index] for row in rows]) for index, name in enumerate(columns)}
+
+    def query_columns(self, query, params=None, chunk_size=QUERY_CHUNK_SIZE, output="pandas"):
+        """
+        Đọc toàn bộ kết quả ở dạng cột (ghép các khối của iter_query_columns).
+        Trả về pandas.DataFrame hoặc dict {tên cột: numpy.ndarray}.
+        """
+        chunks = list(self.iter_query_columns(query, params, chunk_size, output))
+        if output == "pandas":
+            import pandas as pd
+            return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+        import numpy as np
+        if not chunks:
+            return {}
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
     # ---------------- Google / Facebook lookup ----------------
 
     def get_user_by_google(self, google_id: str | None, email: str | None):
@@ -176,7 +524,9 @@ class My_Database:
         """
         query = "EXEC usp_CreateUserIfNotExists_Google @UserName = ?, @Email = ?"
         params = (user_name, email)
-        return self._execute_query(query, params)
+        result = self._execute_query(query, params)
+        self.invalidate_user_cache(email)
+        return result
 
     def link_google_login_if_not_exists(self, user_email: str, google_id: str, provider_email: str):
         """
@@ -192,6 +542,120 @@ class My_Database:
         params = (user_email, "google", google_id, provider_email)
         return self._execute_query(query, params)
 
+    def social_login(self, provider: str, provider_user_id: str, email: str, user_name: str | None = None,
+                     remember: bool = False, days: int = 30, device_info: str | None = None):
+        """
+        Đăng nhập Google/Facebook trong 1 lần gửi lệnh (1 batch, 1 transaction) thay vì 6 lần gọi riêng lẻ:
+        - Xác định user như SP lookup: theo mapping Provider/ProviderUserId trước, không có thì theo Email
+          (email provider trả về có thể đã đổi so với lúc link, user đã link vẫn là user đó)
+        - Nếu không khớp cả hai: tạo user (SP create của provider) và link UserExternalLogin
+        - Nếu remember và user đang hoạt động: tạo session theo email của user đã xác định (lưu TokenHash)
+        - Nếu user đang hoạt động: cập nhật LastLoginAt của user đó
+        - Cuối batch: SP lookup của provider trả về dòng user (User_Name, Email, IsActive, Privilege, ...)
+        Trả về {"success", "message", "data", "token"}; token là raw token (None nếu không tạo session).
+        """
+        response = {
+            "success": False,
+            "message": "",
+            "data": [],
+            "token": None
+        }
+
+        statements = SOCIAL_LOGIN_PROVIDERS.get(provider)
+        if statements is None:
+            response["message"] = f"Không hỗ trợ đăng nhập bằng: {provider}"
+            return response
+
+        raw_token = secrets.token_urlsafe(32) if remember else None
+        token_hash = hashlib.sha256(raw_token.encode("utf-8")).hexdigest() if raw_token else None
+
+        query = f"""
+            SET NOCOUNT ON;
+            SET XACT_ABORT ON;
+
+            DECLARE @Provider NVARCHAR(50) = ?,
+                    @ProviderUserId NVARCHAR(255) = ?,
+                    @Email NVARCHAR(255) = ?,
+                    @UserName NVARCHAR(255) = ?,
+                    @TokenHash NVARCHAR(128) = ?,
+                    @Days INT = ?,
+                    @DeviceInfo NVARCHAR(255) = ?,
+                    @UserEmail NVARCHAR(255) = NULL;
+
+            -- User đã link với tài khoản provider này, nếu chưa link thì user trùng email
+            SELECT TOP 1 @UserEmail = UserEmail
+            FROM UserExternalLogin
+            WHERE Provider = @Provider AND ProviderUserId = @ProviderUserId;
+
+            IF @UserEmail IS NULL
+                SELECT TOP 1 @UserEmail = Email FROM Users WHERE Email = @Email;
+
+            -- Lần đầu đăng nhập: tạo user nội bộ và mapping provider
+            IF @UserEmail IS NULL
+            BEGIN
+                {statements["create"]}
+                EXEC usp_LinkExternalLoginIfNotExists
+                    @UserEmail = @Email,
+                    @Provider = @Provider,
+                    @ProviderUserId = @ProviderUserId,
+                    @ProviderEmail = @Email;
+                SET @UserEmail = @Email;
+            END
+
+            IF EXISTS (SELECT 1 FROM Users WHERE Email = @UserEmail AND IsActive = 1)
+            BEGIN
+                -- Remember me: lưu hash của token, raw token chỉ trả về client
+                IF @TokenHash IS NOT NULL
+                    INSERT INTO UserSessions(UserEmail, TokenHash, ExpiresAt, DeviceInfo)
+                    VALUES (@UserEmail, @TokenHash, DATEADD(DAY, @Days, SYSUTCDATETIME()), @DeviceInfo);
+
+                EXEC usp_UpdateLastLoginAt @Email = @UserEmail;
+            END
+
+            -- Kết quả cuối cùng: dòng user theo định dạng SP lookup của provider
+            {statements["lookup"]}
+        """
+        params = (provider, provider_user_id, email, user_name or email, token_hash, days, device_info)
+
+        conn = self._connect()
+        if conn:
+            try:
+                with conn.cursor() as cursor, self.metrics.track(query, params, f"BATCH social_login_{provider}") as tracker:
+                    cursor.execute(query, params)
+
+                    # Các SP bên trong có thể trả thêm result set, dòng user nằm ở result set cuối cùng
+                    rows = []
+                    while True:
+                        if cursor.description is not None:
+                            rows = cursor.fetchall()
+                        if not cursor.nextset():
+                            break
+                    tracker.rows = len(rows)
+                    conn.commit()
+
+                response["data"] = rows
+                if not rows:
+                    response["message"] = "Không lấy được dữ liệu người dùng sau khi đăng nhập."
+                else:
+                    response["success"] = True
+                    response["message"] = "Đăng nhập thành công."
+                    # Session chỉ được tạo khi user đang hoạt động
+                    response["token"] = raw_token if rows[0][2] else None
+
+            except Exception as e:
+                conn.rollback()
+                self._discard_if_broken(conn, e)
+                response["message"] = f"Lỗi đăng nhập {provider}: {e}"
+
+            finally:
+                conn.close()
+        else:
+            response["message"] = self.connection_unavailable_message()
+
+        # User có thể vừa được tạo -> xóa cache tra cứu theo email
+        self.invalidate_user_cache(email)
+        return response
+
     # ---------------- Remember me 30 days ----------------
 
     def create_session_by_email(self, email: str, days: int = 30, device_info: str | None = None):
@@ -229,9 +693,19 @@ class My_Database:
             session_token.encode("utf-8")
         ).hexdigest()
 
-        query = "EXEC usp_GetUserBySession @TokenHash = ?"
+        key = (self.database_name, "session", token_hash)
+        cached = _user_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+
+        query = SQL_GET_USER_BY_SESSION
         params = (token_hash,)
-        return self._execute_query(query, params)
+        result = self._execute_query(query, params)
+
+        # Chỉ cache session hợp lệ, gắn tag theo email (row: User_Name, Email, ...) để xóa khi user thay đổi
+        if result["success"] and result["data"] and len(result["data"][0]) > 1:
+            _user_cache.set(key, result, tags=(self._email_tag(result["data"][0][1]),))
+        return dict(result)
     
     def create_user_if_not_exists_external(self, user_name: str, email: str):
         """
@@ -240,7 +714,9 @@ class My_Database:
         """
         query = "EXEC usp_CreateUserIfNotExists_External @UserName = ?, @Email = ?"
         params = (user_name, email)
-        return self._execute_query(query, params)
+        result = self._execute_query(query, params)
+        self.invalidate_user_cache(email)
+        return result
 
     def link_facebook_login_if_not_exists(self, user_email: str, facebook_id: str, provider_email: str | None):
         """
@@ -289,13 +765,84 @@ class My_Database:
         # Trả về kết quả rõ ràng
         return result
 
+    def stream_information_all_user(self, chunk_size=QUERY_CHUNK_SIZE):
+        """
+        Đọc thông tin tất cả người dùng theo từng khối (generator) để giao diện hiển thị dần.
+        """
+        query = "SELECT User_Name, Email, IsActive, ActivatedAt, Privilege FROM Users"
+        return self.iter_query(query, chunk_size=chunk_size)
+
+    def get_users_page(self, filter_text=None, sort_column="Email", descending=False, cursor=None, page_size=USER_PAGE_SIZE):
+        """
+        Lấy 1 trang danh sách người dùng theo keyset (không dùng OFFSET).
+        - filter_text: lọc theo tiền tố của User_Name hoặc Email (LIKE 'abc%' để dùng được index).
+        - sort_column: 1 trong USER_SORT_COLUMNS, luôn kèm Email làm khóa phụ để thứ tự ổn định.
+        - cursor: next_cursor của trang trước (giá trị cột sắp xếp, Email) hoặc None cho trang đầu.
+        Trả về {"success", "message", "data", "next_cursor"}; next_cursor = None khi đã hết dữ liệu.
+
+        Index gợi ý để mọi kiểu sắp xếp đều là index seek:
+            CREATE UNIQUE INDEX UX_Users_Email ON Users(Email) INCLUDE (User_Name, IsActive, ActivatedAt, Privilege);
+            CREATE INDEX IX_Users_UserName_Email ON Users(User_Name, Email) INCLUDE (IsActive, ActivatedAt, Privilege);
+            CREATE INDEX IX_Users_Privilege_Email ON Users(Privilege, Email) INCLUDE (User_Name, IsActive, ActivatedAt);
+        """
+        if sort_column not in USER_SORT_COLUMNS:
+            return {"success": False, "message": f"Không hỗ trợ sắp xếp theo cột: {sort_column}", "data": [], "next_cursor": None}
+
+        comparison = "<" if descending else ">"
+        direction = "DESC" if descending else "ASC"
+        conditions = []
+        params = [page_size + 1]  # Lấy dư 1 dòng để biết còn trang sau hay không
+
+        filter_text = (filter_text or "").strip()
+        if filter_text:
+            # Escape ký tự đặc biệt của LIKE rồi lọc theo tiền tố
+            pattern = re.sub(r"([\\%_\[])", r"\\\1", filter_text) + "%"
+            conditions.append("(User_Name LIKE ? ESCAPE '\\' OR Email LIKE ? ESCAPE '\\')")
+            params.extend([pattern, pattern])
+
+        if cursor is not None:
+            last_value, last_email = cursor
+            if sort_column == "Email":
+                conditions.append(f"Email {comparison} ?")
+                params.append(last_email)
+            else:
+                # Dạng (col >= x AND (col > x OR Email > y)) để SQL Server seek được trên index (col, Email)
+                conditions.append(
+                    f"({sort_column} {comparison}= ? AND ({sort_column} {comparison} ? OR Email {comparison} ?))"
+                )
+                params.extend([last_value, last_value, last_email])
+
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order_clause = f"ORDER BY Email {direction}" if sort_column == "Email" else f"ORDER BY {sort_column} {direction}, Email {direction}"
+        query = f"""
+            SELECT TOP (?) User_Name, Email, IsActive, ActivatedAt, Privilege
+            FROM Users
+            {where_clause}
+            {order_clause}
+        """
+
+        result = self._execute_query(query, tuple(params))
+        result["next_cursor"] = None
+        if not result["success"]:
+            result["data"] = []
+            return result
+
+        rows = result["data"]
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last_row = rows[-1]
+            sort_index = {"User_Name": 0, "Email": 1, "Privilege": 4}[sort_column]
+            result["next_cursor"] = (last_row[sort_index], last_row[1])
+        result["data"] = rows
+        return result
+
     def get_username(self, email):
         """
         Lấy tên người dùng thông qua email
         """
-        query = "SELECT User_Name FROM Users WHERE Email = ?"
+        query = SQL_GET_USERNAME
         params = (email,)
-        result = self._execute_query(query, params)
+        result = self._cached_query("username", email, query, params)
 
         # Trả về kết quả rõ ràng
         return result
@@ -304,9 +851,9 @@ class My_Database:
         """
         Lấy mật khẩu, salt mã hóa và quyền hạn của người dùng
         """
-        query = "SELECT PasswordHash, PasswordSalt, IsActive, ActivatedAt, Privilege FROM Users WHERE Email = ?"
+        query = SQL_GET_LOGIN_INFO
         params = (email,)
-        result = self._execute_query(query, params)
+        result = self._cached_query("login", email, query, params)
 
         # Trả về kết quả rõ ràng
         return result
@@ -319,7 +866,7 @@ class My_Database:
             SELECT OTP, Expired_OTP FROM Users WHERE Email = ?
             """
         params = (email,)
-        result = self._execute_query(get_otp_and_time_expired_query, params)
+        result = self._cached_query("otp", email, get_otp_and_time_expired_query, params)
 
         # Trả về kết quả rõ ràng
         return result
@@ -351,7 +898,7 @@ class My_Database:
                             WHERE Email = ? 
                         """
                     params_update = (email,)
-                    cursor.execute(activate_user_query, params_update)
+                    self._timed_execute(cursor, activate_user_query, params_update)
                     conn.commit()
 
                     # Kiểm tra xem có hàng nào được áp dụng không
@@ -371,7 +918,10 @@ class My_Database:
                 conn.close()
         else:
             response["success"] = False
-            response["message"] = "Không thể kết nối đến cơ sở dữ liệu."
+            response["message"] = self.connection_unavailable_message()
+
+        # Dữ liệu người dùng đã (có thể) thay đổi -> xóa cache liên quan
+        self.invalidate_user_cache(email)
 
         return response
         
@@ -384,8 +934,12 @@ class My_Database:
             "message": ""
         }
         
-        # Mã hóa mật khẩu trước khi đưa vào CSDL
-        password_salt, password_hashed = Hash.scrypt(password = password)
+        # Mã hóa mật khẩu trước khi đưa vào CSDL (qua executor giới hạn số phép băm đồng thời)
+        try:
+            password_salt, password_hashed = get_kdf_executor().hash_password(password)
+        except KDFBusyError as e:
+            response["message"] = str(e)
+            return response
 
         # Bởi vì User là 1 từ khóa đã định nghĩa nên cần cho nó vào ngoặc vuông để hiểu đó là tên bảng
         query = """
@@ -397,7 +951,7 @@ class My_Database:
         if conn:
             try:
                 with conn.cursor() as cursor:
-                    cursor.execute(query, params)
+                    self._timed_execute(cursor, query, params)
                     conn.commit()
 
                     if cursor.rowcount > 0:
@@ -417,24 +971,31 @@ class My_Database:
             response["success"] = False
             response["message"] = f"Không thể tạo mới tài khoản cho người dùng {email}"               
         
+        # Dữ liệu người dùng đã (có thể) thay đổi -> xóa cache liên quan
+        self.invalidate_user_cache(email)
+
         return response
 
     def update_password_user(self, email, password=None):
         """
         Cập nhật mật khẩu mới cho người dùng
         """
-        # Mã hóa mật khẩu trước khi đưa vào CSDL
-        salt_password, password_hashed = Hash.scrypt(password = password)
-
-        # Bắt đầu một kết nối
-        conn = self._connect()
-
         # Biến trả kết quả
         response = {
             "success": False,
             "message": ""
         }
 
+        # Mã hóa mật khẩu trước khi đưa vào CSDL (qua executor giới hạn số phép băm đồng thời)
+        try:
+            salt_password, password_hashed = get_kdf_executor().hash_password(password)
+        except KDFBusyError as e:
+            response["message"] = str(e)
+            return response
+
+        # Bắt đầu một kết nối
+        conn = self._connect()
+
         if conn:
             try:
                 # Bắt đầu transaction
@@ -446,7 +1007,7 @@ class My_Database:
                         WHERE Email = ? 
                     """
                     params_update = (password_hashed, salt_password, email)
-                    cursor.execute(update_password_query, params_update)
+                    self._timed_execute(cursor, update_password_query, params_update)
                     conn.commit()
 
                     # Kiểm tra xem có hàng nào được áp dụng không
@@ -468,7 +1029,59 @@ class My_Database:
                 conn.close()
         else:
             response["success"] = False
-            response["message"] = f"Không thể kết nối tới CSDL"
+            response["message"] = self.connection_unavailable_message()
+
+        # Dữ liệu người dùng đã (có thể) thay đổi -> xóa cache liên quan
+        self.invalidate_user_cache(email)
+
+        return response
+
+    def upgrade_password_hash(self, email, password, old_password_hash):
+        """
+        Băm lại mật khẩu với tham số scrypt hiện hành (gọi sau khi đăng nhập đúng mật khẩu mà Hash.needs_rehash = True)
+        - Chỉ ghi đè khi PasswordHash trong CSDL vẫn là old_password_hash: không ghi đè nếu mật khẩu vừa được đổi ở nơi khác.
+        - Lỗi ở đây không ảnh hưởng đăng nhập, chỉ trả về success = False.
+        """
+        response = {
+            "success": False,
+            "message": ""
+        }
+
+        try:
+            salt_password, password_hashed = get_kdf_executor().hash_password(password)
+        except KDFBusyError as e:
+            response["message"] = str(e)
+            return response
+
+        conn = self._connect()
+
+        if conn:
+            try:
+                with conn.cursor() as cursor:
+                    upgrade_query = """
+                        UPDATE Users
+                        SET PasswordHash = ?, PasswordSalt = ?
+                        WHERE Email = ? AND PasswordHash = ?
+                    """
+                    self._timed_execute(cursor, upgrade_query, (password_hashed, salt_password, email, old_password_hash))
+                    conn.commit()
+
+                    if cursor.rowcount > 0:
+                        response["success"] = True
+                        response["message"] = f"Đã nâng cấp mã hóa mật khẩu cho người dùng: {email}."
+                    else:
+                        response["message"] = f"Mật khẩu của người dùng {email} đã thay đổi, bỏ qua nâng cấp mã hóa."
+
+            except Exception as e:
+                conn.rollback()
+                response["message"] = f"Lỗi khi nâng cấp mã hóa mật khẩu cho người dùng {email}: {e}"
+
+            finally:
+                conn.close()
+        else:
+            response["message"] = self.connection_unavailable_message()
+
+        self.invalidate_user_cache(email)
 
         return response
 
@@ -496,7 +1109,7 @@ class My_Database:
                         WHERE Email = ? 
                     """
                     params_update = (OTP, time_expired, email)
-                    cursor.execute(update_OTP_query, params_update)
+                    self._timed_execute(cursor, update_OTP_query, params_update)
                     conn.commit()
 
                     # Kiểm tra xem có hàng nào được áp dụng không
@@ -517,8 +1130,11 @@ class My_Database:
                 conn.close()
         else:
             response["success"] = False
-            response["message"] = f"Không thể kết nối tới CSDL"
+            response["message"] = self.connection_unavailable_message()
             
+        # Dữ liệu người dùng đã (có thể) thay đổi -> xóa cache liên quan
+        self.invalidate_user_cache(email)
+
         return response
 
     def delete_account_user(self, email):
@@ -543,7 +1159,7 @@ class My_Database:
                         WHERE Email = ? 
                     """
                     params_update = (email)
-                    cursor.execute(delete_account_query, params_update)
+                    self._timed_execute(cursor, delete_account_query, params_update)
                     conn.commit()
 
                     # Kiểm tra xem có hàng nào được áp dụng không
@@ -565,8 +1181,11 @@ class My_Database:
                 conn.close()
         else:
             response["success"] = False
-            response["message"] = f"Không thể kết nối tới CSDL"
+            response["message"] = self.connection_unavailable_message()
             
+        # Dữ liệu người dùng đã (có thể) thay đổi -> xóa cache liên quan
+        self.invalidate_user_cache(email)
+
         return response
 
     def change_role_user(self, privilege, email):
@@ -592,7 +1211,7 @@ class My_Database:
                         WHERE Email = ?
                     """
                     params_update = (privilege, email)
-                    cursor.execute(update_privilege_account_query, params_update)
+                    self._timed_execute(cursor, update_privilege_account_query, params_update)
                     conn.commit()
 
                     # Kiểm tra xem có hàng nào được áp dụng không
@@ -614,6 +1233,190 @@ class My_Database:
         
         else:
             response["success"] = False
-            response["message"] = f"Không thể kết nối tới CSDL"
+            response["message"] = self.connection_unavailable_message()
             
-        return response
\ No newline at end of file
+        # Dữ liệu người dùng đã (có thể) thay đổi -> xóa cache liên quan
+        self.invalidate_user_cache(email)
+
+        return response
+    # ---------------- Thao tác hàng loạt ----------------
+
+    @staticmethod
+    def _unique_bulk_rows(rows):
+        """
+        Bỏ email trùng/rỗng nhưng giữ thứ tự người dùng đã chọn: {email viết thường: (email, ...)}.
+        """
+        unique_rows = {}
+        for row in rows:
+            email = (row[0] or "").strip()
+            if email and email.lower() not in unique_rows:
+                unique_rows[email.lower()] = (email,) + tuple(row[1:])
+        return unique_rows
+
+    @staticmethod
+    def _fill_bulk_response(response, unique_rows, affected, action):
+        """
+        Ghi kết quả từng email vào response sau khi thao tác hàng loạt thành công.
+        - affected: tập email (viết thường) thực sự bị tác động.
+        """
+        for key, row in unique_rows.items():
+            ok = key in affected
+            response["data"].append({
+                "email": row[0],
+                "success": ok,
+                "message": "Thành công." if ok else "Không tìm thấy tài khoản."
+            })
+
+        response["success"] = True
+        response["message"] = f"{action} thành công {len(affected)}/{len(unique_rows)} tài khoản."
+
+    def _execute_bulk_by_email(self, rows, temp_columns, statement, action):
+        """
+        Thực thi 1 câu lệnh set-based cho nhiều người dùng trong 1 transaction.
+        - rows: danh sách tuple, phần tử đầu tiên là email (VD: (email,) hoặc (email, privilege)).
+        - temp_columns: định nghĩa cột của bảng tạm #BulkUsers (cột đầu tiên là Email).
+        - statement: câu lệnh JOIN với #BulkUsers và ghi email bị tác động vào #BulkResult qua OUTPUT ... INTO.
+        Trả về kết quả cho từng email trong response["data"].
+        """
+        response = {
+            "success": False,
+            "message": "",
+            "data": []
+        }
+
+        unique_rows = self._unique_bulk_rows(rows)
+        if not unique_rows:
+            response["message"] = "Không có tài khoản nào được chọn."
+            return response
+
+        number_columns = len(next(iter(unique_rows.values())))
+        insert_query = f"INSERT INTO #BulkUsers VALUES ({', '.join('?' * number_columns)})"
+
+        conn = self._connect()
+        if conn:
+            try:
+                with conn.cursor() as cursor:
+                    # Bảng tạm gắn với phiên kết nối, kết nối được tái sử dụng từ pool nên phải dọn trước khi tạo
+                    cursor.execute("""
+                        IF OBJECT_ID('tempdb..#BulkUsers') IS NOT NULL DROP TABLE #BulkUsers;
+                        IF OBJECT_ID('tempdb..#BulkResult') IS NOT NULL DROP TABLE #BulkResult;
+                    """)
+                    cursor.execute(f"CREATE TABLE #BulkUsers ({temp_columns})")
+                    cursor.execute("CREATE TABLE #BulkResult (Email NVARCHAR(255) COLLATE DATABASE_DEFAULT NOT NULL)")
+
+                    # Đẩy toàn bộ danh sách lên server trong 1 lần (fast_executemany gửi theo mảng tham số)
+                    cursor.fast_executemany = True
+                    cursor.executemany(insert_query, list(unique_rows.values()))
+
+                    # 1 câu lệnh set-based cho toàn bộ danh sách
+                    self._timed_execute(cursor, statement, statement=f"BULK {action}")
+                    cursor.execute("SELECT Email FROM #BulkResult")
+                    affected = {str(row[0] or "").strip().lower() for row in cursor.fetchall()}
+
+                    cursor.execute("DROP TABLE #BulkUsers; DROP TABLE #BulkResult;")
+                    conn.commit()
+
+                self._fill_bulk_response(response, unique_rows, affected, action)
+
+            except Exception as e:
+                # Lỗi ở bất kỳ bước nào -> rollback toàn bộ, không tài khoản nào bị thay đổi
+                conn.rollback()
+                response["success"] = False
+                response["message"] = f"Lỗi khi {action.lower()} hàng loạt: {e}"
+                response["data"] = [
+                    {"email": row[0], "success": False, "message": str(e)} for row in unique_rows.values()
+                ]
+
+            finally:
+                conn.close()
+        else:
+            response["message"] = self.connection_unavailable_message()
+
+        # Dữ liệu người dùng đã (có thể) thay đổi -> xóa cache liên quan
+        for row in unique_rows.values():
+            self.invalidate_user_cache(row[0])
+
+        return response
+
+    def activate_users(self, emails, activate=True):
+        """
+        Kích hoạt hoặc khóa nhiều tài khoản trong 1 transaction
+        """
+        if activate:
+            statement = """
+                UPDATE u
+                SET u.ActivatedAt = GETDATE(),
+                    u.IsActive = 1
+                OUTPUT inserted.Email INTO #BulkResult(Email)
+                FROM Users u
+                INNER JOIN #BulkUsers b ON u.Email = b.Email
+            """
+        else:
+            statement = """
+                UPDATE u
+                SET u.IsActive = 0
+                OUTPUT inserted.Email INTO #BulkResult(Email)
+                FROM Users u
+                INNER JOIN #BulkUsers b ON u.Email = b.Email
+            """
+        return self._execute_bulk_by_email(
+            rows=[(email,) for email in emails],
+            temp_columns="Email NVARCHAR(255) COLLATE DATABASE_DEFAULT NOT NULL",
+            statement=statement,
+            action="Kích hoạt" if activate else "Khóa"
+        )
+
+    def delete_account_users(self, emails):
+        """
+        Xóa nhiều tài khoản người dùng trong 1 transaction
+        """
+        statement = """
+            DELETE u
+            OUTPUT deleted.Email INTO #BulkResult(Email)
+            FROM Users u
+            INNER JOIN #BulkUsers b ON u.Email = b.Email
+        """
+        return self._execute_bulk_by_email(
+            rows=[(email,) for email in emails],
+            temp_columns="Email NVARCHAR(255) COLLATE DATABASE_DEFAULT NOT NULL",
+            statement=statement,
+            action="Xóa"
+        )
+
+    def change_role_users(self, email_privilege_pairs):
+        """
+        Cập nhật quyền hạn cho nhiều người dùng trong 1 transaction
+        - email_privilege_pairs: danh sách (email, privilege)
+        """
+        statement = """
+            UPDATE u
+            SET u.Privilege = b.Privilege
+            OUTPUT inserted.Email INTO #BulkResult(Email)
+            FROM Users u
+            INNER JOIN #BulkUsers b ON u.Email = b.Email
+        """
+        return self._execute_bulk_by_email(
+            rows=list(email_privilege_pairs),
+            temp_columns=(
+                "Email NVARCHAR(255) COLLATE DATABASE_DEFAULT NOT NULL, "
+                "Privilege NVARCHAR(50) COLLATE DATABASE_DEFAULT NOT NULL"
+            ),
+            statement=statement,
+            action="Cập nhật quyền hạn"
+        )
+
+
+def create_database(backend=None, **kwargs):
+    """
+    Tạo đối tượng CSDL theo cấu hình.
+    - backend: "sqlserver" hoặc "sqlite"; mặc định lấy từ biến môi trường DB_BACKEND.
+    - kwargs: tham số khởi tạo của backend tương ứng (VD: path cho SQLite, server_name cho SQL Server).
+    """
+    backend = (backend or DB_BACKEND).strip().lower()
+    if backend == "sqlite":
+        # Import muộn để tránh vòng lặp import (sqlite_database kế thừa My_Database)
+        from services.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(**kwargs)
+    if backend != "sqlserver":
+        raise ValueError(f"Không hỗ trợ backend CSDL: {backend}")
+    return My_Database(**kwargs)
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+Đo đạc hiệu năng truy vấn CSDL
+- Ghi nhận độ trễ (histogram theo bucket cố định), số dòng, lỗi theo loại cho từng câu lệnh đã chuẩn hóa tên.
+- Ghi nhận thời gian mượn kết nối từ pool.
+- Câu lệnh chậm hơn ngưỡng được ghi log kèm "hình dạng" tham số (kiểu + độ dài, không ghi giá trị).
+- Xuất snapshot dạng dict/JSON để hiển thị trong ứng dụng hoặc lưu lại phân tích.
+- Cho phép đăng ký hook nhận từng sự kiện (VD: đẩy sang hệ thống giám sát khác).
+"""
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Cận trên (ms) của các bucket histogram độ trễ, bucket cuối cùng là "lớn hơn mọi cận"
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Câu lệnh chạy lâu hơn ngưỡng này (ms) sẽ được ghi log cảnh báo
+SLOW_QUERY_THRESHOLD_MS = 500
+
+_EXEC_RE = re.compile(r"\bEXEC(?:UTE)?\s+([\w.\[\]]+)", re.IGNORECASE)
+_VERB_RE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|MERGE|WITH|IF|DECLARE|SET|BEGIN|CREATE|DROP)\b", re.IGNORECASE)
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+([#\w.\[\]]+)", re.IGNORECASE)
+
+
+def normalize_statement(query: str) -> str:
+    """
+    Chuẩn hóa câu lệnh thành tên ngắn để gom nhóm thống kê.
+    - Gọi stored procedure: "EXEC usp_GetUserBySession"
+    - Câu lệnh thường: "SELECT Users", "UPDATE Users", ...
+    """
+    text = " ".join((query or "").split())
+    verb_match = _VERB_RE.match(text)
+    verb = verb_match.group(1).upper() if verb_match else (text.split(" ", 1)[0].upper() if text else "UNKNOWN")
+
+    if verb in ("SELECT", "INSERT", "UPDATE", "DELETE", "MERGE"):
+        table_match = _TABLE_RE.search(text)
+        if table_match:
+            return f"{verb} {table_match.group(1).strip('[]')}"
+        return verb
+
+    exec_match = _EXEC_RE.search(text)
+    if exec_match:
+        return f"EXEC {exec_match.group(1).strip('[]')}"
+
+    table_match = _TABLE_RE.search(text)
+    if table_match:
+        return f"{verb} {table_match.group(1).strip('[]')}"
+    return verb
+
+
+def describe_params(params: Optional[Sequence[Any]]) -> List[str]:
+    """Mô tả tham số bằng kiểu và độ dài (không lộ giá trị như mật khẩu, OTP, token)."""
+    if params is None:
+        return []
+    if isinstance(params, (str, bytes)) or not isinstance(params, (list, tuple)):
+        params = (params,)
+    shape = []
+    for value in params:
+        if value is None:
+            shape.append("None")
+        elif isinstance(value, (str, bytes)):
+            shape.append(f"{type(value).__name__}({len(value)})")
+        elif isinstance(value, (list, tuple)):
+            shape.append(f"{type(value).__name__}[{len(value)}]")
+        else:
+            shape.append(type(value).__name__)
+    return shape
+
+
+def error_class(error: BaseException) -> str:
+    """Phân loại lỗi: tên lớp exception kèm SQLSTATE nếu có (pyodbc lưu ở args[0])."""
+    name = type(error).__name__
+    args = getattr(error, "args", None) or ()
+    if args and isinstance(args[0], str) and re.fullmatch(r"[0-9A-Z]{5}", args[0]):
+        return f"{name}:{args[0]}"
+    return name
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+class LatencyHistogram:
+    """Histogram độ trễ với bucket cố định (không giữ từng mẫu nên bộ nhớ không tăng theo số lần gọi)."""
+
+    def __init__(self, buckets_ms: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms: Optional[float] = None
+        self.max_ms: Optional[float] = None
+
+    def add(self, value_ms: float):
+        index = len(self.buckets_ms)
+        for i, bound in enumerate(self.buckets_ms):
+            if value_ms <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.min_ms = value_ms if self.min_ms is None else min(self.min_ms, value_ms)
+        self.max_ms = value_ms if self.max_ms is None else max(self.max_ms, value_ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Ước lượng phân vị p (0..100) bằng cận trên của bucket chứa phân vị đó."""
+        if not self.count:
+            return None
+        target = self.count * p / 100.0
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                bound = self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b}" for b in self.buckets_ms] + [f">{self.buckets_ms[-1]}"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "min_ms": None if self.min_ms is None else round(self.min_ms, 3),
+            "max_ms": None if self.max_ms is None else round(self.max_ms, 3),
+            "p50_ms": _round(self.percentile(50)),
+            "p95_ms": _round(self.percentile(95)),
+            "p99_ms": _round(self.percentile(99)),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+class _StatementStats:
+    """Thống kê của 1 câu lệnh đã chuẩn hóa."""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.rows_total = 0
+        self.slow = 0
+        self.errors: Dict[str, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = self.latency.to_dict()
+        data["rows_total"] = self.rows_total
+        data["slow"] = self.slow
+        data["errors"] = dict(self.errors)
+        return data
+
+
+class _Tracker:
+    """Đối tượng trả về từ QueryMetrics.track để người gọi gán số dòng kết quả."""
+    __slots__ = ("rows",)
+
+    def __init__(self):
+        self.rows: Optional[int] = None
+
+
+class QueryMetrics:
+    """
+    Bộ ghi nhận số liệu truy vấn, an toàn đa luồng.
+
+    :param slow_threshold_ms: ngưỡng (ms) coi là câu lệnh chậm.
+    """
+
+    def __init__(self, slow_threshold_ms: float = SLOW_QUERY_THRESHOLD_MS):
+        self.slow_threshold_ms = slow_threshold_ms
+        self._lock = threading.Lock()
+        self._hooks: List[Callable[[Dict[str, Any]], None]] = []
+        self._started_at = datetime.now()
+        self._statements: Dict[str, _StatementStats] = {}
+        self._acquire = LatencyHistogram()
+        self._acquire_errors: Dict[str, int] = {}
+
+    # ----------------------------- Hook -----------------------------
+    def add_hook(self, hook: Callable[[Dict[str, Any]], None]):
+        """Đăng ký hàm nhận từng sự kiện (dict) ngay khi được ghi nhận."""
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[Dict[str, Any]], None]):
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def _emit(self, event: Dict[str, Any]):
+        for hook in list(self._hooks):
+            try:
+                hook(event)
+            except Exception as e:
+                logger.debug(f"Hook đo đạc truy vấn bị lỗi: {e}")
+
+    # ----------------------------- Ghi nhận -----------------------------
+    def record_query(self, statement: str, elapsed: float, rows: Optional[int] = None,
+                     error: Optional[BaseException] = None, params: Optional[Sequence[Any]] = None):
+        """Ghi nhận 1 lần thực thi câu lệnh (elapsed tính bằng giây)."""
+        elapsed_ms = elapsed * 1000.0
+        error_name = error_class(error) if error is not None else None
+        is_slow = elapsed_ms >= self.slow_threshold_ms
+
+        with self._lock:
+            stats = self._statements.get(statement)
+            if stats is None:
+                stats = self._statements[statement] = _StatementStats()
+            stats.latency.add(elapsed_ms)
+            if rows is not None and rows > 0:
+                stats.rows_total += rows
+            if is_slow:
+                stats.slow += 1
+            if error_name:
+                stats.errors[error_name] = stats.errors.get(error_name, 0) + 1
+
+        if is_slow:
+            logger.warning(
+                "Truy vấn chậm %.1f ms: %s, tham số: %s, số dòng: %s",
+                elapsed_ms, statement, describe_params(params), rows
+            )
+
+        if self._hooks:
+            self._emit({
+                "kind": "query",
+                "statement": statement,
+                "elapsed_ms": elapsed_ms,
+                "rows": rows,
+                "error": error_name,
+                "slow": is_slow,
+            })
+
+    def record_acquire(self, elapsed: float, error: Optional[BaseException] = None):
+        """Ghi nhận thời gian mượn kết nối (elapsed tính bằng giây)."""
+        elapsed_ms = elapsed * 1000.0
+        error_name = error_class(error) if error is not None else None
+        with self._lock:
+            self._acquire.add(elapsed_ms)
+            if error_name:
+                self._acquire_errors[error_name] = self._acquire_errors.get(error_name, 0) + 1
+
+        if self._hooks:
+            self._emit({"kind": "acquire", "elapsed_ms": elapsed_ms, "error": error_name})
+
+    @contextmanager
+    def track(self, query: str, params: Optional[Sequence[Any]] = None, statement: Optional[str] = None):
+        """
+        Đo 1 khối lệnh:
+            with metrics.track(query, params) as tracker:
+                cursor.execute(query, params)
+                tracker.rows = len(cursor.fetchall())
+        """
+        tracker = _Tracker()
+        name = statement or normalize_statement(query)
+        started = time.perf_counter()
+        try:
+            yield tracker
+        except BaseException as e:
+            self.record_query(name, time.perf_counter() - started, tracker.rows, e, params)
+            raise
+        self.record_query(name, time.perf_counter() - started, tracker.rows, None, params)
+
+    # ----------------------------- Snapshot -----------------------------
+    def snapshot(self) -> Dict[str, Any]:
+        """Ảnh chụp toàn bộ số liệu, câu lệnh sắp xếp theo tổng thời gian giảm dần."""
+        with self._lock:
+            statements = {name: stats.to_dict() for name, stats in self._statements.items()}
+            acquire = self._acquire.to_dict()
+            acquire["errors"] = dict(self._acquire_errors)
+            started_at = self._started_at
+
+        ordered = dict(sorted(statements.items(), key=lambda item: item[1]["total_ms"], reverse=True))
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "since": started_at.isoformat(timespec="seconds"),
+            "slow_threshold_ms": self.slow_threshold_ms,
+            "connection_acquire": acquire,
+            "statements": ordered,
+        }
+
+    def snapshot_json(self, indent: Optional[int] = 2) -> str:
+        """Snapshot dạng chuỗi JSON."""
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent, default=str)
+
+    def reset(self):
+        """Xóa toàn bộ số liệu đã ghi nhận (giữ nguyên hook)."""
+        with self._lock:
+            self._started_at = datetime.now()
+            self._statements.clear()
+            self._acquire = LatencyHistogram()
+            self._acquire_errors.clear()
+
+
+# Bộ ghi nhận dùng chung cho toàn bộ tiến trình (mọi đối tượng My_Database)
+DB_METRICS = QueryMetrics()
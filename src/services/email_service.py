@@ -1,7 +1,6 @@
 import smtplib
 from smtplib import SMTPException
 import logging
-import threading
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
@@ -12,6 +11,11 @@ import time
 import os
 from dotenv import load_dotenv
 
+from services.smtp_session import SMTPSession
+from services.mime_stream import iter_message
+from services.mail_spool import PRIORITY_BULK, PRIORITY_CRITICAL, PRIORITY_NORMAL, get_mail_spool
+from services.alert_digest import AlertDigest, SEVERITY_WARNING
+
 
 logger = logging.getLogger(__name__)
 
@@ -29,15 +33,18 @@ EMAIL_SERVICES = os.getenv("EMAIL_SERVICES", "Internal")
 
 MAX_ATTACHMENT_SIZE_MB = 200  # Giới hạn dung lượng tệp đính kèm (200MB)
 MAX_RETRY_ATTEMPTS = 3  # Số lần thử gửi email tối đa
+# Nén gzip tệp đính kèm dễ nén (log, csv...) trước khi gửi: "auto" (theo đuôi tệp + kích thước), "1" luôn nén, "0" không nén
+EMAIL_COMPRESS_ATTACHMENTS = os.getenv("EMAIL_COMPRESS_ATTACHMENTS", "auto")
 
 class InternalEmailSender():
     """
     Gửi email tới người dùng  
     Khi sử dụng dịch vụ Internal thì cần có địa chỉ host SMTP và PORT email service của công ty
     """
-    def __init__(self, email = EMAIL_SENDER, password = PASSWORD_EMAIL_SENDER, smtp_host = SMTP_HOST, smtp_port = SMTP_PORT, email_service = EMAIL_SERVICES ):
+    def __init__(self, email = EMAIL_SENDER, password = PASSWORD_EMAIL_SENDER, smtp_host = SMTP_HOST, smtp_port = SMTP_PORT, email_service = EMAIL_SERVICES, spool = None):
         """
         Phân loại dịch vụ mail và mở cổng tương ứng
+        spool: hàng đợi gửi email (MailSpool), mặc định dùng spool chung của ứng dụng
         """
         self.email = email
         self.password = password
@@ -45,6 +52,9 @@ class InternalEmailSender():
         self.smtp_host = smtp_host
         self.smtp_port = smtp_port
 
+        # Phiên SMTP dùng lại giữa các email (không kết nối + đăng nhập lại cho mỗi email)
+        self.session = SMTPSession(self.connect_to_email_server)
+
         # Kết nối thử tới email
         # server = self.connect_to_email_server()
         # if server:
@@ -64,6 +74,21 @@ class InternalEmailSender():
                 <br>
             """
 
+        # Chế độ nén tệp đính kèm
+        self.compress_attachments = "auto" if EMAIL_COMPRESS_ATTACHMENTS == "auto" else EMAIL_COMPRESS_ATTACHMENTS == "1"
+
+        # Hàng đợi gửi email bền vững (send_email_async xếp email vào đây thay vì tạo luồng mới)
+        self.spool = spool if spool is not None else get_mail_spool(self)
+
+        # Gom email cảnh báo thành email tổng hợp (ALERT_DIGEST_WINDOW, ALERT_DIGEST_MAX_EVENTS, ALERT_DIGEST_GROUP_BY)
+        self.alert_digest = AlertDigest(self)
+
+    def new_session(self):
+        """
+        Tạo 1 phiên SMTP mới (mỗi luồng gửi của spool giữ 1 phiên riêng)
+        """
+        return SMTPSession(self.connect_to_email_server)
+
     def connect_to_email_server(self):
         """
         Kết nối tới máy chủ email theo từng dịch vụ mail
@@ -99,24 +124,37 @@ class InternalEmailSender():
         regex = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
         return re.match(regex, email) is not None
     
-    def attach_file(self, msg, attachment_path):
+    def is_attachable(self, attachment_path):
         """
-        Đính kèm tệp vào email.
-        
-        :param msg: Đối tượng email.
-        :param attachment_path: Đường dẫn tệp đính kèm.
+        Kiểm tra tệp đính kèm tồn tại và không vượt quá giới hạn dung lượng.
         """
         # Lấy tên tệp từ đường dẫn
         filename = os.path.basename(attachment_path)
 
         if not os.path.exists(attachment_path):
             logger.warning(f"Không tìm thấy tệp tin: {attachment_path}. Gửi mail mà không đính kèm tệp tin.")
-            return
+            return False
         
         # Kiểm tra dung lượng tệp (chuyển sang MB và so với giới hạn 200MB)
         file_size_mb = os.path.getsize(attachment_path) / (1024 * 1024)
         if file_size_mb > MAX_ATTACHMENT_SIZE_MB:
             logger.warning(f"Tệp đính kèm {filename} có dung lượng {file_size_mb:.2f}MB, vượt quá giới hạn {MAX_ATTACHMENT_SIZE_MB}MB. Không gửi tệp này.")
+            return False
+
+        return True
+
+    def attach_file(self, msg, attachment_path):
+        """
+        Đính kèm tệp vào email (đọc toàn bộ tệp vào bộ nhớ, chỉ dùng cho tệp nhỏ;
+        deliver gửi tệp đính kèm theo luồng qua services.mime_stream).
+        
+        :param msg: Đối tượng email.
+        :param attachment_path: Đường dẫn tệp đính kèm.
+        """
+        # Lấy tên tệp từ đường dẫn
+        filename = os.path.basename(attachment_path)
+
+        if not self.is_attachable(attachment_path):
             return
 
         try:
@@ -130,6 +168,61 @@ class InternalEmailSender():
         except Exception as e:
             logger.error("Không thể đính kèm tệp tin: %s. Lỗi xuất hiện: %s. Gửi mail mà không đính kèm tệp tin", attachment_path, e)
 
+    @staticmethod
+    def recipients(to_email, cc_email=None):
+        """
+        Danh sách người nhận thực tế (to + cc), cc có thể là 1 string hoặc list.
+        """
+        recipients = [to_email]
+        if isinstance(cc_email, str) and cc_email:
+            recipients.append(cc_email)
+        elif isinstance(cc_email, list):
+            recipients.extend(cc_email)
+        return recipients
+
+    def build_message(self, to_email, subject, body, signature='', attachment_path=None, cc_email=None):
+        """
+        Tạo đối tượng email và danh sách người nhận (to + cc).
+        """
+        msg = MIMEMultipart()
+        msg['From'] = self.email
+        msg['To'] = to_email
+        msg['Subject'] = subject
+
+        # Nếu có CC
+        recipients = self.recipients(to_email, cc_email)
+        if cc_email:
+            msg['Cc'] = ', '.join(recipients[1:])
+
+        # Thêm nội dung email với mã hóa UTF-8
+        email_body = body + signature
+        msg.attach(MIMEText(email_body, 'html', _charset='utf-8'))
+
+        # Nếu có tệp đính kèm
+        if attachment_path:
+            self.attach_file(msg, attachment_path)
+
+        return msg, recipients
+
+    def deliver(self, to_email, subject, body, signature='', attachment_path=None, cc_email=None, session=None):
+        """
+        Gửi email đúng 1 lần (không thử lại), lỗi được ném ra cho bên gọi quyết định (spool hoặc send_email).
+        session: phiên SMTP dùng để gửi, mặc định là phiên của sender.
+        """
+        if not self.is_valid_email(to_email):
+            raise ValueError(f"Địa chỉ email {to_email} không hợp lệ.")
+        session = session or self.session
+
+        # Có tệp đính kèm: dựng email theo luồng, base64 từng khối thẳng vào lệnh DATA (bộ nhớ không tăng theo kích thước tệp)
+        if attachment_path and self.is_attachable(attachment_path):
+            session.sendmail_stream(self.email, self.recipients(to_email, cc_email), lambda: iter_message(
+                self.email, to_email, subject, body + signature, [attachment_path], cc_email,
+                compress=self.compress_attachments))
+            return
+
+        msg, recipients = self.build_message(to_email, subject, body, signature, None, cc_email)
+        session.sendmail(self.email, recipients, msg.as_string())
+
     def send_email(self, to_email, subject, body, signature='', attachment_path=None, cc_email=None):
         """
         Gửi email với nội dung và tệp đính kèm.  
@@ -152,45 +245,12 @@ class InternalEmailSender():
         # Cố gắng gửi email tối đa 3 lần
         while retry_attempts < MAX_RETRY_ATTEMPTS and not success_send_email:
             try:
-                # Tạo đối tượng email
-                msg = MIMEMultipart()
-                msg['From'] = self.email
-                msg['To'] = to_email
-                msg['Subject'] = subject
-
-                # Nếu có CC
-                recipients = [to_email]
-                if cc_email:
-                    if isinstance(cc_email, str):
-                        msg['Cc'] = cc_email
-                        recipients.append(cc_email)
-                    elif isinstance(cc_email, list):
-                        msg['Cc'] = ', '.join(cc_email)
-                        recipients.extend(cc_email)
-
-                # Thêm nội dung email với mã hóa UTF-8
-                email_body = body + signature
-                msg.attach(MIMEText(email_body, 'html', _charset='utf-8'))
-
-                # Nếu có tệp đính kèm
-                if attachment_path:
-                    self.attach_file(msg, attachment_path)
-
-                # Thiết lập kết nối đến SMTP server
-                server = self.connect_to_email_server()
-
-                if server:
-                    # Gửi email
-                    server.sendmail(self.email, recipients, msg.as_string())
-                    # Đóng kết nối
-                    server.quit()
+                # Gửi email qua phiên SMTP đang mở (tự kết nối/kết nối lại khi cần)
+                self.deliver(to_email, subject, body, signature, attachment_path, cc_email)
 
-                    # Trả về thành công
-                    success_send_email = True
-                    logger.info(f"Email gửi thành công tới {to_email}.")
-
-                else:
-                    raise ValueError("Không thể kết nối tới máy chủ mail")
+                # Trả về thành công
+                success_send_email = True
+                logger.info(f"Email gửi thành công tới {to_email}.")
 
             except Exception as e:
                 logger.error(f"Gửi email tới {to_email} thất bại lần {retry_attempts + 1}. Lỗi: {e}")
@@ -199,28 +259,51 @@ class InternalEmailSender():
 
         return success_send_email
 
-    def send_email_async(self, to_email, subject, body, signature='', attachment_path=None, callback=None, cc_email=None):
+    def close(self):
         """
-        Gửi email trong một luồng riêng biệt và gọi callback khi hoàn thành.
-        Để xác nhận xem email gửi thành công hay không
+        Gửi nốt các cảnh báo đang gom và đóng phiên SMTP đang giữ (gọi khi thoát ứng dụng).
         """
-        def run():
-            success = self.send_email(to_email, subject, body, signature, attachment_path, cc_email)
+        self.alert_digest.flush()
+        self.session.close()
 
-            # Gọi hàm callback nếu có (hàm này có thể là gửi lại email lần nữa nếu success trả về false chẳng hạn)
+    def send_email_async(self, to_email, subject, body, signature='', attachment_path=None, callback=None, cc_email=None,
+                         priority=PRIORITY_NORMAL, dedupe_key=None):
+        """
+        Xếp email vào spool (gửi nền bởi các luồng gửi cố định) và gọi callback khi hoàn thành.
+        Để xác nhận xem email gửi thành công hay không: callback(to_email, success) hoặc hỏi self.spool.status(job_id).
+        priority: PRIORITY_CRITICAL (OTP...), PRIORITY_NORMAL, PRIORITY_BULK (thông báo hàng loạt)
+        dedupe_key: email cùng khóa đang chờ/vừa gửi sẽ không bị gửi lại
+        Trả về job_id, hoặc None nếu địa chỉ email không hợp lệ.
+        """
+        # Kiểm tra email hợp lệ
+        if not self.is_valid_email(to_email):
+            logger.error("Địa chỉ email %s không hợp lệ.", to_email)
             if callback:
-                callback(to_email, success)
+                callback(to_email, False)
+            return None
 
-            return success
-        
-        # Gọi hàm gửi mail trong thread
-        email_thread = threading.Thread(target=run)
-        email_thread.start()
+        return self.spool.enqueue(to_email, subject, body, signature, attachment_path, cc_email,
+                                  priority=priority, dedupe_key=dedupe_key, callback=callback)
 
-    def send_mail_alert(self, to_email, subject_mail, ip, reason, path_api, user_agent, time_ban, attachment_path=None, callback=None):
+    def send_mail_alert(self, to_email, subject_mail, ip, reason, path_api, user_agent, time_ban, attachment_path=None, callback=None,
+                        severity=SEVERITY_WARNING):
         """
         Gửi email cảnh báo tới quản trị viên hệ thống.
+        Cảnh báo thường được gom vào email tổng hợp (self.alert_digest) và trả về None;
+        mức độ nghiêm trọng (severity="critical"), có tệp đính kèm hoặc tắt chế độ gom thì gửi ngay và trả về job_id.
         """
+        if self.alert_digest.enabled and not attachment_path and not self.alert_digest.is_critical(severity):
+            if not self.is_valid_email(to_email):
+                logger.error("Địa chỉ email %s không hợp lệ.", to_email)
+                if callback:
+                    callback(to_email, False)
+                return None
+            event = {"ip": ip, "reason": reason, "path_api": path_api, "user_agent": user_agent,
+                     "time_ban": time_ban, "at": time.time()}
+            self.alert_digest.add(to_email, subject_mail, event, callback=callback)
+            return None
+
+        self.alert_digest.record_immediate()
         body_alert = f"""
         <html>
             <body style="font-family: Arial, sans-serif; color: #333;">
@@ -238,7 +321,8 @@ class InternalEmailSender():
         # Gửi email với nội dung và chữ ký
         success_send_email = self.send_email_async(to_email=to_email, subject=subject_mail, 
                                                 body=body_alert, signature=self.signature_email, 
-                                                attachment_path=attachment_path, callback=callback)
+                                                attachment_path=attachment_path, callback=callback,
+                                                priority=PRIORITY_CRITICAL if self.alert_digest.is_critical(severity) else PRIORITY_NORMAL)
     
         return success_send_email
 
@@ -262,7 +346,8 @@ class InternalEmailSender():
         # Gửi email với nội dung và chữ ký
         success_send_email = self.send_email_async(to_email = to_email, subject = subject_mail, 
                                              body= body_account_creation, signature = self.signature_email, 
-                                             attachment_path = attachment_path, callback= callback)
+                                             attachment_path = attachment_path, callback= callback,
+                                             dedupe_key = f"new_account:{to_email.lower()}")
         
         return success_send_email
 
@@ -290,9 +375,12 @@ class InternalEmailSender():
         </html>
         """
         # Gửi email với nội dung và chữ ký
+        # Khóa dedupe gắn với lần kích hoạt (theo giây): chỉ chặn bấm trùng, không chặn kích hoạt lại sau khi bị khóa
         success_send_email = self.send_email_async(to_email=to_email, subject=subject_mail, 
                                                 body=body_account_creation, signature=self.signature_email, 
-                                                attachment_path=attachment_path, callback=callback)
+                                                attachment_path=attachment_path, callback=callback,
+                                                priority=PRIORITY_BULK,
+                                                dedupe_key=f"activate:{to_email.lower()}:{int(time.time())}")
     
         return success_send_email
 
@@ -319,7 +407,8 @@ class InternalEmailSender():
         # Gửi email với nội dung và chữ ký
         success_send_email = self.send_email_async(to_email, subject = subject_mail,
                                               body = body_password_reset, signature = self.signature_email,
-                                                attachment_path = attachment_path, callback= callback)
+                                                attachment_path = attachment_path, callback= callback,
+                                                priority = PRIORITY_CRITICAL, dedupe_key = f"password_reset:{to_email.lower()}:{OTP}")
         return success_send_email
 
     def send_mail_on_startup(self, to_email, website_name, timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")):
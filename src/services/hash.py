@@ -1,9 +1,54 @@
 # import bcrypt # pip install bcrypt
 import hashlib
+import hmac
+import json
+import logging
 import os
 import base64
+import threading
+import time
 from Crypto.Cipher import AES   # pip install pycryptodome
 from Crypto.Util.Padding import pad, unpad
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger(__name__)
+
+# Tham số scrypt mặc định (~16 MB RAM mỗi lần băm: 128 * n * r * p byte)
+# Đây cũng là tham số của định dạng cũ (chỉ lưu hex salt + hex hash, không kèm tham số) -> KHÔNG được đổi
+SCRYPT_N = 16384
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_DKLEN = 64
+
+# Định dạng mới tự mô tả: $scrypt$ln=<log2 n>,r=<r>,p=<p>$<salt base64>$<hash base64>
+SCRYPT_PREFIX = "$scrypt$"
+# Giới hạn khi tự hiệu chỉnh: không yếu hơn tham số mặc định, không vượt quá bộ nhớ cho phép
+SCRYPT_MIN_N = SCRYPT_N
+SCRYPT_MAX_N = 2 ** 20
+SCRYPT_MAX_MEMORY_MB = int(os.getenv("SCRYPT_MAX_MEMORY_MB", "64"))
+# Thời gian mục tiêu (ms) cho 1 lần băm khi hiệu chỉnh trên máy hiện tại
+KDF_TARGET_MS = float(os.getenv("KDF_TARGET_MS", "250"))
+# Tệp lưu tham số đã hiệu chỉnh (hiệu chỉnh 1 lần cho mỗi máy)
+KDF_PARAMS_PATH = os.getenv("KDF_PARAMS_PATH", os.path.join(os.path.dirname(PROJECT_DIR), "data", "kdf_params.json"))
+
+# Tham số đang dùng để băm mật khẩu mới
+_params_lock = threading.Lock()
+_current_params = {"n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P}
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt_raw(password_bytes, salt, n, r, p):
+    # maxmem mặc định của OpenSSL là 32 MB -> phải nới ra khi n/r lớn hơn mặc định
+    maxmem = 128 * r * (n + p + 2) + 1024 * 1024
+    return hashlib.scrypt(password_bytes, salt=salt, n=n, r=r, p=p, dklen=SCRYPT_DKLEN, maxmem=maxmem)
 """
 Sự khác nhau phương thức thể hiện và phương thức tĩnh
 Class Hash đang được coi là phuong thức tĩnh, bởi 
@@ -35,9 +80,10 @@ class Hash:
     @staticmethod
     def scrypt(password):
         """
-        Mã hóa mật khẩu sử dụng thuật toán scrypt
-        Trả về chuỗi mã hóa cùng với salt của mật khẩu đó
+        Mã hóa mật khẩu sử dụng thuật toán scrypt với tham số hiện hành (Hash.get_params)
+        Trả về salt (hex) cùng chuỗi mã hóa tự mô tả: $scrypt$ln=14,r=8,p=1$<salt>$<hash>
         Mỗi mật khẩu sẽ được băm với một salt ngẫu nhiên và duy nhất
+        (salt hex vẫn được trả về để lưu vào cột salt như trước)
         """
         try:
             # Chuyển đổi mật khẩu sang bytes
@@ -47,17 +93,17 @@ class Hash:
             salt = os.urandom(16)
             
             # Băm mật khẩu với scrypt
-            hashed_password = hashlib.scrypt(
+            params = Hash.get_params()
+            hashed_password = _scrypt_raw(
                 pwd_bytes,
-                salt=salt,
-                n=16384,  # Số vòng lặp (cost factor)
-                r=8,      # Độ rộng khối
-                p=1,      # Số luồng
-                dklen=64  # Độ dài khóa băm
+                salt,
+                n=params["n"],  # Số vòng lặp (cost factor)
+                r=params["r"],  # Độ rộng khối
+                p=params["p"],  # Số luồng
             )
             
-            # Trả về salt và hashed_password dưới dạng hex để lưu trữ
-            return salt.hex(), hashed_password.hex()
+            # Trả về salt (hex) và chuỗi mã hóa kèm tham số để lưu trữ
+            return salt.hex(), Hash.encode(salt, hashed_password, **params)
         except Exception as e:
             # Xử lý lỗi nếu có
             print(f"Error hashing password: {e}")
@@ -67,33 +113,171 @@ class Hash:
     def verify(stored_salt, stored_hashed_password, input_password):
         """
         Kiểm tra chuỗi đưa vào có trùng với mật khẩu đã mã hóa không
-        Sử dụng một mã salt đã lưu trữ từ lúc scrypt để kiểm tra.
+        - Định dạng mới ($scrypt$...): salt và tham số lấy từ chính chuỗi mã hóa.
+        - Định dạng cũ (hex): sử dụng mã salt đã lưu trữ từ lúc scrypt và tham số mặc định.
         """
         try:
-            # Chuyển đổi salt và hashed_password từ hex về bytes
-            salt = bytes.fromhex(stored_salt)
-            stored_hashed_password = bytes.fromhex(stored_hashed_password)
+            decoded = Hash.decode(stored_hashed_password)
+            if decoded is not None:
+                n, r, p, salt, expected = decoded
+            else:
+                # Chuyển đổi salt và hashed_password từ hex về bytes
+                n, r, p = SCRYPT_N, SCRYPT_R, SCRYPT_P
+                salt = bytes.fromhex(stored_salt)
+                expected = bytes.fromhex(stored_hashed_password)
             
             # Chuyển đổi mật khẩu đầu vào sang bytes
             input_password_bytes = input_password.encode("utf-8")
             
             # Băm mật khẩu đầu vào với cùng salt và tham số scrypt
-            input_hashed_password = hashlib.scrypt(
-                input_password_bytes,
-                salt=salt,
-                n=16384,
-                r=8,
-                p=1,
-                dklen=64
-            )
+            input_hashed_password = _scrypt_raw(input_password_bytes, salt, n=n, r=r, p=p)
             
-            # So sánh băm đầu ra với băm đã lưu trữ
-            return input_hashed_password == stored_hashed_password
+            # So sánh băm đầu ra với băm đã lưu trữ (thời gian so sánh không phụ thuộc nội dung)
+            return hmac.compare_digest(input_hashed_password, expected)
         except Exception as e:
             # Xử lý lỗi nếu có
             print(f"Error verifying password: {e}")
             return False
     
+    @staticmethod
+    def encode(salt: bytes, hashed_password: bytes, n: int, r: int, p: int) -> str:
+        """Ghép salt, hash và tham số thành chuỗi $scrypt$ln=..,r=..,p=..$salt$hash."""
+        return f"{SCRYPT_PREFIX}ln={n.bit_length() - 1},r={r},p={p}${_b64encode(salt)}${_b64encode(hashed_password)}"
+
+    @staticmethod
+    def decode(stored_hashed_password):
+        """
+        Tách chuỗi mã hóa định dạng mới thành (n, r, p, salt, hash).
+        Trả về None nếu là định dạng cũ (hex); ném ValueError nếu chuỗi $scrypt$ bị hỏng.
+        """
+        if not stored_hashed_password or not stored_hashed_password.startswith(SCRYPT_PREFIX):
+            return None
+        try:
+            param_text, salt_text, hash_text = stored_hashed_password[len(SCRYPT_PREFIX):].split("$")
+            params = dict(item.split("=", 1) for item in param_text.split(","))
+            ln, r, p = int(params["ln"]), int(params["r"]), int(params["p"])
+            return 1 << ln, r, p, _b64decode(salt_text), _b64decode(hash_text)
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"Chuỗi mã hóa mật khẩu không hợp lệ: {e}") from e
+
+    @staticmethod
+    def needs_rehash(stored_hashed_password) -> bool:
+        """
+        Mật khẩu đã lưu có cần băm lại với tham số hiện hành không:
+        - Định dạng cũ (hex, không kèm tham số) -> luôn cần.
+        - Định dạng mới nhưng yếu hơn tham số hiện hành (n nhỏ hơn, hoặc r/p khác) -> cần.
+        Chỉ nâng cấp chứ không hạ cấp: máy yếu không ghi đè mật khẩu đã băm mạnh hơn từ máy khác.
+        """
+        try:
+            decoded = Hash.decode(stored_hashed_password)
+        except ValueError:
+            return True
+        if decoded is None:
+            return True
+        n, r, p = decoded[:3]
+        params = Hash.get_params()
+        return n < params["n"] or r != params["r"] or p != params["p"]
+
+    @staticmethod
+    def get_params():
+        """Tham số scrypt đang dùng cho mật khẩu mới: {"n", "r", "p"}."""
+        with _params_lock:
+            return dict(_current_params)
+
+    @staticmethod
+    def set_params(n: int, r: int = SCRYPT_R, p: int = SCRYPT_P):
+        """Đổi tham số scrypt cho mật khẩu mới (n phải là lũy thừa của 2, không nhỏ hơn SCRYPT_MIN_N)."""
+        if n < SCRYPT_MIN_N or n & (n - 1):
+            raise ValueError(f"n phải là lũy thừa của 2 và >= {SCRYPT_MIN_N}")
+        with _params_lock:
+            _current_params.update(n=int(n), r=int(r), p=int(p))
+
+    @staticmethod
+    def calibrate(target_ms: float = KDF_TARGET_MS, r: int = SCRYPT_R, p: int = SCRYPT_P,
+                  max_memory_mb: float = SCRYPT_MAX_MEMORY_MB):
+        """
+        Đo tốc độ máy hiện tại và chọn n lớn nhất sao cho 1 lần băm không vượt quá target_ms
+        (n tối thiểu SCRYPT_MIN_N, bộ nhớ 128 * n * r * p không vượt quá max_memory_mb).
+        Trả về {"n", "r", "p", "ms"} với ms là thời gian đo được của n đã chọn.
+        """
+        def _measure(n):
+            # Lấy lần nhanh nhất trong 2 lần đo để bớt nhiễu
+            best = None
+            for _ in range(2):
+                started = time.perf_counter()
+                _scrypt_raw(b"calibration", b"\x00" * 16, n=n, r=r, p=p)
+                elapsed = (time.perf_counter() - started) * 1000.0
+                best = elapsed if best is None else min(best, elapsed)
+            return best
+
+        max_memory = max_memory_mb * 1024 * 1024
+        n = SCRYPT_MIN_N
+        elapsed = _measure(n)
+        # Thời gian scrypt tăng gần tuyến tính theo n -> dự đoán trước khi đo lần kế tiếp
+        while n * 2 <= SCRYPT_MAX_N and 128 * n * 2 * r * p <= max_memory and elapsed * 2 <= target_ms:
+            candidate = _measure(n * 2)
+            if candidate > target_ms:
+                break
+            n, elapsed = n * 2, candidate
+        logger.info("Hiệu chỉnh scrypt: n=%s, r=%s, p=%s (%.1f ms, mục tiêu %.0f ms)", n, r, p, elapsed, target_ms)
+        return {"n": n, "r": r, "p": p, "ms": round(elapsed, 1)}
+
+    @staticmethod
+    def load_params(path: str = KDF_PARAMS_PATH, calibrate_if_missing: bool = True, target_ms: float = KDF_TARGET_MS):
+        """
+        Nạp tham số scrypt đã hiệu chỉnh từ tệp JSON; nếu chưa có thì hiệu chỉnh trên máy này và lưu lại.
+        Gọi 1 lần khi khởi động ứng dụng (nên chạy ở luồng nền vì hiệu chỉnh mất khoảng 1 giây).
+        """
+        params = None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                params = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("Không đọc được tham số scrypt từ %s: %s", path, e)
+
+        if params is None:
+            if not calibrate_if_missing:
+                return Hash.get_params()
+            params = Hash.calibrate(target_ms=target_ms)
+            params["target_ms"] = target_ms
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(params, f, indent=2)
+            except OSError as e:
+                logger.warning("Không lưu được tham số scrypt vào %s: %s", path, e)
+
+        try:
+            Hash.set_params(int(params["n"]), int(params.get("r", SCRYPT_R)), int(params.get("p", SCRYPT_P)))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning("Tham số scrypt không hợp lệ (%s), dùng mặc định", e)
+            return Hash.get_params()
+
+        # Bộ nhớ mỗi lần băm thay đổi -> tạo lại executor băm mật khẩu theo ngân sách bộ nhớ mới
+        from services.kdf_executor import reset_kdf_executor
+        reset_kdf_executor()
+        return Hash.get_params()
+
+    @staticmethod
+    def hash_many(passwords):
+        """
+        Băm nhiều mật khẩu (tạo tài khoản hàng loạt, nhập dữ liệu) qua executor giới hạn bộ nhớ.
+        Trả về danh sách (salt, chuỗi mã hóa) theo đúng thứ tự đầu vào.
+        """
+        from services.kdf_executor import get_kdf_executor
+        return get_kdf_executor().hash_many(passwords)
+
+    @staticmethod
+    def verify_many(items):
+        """
+        Kiểm tra nhiều bộ (stored_salt, stored_hashed_password, input_password) qua executor giới hạn bộ nhớ.
+        Trả về danh sách True/False theo đúng thứ tự đầu vào.
+        """
+        from services.kdf_executor import get_kdf_executor
+        return get_kdf_executor().verify_many(items)
+
     @staticmethod
     def generate_aes_key():
         """
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Executor riêng cho hàm băm mật khẩu (scrypt)
+- Mỗi lần scrypt (n=16384, r=8) cần ~16 MB RAM và hàng chục ms CPU: chạy tự do trên mọi luồng sẽ làm bộ nhớ tăng vọt khi nhiều người đăng nhập cùng lúc.
+- Số phép băm chạy đồng thời bị giới hạn theo ngân sách bộ nhớ (memory_budget_mb / bộ nhớ 1 lần băm) và số CPU.
+- Hàng đợi có giới hạn: đầy thì người gửi phải chờ (backpressure), chờ quá hạn thì nhận KDFBusyError thay vì xếp hàng vô hạn.
+- hashlib.scrypt nhả GIL khi tính toán nên dùng ThreadPoolExecutor là đủ (không cần tiến trình riêng).
+- hash_many / verify_many cho tạo tài khoản hàng loạt, nhập dữ liệu.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.hash import Hash
+
+logger = logging.getLogger(__name__)
+
+# Ngân sách bộ nhớ mặc định cho các phép băm chạy đồng thời (MB)
+KDF_MEMORY_BUDGET_MB = 128
+# Số yêu cầu được phép chờ trong hàng đợi (ngoài các yêu cầu đang chạy)
+KDF_MAX_QUEUE = 64
+# Thời gian tối đa (giây) chờ có chỗ trong hàng đợi trước khi báo bận
+KDF_SUBMIT_TIMEOUT = 30.0
+
+
+class KDFBusyError(RuntimeError):
+    """Hàng đợi băm mật khẩu đã đầy quá thời gian chờ (hệ thống đang quá tải)."""
+
+
+def scrypt_memory_bytes(n: Optional[int] = None, r: Optional[int] = None, p: Optional[int] = None) -> int:
+    """Bộ nhớ scrypt cần cho 1 lần băm: 128 * n * r * p byte (n=16384, r=8 -> 16 MB), mặc định theo tham số hiện hành."""
+    params = Hash.get_params()
+    return 128 * (n or params["n"]) * (r or params["r"]) * (p or params["p"])
+
+
+class KDFExecutor:
+    """
+    Thread pool giới hạn cho Hash.scrypt / Hash.verify.
+
+    :param memory_budget_mb: tổng bộ nhớ tối đa cho các phép băm chạy đồng thời.
+    :param max_workers: số luồng tối đa (mặc định số CPU), bị giới hạn thêm bởi ngân sách bộ nhớ.
+    :param max_queue: số yêu cầu được chờ thêm khi mọi luồng đang bận.
+    :param submit_timeout: thời gian chờ (giây) khi hàng đợi đầy trước khi ném KDFBusyError.
+    """
+
+    def __init__(self, memory_budget_mb: float = KDF_MEMORY_BUDGET_MB, max_workers: Optional[int] = None,
+                 max_queue: int = KDF_MAX_QUEUE, submit_timeout: float = KDF_SUBMIT_TIMEOUT):
+        per_call = scrypt_memory_bytes()
+        self.memory_per_call = per_call
+        by_memory = max(1, int(memory_budget_mb * 1024 * 1024 // per_call))
+        self.workers = max(1, min(max_workers or os.cpu_count() or 1, by_memory))
+        self.max_queue = max(0, max_queue)
+        self.submit_timeout = submit_timeout
+        self.memory_budget_mb = memory_budget_mb
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="kdf-worker")
+        # Mỗi yêu cầu giữ 1 chỗ từ lúc gửi tới lúc xong: tổng số chỗ = đang chạy + đang chờ
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,              # số yêu cầu bị từ chối vì hàng đợi đầy
+            "backpressure_waits": 0,    # số lần người gửi phải chờ chỗ trống
+            "backpressure_wait_total": 0.0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "run_time_total": 0.0,
+        }
+
+    # ----------------------------- Gửi yêu cầu -----------------------------
+    def _acquire_slot(self, timeout: Optional[float]):
+        if self._slots.acquire(blocking=False):
+            return
+        timeout = self.submit_timeout if timeout is None else timeout
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=timeout)
+        with self._lock:
+            self._stats["backpressure_waits"] += 1
+            self._stats["backpressure_wait_total"] += time.monotonic() - started
+            if not acquired:
+                self._stats["rejected"] += 1
+        if not acquired:
+            raise KDFBusyError(f"Hệ thống đang xử lý quá nhiều yêu cầu mật khẩu, vui lòng thử lại sau ({timeout:.0f}s).")
+
+    def _submit(self, fn, *args, timeout: Optional[float] = None) -> Future:
+        self._acquire_slot(timeout)
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["in_flight"] += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._stats["in_flight"])
+        try:
+            return self._executor.submit(self._run, fn, *args)
+        except RuntimeError as e:
+            # Executor đã đóng: nơi còn giữ executor cũ sau reset_kdf_executor được chuyển sang executor dùng chung mới
+            self._finish(0.0, failed=True)
+            current = get_kdf_executor()
+            if current is self:
+                raise KDFBusyError("Bộ băm mật khẩu đã dừng, vui lòng thử lại sau.") from e
+            return current._submit(fn, *args, timeout=timeout)
+        except Exception:
+            self._finish(0.0, failed=True)
+            raise
+
+    def _run(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            self._finish(time.perf_counter() - started, failed=True)
+            raise
+        self._finish(time.perf_counter() - started, failed=result is None)
+        return result
+
+    def _finish(self, elapsed: float, failed: bool):
+        with self._lock:
+            self._stats["in_flight"] -= 1
+            self._stats["completed"] += 1
+            self._stats["run_time_total"] += elapsed
+            if failed:
+                self._stats["failed"] += 1
+        self._slots.release()
+
+    def submit_hash(self, password: str, timeout: Optional[float] = None) -> Future:
+        """Gửi yêu cầu băm, Future trả về (salt_hex, hash_hex) giống Hash.scrypt."""
+        return self._submit(Hash.scrypt, password, timeout=timeout)
+
+    def submit_verify(self, stored_salt: str, stored_hashed_password: str, input_password: str,
+                      timeout: Optional[float] = None) -> Future:
+        """Gửi yêu cầu kiểm tra mật khẩu, Future trả về True/False giống Hash.verify."""
+        return self._submit(Hash.verify, stored_salt, stored_hashed_password, input_password, timeout=timeout)
+
+    # ----------------------------- Gọi đồng bộ -----------------------------
+    def hash_password(self, password: str) -> Tuple[str, str]:
+        """Băm mật khẩu qua executor (chờ kết quả). Ném KDFBusyError nếu quá tải."""
+        return self.submit_hash(password).result()
+
+    def verify_password(self, stored_salt: str, stored_hashed_password: str, input_password: str) -> bool:
+        """Kiểm tra mật khẩu qua executor (chờ kết quả). Ném KDFBusyError nếu quá tải."""
+        return self.submit_verify(stored_salt, stored_hashed_password, input_password).result()
+
+    def hash_many(self, passwords: Iterable[str]) -> List[Tuple[str, str]]:
+        """
+        Băm nhiều mật khẩu, kết quả theo đúng thứ tự đầu vào.
+        Yêu cầu được gửi dần: khi hàng đợi đầy thì chờ (không nạp toàn bộ danh sách vào hàng đợi cùng lúc).
+        """
+        futures = [self.submit_hash(password) for password in passwords]
+        return [future.result() for future in futures]
+
+    def verify_many(self, items: Iterable[Sequence[str]]) -> List[bool]:
+        """Kiểm tra nhiều bộ (salt, hash, mật khẩu), kết quả theo đúng thứ tự đầu vào."""
+        futures = [self.submit_verify(salt, hashed, password) for salt, hashed, password in items]
+        return [bool(future.result()) for future in futures]
+
+    # ----------------------------- Thống kê / đóng -----------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data = dict(self._stats)
+        data["workers"] = self.workers
+        data["max_queue"] = self.max_queue
+        data["memory_budget_mb"] = self.memory_budget_mb
+        data["memory_per_call_mb"] = round(self.memory_per_call / (1024 * 1024), 2)
+        data["queued"] = max(0, data["in_flight"] - self.workers)
+        data["run_time_avg"] = round(data["run_time_total"] / data["completed"], 6) if data["completed"] else 0.0
+        return data
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+_shared_lock = threading.Lock()
+_shared_executor: Optional[KDFExecutor] = None
+
+
+def get_kdf_executor() -> KDFExecutor:
+    """Executor băm mật khẩu dùng chung cho toàn bộ tiến trình."""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = KDFExecutor()
+        return _shared_executor
+
+
+def reset_kdf_executor():
+    """
+    Bỏ executor dùng chung hiện tại (VD: sau khi đổi tham số scrypt), lần gọi get_kdf_executor kế tiếp sẽ tạo mới.
+    Executor cũ chạy nốt các yêu cầu đang chạy / đang chờ; nơi còn giữ nó mà gửi thêm yêu cầu
+    thì được chuyển sang executor dùng chung mới (không nhận RuntimeError của executor đã đóng).
+    """
+    global _shared_executor
+    with _shared_lock:
+        old, _shared_executor = _shared_executor, None
+    if old is not None:
+        old.shutdown(wait=False)
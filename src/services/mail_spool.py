@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+"""
+Hàng đợi gửi email bền vững (spool) có độ ưu tiên
+- Mỗi email là 1 tệp JSON trong thư mục spool: ứng dụng tắt giữa chừng thì lần chạy sau gửi tiếp (ít nhất 1 lần).
+  Riêng email critical (chứa OTP / mã đặt lại mật khẩu) chỉ nằm trong bộ nhớ, không bao giờ ghi ra đĩa:
+  ứng dụng tắt giữa chừng thì người dùng yêu cầu mã mới (mã cũ cũng sắp hết hạn).
+- Email thất bại hẳn được chép vào failed/ để tra cứu; thư mục này được dọn theo số tệp và tuổi tối đa.
+- Số luồng gửi cố định (không tạo 1 luồng cho mỗi email); mỗi luồng có phiên SMTP riêng.
+- 3 làn ưu tiên: critical (OTP, đặt lại mật khẩu) > normal > bulk (thông báo hàng loạt, tệp đính kèm lớn).
+  Luồng số 0 chỉ phục vụ làn critical -> OTP không bao giờ phải chờ sau email hàng loạt hay tệp đính kèm lớn.
+- Gửi lỗi tạm thời: hẹn giờ gửi lại theo lũy thừa 2 (không ngủ giữ luồng); lỗi vĩnh viễn (5xx) thì dừng ngay.
+- dedupe_key: email cùng khóa đang chờ/vừa gửi (trong MAIL_DEDUPE_WINDOW giây) không bị xếp hàng lại;
+  callback của lần gửi trùng được gắn vào email đang chờ (hoặc gọi ngay nếu email đã gửi xong).
+- status(job_id): trạng thái để giao diện hỏi định kỳ (queued / sending / retrying / sent / failed).
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Mở comment 3 dòng bên dưới mỗi khi test (Chạy trực tiếp hàm if __main__)
+import sys
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+logger = logging.getLogger(__name__)
+
+# Thư mục lưu các email đang chờ gửi
+MAIL_SPOOL_DIR = os.getenv("MAIL_SPOOL_DIR", os.path.join(os.path.dirname(PROJECT_DIR), "data", "mail_spool"))
+# Số luồng gửi (luồng đầu tiên dành riêng cho làn critical)
+MAIL_SPOOL_WORKERS = int(os.getenv("MAIL_SPOOL_WORKERS", "3"))
+# Số lần gửi tối đa cho 1 email
+MAIL_SPOOL_MAX_ATTEMPTS = int(os.getenv("MAIL_SPOOL_MAX_ATTEMPTS", "5"))
+# Thời gian chờ gửi lại: base * 2^(lần thử - 1), tối đa max (giây)
+MAIL_RETRY_BASE_DELAY = 5.0
+MAIL_RETRY_MAX_DELAY = 600.0
+# Khoảng thời gian (giây) bỏ qua email trùng dedupe_key vừa gửi xong
+MAIL_DEDUPE_WINDOW = 600.0
+# Số trạng thái email đã xong được giữ lại để tra cứu
+MAIL_STATUS_HISTORY = 1000
+# Số tệp tối đa và tuổi tối đa (giây) của các email thất bại giữ lại trong failed/
+MAIL_FAILED_KEEP = int(os.getenv("MAIL_FAILED_KEEP", "200"))
+MAIL_FAILED_MAX_AGE = 30 * 86400
+# Tệp đính kèm từ kích thước này (byte) trở lên được chuyển sang làn bulk
+BULK_ATTACHMENT_BYTES = 1024 * 1024
+
+# Các làn ưu tiên (số nhỏ = ưu tiên cao)
+PRIORITY_CRITICAL = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+LANE_NAMES = {PRIORITY_CRITICAL: "critical", PRIORITY_NORMAL: "normal", PRIORITY_BULK: "bulk"}
+
+STATUS_QUEUED = "queued"
+STATUS_SENDING = "sending"
+STATUS_RETRYING = "retrying"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_SENDING, STATUS_RETRYING)
+
+
+def is_permanent_error(error: BaseException) -> bool:
+    """Lỗi 5xx / người nhận bị từ chối: gửi lại cũng không thành công."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return isinstance(error, ValueError)
+
+
+def retry_delay(attempts: int, base: float = MAIL_RETRY_BASE_DELAY, max_delay: float = MAIL_RETRY_MAX_DELAY) -> float:
+    """Thời gian chờ trước lần gửi kế tiếp (có nhiễu ngẫu nhiên ±20% để các email lỗi cùng lúc không dồn lại)."""
+    delay = min(max_delay, base * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class MailSpool:
+    """
+    Hàng đợi email lưu trên đĩa + nhóm luồng gửi.
+
+    :param sender: InternalEmailSender dùng để dựng và gửi email (sender.deliver, sender.new_session).
+    :param directory: thư mục spool.
+    :param workers: số luồng gửi (tối thiểu 2: 1 luồng riêng cho critical + 1 luồng chung).
+    :param max_attempts: số lần gửi tối đa mỗi email.
+    :param base_delay: thời gian chờ gửi lại lần đầu (giây).
+    """
+
+    def __init__(self, sender, directory: str = MAIL_SPOOL_DIR, workers: int = MAIL_SPOOL_WORKERS,
+                 max_attempts: int = MAIL_SPOOL_MAX_ATTEMPTS, base_delay: float = MAIL_RETRY_BASE_DELAY,
+                 start: bool = True):
+        self.sender = sender
+        self.directory = directory
+        self.failed_directory = os.path.join(directory, "failed")
+        self.workers = max(2, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+
+        self._cond = threading.Condition()
+        self._lanes: Dict[int, List] = {lane: [] for lane in LANE_NAMES}
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._callbacks: Dict[str, List[Callable]] = {}
+        self._active_keys: Dict[str, str] = {}
+        self._recent_keys: Dict[str, tuple] = {}
+        self._history: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._stats = {"enqueued": 0, "deduplicated": 0, "sent": 0, "failed": 0, "retries": 0, "recovered": 0}
+
+        os.makedirs(self.failed_directory, exist_ok=True)
+        self._recover()
+        self._prune_failed(scrub=True)
+        if start:
+            self.start()
+
+    # ----------------------------- Lưu trữ -----------------------------
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    @staticmethod
+    def _persistent(job: Dict[str, Any]) -> bool:
+        """Email critical (OTP, đặt lại mật khẩu) chỉ giữ trong bộ nhớ để mã bí mật không nằm lại trên đĩa."""
+        return job["priority"] != PRIORITY_CRITICAL
+
+    def _write(self, job: Dict[str, Any], directory: Optional[str] = None):
+        """Ghi tệp JSON nguyên tử (ghi tệp tạm rồi đổi tên) để không bao giờ đọc phải tệp ghi dở."""
+        if not self._persistent(job):
+            return
+        path = os.path.join(directory or self.directory, f"{job['id']}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _remove(self, job_id: str):
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _prune_failed(self, scrub: bool = False):
+        """
+        Giữ tối đa MAIL_FAILED_KEEP email thất bại gần nhất trong failed/, bỏ các email cũ hơn MAIL_FAILED_MAX_AGE.
+        scrub=True (lúc khởi động): xóa thêm các email critical do phiên bản cũ ghi lại.
+        """
+        try:
+            names = sorted((name for name in os.listdir(self.failed_directory) if name.endswith(".json")), reverse=True)
+        except OSError as e:
+            logger.warning("Không đọc được thư mục %s: %s", self.failed_directory, e)
+            return
+        cutoff = time.time() - MAIL_FAILED_MAX_AGE
+        for index, name in enumerate(names):
+            path = os.path.join(self.failed_directory, name)
+            try:
+                if index >= MAIL_FAILED_KEEP or os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                elif scrub:
+                    with open(path, "r", encoding="utf-8") as f:
+                        critical = json.load(f).get("priority") == PRIORITY_CRITICAL
+                    if critical:
+                        os.remove(path)
+            except (OSError, ValueError) as e:
+                logger.warning("Không xóa được %s: %s", path, e)
+
+    def _recover(self):
+        """Nạp lại các email chưa gửi xong từ lần chạy trước (email đang 'sending' được gửi lại)."""
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error("Bỏ qua tệp spool hỏng %s: %s", name, e)
+                continue
+            if job.get("status") == STATUS_SENDING:
+                job["status"] = STATUS_QUEUED
+            self._track(job)
+            if not self._persistent(job):
+                # Tệp critical do phiên bản cũ ghi lại: gửi từ bộ nhớ và xóa khỏi đĩa ngay
+                self._remove(job["id"])
+            self._stats["recovered"] += 1
+        if self._stats["recovered"]:
+            logger.info("Nạp lại %s email chưa gửi từ spool %s", self._stats["recovered"], self.directory)
+
+    def _track(self, job: Dict[str, Any]):
+        self._jobs[job["id"]] = job
+        if job.get("dedupe_key"):
+            self._active_keys[job["dedupe_key"]] = job["id"]
+        heapq.heappush(self._lanes[job["priority"]], (job["next_attempt_at"], next(self._seq), job["id"]))
+
+    # ----------------------------- Xếp hàng -----------------------------
+    def enqueue(self, to_email, subject, body, signature="", attachment_path=None, cc_email=None,
+                priority: int = PRIORITY_NORMAL, dedupe_key: Optional[str] = None,
+                callback: Optional[Callable[[str, bool], None]] = None) -> str:
+        """
+        Lưu email vào spool và trả về job_id ngay (không chờ gửi).
+        callback(to_email, success) được gọi trên luồng gửi khi email gửi xong hoặc thất bại hẳn.
+        Email trùng dedupe_key: trả về job_id đã có; callback được gắn vào email đó, hoặc gọi ngay với True nếu đã gửi xong.
+        """
+        if priority not in LANE_NAMES:
+            raise ValueError(f"Độ ưu tiên không hợp lệ: {priority}")
+        if priority == PRIORITY_NORMAL and attachment_path and os.path.exists(attachment_path) \
+                and os.path.getsize(attachment_path) >= BULK_ATTACHMENT_BYTES:
+            priority = PRIORITY_BULK
+
+        job_id, already_sent = self._enqueue_locked(to_email, subject, body, signature, attachment_path, cc_email,
+                                                    priority, dedupe_key, callback)
+        if already_sent:
+            # Email trùng đã gửi thành công trong cửa sổ dedupe: báo kết quả ngay (ngoài lock)
+            self._safe_callback(callback, job_id, to_email, True)
+        return job_id
+
+    def _enqueue_locked(self, to_email, subject, body, signature, attachment_path, cc_email, priority, dedupe_key,
+                        callback) -> Tuple[str, bool]:
+        """Xếp email (giữ lock); trả về (job_id, True nếu email trùng đã gửi xong và callback cần được gọi ngay)."""
+        with self._cond:
+            existing = self._find_duplicate(dedupe_key)
+            if existing is not None:
+                self._stats["deduplicated"] += 1
+                logger.info("Bỏ qua email trùng khóa %s (job %s)", dedupe_key, existing)
+                if callback is None:
+                    return existing, False
+                if existing in self._jobs:
+                    # Email trùng còn đang chờ gửi: báo kết quả cùng lúc với email đó
+                    self._callbacks.setdefault(existing, []).append(callback)
+                    return existing, False
+                return existing, True
+
+            now = time.time()
+            job = {
+                "id": f"{int(now * 1000):013d}-{uuid.uuid4().hex[:8]}",
+                "to_email": to_email,
+                "subject": subject,
+                "body": body,
+                "signature": signature,
+                "attachment_path": attachment_path,
+                "cc_email": cc_email,
+                "priority": priority,
+                "dedupe_key": dedupe_key,
+                "status": STATUS_QUEUED,
+                "attempts": 0,
+                "created_at": now,
+                "next_attempt_at": now,
+                "last_error": None,
+            }
+            self._write(job)
+            self._track(job)
+            if callback is not None:
+                self._callbacks[job["id"]] = [callback]
+            self._stats["enqueued"] += 1
+            self._cond.notify_all()
+            return job["id"], False
+
+    def _find_duplicate(self, dedupe_key: Optional[str]) -> Optional[str]:
+        if not dedupe_key:
+            return None
+        if dedupe_key in self._active_keys:
+            return self._active_keys[dedupe_key]
+        recent = self._recent_keys.get(dedupe_key)
+        if recent and time.time() - recent[1] < MAIL_DEDUPE_WINDOW:
+            return recent[0]
+        return None
+
+    # ----------------------------- Luồng gửi -----------------------------
+    def start(self):
+        if self._threads:
+            return
+        for index in range(self.workers):
+            # Luồng 0 chỉ gửi email critical, các luồng khác gửi mọi làn theo thứ tự ưu tiên
+            lanes = (PRIORITY_CRITICAL,) if index == 0 else tuple(sorted(LANE_NAMES))
+            thread = threading.Thread(target=self._worker, args=(lanes,), name=f"mail-spool-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_job(self, lanes) -> Optional[Dict[str, Any]]:
+        """Chờ (không giữ CPU) tới khi có email đến hạn gửi trong các làn được phục vụ."""
+        with self._cond:
+            while not self._stopping:
+                now = time.time()
+                earliest = None
+                for lane in lanes:
+                    heap = self._lanes[lane]
+                    if heap and heap[0][0] <= now:
+                        _, _, job_id = heapq.heappop(heap)
+                        job = self._jobs.get(job_id)
+                        if job is None:
+                            continue
+                        job["status"] = STATUS_SENDING
+                        return job
+                    if heap:
+                        earliest = heap[0][0] if earliest is None else min(earliest, heap[0][0])
+                self._cond.wait(None if earliest is None else max(0.0, earliest - now))
+        return None
+
+    def _worker(self, lanes):
+        session = self.sender.new_session()
+        try:
+            while True:
+                job = self._next_job(lanes)
+                if job is None:
+                    return
+                self._write(job)
+                try:
+                    self.sender.deliver(job["to_email"], job["subject"], job["body"], job["signature"],
+                                        job["attachment_path"], job["cc_email"], session=session)
+                except Exception as e:
+                    self._on_failure(job, e)
+                else:
+                    self._on_success(job)
+        finally:
+            session.close()
+
+    def _on_success(self, job):
+        with self._cond:
+            job["status"] = STATUS_SENT
+            job["attempts"] += 1
+            job["last_error"] = None
+            self._remove(job["id"])
+            self._finish(job)
+            self._stats["sent"] += 1
+        logger.info("Email gửi thành công tới %s (job %s, lần %s).", job["to_email"], job["id"], job["attempts"])
+        self._fire_callback(job, True)
+
+    def _on_failure(self, job, error: BaseException):
+        with self._cond:
+            job["attempts"] += 1
+            job["last_error"] = f"{type(error).__name__}: {error}"
+            if is_permanent_error(error) or job["attempts"] >= self.max_attempts:
+                job["status"] = STATUS_FAILED
+                self._write(job, self.failed_directory)
+                self._remove(job["id"])
+                self._finish(job)
+                self._stats["failed"] += 1
+                final = True
+            else:
+                job["status"] = STATUS_RETRYING
+                job["next_attempt_at"] = time.time() + retry_delay(job["attempts"], self.base_delay)
+                self._write(job)
+                heapq.heappush(self._lanes[job["priority"]], (job["next_attempt_at"], next(self._seq), job["id"]))
+                self._stats["retries"] += 1
+                self._cond.notify_all()
+                final = False
+        logger.error("Gửi email tới %s thất bại lần %s (job %s). Lỗi: %s",
+                     job["to_email"], job["attempts"], job["id"], job["last_error"])
+        if final:
+            if self._persistent(job):
+                self._prune_failed()
+            self._fire_callback(job, False)
+
+    def _finish(self, job):
+        """Email đã xong (gửi được hoặc thất bại hẳn): chuyển sang lịch sử trạng thái."""
+        self._jobs.pop(job["id"], None)
+        key = job.get("dedupe_key")
+        if key:
+            self._active_keys.pop(key, None)
+            if job["status"] == STATUS_SENT:
+                self._recent_keys[key] = (job["id"], time.time())
+        self._history[job["id"]] = self._describe(job)
+        while len(self._history) > MAIL_STATUS_HISTORY:
+            self._history.popitem(last=False)
+        # Dọn các khóa dedupe đã quá hạn
+        cutoff = time.time() - MAIL_DEDUPE_WINDOW
+        for stale in [k for k, (_, at) in self._recent_keys.items() if at < cutoff]:
+            del self._recent_keys[stale]
+
+    def _fire_callback(self, job, success: bool):
+        with self._cond:
+            callbacks = self._callbacks.pop(job["id"], [])
+        for callback in callbacks:
+            self._safe_callback(callback, job["id"], job["to_email"], success)
+
+    @staticmethod
+    def _safe_callback(callback: Callable, job_id: str, to_email: str, success: bool):
+        try:
+            callback(to_email, success)
+        except Exception as e:
+            logger.error("Lỗi trong callback gửi email %s: %s", job_id, e)
+
+    # ----------------------------- Trạng thái -----------------------------
+    @staticmethod
+    def _describe(job) -> Dict[str, Any]:
+        data = {
+            "id": job["id"],
+            "to_email": job["to_email"],
+            "lane": LANE_NAMES[job["priority"]],
+            "status": job["status"],
+            "attempts": job["attempts"],
+            "last_error": job["last_error"],
+        }
+        if job["status"] == STATUS_RETRYING:
+            data["next_attempt_in"] = round(max(0.0, job["next_attempt_at"] - time.time()), 1)
+        return data
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Trạng thái 1 email (None nếu không biết job_id này)."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._describe(job)
+            return self._history.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            data = dict(self._stats)
+            data["pending"] = {LANE_NAMES[lane]: len(heap) for lane, heap in self._lanes.items()}
+            data["in_flight"] = sum(1 for job in self._jobs.values() if job["status"] == STATUS_SENDING)
+            data["workers"] = self.workers
+        return data
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Chờ tới khi không còn email nào chưa xong (dùng khi thoát ứng dụng / benchmark)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if not self._jobs:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """Dừng các luồng gửi; email chưa gửi vẫn nằm trong spool cho lần chạy sau."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join(timeout)
+        self._threads = []
+
+
+_shared_lock = threading.Lock()
+_shared_spool: Optional[MailSpool] = None
+
+
+def get_mail_spool(sender) -> MailSpool:
+    """Spool dùng chung cho toàn bộ ứng dụng; sender đầu tiên gọi hàm này được dùng để gửi."""
+    global _shared_spool
+    with _shared_lock:
+        if _shared_spool is None:
+            _shared_spool = MailSpool(sender)
+        return _shared_spool
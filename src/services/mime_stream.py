@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Dựng email MIME dạng luồng cho tệp đính kèm lớn
+- Phần đầu email (header + nội dung HTML) vẫn dựng bằng thư viện email (nhỏ).
+- Tệp đính kèm được đọc theo khối, mã hóa base64 từng khối và đẩy thẳng vào lệnh DATA của SMTP:
+  bộ nhớ gần như không đổi dù tệp 200 MB (không còn attachment.read() + msg.as_string()).
+- Tệp dễ nén (log, csv, txt, json, xml...) có thể được nén gzip trên đường truyền trước khi base64.
+- Kết quả là các đoạn bytes đã chuẩn hóa CRLF và dot-stuffing, gửi qua SMTPSession.sendmail_stream.
+"""
+import logging
+import os
+import re
+import uuid
+import zlib
+from base64 import b64encode
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Iterator, List, Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+CRLF = b"\r\n"
+# 57 byte dữ liệu -> đúng 1 dòng base64 76 ký tự; mỗi lần đọc 1024 dòng (~57 KB)
+BASE64_LINE_BYTES = 57
+READ_BLOCK_BYTES = BASE64_LINE_BYTES * 1024
+
+# Phần mở rộng được coi là dễ nén và kích thước tối thiểu để nén khi compress="auto"
+COMPRESSIBLE_EXTENSIONS = {".log", ".txt", ".csv", ".json", ".xml", ".html", ".htm", ".sql", ".tsv", ".md"}
+COMPRESS_MIN_BYTES = 64 * 1024
+
+_LEADING_DOT = re.compile(rb"(?m)^\.")
+
+
+def dot_stuff(data: bytes) -> bytes:
+    """Nhân đôi dấu chấm đầu dòng (RFC 5321 4.5.2) để không bị hiểu nhầm là kết thúc DATA."""
+    return _LEADING_DOT.sub(b"..", data)
+
+
+class Base64LineEncoder:
+    """
+    Mã hóa base64 theo luồng: nhận dữ liệu có độ dài bất kỳ, trả về các dòng 76 ký tự hoàn chỉnh (kết thúc CRLF),
+    phần dư (< 57 byte) được giữ lại tới lần feed kế tiếp hoặc finish().
+    """
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data: bytes) -> bytes:
+        data = self._pending + data
+        usable = len(data) - len(data) % BASE64_LINE_BYTES
+        self._pending = data[usable:]
+        if not usable:
+            return b""
+        encoded = b64encode(data[:usable])
+        return CRLF.join(encoded[i:i + 76] for i in range(0, len(encoded), 76)) + CRLF
+
+    def finish(self) -> bytes:
+        data, self._pending = self._pending, b""
+        return b64encode(data) + CRLF if data else b""
+
+
+def should_compress(path: str, compress: Union[bool, str] = "auto") -> bool:
+    if compress == "auto":
+        return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS and os.path.getsize(path) >= COMPRESS_MIN_BYTES
+    return bool(compress)
+
+
+def iter_attachment(path: str, boundary: str, compress: bool = False,
+                    block_size: int = READ_BLOCK_BYTES) -> Iterator[bytes]:
+    """
+    Sinh 1 phần MIME đính kèm: header của phần + nội dung base64 (đọc tệp theo khối).
+    compress=True: nén gzip trên đường truyền, tên tệp thêm đuôi .gz.
+    """
+    filename = os.path.basename(path)
+    if compress:
+        part = MIMEBase("application", "gzip")
+        filename += ".gz"
+    else:
+        part = MIMEBase("application", "octet-stream")
+    part.add_header("Content-Disposition", "attachment", filename=filename)
+    part["Content-Transfer-Encoding"] = "base64"
+
+    yield f"--{boundary}".encode("ascii") + CRLF
+    yield part.as_bytes(policy=part.policy.clone(linesep="\r\n"))
+
+    encoder = Base64LineEncoder()
+    # wbits=31: định dạng gzip (có header + CRC) để người nhận mở được bằng công cụ thông thường
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            if compressor is not None:
+                block = compressor.compress(block)
+            lines = encoder.feed(block)
+            if lines:
+                yield lines
+    if compressor is not None:
+        lines = encoder.feed(compressor.flush())
+        if lines:
+            yield lines
+    yield encoder.finish()
+
+
+def iter_message(from_addr: str, to_email: str, subject: str, html_body: str,
+                 attachments: Sequence[str] = (), cc_email: Optional[Union[str, List[str]]] = None,
+                 compress: Union[bool, str] = "auto") -> Iterator[bytes]:
+    """
+    Sinh toàn bộ email (multipart/mixed) dạng các đoạn bytes sẵn sàng gửi trong lệnh DATA.
+    Mỗi lần gọi tạo 1 luồng mới (có thể gọi lại khi cần gửi lại email).
+    """
+    boundary = f"===============stream_{uuid.uuid4().hex}=="
+    msg = MIMEMultipart(boundary=boundary)
+    msg["From"] = from_addr
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    if cc_email:
+        msg["Cc"] = cc_email if isinstance(cc_email, str) else ", ".join(cc_email)
+    msg.attach(MIMEText(html_body, "html", _charset="utf-8"))
+
+    # Dựng phần đầu (header + nội dung), bỏ dấu kết thúc multipart để chèn các tệp đính kèm phía sau
+    head = msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))
+    closing = f"--{boundary}--".encode("ascii")
+    head = head[:head.rindex(closing)]
+    yield dot_stuff(head)
+
+    for path in attachments:
+        yield from iter_attachment(path, boundary, compress=should_compress(path, compress))
+
+    yield closing + CRLF
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Phiên SMTP dùng lại giữa nhiều email
+- Mỗi email mới không phải kết nối TCP + STARTTLS + đăng nhập lại: phiên được giữ mở và dùng cho các email kế tiếp.
+- Trước khi dùng lại 1 phiên đã rảnh lâu sẽ gửi NOOP để chắc chắn máy chủ còn giữ kết nối.
+- Luồng keepalive gửi NOOP định kỳ khi rảnh, rảnh quá idle_timeout thì đóng phiên (không giữ kết nối vô hạn).
+- Máy chủ trả 421 hoặc socket bị ngắt: tự kết nối lại và gửi lại email đó 1 lần.
+- Sau max_messages email thì đóng phiên và mở phiên mới (nhiều máy chủ giới hạn số email mỗi phiên).
+- Mọi thao tác trên 1 phiên được tuần tự hóa bằng khóa (smtplib.SMTP không an toàn đa luồng).
+"""
+import logging
+import os
+import smtplib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Số email tối đa trong 1 phiên trước khi mở phiên mới
+SMTP_SESSION_MAX_MESSAGES = int(os.getenv("SMTP_SESSION_MAX_MESSAGES", "100"))
+# Phiên rảnh quá số giây này thì gửi NOOP kiểm tra trước khi dùng lại
+SMTP_NOOP_AFTER = float(os.getenv("SMTP_NOOP_AFTER", "15"))
+# Chu kỳ gửi NOOP giữ kết nối khi rảnh (giây)
+SMTP_KEEPALIVE_INTERVAL = float(os.getenv("SMTP_KEEPALIVE_INTERVAL", "60"))
+# Phiên rảnh quá số giây này thì đóng hẳn
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "300"))
+
+# Mã phản hồi báo máy chủ sắp đóng kết nối -> kết nối lại
+RECONNECT_CODES = {421}
+# Lỗi mất kết nối ở tầng socket
+DISCONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError, OSError)
+
+
+class SMTPSessionError(smtplib.SMTPException):
+    """Không mở được phiên SMTP (hàm kết nối trả về None)."""
+
+
+def _reset_or_close(server: smtplib.SMTP, code: int):
+    # Giống smtplib.sendmail: 421 thì máy chủ đã đóng kết nối, còn lại RSET để dùng tiếp phiên
+    if code == 421:
+        server.close()
+    else:
+        try:
+            server.rset()
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+
+def _stream_transaction(server: smtplib.SMTP, from_addr: str, to_addrs, chunks: Iterable[bytes]) -> Dict[str, Any]:
+    """MAIL FROM / RCPT TO / DATA với nội dung gửi dần theo từng đoạn (theo đúng quy ước lỗi của smtplib.sendmail)."""
+    server.ehlo_or_helo_if_needed()
+    code, resp = server.mail(from_addr)
+    if code != 250:
+        _reset_or_close(server, code)
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+
+    refused = {}
+    for addr in to_addrs:
+        code, resp = server.rcpt(addr)
+        if code not in (250, 251):
+            refused[addr] = (code, resp)
+        if code == 421:
+            server.close()
+            raise smtplib.SMTPRecipientsRefused(refused)
+    if len(refused) == len(to_addrs):
+        _reset_or_close(server, 0)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, resp = server.docmd("data")
+    if code != 354:
+        _reset_or_close(server, code)
+        raise smtplib.SMTPDataError(code, resp)
+
+    tail = b""
+    try:
+        for chunk in chunks:
+            if chunk:
+                server.send(chunk)
+                tail = chunk[-2:]
+    except Exception:
+        # Đang dở lệnh DATA (VD: lỗi đọc tệp đính kèm) -> phiên không dùng tiếp được
+        server.close()
+        raise
+    server.send((b"" if tail == b"\r\n" else b"\r\n") + b".\r\n")
+    code, resp = server.getreply()
+    if code != 250:
+        _reset_or_close(server, code)
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
+
+
+class SMTPSession:
+    """
+    Giữ 1 kết nối SMTP và dùng lại cho nhiều email.
+
+    :param connect: hàm tạo kết nối đã sẵn sàng gửi (VD: InternalEmailSender.connect_to_email_server), trả về None nếu lỗi.
+    :param max_messages: số email tối đa mỗi phiên.
+    :param noop_after: phiên rảnh quá số giây này thì NOOP trước khi dùng lại.
+    :param keepalive_interval: chu kỳ NOOP nền khi rảnh (0 = tắt luồng keepalive).
+    :param idle_timeout: phiên rảnh quá số giây này thì đóng.
+    """
+
+    def __init__(self, connect: Callable[[], Optional[smtplib.SMTP]], max_messages: int = SMTP_SESSION_MAX_MESSAGES,
+                 noop_after: float = SMTP_NOOP_AFTER, keepalive_interval: float = SMTP_KEEPALIVE_INTERVAL,
+                 idle_timeout: float = SMTP_IDLE_TIMEOUT):
+        self._connect = connect
+        self.max_messages = max(1, max_messages)
+        self.noop_after = noop_after
+        self.keepalive_interval = keepalive_interval
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.RLock()
+        self._server: Optional[smtplib.SMTP] = None
+        self._messages_in_session = 0
+        self._last_used = 0.0
+        self._keepalive_thread: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+        self._stats = {
+            "connects": 0,
+            "reconnects": 0,       # kết nối lại do 421/mất kết nối
+            "recycled": 0,         # đóng phiên do đủ max_messages
+            "idle_closed": 0,      # đóng phiên do rảnh quá lâu
+            "noops": 0,
+            "noop_failures": 0,
+            "messages": 0,
+        }
+
+    # ----------------------------- Kết nối -----------------------------
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def _open(self) -> smtplib.SMTP:
+        server = self._connect()
+        if server is None:
+            raise SMTPSessionError("Không thể kết nối tới máy chủ mail")
+        self._server = server
+        self._messages_in_session = 0
+        self._last_used = time.monotonic()
+        self._stats["connects"] += 1
+        self._closed.clear()
+        self._start_keepalive()
+        return server
+
+    def _drop(self, quit: bool = True):
+        """Đóng phiên hiện tại; quit=False khi kết nối đã hỏng (không gửi QUIT)."""
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            if quit:
+                server.quit()
+            else:
+                server.close()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _noop_ok(self, server: smtplib.SMTP) -> bool:
+        self._stats["noops"] += 1
+        try:
+            code, _ = server.noop()
+        except (smtplib.SMTPException, OSError):
+            code = None
+        if code != 250:
+            self._stats["noop_failures"] += 1
+            return False
+        return True
+
+    def _ensure(self) -> smtplib.SMTP:
+        server = self._server
+        if server is None:
+            return self._open()
+        if time.monotonic() - self._last_used >= self.noop_after and not self._noop_ok(server):
+            self._drop(quit=False)
+            self._stats["reconnects"] += 1
+            return self._open()
+        return server
+
+    # ----------------------------- Gửi -----------------------------
+    def sendmail(self, from_addr: str, to_addrs, msg) -> Dict[str, Any]:
+        """
+        Gửi 1 email qua phiên hiện tại (mở phiên nếu chưa có).
+        Kết nối lại và thử lại đúng 1 lần nếu máy chủ trả 421 hoặc mất kết nối; lỗi khác được ném ra như smtplib.
+        Trả về dict người nhận bị từ chối giống smtplib.SMTP.sendmail.
+        """
+        return self._transact(lambda server: server.sendmail(from_addr, to_addrs, msg))
+
+    def sendmail_stream(self, from_addr: str, to_addrs, make_chunks: Callable[[], Iterable[bytes]]) -> Dict[str, Any]:
+        """
+        Giống sendmail nhưng nội dung được gửi dần theo từng đoạn bytes (không dựng cả email trong bộ nhớ).
+        make_chunks() trả về 1 luồng mới mỗi lần gọi (được gọi lại khi phải kết nối lại và gửi lại);
+        các đoạn phải đã chuẩn hóa CRLF và dot-stuffing (xem services.mime_stream).
+        """
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        return self._transact(lambda server: _stream_transaction(server, from_addr, to_addrs, make_chunks()))
+
+    def _transact(self, transaction: Callable[[smtplib.SMTP], Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            for attempt in range(2):
+                server = self._ensure()
+                try:
+                    refused = transaction(server)
+                except smtplib.SMTPResponseException as e:
+                    if e.smtp_code not in RECONNECT_CODES or attempt:
+                        if e.smtp_code in RECONNECT_CODES:
+                            self._drop(quit=False)
+                        raise
+                    logger.warning("Máy chủ mail trả %s, kết nối lại phiên SMTP", e.smtp_code)
+                    self._drop(quit=False)
+                    self._stats["reconnects"] += 1
+                    continue
+                except DISCONNECT_ERRORS as e:
+                    self._drop(quit=False)
+                    if attempt:
+                        raise
+                    logger.warning("Mất kết nối phiên SMTP (%s), kết nối lại", e)
+                    self._stats["reconnects"] += 1
+                    continue
+
+                self._last_used = time.monotonic()
+                self._messages_in_session += 1
+                self._stats["messages"] += 1
+                if self._messages_in_session >= self.max_messages:
+                    self._stats["recycled"] += 1
+                    self._drop(quit=True)
+                return refused
+
+    # ----------------------------- Keepalive -----------------------------
+    def _start_keepalive(self):
+        if self.keepalive_interval <= 0:
+            return
+        if self._keepalive_thread is not None and self._keepalive_thread.is_alive():
+            return
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop, name="smtp-keepalive", daemon=True)
+        self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._closed.wait(self.keepalive_interval):
+            # Đang gửi email thì bỏ qua lượt này (không chờ khóa)
+            if not self._lock.acquire(blocking=False):
+                continue
+            try:
+                if self._server is None:
+                    return
+                idle = time.monotonic() - self._last_used
+                if idle >= self.idle_timeout:
+                    self._stats["idle_closed"] += 1
+                    self._drop(quit=True)
+                    return
+                if idle >= self.keepalive_interval and not self._noop_ok(self._server):
+                    self._drop(quit=False)
+                    return
+            finally:
+                self._lock.release()
+
+    # ----------------------------- Thống kê / đóng -----------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data = dict(self._stats)
+            data["connected"] = self.connected
+            data["messages_in_session"] = self._messages_in_session
+        return data
+
+    def close(self):
+        """Gửi QUIT và đóng phiên (gọi khi thoát ứng dụng)."""
+        self._closed.set()
+        with self._lock:
+            self._drop(quit=True)
@@ -0,0 +1,586 @@
+# -*- coding: utf-8 -*-
+"""
+Backend SQLite cho My_Database (CSDL cục bộ, không cần SQL Server)
+- Cùng API công khai với My_Database: GUI, AsyncDatabase, benchmark dùng được mà không cần sửa.
+- Bảng Users, UserSessions, UserExternalLogin được tạo tự động với kiểu dữ liệu tương đương.
+- Các stored procedure (usp_GetUserByGoogle, usp_GetUserBySession, ...) được giả lập bằng Python trên cùng kết nối,
+  nên câu lệnh "EXEC usp_... ?" trong My_Database chạy được nguyên văn.
+- Một số cú pháp T-SQL được dịch khi thực thi: SELECT TOP (?) -> LIMIT ?, DELETE TOP(n) FROM -> DELETE FROM,
+  GETDATE()/SYSUTCDATETIME() là hàm SQLite đăng ký thêm.
+- Chọn backend bằng biến môi trường DB_BACKEND=sqlite (xem create_database trong database_service).
+"""
+import hashlib
+import logging
+import re
+import secrets
+import sqlite3
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# Mở comment 3 dòng bên dưới mỗi khi test (Chạy trực tiếp hàm if __main__)
+import os,sys
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+from services.connection_pool import ConnectionPool
+from services.circuit_breaker import get_circuit_breaker
+from services.database_service import My_Database, HOT_STATEMENTS
+from services.statement_cache import StatementCache
+from services.db_metrics import DB_METRICS
+
+logger = logging.getLogger(__name__)
+
+# Đường dẫn file SQLite mặc định (":memory:" để tạo CSDL trong bộ nhớ, mất khi đóng ứng dụng)
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", os.path.join(os.path.dirname(PROJECT_DIR), "data", "local_app.db"))
+
+# Thời gian chờ (giây) khi file CSDL đang bị khóa bởi kết nối khác
+SQLITE_BUSY_TIMEOUT = 30
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Users (
+        User_Name    TEXT COLLATE NOCASE,
+        Email        TEXT COLLATE NOCASE NOT NULL UNIQUE,
+        PasswordHash TEXT,
+        PasswordSalt TEXT,
+        IsActive     BIT NOT NULL DEFAULT 0,
+        ActivatedAt  DATETIME2,
+        Privilege    TEXT COLLATE NOCASE NOT NULL DEFAULT 'User',
+        OTP          TEXT,
+        Expired_OTP  DATETIME2,
+        Status       TEXT,
+        LastLoginAt  DATETIME2,
+        CreatedAt    DATETIME2 NOT NULL DEFAULT (GETDATE())
+    );
+    CREATE INDEX IF NOT EXISTS IX_Users_UserName_Email ON Users(User_Name, Email);
+    CREATE INDEX IF NOT EXISTS IX_Users_Privilege_Email ON Users(Privilege, Email);
+
+    CREATE TABLE IF NOT EXISTS UserSessions (
+        SessionId  INTEGER PRIMARY KEY AUTOINCREMENT,
+        UserEmail  TEXT COLLATE NOCASE NOT NULL,
+        TokenHash  TEXT NOT NULL UNIQUE,
+        ExpiresAt  DATETIME2 NOT NULL,
+        DeviceInfo TEXT,
+        CreatedAt  DATETIME2 NOT NULL DEFAULT (SYSUTCDATETIME()),
+        RevokedAt  DATETIME2
+    );
+    CREATE INDEX IF NOT EXISTS IX_UserSessions_UserEmail ON UserSessions(UserEmail);
+
+    CREATE TABLE IF NOT EXISTS UserExternalLogin (
+        Id             INTEGER PRIMARY KEY AUTOINCREMENT,
+        UserEmail      TEXT COLLATE NOCASE NOT NULL,
+        Provider       TEXT NOT NULL,
+        ProviderUserId TEXT NOT NULL,
+        ProviderEmail  TEXT,
+        CreatedAt      DATETIME2 NOT NULL DEFAULT (SYSUTCDATETIME()),
+        UNIQUE (Provider, ProviderUserId)
+    );
+"""
+
+_EXEC_RE = re.compile(r"^\s*EXEC(?:UTE)?\s+([\w.]+)", re.IGNORECASE)
+_SELECT_TOP_PARAM_RE = re.compile(r"^\s*SELECT\s+TOP\s*\(\s*\?\s*\)", re.IGNORECASE)
+_DELETE_TOP_RE = re.compile(r"\bDELETE\s+TOP\s*\(\s*\d+\s*\)\s+FROM\b", re.IGNORECASE)
+
+# Cột trả về của các SP tra cứu người dùng (giống SQL Server: User_Name, Email, IsActive, Privilege, Status)
+_USER_COLUMNS = "u.User_Name, u.Email, u.IsActive, u.Privilege, u.Status"
+
+
+def _now() -> str:
+    return datetime.now().isoformat(sep=" ", timespec="seconds")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _adapt(value: Any) -> Any:
+    """Chuyển tham số Python về kiểu SQLite lưu được (datetime -> chuỗi ISO)."""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def _parse_datetime(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode("utf-8"))
+
+
+# Kiểu cột giống SQL Server: DATETIME2 -> datetime, BIT -> bool (pyodbc trả về đúng các kiểu này)
+sqlite3.register_converter("DATETIME2", _parse_datetime)
+sqlite3.register_converter("BIT", lambda value: bool(int(value)))
+
+
+# ---------------- Stored procedure giả lập ----------------
+# Mỗi hàm nhận kết nối sqlite3 và tham số theo đúng thứ tự "?" trong câu EXEC, trả về (tên cột, danh sách dòng)
+
+def _select_user(db: sqlite3.Connection, where: str, params: Sequence[Any]) -> Tuple[List[str], List[tuple]]:
+    cursor = db.execute(f"SELECT {_USER_COLUMNS} FROM Users u {where}", tuple(params))
+    return [c[0] for c in cursor.description], cursor.fetchall()
+
+
+def _get_user_by_provider(provider: str) -> Callable:
+    def procedure(db, provider_user_id, email):
+        columns, rows = _select_user(
+            db,
+            "JOIN UserExternalLogin l ON l.UserEmail = u.Email WHERE l.Provider = ? AND l.ProviderUserId = ? LIMIT 1",
+            (provider, provider_user_id),
+        )
+        if not rows and email:
+            columns, rows = _select_user(db, "WHERE u.Email = ?", (email,))
+        return columns, rows
+    return procedure
+
+
+def _create_user_if_not_exists(db, user_name, email):
+    # Như SP thật: tài khoản tạo tự động qua đăng nhập Google/Facebook được kích hoạt ngay (IsActive = 1)
+    db.execute(
+        "INSERT OR IGNORE INTO Users (User_Name, Email, IsActive, Privilege) VALUES (?, ?, 1, 'User')",
+        (user_name, email),
+    )
+    return _select_user(db, "WHERE u.Email = ?", (email,))
+
+
+def _link_external_login_if_not_exists(db, user_email, provider, provider_user_id, provider_email):
+    db.execute(
+        "INSERT OR IGNORE INTO UserExternalLogin (UserEmail, Provider, ProviderUserId, ProviderEmail) VALUES (?, ?, ?, ?)",
+        (user_email, provider, provider_user_id, provider_email),
+    )
+    cursor = db.execute(
+        "SELECT UserEmail, Provider, ProviderUserId FROM UserExternalLogin WHERE Provider = ? AND ProviderUserId = ?",
+        (provider, provider_user_id),
+    )
+    return [c[0] for c in cursor.description], cursor.fetchall()
+
+
+def _get_user_by_session(db, token_hash):
+    cursor = db.execute(
+        f"""
+        SELECT {_USER_COLUMNS}, s.ExpiresAt
+        FROM UserSessions s
+        JOIN Users u ON u.Email = s.UserEmail
+        WHERE s.TokenHash = ? AND s.RevokedAt IS NULL AND s.ExpiresAt > ?
+        """,
+        (token_hash, _adapt(_utcnow())),
+    )
+    return [c[0] for c in cursor.description], cursor.fetchall()
+
+
+def _update_last_login_at(db, email):
+    db.execute("UPDATE Users SET LastLoginAt = GETDATE() WHERE Email = ?", (email,))
+    return [], []
+
+
+SQLITE_PROCEDURES: Dict[str, Callable] = {
+    "usp_GetUserByGoogle": _get_user_by_provider("google"),
+    "usp_GetUserByFacebook": _get_user_by_provider("facebook"),
+    "usp_CreateUserIfNotExists_Google": _create_user_if_not_exists,
+    "usp_CreateUserIfNotExists_External": _create_user_if_not_exists,
+    "usp_LinkExternalLoginIfNotExists": _link_external_login_if_not_exists,
+    "usp_GetUserBySession": _get_user_by_session,
+    "usp_UpdateLastLoginAt": _update_last_login_at,
+}
+
+# SP tra cứu / tạo user theo nhà cung cấp đăng nhập ngoài (dùng trong social_login)
+SQLITE_SOCIAL_LOGIN_PROVIDERS = {
+    "google": ("usp_GetUserByGoogle", "usp_CreateUserIfNotExists_Google"),
+    "facebook": ("usp_GetUserByFacebook", "usp_CreateUserIfNotExists_External"),
+}
+
+
+# ---------------- Lớp bọc kết nối/cursor kiểu pyodbc ----------------
+
+class SQLiteCursor:
+    """
+    Cursor có hành vi giống pyodbc mà My_Database đang dùng:
+    - execute(query, params) nhận tuple hoặc 1 giá trị đơn, câu "EXEC usp_..." chạy SP giả lập.
+    - Dùng được với "with": thoát khối không lỗi thì commit (giống pyodbc).
+    - Có fast_executemany, arraysize, nextset để code chung không phải rẽ nhánh.
+    """
+
+    def __init__(self, connection: "SQLiteConnection"):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+        self._rows = None            # kết quả của SP giả lập (None nếu là câu lệnh thường)
+        self._description = None
+        self._rowcount = -1
+        self.fast_executemany = False
+
+    @property
+    def description(self):
+        return self._description if self._rows is not None else self._cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._rowcount if self._rows is not None else self._cursor.rowcount
+
+    @property
+    def arraysize(self) -> int:
+        return self._cursor.arraysize
+
+    @arraysize.setter
+    def arraysize(self, value: int):
+        self._cursor.arraysize = value
+
+    @staticmethod
+    def _params(params) -> tuple:
+        if params is None:
+            return ()
+        if not isinstance(params, (list, tuple)):
+            params = (params,)
+        return tuple(_adapt(value) for value in params)
+
+    def execute(self, query: str, params=None):
+        params = self._params(params)
+        exec_match = _EXEC_RE.match(query)
+        if exec_match:
+            procedure = SQLITE_PROCEDURES.get(exec_match.group(1))
+            if procedure is None:
+                raise sqlite3.OperationalError(f"Không có stored procedure giả lập: {exec_match.group(1)}")
+            columns, rows = procedure(self._connection.raw, *params)
+            self._rows = list(rows)
+            self._description = [(name, None, None, None, None, None, None) for name in columns] or None
+            self._rowcount = len(self._rows)
+            return self
+
+        self._rows = None
+        if _SELECT_TOP_PARAM_RE.match(query):
+            # SELECT TOP (?) ... -> SELECT ... LIMIT ? (tham số TOP chuyển xuống cuối)
+            query = _SELECT_TOP_PARAM_RE.sub("SELECT", query, count=1) + " LIMIT ?"
+            params = params[1:] + params[:1]
+        query = _DELETE_TOP_RE.sub("DELETE FROM", query)
+        self._cursor.execute(query, params)
+        return self
+
+    def executemany(self, query: str, seq_of_params):
+        self._rows = None
+        self._cursor.executemany(query, [self._params(params) for params in seq_of_params])
+        return self
+
+    def fetchall(self) -> list:
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return rows
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size: int = None) -> list:
+        size = size or self.arraysize
+        if self._rows is not None:
+            rows, self._rows = self._rows[:size], self._rows[size:]
+            return rows
+        return self._cursor.fetchmany(size)
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def nextset(self) -> bool:
+        # Mỗi lần execute chỉ có 1 result set
+        return False
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._connection.commit()
+
+
+class SQLiteConnection:
+    """Kết nối sqlite3 bọc lại để pool và My_Database dùng như kết nối pyodbc."""
+
+    def __init__(self, raw: sqlite3.Connection):
+        self.raw = raw
+        self.closed = False
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.closed = True
+        self.raw.close()
+
+
+def connect_sqlite(target: str, uri: bool = False) -> SQLiteConnection:
+    """Mở kết nối SQLite có đăng ký các hàm T-SQL thường dùng."""
+    raw = sqlite3.connect(
+        target,
+        uri=uri,
+        timeout=SQLITE_BUSY_TIMEOUT,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False,  # Kết nối được mượn/trả qua pool giữa nhiều luồng (mỗi lúc 1 luồng dùng)
+    )
+    raw.create_function("GETDATE", 0, _now)
+    raw.create_function("SYSUTCDATETIME", 0, lambda: _adapt(_utcnow()))
+    return SQLiteConnection(raw)
+
+
+class SQLiteDatabase(My_Database):
+    """
+    My_Database chạy trên SQLite.
+
+    :param path: đường dẫn file CSDL, ":memory:" để tạo CSDL trong bộ nhớ (mặc định SQLITE_DB_PATH).
+    Các tham số pool giống My_Database; CSDL trong bộ nhớ luôn dùng tối đa 1 kết nối
+    (shared cache của SQLite khóa theo bảng, nhiều kết nối ghi đồng thời sẽ lỗi thay vì chờ).
+    """
+
+    def __init__(self, path=None, pool_min_size=1, pool_max_size=10, pool_timeout=10.0, pool_idle_timeout=300.0):
+        path = path or SQLITE_DB_PATH
+        self.database_name = f"sqlite:{os.path.basename(path) if path != ':memory:' else 'memory'}"
+        self.pool = None
+        self.breaker = None
+        self.statements = StatementCache(HOT_STATEMENTS)
+        self.metrics = DB_METRICS
+
+        if path == ":memory:":
+            # Mỗi đối tượng có 1 CSDL riêng, giữ 1 kết nối mở để CSDL không bị xóa khi pool đóng bớt kết nối
+            self._target, self._uri = f"file:memdb-{uuid.uuid4().hex}?mode=memory&cache=shared", True
+            pool_min_size, pool_max_size = 1, 1
+        else:
+            ensure_dir = os.path.dirname(os.path.abspath(path))
+            os.makedirs(ensure_dir, exist_ok=True)
+            self._target, self._uri = path, False
+        self.connection_string = self._target
+
+        self._keeper = connect_sqlite(self._target, self._uri)
+        self._create_schema(self._keeper)
+
+        self.breaker = get_circuit_breaker(
+            f"sqlite:{self._target}",
+            name=self.database_name,
+            probe=self._probe_connection,
+        )
+        self.pool = ConnectionPool(
+            factory=lambda: self.breaker.call(lambda: connect_sqlite(self._target, self._uri)),
+            min_size=pool_min_size,
+            max_size=pool_max_size,
+            borrow_timeout=pool_timeout,
+            idle_timeout=pool_idle_timeout,
+            name=f"db-{self.database_name}",
+            on_discard=self.statements.discard_connection,
+        )
+
+    @staticmethod
+    def _create_schema(conn: SQLiteConnection):
+        """Tạo bảng/index nếu chưa có; file CSDL dùng WAL để đọc không chặn ghi."""
+        if conn.raw.execute("PRAGMA database_list").fetchone()[2]:
+            conn.raw.execute("PRAGMA journal_mode=WAL")
+        conn.raw.executescript(SCHEMA)
+        conn.commit()
+
+    def _probe_connection(self):
+        conn = connect_sqlite(self._target, self._uri)
+        try:
+            conn.raw.execute("SELECT 1").fetchall()
+        finally:
+            conn.close()
+
+    def close(self):
+        """
+        Đóng pool và kết nối giữ CSDL (CSDL trong bộ nhớ sẽ bị xóa).
+        """
+        super().close()
+        self._keeper.close()
+
+    # ---------------- Các hàm dùng cú pháp riêng của SQL Server ----------------
+
+    def social_login(self, provider: str, provider_user_id: str, email: str, user_name: str | None = None,
+                     remember: bool = False, days: int = 30, device_info: str | None = None):
+        """
+        Giống My_Database.social_login: tìm/tạo user, link provider, tạo session, cập nhật LastLoginAt
+        trong 1 transaction trên 1 kết nối (các SP được giả lập thay cho batch T-SQL).
+        """
+        response = {
+            "success": False,
+            "message": "",
+            "data": [],
+            "token": None
+        }
+
+        procedures = SQLITE_SOCIAL_LOGIN_PROVIDERS.get(provider)
+        if procedures is None:
+            response["message"] = f"Không hỗ trợ đăng nhập bằng: {provider}"
+            return response
+        lookup_procedure, create_procedure = procedures
+
+        raw_token, token_hash = self._new_session_token() if remember else (None, None)
+
+        conn = self._connect()
+        if conn:
+            try:
+                with conn.cursor() as cursor, self.metrics.track("", None, f"BATCH social_login_{provider}") as tracker:
+                    # User đã link với tài khoản provider này, nếu chưa link thì user trùng email
+                    cursor.execute(
+                        "SELECT UserEmail FROM UserExternalLogin WHERE Provider = ? AND ProviderUserId = ? LIMIT 1",
+                        (provider, provider_user_id),
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        cursor.execute("SELECT Email FROM Users WHERE Email = ? LIMIT 1", (email,))
+                        rows = cursor.fetchall()
+                    user_email = rows[0][0] if rows else None
+
+                    # Lần đầu đăng nhập: tạo user nội bộ và mapping provider
+                    if user_email is None:
+                        cursor.execute(f"EXEC {create_procedure} @UserName = ?, @Email = ?", (user_name or email, email))
+                        cursor.execute(
+                            "EXEC usp_LinkExternalLoginIfNotExists @UserEmail = ?, @Provider = ?, @ProviderUserId = ?, @ProviderEmail = ?",
+                            (email, provider, provider_user_id, email),
+                        )
+                        user_email = email
+
+                    cursor.execute("SELECT 1 FROM Users WHERE Email = ? AND IsActive = 1", (user_email,))
+                    if cursor.fetchall():
+                        if token_hash is not None:
+                            cursor.execute(
+                                "INSERT INTO UserSessions(UserEmail, TokenHash, ExpiresAt, DeviceInfo) VALUES (?, ?, ?, ?)",
+                                (user_email, token_hash, _utcnow() + timedelta(days=days), device_info),
+                            )
+                        cursor.execute("EXEC usp_UpdateLastLoginAt @Email = ?", (user_email,))
+
+                    cursor.execute(f"EXEC {lookup_procedure} @ProviderUserId = ?, @Email = ?", (provider_user_id, email))
+                    rows = cursor.fetchall()
+                    tracker.rows = len(rows)
+
+                response["data"] = rows
+                if not rows:
+                    response["message"] = "Không lấy được dữ liệu người dùng sau khi đăng nhập."
+                else:
+                    response["success"] = True
+                    response["message"] = "Đăng nhập thành công."
+                    response["token"] = raw_token if rows[0][2] else None
+
+            except Exception as e:
+                conn.rollback()
+                response["message"] = f"Lỗi đăng nhập {provider}: {e}"
+
+            finally:
+                conn.close()
+        else:
+            response["message"] = self.connection_unavailable_message()
+
+        self.invalidate_user_cache(email)
+        return response
+
+    @staticmethod
+    def _new_session_token():
+        """Sinh raw token (trả cho client) và hash của nó (lưu CSDL)."""
+        raw_token = secrets.token_urlsafe(32)
+        return raw_token, hashlib.sha256(raw_token.encode("utf-8")).hexdigest()
+
+    def create_session_by_email(self, email: str, days: int = 30, device_info: str | None = None):
+        """
+        Tạo session theo Email (thời điểm hết hạn tính bằng Python thay cho DATEADD).
+        """
+        raw_token, token_hash = self._new_session_token()
+        query = """
+            INSERT INTO UserSessions(UserEmail, TokenHash, ExpiresAt, DeviceInfo)
+            VALUES (?, ?, ?, ?)
+        """
+        result = self._execute_non_query(query, (email, token_hash, _utcnow() + timedelta(days=days), device_info))
+        if not result["success"]:
+            return {"success": False, "message": result["message"], "token": None}
+        return {"success": True, "message": "Tạo session thành công.", "token": raw_token}
+
+    def _execute_bulk_by_email(self, rows, temp_columns, statement, action):
+        """
+        Giống My_Database._execute_bulk_by_email nhưng dùng bảng tạm của SQLite (temp.BulkUsers).
+        SQLite không có OUTPUT ... INTO nên danh sách email bị tác động được lấy trước khi thực thi, trong cùng transaction.
+        """
+        response = {
+            "success": False,
+            "message": "",
+            "data": []
+        }
+
+        unique_rows = self._unique_bulk_rows(rows)
+        if not unique_rows:
+            response["message"] = "Không có tài khoản nào được chọn."
+            return response
+
+        number_columns = len(next(iter(unique_rows.values())))
+        insert_query = f"INSERT INTO temp.BulkUsers VALUES ({', '.join('?' * number_columns)})"
+
+        conn = self._connect()
+        if conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("DROP TABLE IF EXISTS temp.BulkUsers")
+                    cursor.execute(f"CREATE TEMP TABLE BulkUsers ({temp_columns})")
+                    cursor.executemany(insert_query, list(unique_rows.values()))
+
+                    cursor.execute("SELECT u.Email FROM Users u JOIN temp.BulkUsers b ON u.Email = b.Email")
+                    affected = {str(row[0] or "").strip().lower() for row in cursor.fetchall()}
+
+                    self._timed_execute(cursor, statement, statement=f"BULK {action}")
+                    cursor.execute("DROP TABLE temp.BulkUsers")
+                    conn.commit()
+
+                self._fill_bulk_response(response, unique_rows, affected, action)
+
+            except Exception as e:
+                conn.rollback()
+                response["success"] = False
+                response["message"] = f"Lỗi khi {action.lower()} hàng loạt: {e}"
+                response["data"] = [
+                    {"email": row[0], "success": False, "message": str(e)} for row in unique_rows.values()
+                ]
+
+            finally:
+                conn.close()
+        else:
+            response["message"] = self.connection_unavailable_message()
+
+        for row in unique_rows.values():
+            self.invalidate_user_cache(row[0])
+
+        return response
+
+    def activate_users(self, emails, activate=True):
+        """
+        Kích hoạt hoặc khóa nhiều tài khoản trong 1 transaction
+        """
+        if activate:
+            statement = "UPDATE Users SET ActivatedAt = GETDATE(), IsActive = 1 WHERE Email IN (SELECT Email FROM temp.BulkUsers)"
+        else:
+            statement = "UPDATE Users SET IsActive = 0 WHERE Email IN (SELECT Email FROM temp.BulkUsers)"
+        return self._execute_bulk_by_email(
+            rows=[(email,) for email in emails],
+            temp_columns="Email TEXT COLLATE NOCASE NOT NULL",
+            statement=statement,
+            action="Kích hoạt" if activate else "Khóa"
+        )
+
+    def delete_account_users(self, emails):
+        """
+        Xóa nhiều tài khoản người dùng trong 1 transaction
+        """
+        return self._execute_bulk_by_email(
+            rows=[(email,) for email in emails],
+            temp_columns="Email TEXT COLLATE NOCASE NOT NULL",
+            statement="DELETE FROM Users WHERE Email IN (SELECT Email FROM temp.BulkUsers)",
+            action="Xóa"
+        )
+
+    def change_role_users(self, email_privilege_pairs):
+        """
+        Cập nhật quyền hạn cho nhiều người dùng trong 1 transaction
+        """
+        statement = """
+            UPDATE Users
+            SET Privilege = (SELECT b.Privilege FROM temp.BulkUsers b WHERE b.Email = Users.Email)
+            WHERE Email IN (SELECT Email FROM temp.BulkUsers)
+        """
+        return self._execute_bulk_by_email(
+            rows=list(email_privilege_pairs),
+            temp_columns="Email TEXT COLLATE NOCASE NOT NULL, Privilege TEXT NOT NULL",
+            statement=statement,
+            action="Cập nhật quyền hạn"
+        )
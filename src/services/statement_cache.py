@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Cache cursor đã chuẩn bị (prepared) theo từng kết nối cho các câu lệnh gọi nhiều nhất
+- pyodbc giữ lại prepared statement của cursor nếu câu lệnh SQL lần sau giống hệt lần trước,
+  nên giữ 1 cursor riêng cho mỗi câu lệnh "nóng" trên mỗi kết nối giúp bỏ qua bước prepare/biên dịch lại.
+- Chỉ các câu lệnh đã đăng ký (register) mới được cache; câu lệnh khác vẫn dùng cursor mới như cũ.
+- Cursor bị bỏ khi kết nối bị đóng (pool gọi discard_connection) hoặc khi câu lệnh lỗi.
+- Bộ đếm số lần prepare/dùng lại và tỉ lệ dùng lại để đánh giá hiệu quả.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(sql: str) -> str:
+    """Bỏ khoảng trắng thừa để cùng 1 câu lệnh viết khác định dạng vẫn được coi là một."""
+    return " ".join((sql or "").split())
+
+
+class StatementCache:
+    """
+    Cache cursor theo (kết nối, câu lệnh), an toàn đa luồng.
+    Mỗi kết nối chỉ được 1 luồng dùng tại 1 thời điểm (đã mượn từ pool) nên cursor không bị dùng chung giữa các luồng.
+
+    :param statements: danh sách câu lệnh "nóng" đăng ký sẵn.
+    :param max_per_connection: số cursor tối đa giữ trên 1 kết nối (vượt thì bỏ cursor ít dùng nhất).
+    """
+
+    def __init__(self, statements: Iterable[str] = (), max_per_connection: int = 16):
+        self.max_per_connection = max_per_connection
+        self._lock = threading.Lock()
+        self._hot = {_normalize(sql) for sql in statements}
+        # id(kết nối thật) -> OrderedDict(câu lệnh chuẩn hóa -> cursor)
+        self._cursors: Dict[int, "OrderedDict[str, Any]"] = {}
+        self._stats = {"prepares": 0, "reuses": 0, "dropped": 0}
+
+    def register(self, sql: str):
+        """Đăng ký thêm 1 câu lệnh nóng."""
+        with self._lock:
+            self._hot.add(_normalize(sql))
+
+    def is_hot(self, sql: str) -> bool:
+        return _normalize(sql) in self._hot
+
+    def cursor_for(self, raw_connection: Any, sql: str) -> Tuple[Any, bool]:
+        """
+        Lấy cursor dành riêng cho câu lệnh trên kết nối.
+        Trả về (cursor, True) nếu dùng lại cursor đã prepare, (cursor mới, False) nếu vừa tạo.
+        """
+        key = _normalize(sql)
+        with self._lock:
+            cursors = self._cursors.setdefault(id(raw_connection), OrderedDict())
+            cursor = cursors.get(key)
+            if cursor is not None:
+                cursors.move_to_end(key)
+                self._stats["reuses"] += 1
+                return cursor, True
+
+        cursor = raw_connection.cursor()
+        evicted = None
+        with self._lock:
+            cursors = self._cursors.setdefault(id(raw_connection), OrderedDict())
+            cursors[key] = cursor
+            self._stats["prepares"] += 1
+            if len(cursors) > self.max_per_connection:
+                _, evicted = cursors.popitem(last=False)
+                self._stats["dropped"] += 1
+        if evicted is not None:
+            self._close_cursor(evicted)
+        return cursor, False
+
+    def discard_cursor(self, raw_connection: Any, sql: str):
+        """Bỏ cursor của 1 câu lệnh (gọi khi câu lệnh lỗi để lần sau prepare lại)."""
+        with self._lock:
+            cursors = self._cursors.get(id(raw_connection))
+            cursor = cursors.pop(_normalize(sql), None) if cursors else None
+            if cursor is not None:
+                self._stats["dropped"] += 1
+        if cursor is not None:
+            self._close_cursor(cursor)
+
+    def discard_connection(self, raw_connection: Any):
+        """Bỏ toàn bộ cursor của kết nối (gọi trước khi kết nối bị đóng hẳn)."""
+        with self._lock:
+            cursors = self._cursors.pop(id(raw_connection), None)
+            if cursors:
+                self._stats["dropped"] += len(cursors)
+        for cursor in (cursors or {}).values():
+            self._close_cursor(cursor)
+
+    def stats(self) -> Dict[str, Any]:
+        """Số lần prepare/dùng lại, số cursor đang giữ và tỉ lệ dùng lại."""
+        with self._lock:
+            data = dict(self._stats)
+            data["connections"] = len(self._cursors)
+            data["cursors"] = sum(len(c) for c in self._cursors.values())
+            data["registered"] = len(self._hot)
+        executions = data["prepares"] + data["reuses"]
+        data["reuse_ratio"] = round(data["reuses"] / executions, 4) if executions else 0.0
+        return data
+
+    @staticmethod
+    def _close_cursor(cursor: Any):
+        try:
+            cursor.close()
+        except Exception as e:
+            logger.debug(f"Đóng cursor đã cache thất bại: {e}")
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+Cấu hình chung cho pytest
+- Các module trong src import theo gốc src (VD: from schedule_work.cron import ...), nên thêm src vào sys.path.
+"""
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử mã hóa/giải mã tệp backup dạng khối (services.backup_crypto)
+- Mã hóa -> giải mã trả lại đúng dữ liệu gốc (nhiều khối, khối cuối ngắn, đúng bội số khối, passphrase).
+- Tệp rỗng: vẫn có 1 khối rỗng được xác thực, giải mã ra tệp rỗng.
+- Phát hiện sửa đổi: lật 1 bit trong khối / header, tráo khối, cắt cụt, nối thêm, sai khóa.
+- Lỗi giải mã không để lại tệp đích hoặc tệp .part dở dang.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("Crypto.Cipher", reason="cần pycryptodome (pip install pycryptodome)")
+
+from services.backup_crypto import (HEADER_SIZE, MIN_CHUNK_SIZE, TAG_SIZE, BackupCryptoError, create_key_file,
+                                    decrypt_file, encrypt_file, generate_key, load_key_file, read_header,
+                                    verify_file)
+
+CHUNK = MIN_CHUNK_SIZE
+
+
+def _write(path, data: bytes) -> str:
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def _read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _flip_byte(path, offset: int):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        value = f.read(1)[0]
+        f.seek(offset)
+        f.write(bytes([value ^ 0x01]))
+
+
+@pytest.fixture
+def key():
+    return generate_key()
+
+
+@pytest.fixture
+def encrypted(tmp_path, key):
+    """Tệp 3.5 khối đã mã hóa -> (đường dẫn .enc, dữ liệu gốc)."""
+    data = os.urandom(CHUNK * 3 + CHUNK // 2)
+    src = _write(tmp_path / "db.bak", data)
+    encrypt_file(src, key=key, chunk_size=CHUNK, workers=2)
+    return src + ".enc", data
+
+
+# ----------------------------- Mã hóa -> giải mã -----------------------------
+@pytest.mark.parametrize("size", [1, CHUNK - 1, CHUNK, CHUNK + 1, CHUNK * 3, CHUNK * 3 + 12345])
+def test_round_trip(tmp_path, key, size):
+    data = os.urandom(size)
+    src = _write(tmp_path / "db.bak", data)
+    enc = str(tmp_path / "db.bak.enc")
+    out = str(tmp_path / "restored.bak")
+
+    stats = encrypt_file(src, enc, key, chunk_size=CHUNK, workers=3)
+    assert stats["bytes"] == size
+    assert stats["chunks"] == -(-size // CHUNK)
+    assert os.path.getsize(enc) == HEADER_SIZE + size + stats["chunks"] * TAG_SIZE
+    if size >= 16:     # vài byte ngẫu nhiên có thể tình cờ xuất hiện trong bản mã
+        assert data not in _read(enc)
+
+    decrypt_file(enc, out, key, workers=3)
+    assert _read(out) == data
+    assert verify_file(enc, key)["ok"]
+    assert not os.path.exists(enc + ".part") and not os.path.exists(out + ".part")
+
+
+def test_round_trip_with_passphrase(tmp_path):
+    data = os.urandom(CHUNK + 100)
+    src = _write(tmp_path / "db.bak", data)
+    out = str(tmp_path / "restored.bak")
+
+    encrypt_file(src, key="mật khẩu backup", chunk_size=CHUNK)
+    assert read_header(src + ".enc").to_dict()["kdf"] == "scrypt"
+    decrypt_file(src + ".enc", out, "mật khẩu backup")
+    assert _read(out) == data
+
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(src + ".enc", out + "2", "sai mật khẩu")
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(src + ".enc", out + "3", generate_key())
+
+
+def test_key_file_round_trip(tmp_path):
+    path = str(tmp_path / "keys" / "backup.key")
+    key = create_key_file(path)
+    assert load_key_file(path) == key
+    with pytest.raises(FileExistsError):
+        create_key_file(path)
+
+    _write(tmp_path / "bad.key", b"not-hex")
+    with pytest.raises(BackupCryptoError):
+        load_key_file(str(tmp_path / "bad.key"))
+
+
+def test_same_input_encrypts_differently(tmp_path, key):
+    src = _write(tmp_path / "db.bak", os.urandom(1000))
+    encrypt_file(src, str(tmp_path / "a.enc"), key, chunk_size=CHUNK)
+    encrypt_file(src, str(tmp_path / "b.enc"), key, chunk_size=CHUNK)
+    assert _read(tmp_path / "a.enc") != _read(tmp_path / "b.enc")
+
+
+# ----------------------------- Tệp rỗng -----------------------------
+def test_empty_file(tmp_path, key):
+    src = _write(tmp_path / "empty.bak", b"")
+    out = str(tmp_path / "restored.bak")
+
+    stats = encrypt_file(src, key=key, chunk_size=CHUNK)
+    assert stats["bytes"] == 0
+    assert stats["chunks"] == 1
+    assert os.path.getsize(src + ".enc") == HEADER_SIZE + TAG_SIZE
+
+    decrypt_file(src + ".enc", out, key)
+    assert _read(out) == b""
+    result = verify_file(src + ".enc", key)
+    assert result["ok"] and result["checked"] == 1
+
+
+def test_empty_file_tampered_header_detected(tmp_path, key):
+    src = _write(tmp_path / "empty.bak", b"")
+    encrypt_file(src, key=key, chunk_size=CHUNK)
+    _flip_byte(src + ".enc", HEADER_SIZE - 8)   # salt (không dùng với khóa thô nhưng nằm trong AAD)
+
+    assert not verify_file(src + ".enc", key)["ok"]
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(src + ".enc", str(tmp_path / "restored.bak"), key)
+
+
+# ----------------------------- Phát hiện sửa đổi -----------------------------
+@pytest.mark.parametrize("chunk_index", [0, 1, 3])
+def test_flipped_ciphertext_detected(tmp_path, key, encrypted, chunk_index):
+    enc, _ = encrypted
+    header = read_header(enc)
+    _flip_byte(enc, header.chunk_offset(chunk_index) + 10)
+
+    result = verify_file(enc, key)
+    assert not result["ok"]
+    assert result["bad_chunks"] == [chunk_index]
+    assert result["size_ok"]
+
+    out = str(tmp_path / "restored.bak")
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(enc, out, key)
+    assert not os.path.exists(out) and not os.path.exists(out + ".part")
+
+
+def test_flipped_tag_detected(key, encrypted):
+    enc, _ = encrypted
+    header = read_header(enc)
+    _flip_byte(enc, header.chunk_offset(1) + header.chunk_size + TAG_SIZE - 1)
+    assert verify_file(enc, key)["bad_chunks"] == [1]
+
+
+def test_flipped_header_detected(tmp_path, key, encrypted):
+    enc, _ = encrypted
+    _flip_byte(enc, 20)   # nonce_prefix: nằm trong AAD và nonce của mọi khối
+
+    result = verify_file(enc, key)
+    assert result["bad_chunks"] == list(range(result["chunk_count"]))
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(enc, str(tmp_path / "restored.bak"), key)
+
+
+def test_bad_magic_rejected(tmp_path, key, encrypted):
+    enc, _ = encrypted
+    _flip_byte(enc, 0)
+    with pytest.raises(BackupCryptoError):
+        verify_file(enc, key)
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(enc, str(tmp_path / "restored.bak"), key)
+
+
+def test_swapped_chunks_detected(tmp_path, key, encrypted):
+    enc, _ = encrypted
+    header = read_header(enc)
+    blob = bytearray(_read(enc))
+    size = header.chunk_size + TAG_SIZE
+    first, second = header.chunk_offset(0), header.chunk_offset(1)
+    blob[first:first + size], blob[second:second + size] = blob[second:second + size], blob[first:first + size]
+    _write(enc, bytes(blob))
+
+    assert verify_file(enc, key)["bad_chunks"] == [0, 1]
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(enc, str(tmp_path / "restored.bak"), key)
+
+
+def test_truncated_file_detected(tmp_path, key, encrypted):
+    enc, _ = encrypted
+    header = read_header(enc)
+    # Cắt đúng ở ranh giới khối: các khối còn lại vẫn hợp lệ nhưng thiếu khối cuối
+    _write(enc, _read(enc)[:header.chunk_offset(header.chunk_count - 1)])
+
+    result = verify_file(enc, key)
+    assert not result["ok"] and not result["size_ok"]
+    out = str(tmp_path / "restored.bak")
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(enc, out, key)
+    assert not os.path.exists(out) and not os.path.exists(out + ".part")
+
+
+def test_appended_data_detected(tmp_path, key, encrypted):
+    enc, _ = encrypted
+    with open(enc, "ab") as f:
+        f.write(b"\x00" * 32)
+
+    result = verify_file(enc, key)
+    assert not result["ok"] and not result["size_ok"]
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(enc, str(tmp_path / "restored.bak"), key)
+
+
+def test_wrong_key_detected(tmp_path, encrypted):
+    enc, _ = encrypted
+    result = verify_file(enc, generate_key())
+    assert result["bad_chunks"] == list(range(result["chunk_count"]))
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(enc, str(tmp_path / "restored.bak"), generate_key())
+    with pytest.raises(BackupCryptoError):
+        decrypt_file(enc, str(tmp_path / "restored.bak"), "passphrase cho tệp khóa thô")
+
+
+def test_verify_sample_always_checks_last_chunk(key, encrypted):
+    enc, _ = encrypted
+    header = read_header(enc)
+    last = header.chunk_count - 1
+    _flip_byte(enc, header.chunk_offset(last))
+
+    result = verify_file(enc, key, sample=2)
+    assert result["checked"] == 2
+    assert result["bad_chunks"] == [last]
+    assert verify_file(enc, key, chunks=[0, 1])["ok"]
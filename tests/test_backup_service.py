@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử dịch vụ sao lưu (backup_service.service) với công việc retention (không cần pyodbc / SQL Server)
+- plan_jobs: công việc theo cấu hình scheduler.json.
+- reload trong lúc công việc đang chờ trong executor: công việc vẫn chạy theo định nghĩa đã chụp lúc xếp hàng.
+"""
+import json
+import threading
+
+import pytest
+
+from backup_service.service import BackupService
+from schedule_work.job_store import JobStore
+
+WAIT = 5.0
+JOB_ID = "Sales:RETENTION"
+
+
+def _write_config(path, backup_dir, databases):
+    config = {
+        "databases": databases,
+        "storage": {"backup_dir": str(backup_dir)},
+        "schedule": {"full": "", "diff": "", "log": ""},
+        "per_db": {"Sales": {"retention": {"keep_days": 7, "cron": "0 3 * * *", "dry_run": True}}},
+    }
+    path.write_text(json.dumps(config), encoding="utf-8")
+
+
+@pytest.fixture
+def service(tmp_path):
+    (tmp_path / "backup" / "Sales").mkdir(parents=True)
+    config_path = tmp_path / "scheduler.json"
+    _write_config(config_path, tmp_path / "backup", ["Sales"])
+    backup_service = BackupService(config_path=str(config_path), workers=1, listen=False,
+                                   store=JobStore(str(tmp_path / "jobs.json")))
+    backup_service.start()
+    yield backup_service
+    backup_service.stop()
+
+
+def test_plan_jobs(service):
+    assert list(service.jobs) == [JOB_ID]
+    job = service.jobs[JOB_ID]
+    assert job["kind"] == "retention" and job["cron"] == "0 3 * * *"
+    assert [status["id"] for status in service.status()["jobs"]] == [JOB_ID]
+    assert service.status()["jobs"][0]["scheduled"]
+
+
+def test_run_now_records_result(service):
+    result = service.run_now(JOB_ID, wait=True, timeout=WAIT)
+    assert result["success"], result
+    record = service.schedule.store.get(JOB_ID)
+    assert record["last_status"] == "success" and record["next_run"] is not None
+    assert service.run_now("Other:FULL")["success"] is False
+
+
+def test_reload_keeps_queued_job_definition(service, tmp_path):
+    gate = threading.Event()
+    service.executor.submit_job(lambda: gate.wait(WAIT))     # giữ luồng duy nhất của executor
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(service.run_now(JOB_ID, wait=True, timeout=WAIT)))
+    waiter.start()
+
+    # Công việc đang chờ thì cấu hình bỏ CSDL Sales
+    _write_config(tmp_path / "scheduler.json", tmp_path / "backup", [])
+    assert service.reload()["message"].endswith("0 công việc.")
+    assert service.jobs == {} and service.status()["jobs"] == []
+
+    gate.set()
+    waiter.join(WAIT)
+    assert results[0]["success"], results[0]
+    record = service.schedule.store.get(JOB_ID)
+    # Công việc không còn trong lịch: không có lần chạy kế tiếp
+    assert record["last_status"] == "success" and record["next_run"] is None
+
+
+def test_reload_from_other_thread_while_running(service):
+    errors = []
+
+    def reload_many():
+        try:
+            for _ in range(20):
+                service.reload()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reload_many) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for _ in range(10):
+        assert service.run_now(JOB_ID, wait=True, timeout=WAIT)["success"]
+    for thread in threads:
+        thread.join(WAIT)
+    assert errors == []
+    assert list(service.jobs) == [JOB_ID] and service.status()["jobs"][0]["scheduled"]
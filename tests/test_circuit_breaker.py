@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử circuit breaker và thử lại có backoff (services.circuit_breaker)
+- Phân loại lỗi tạm thời theo SQLSTATE / mã native của SQL Server.
+- retry_with_backoff: chỉ thử lại lỗi tạm thời, tối đa retries lần.
+- Mạch mở sau failure_threshold lần lỗi liên tiếp, từ chối ngay; luồng probe đóng mạch khi CSDL hoạt động lại.
+"""
+import threading
+import time
+
+import pytest
+
+from services import circuit_breaker
+from services.circuit_breaker import (STATE_CLOSED, STATE_OPEN, CircuitBreaker, CircuitOpenError, backoff_delay,
+                                      get_circuit_breaker, is_transient_error, retry_with_backoff)
+
+WAIT = 5.0
+
+
+class DbError(Exception):
+    """Lỗi giả có dạng pyodbc.Error: args = (SQLSTATE, thông báo)."""
+
+
+def _wait_for(predicate):
+    deadline = time.monotonic() + WAIT
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def make_breaker():
+    breakers = []
+
+    def build(probe=lambda: None, **kwargs):
+        kwargs.setdefault("failure_threshold", 2)
+        kwargs.setdefault("probe_interval", 0.01)
+        kwargs.setdefault("max_probe_interval", 0.02)
+        breaker = CircuitBreaker("test-db", probe, **kwargs)
+        breakers.append(breaker)
+        return breaker
+
+    yield build
+    for breaker in breakers:
+        breaker.close()
+
+
+# ----------------------------- Lỗi tạm thời / backoff -----------------------------
+@pytest.mark.parametrize("error, transient", [
+    (DbError("40001", "[SQL Server]Transaction was deadlocked (1205)"), True),
+    (DbError("08S01", "Communication link failure"), True),
+    (DbError("42000", "[SQL Server]Database is not currently available (40613)"), True),
+    (DbError("HY000", "[SQL Server]Deadlock victim (1205) (SQLExecDirectW)"), True),
+    (DbError("HYT00", "Login timeout expired"), False),
+    (DbError("42S02", "Invalid object name (208)"), False),
+    (DbError(1205), False),
+    (ValueError(), False),
+])
+def test_is_transient_error(error, transient):
+    assert is_transient_error(error) is transient
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, 0.2, 1.0) <= min(1.0, 0.2 * 2 ** attempt)
+
+
+def test_retry_transient_error_then_succeed():
+    sleeps = []
+    calls = iter([DbError("40001", "deadlock"), DbError("08S01", "link"), "ok"])
+
+    def fn():
+        result = next(calls)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert retry_with_backoff(fn, retries=2, sleep=sleeps.append) == "ok"
+    assert len(sleeps) == 2
+
+
+@pytest.mark.parametrize("error, retries, expected_calls", [
+    (DbError("40001", "deadlock"), 2, 3),     # hết lượt thử
+    (DbError("42000", "syntax"), 2, 1),       # không tạm thời: ném ngay
+    (DbError("40001", "deadlock"), 0, 1),
+])
+def test_retry_gives_up(error, retries, expected_calls):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise error
+
+    with pytest.raises(DbError):
+        retry_with_backoff(fn, retries=retries, sleep=lambda delay: None)
+    assert len(calls) == expected_calls
+
+
+# ----------------------------- Circuit breaker -----------------------------
+def test_opens_after_threshold_and_rejects(make_breaker):
+    probe_gate = threading.Event()
+    breaker = make_breaker(probe=lambda: probe_gate.wait(WAIT) and None, failure_threshold=3)
+
+    for _ in range(2):
+        breaker.record_failure(DbError("08001", "không kết nối được"))
+    assert breaker.state == STATE_CLOSED and breaker.allow()
+
+    with pytest.raises(DbError):
+        breaker.call(lambda: (_ for _ in ()).throw(DbError("08001", "không kết nối được")))
+    assert breaker.state != STATE_CLOSED
+    called = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: called.append(1))
+    assert called == []
+
+    status = breaker.status()
+    assert status["trips"] == 1 and status["rejected"] >= 1 and status["consecutive_failures"] == 3
+    assert "08001" in status["last_error"]
+    assert "không khả dụng" in breaker.status_message()
+    probe_gate.set()
+
+
+def test_success_resets_consecutive_failures(make_breaker):
+    breaker = make_breaker(failure_threshold=2)
+    breaker.record_failure()
+    assert breaker.call(lambda: "ok") == "ok"
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+
+
+def test_probe_closes_circuit(make_breaker):
+    attempts = []
+
+    def probe():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise DbError("08001", "chưa sẵn sàng")
+
+    breaker = make_breaker(probe=probe)
+    breaker.record_failure()
+    breaker.record_failure()
+    _wait_for(lambda: breaker.state == STATE_CLOSED)
+
+    status = breaker.status()
+    assert status["probes"] == 3 and status["probe_failures"] == 2
+    assert status["consecutive_failures"] == 0 and status["opened_at"] is None
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.status_message() == "Kết nối CSDL bình thường."
+
+
+def test_close_stops_probe(make_breaker):
+    breaker = make_breaker(probe=lambda: (_ for _ in ()).throw(DbError("08001", "x")), probe_interval=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.close()
+    time.sleep(0.1)
+    assert breaker.state == STATE_OPEN
+    assert breaker.status()["probes"] == 0
+
+
+def test_registry_shares_breaker_by_key(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "_registry", {})
+    first = get_circuit_breaker("DSN=a", "a", lambda: None, failure_threshold=5)
+    assert get_circuit_breaker("DSN=a", "other", lambda: None) is first
+    assert first.failure_threshold == 5
+    assert get_circuit_breaker("DSN=b", "b", lambda: None) is not first
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử connection pool (services.connection_pool) với kết nối giả (không cần pyodbc / SQL Server)
+- max_size: người mượn thứ max_size + 1 phải chờ, hết borrow_timeout thì PoolTimeoutError.
+- Kiểm tra kết nối khi mượn: chỉ chạy validation_query khi kết nối đã nằm im quá validate_after.
+- Trả kết nối: rollback thất bại / lỗi kết nối (SQLSTATE 08xxx) thì đóng hẳn thay vì đưa lại vào pool.
+- Luồng nền làm ấm pool tới min_size; evict_idle đóng kết nối nhàn rỗi nhưng giữ min_size; close().
+"""
+import threading
+import time
+
+import pytest
+
+from services.connection_pool import ConnectionPool, PoolClosedError, PoolTimeoutError, is_connection_error
+
+WAIT = 5.0
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query):
+        self.connection.queries.append(query)
+        if self.connection.fail_validation:
+            raise ConnectionError("08S01", "server đã đóng phiên")
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.queries = []
+        self.rollbacks = 0
+        self.fail_rollback = False
+        self.fail_validation = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.fail_rollback:
+            raise ConnectionError("08S01", "mất kết nối")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeFactory:
+    """Hàm tạo kết nối giả: ghi lại mọi kết nối đã tạo, fail > 0 thì lần gọi kế tiếp ném lỗi."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.created = []
+        self.fail = 0
+
+    def __call__(self):
+        with self.lock:
+            if self.fail:
+                self.fail -= 1
+                raise ConnectionError("08001", "không mở được kết nối")
+            connection = FakeConnection(len(self.created))
+            self.created.append(connection)
+            return connection
+
+
+@pytest.fixture
+def factory():
+    return FakeFactory()
+
+
+@pytest.fixture
+def make_pool(factory):
+    pools = []
+
+    def build(**kwargs):
+        kwargs.setdefault("min_size", 0)
+        kwargs.setdefault("evict_interval", 3600)
+        pool = ConnectionPool(factory, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield build
+    for pool in pools:
+        pool.close()
+
+
+def _wait_for(predicate):
+    deadline = time.monotonic() + WAIT
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+# ----------------------------- Mượn / trả -----------------------------
+def test_reuses_released_connection(factory, make_pool):
+    pool = make_pool(max_size=2)
+    first = pool.acquire()
+    raw = first.raw
+    first.close()
+    first.close()       # gọi nhiều lần không trả 2 lần
+
+    with pool.acquire() as second:
+        assert second.raw is raw
+    stats = pool.stats()
+    assert (stats["misses"], stats["hits"], stats["size"], stats["idle"]) == (1, 1, 1, 1)
+    assert len(factory.created) == 1 and raw.rollbacks == 2
+
+
+def test_max_size_blocks_until_release(make_pool):
+    pool = make_pool(max_size=2, borrow_timeout=WAIT)
+    held = [pool.acquire(), pool.acquire()]
+    borrowed = []
+    waiter = threading.Thread(target=lambda: borrowed.append(pool.acquire()))
+    waiter.start()
+
+    _wait_for(lambda: pool.stats()["waits"] == 1)
+    assert not borrowed
+    held[0].close()
+    waiter.join(WAIT)
+    assert borrowed[0].raw is held[0].raw
+    assert pool.stats()["size"] == 2
+    borrowed[0].close()
+    held[1].close()
+
+
+def test_borrow_timeout(make_pool):
+    pool = make_pool(max_size=1)
+    held = pool.acquire()
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire(timeout=0.1)
+    assert time.monotonic() - started >= 0.1
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["waits"] == 1 and stats["wait_time_max"] >= 0.1
+    held.close()
+
+
+def test_connect_error_frees_reserved_slot(factory, make_pool):
+    pool = make_pool(max_size=1)
+    factory.fail = 1
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    assert pool.stats()["connect_errors"] == 1 and pool.stats()["size"] == 0
+    # Chỗ đã giữ được trả lại: lần mượn sau không phải chờ
+    pool.acquire(timeout=0).close()
+
+
+# ----------------------------- Kiểm tra kết nối -----------------------------
+def test_recently_returned_connection_not_validated(make_pool):
+    pool = make_pool(validate_after=3600)
+    pool.acquire().close()
+    with pool.acquire() as conn:
+        assert conn.raw.queries == []
+
+
+def test_validation_after_idle(make_pool):
+    pool = make_pool(validate_after=0.05)
+    pool.acquire().close()
+    time.sleep(0.1)
+    with pool.acquire() as conn:
+        assert conn.raw.queries == ["SELECT 1"]
+
+
+def test_failed_validation_replaces_connection(factory, make_pool):
+    pool = make_pool(validate_after=0.05)
+    first = pool.acquire()
+    stale = first.raw
+    first.close()
+    stale.fail_validation = True
+    time.sleep(0.1)
+
+    with pool.acquire() as conn:
+        assert conn.raw is not stale
+    assert stale.closed
+    stats = pool.stats()
+    assert stats["validation_failures"] == 1 and stats["closed"] == 1 and stats["size"] == 1
+
+
+def test_closed_flag_checked_without_query(factory, make_pool):
+    pool = make_pool(validate_after=3600)
+    first = pool.acquire()
+    first.raw.closed = True
+    first.close()
+    with pool.acquire() as conn:
+        assert conn.raw is factory.created[1]
+    assert pool.stats()["validation_failures"] == 1
+
+
+# ----------------------------- Kết nối hỏng -----------------------------
+def test_rollback_failure_on_release_discards(factory, make_pool):
+    discarded = []
+    pool = make_pool(on_discard=discarded.append)
+    conn = pool.acquire()
+    raw = conn.raw
+    raw.fail_rollback = True
+    conn.close()
+
+    assert raw.closed and discarded == [raw]
+    stats = pool.stats()
+    assert (stats["size"], stats["idle"], stats["closed"]) == (0, 0, 1)
+    with pool.acquire() as again:
+        assert again.raw is factory.created[1]
+
+
+def test_wrapper_rollback_failure_marks_broken(make_pool):
+    pool = make_pool()
+    conn = pool.acquire()
+    conn.raw.fail_rollback = True
+    conn.rollback()     # không ném lỗi ra ngoài
+    conn.close()
+    assert conn.raw.closed and pool.stats()["size"] == 0
+
+
+@pytest.mark.parametrize("error, discarded", [
+    (ConnectionError("08S01", "mất kết nối"), True),
+    (ValueError("42000", "lỗi cú pháp"), False),
+])
+def test_context_manager_discards_on_connection_error(make_pool, error, discarded):
+    pool = make_pool()
+    with pytest.raises(type(error)):
+        with pool.acquire() as conn:
+            raise error
+    assert conn.raw.closed is discarded
+    assert pool.stats()["idle"] == (0 if discarded else 1)
+
+
+@pytest.mark.parametrize("error, expected", [
+    (ConnectionError("08S01", "x"), True),
+    (ConnectionError("08001", "x"), True),
+    (ValueError("40001", "deadlock"), False),
+    (ValueError(1205), False),
+    (ValueError(), False),
+])
+def test_is_connection_error(error, expected):
+    assert is_connection_error(error) is expected
+
+
+# ----------------------------- Làm ấm / dọn dẹp -----------------------------
+def test_evictor_warms_up_to_min_size(factory, make_pool):
+    pool = make_pool(min_size=3, max_size=5)
+    _wait_for(lambda: pool.stats()["idle"] == 3)
+    stats = pool.stats()
+    assert stats["size"] == 3 and stats["created"] == 3
+    # Mượn kết nối đã làm ấm là hit, không tạo mới
+    with pool.acquire():
+        pass
+    assert pool.stats()["hits"] == 1 and len(factory.created) == 3
+
+
+def test_warm_up_stops_on_connect_error(factory, make_pool):
+    factory.fail = 1
+    pool = make_pool(min_size=2)
+    _wait_for(lambda: pool.stats()["connect_errors"] == 1)
+    assert pool.stats()["size"] == 0
+
+
+def test_evict_idle_keeps_min_size(factory, make_pool):
+    pool = make_pool(min_size=1, max_size=4, idle_timeout=0)
+    held = [pool.acquire() for _ in range(4)]
+    for conn in held:
+        conn.close()
+
+    assert pool.evict_idle() == 3
+    stats = pool.stats()
+    assert (stats["size"], stats["idle"], stats["evicted"]) == (1, 1, 3)
+    # Kết nối cũ nhất bị đóng trước, kết nối vừa trả (nóng nhất) được giữ lại
+    assert [c.closed for c in factory.created] == [True, True, True, False]
+
+
+def test_evict_idle_respects_idle_timeout(make_pool):
+    pool = make_pool(idle_timeout=3600)
+    pool.acquire().close()
+    assert pool.evict_idle() == 0 and pool.stats()["idle"] == 1
+
+
+# ----------------------------- Đóng pool -----------------------------
+def test_close(factory, make_pool):
+    pool = make_pool(max_size=2)
+    borrowed = pool.acquire()
+    pool.acquire().close()
+
+    pool.close()
+    assert factory.created[1].closed and not borrowed.raw.closed
+    with pytest.raises(PoolClosedError):
+        pool.acquire()
+    # Kết nối đang mượn được đóng hẳn khi trả
+    borrowed.close()
+    assert borrowed.raw.closed and pool.stats()["size"] == 0
+
+
+def test_close_wakes_waiting_borrower(make_pool):
+    pool = make_pool(max_size=1, borrow_timeout=WAIT)
+    held = pool.acquire()
+    errors = []
+
+    def borrow():
+        try:
+            pool.acquire()
+        except PoolClosedError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=borrow)
+    waiter.start()
+    _wait_for(lambda: pool.stats()["waits"] == 1)
+    pool.close()
+    waiter.join(WAIT)
+    assert len(errors) == 1
+    held.close()
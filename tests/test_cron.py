@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử bộ phân tích / tính lịch CRON (schedule_work.cron) và ánh xạ CRON -> schtasks
+- Bảng phân tích: dải, bước, danh sách, tên tháng/thứ, thứ 7 = Chủ nhật, dải thứ quấn tuần, bí danh.
+- Bảng lần chạy kế tiếp: quy ước OR giữa ngày-tháng và thứ, ngày 29/02, qua năm.
+- Fuzz: so next_fire với 1 bộ tính độc lập (duyệt từng ngày trên tập giá trị sinh ngẫu nhiên).
+- cron_to_schtasks_args: bảng ánh xạ sang tham số schtasks và các mẫu không ánh xạ được.
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from schedule_work.cron import MAX_SEARCH_YEARS, CronError, CronExpression, cron_to_schtasks_args
+
+
+# ----------------------------- Phân tích -----------------------------
+@pytest.mark.parametrize("expr, field, expected", [
+    ("* * * * *", "minutes", list(range(60))),
+    ("5 * * * *", "minutes", [5]),
+    ("10-14 * * * *", "minutes", [10, 11, 12, 13, 14]),
+    ("*/15 * * * *", "minutes", [0, 15, 30, 45]),
+    ("0-30/10 * * * *", "minutes", [0, 10, 20, 30]),
+    ("5/20 * * * *", "minutes", [5, 25, 45]),
+    ("1,15,30 * * * *", "minutes", [1, 15, 30]),
+    ("0 */6 * * *", "hours", [0, 6, 12, 18]),
+    ("0 8-17/3 * * *", "hours", [8, 11, 14, 17]),
+    ("0 0 1,15 * *", "doms", [1, 15]),
+    ("0 0 * JAN,jul *", "months", [1, 7]),
+    ("0 0 * FEB-APR *", "months", [2, 3, 4]),
+    ("0 0 * */4 *", "months", [1, 5, 9]),
+    ("0 0 * * MON-FRI", "dows", [1, 2, 3, 4, 5]),
+    ("0 0 * * 7", "dows", [0]),
+    ("0 0 * * 5-7", "dows", [0, 5, 6]),
+    ("0 0 * * FRI-MON", "dows", [0, 1, 5, 6]),
+    ("0 0 * * sun,Sat", "dows", [0, 6]),
+    ("0 0 * * *", "dows", [0, 1, 2, 3, 4, 5, 6]),
+    ("0 0 ? * ?", "doms", list(range(1, 32))),
+])
+def test_parse_fields(expr, field, expected):
+    assert CronExpression(expr).values()[field] == expected
+
+
+@pytest.mark.parametrize("alias, expr", [
+    ("@yearly", "0 0 1 1 *"),
+    ("@annually", "0 0 1 1 *"),
+    ("@monthly", "0 0 1 * *"),
+    ("@weekly", "0 0 * * 0"),
+    ("@daily", "0 0 * * *"),
+    ("@midnight", "0 0 * * *"),
+    ("@HOURLY", "0 * * * *"),
+])
+def test_aliases(alias, expr):
+    assert CronExpression(alias).expr == expr
+
+
+def test_star_flags():
+    values = CronExpression("0 0 * * 1").values()
+    assert values["dom_any"] and not values["dow_any"]
+    # Chỉ đúng "*" / "?" mới là không giới hạn, "*/1" là 1 danh sách giá trị
+    assert not CronExpression("0 0 */1 * *").values()["dom_any"]
+
+
+@pytest.mark.parametrize("expr", [
+    "",
+    "* * * *",
+    "* * * * * *",
+    "60 * * * *",
+    "* 24 * * *",
+    "* * 0 * *",
+    "* * 32 * *",
+    "* * * 13 *",
+    "* * * * 8",
+    "*/0 * * * *",
+    "1,,2 * * * *",
+    "30-10 * * * *",
+    "a * * * *",
+    "* * * FOO *",
+    "0 0 30 2 *",
+    "0 0 31 4,6,9,11 *",
+])
+def test_invalid_expressions(expr):
+    with pytest.raises(CronError):
+        CronExpression(expr)
+
+
+# ----------------------------- Lần chạy kế tiếp -----------------------------
+@pytest.mark.parametrize("expr, after, expected", [
+    # Bước / dải
+    ("*/15 * * * *", datetime(2024, 1, 1, 10, 7), datetime(2024, 1, 1, 10, 15)),
+    ("*/15 * * * *", datetime(2024, 1, 1, 10, 45, 30), datetime(2024, 1, 1, 11, 0)),
+    ("0 8-17 * * *", datetime(2024, 1, 1, 17, 0), datetime(2024, 1, 2, 8, 0)),
+    ("5/20 * * * *", datetime(2024, 1, 1, 10, 26), datetime(2024, 1, 1, 10, 45)),
+    # Luôn sau thời điểm after (không trả về đúng after)
+    ("30 2 * * *", datetime(2024, 3, 10, 2, 30), datetime(2024, 3, 11, 2, 30)),
+    # Tên tháng / thứ, dải thứ quấn tuần
+    ("0 9 * JAN,JUL SUN", datetime(2024, 1, 31), datetime(2024, 7, 7, 9, 0)),
+    ("0 12 * * FRI-MON", datetime(2024, 1, 2), datetime(2024, 1, 5, 12, 0)),
+    ("0 12 * * FRI-MON", datetime(2024, 1, 7, 12, 0), datetime(2024, 1, 8, 12, 0)),
+    ("0 0 * * 7", datetime(2024, 1, 1), datetime(2024, 1, 7, 0, 0)),
+    # Ngày-tháng và thứ cùng giới hạn: khớp 1 trong 2 (OR)
+    ("0 0 13 * FRI", datetime(2024, 9, 1), datetime(2024, 9, 6, 0, 0)),
+    ("0 0 13 * FRI", datetime(2024, 9, 6), datetime(2024, 9, 13, 0, 0)),
+    ("0 0 13 * FRI", datetime(2024, 9, 13), datetime(2024, 9, 20, 0, 0)),
+    ("0 0 1 * MON", datetime(2024, 1, 1), datetime(2024, 1, 8, 0, 0)),
+    ("0 0 1 * MON", datetime(2024, 1, 29), datetime(2024, 2, 1, 0, 0)),
+    # Chỉ 1 trường giới hạn: chỉ xét trường đó
+    ("0 0 1 * *", datetime(2024, 1, 1), datetime(2024, 2, 1, 0, 0)),
+    ("0 0 * * MON", datetime(2024, 1, 1), datetime(2024, 1, 8, 0, 0)),
+    # Ngày không tồn tại trong tháng bị bỏ qua
+    ("0 0 31 * *", datetime(2024, 4, 1), datetime(2024, 5, 31, 0, 0)),
+    # 29/02 chỉ có ở năm nhuận
+    ("0 0 29 2 *", datetime(2023, 3, 1), datetime(2024, 2, 29, 0, 0)),
+    ("0 0 29 2 *", datetime(2024, 2, 29), datetime(2028, 2, 29, 0, 0)),
+    ("0 0 29 2 *", datetime(2096, 3, 1), datetime(2104, 2, 29, 0, 0)),
+    ("0 0 29 2 MON", datetime(2024, 2, 20), datetime(2024, 2, 26, 0, 0)),
+    ("0 0 29 2 MON", datetime(2024, 2, 26), datetime(2024, 2, 29, 0, 0)),
+    ("0 0 29 2 MON", datetime(2024, 2, 29), datetime(2025, 2, 3, 0, 0)),
+    # Qua năm
+    ("59 23 31 12 *", datetime(2024, 12, 31, 23, 59), datetime(2025, 12, 31, 23, 59)),
+    ("@yearly", datetime(2024, 6, 15, 8, 30), datetime(2025, 1, 1, 0, 0)),
+])
+def test_next_fire_table(expr, after, expected):
+    cron = CronExpression(expr)
+    fire = cron.next_fire(after)
+    assert fire == expected
+    assert cron.matches(fire)
+
+
+def test_next_fires_and_timestamp():
+    cron = CronExpression("0 */6 * * *")
+    after = datetime(2024, 1, 1, 5, 0)
+    assert cron.next_fires(3, after) == [datetime(2024, 1, 1, 6), datetime(2024, 1, 1, 12), datetime(2024, 1, 1, 18)]
+    assert cron.next_timestamp(after.timestamp()) == datetime(2024, 1, 1, 6).timestamp()
+
+
+# ----------------------------- Fuzz -----------------------------
+FUZZ_CASES = 400
+# (nhỏ nhất, lớn nhất) của từng trường theo thứ tự CRON
+FUZZ_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _random_field(rng: random.Random, low: int, high: int):
+    """Sinh 1 trường ngẫu nhiên: trả về (chuỗi CRON, tập giá trị, là_dấu_sao)."""
+    kind = rng.random()
+    if kind < 0.3:
+        return "*", set(range(low, high + 1)), True
+    if kind < 0.45:
+        step = rng.randint(1, max(1, (high - low) // 2))
+        return f"*/{step}", set(range(low, high + 1, step)), False
+    if kind < 0.6:
+        start = rng.randint(low, high)
+        end = rng.randint(start, high)
+        return f"{start}-{end}", set(range(start, end + 1)), False
+    values = set(rng.sample(range(low, high + 1), rng.randint(1, min(4, high - low + 1))))
+    return ",".join(str(v) for v in sorted(values)), values, False
+
+
+def _oracle_next_fire(fields, after: datetime):
+    """Lần chạy kế tiếp tính độc lập: duyệt từng ngày, trong ngày lấy mốc giờ:phút nhỏ nhất còn hợp lệ."""
+    (_, minutes, _), (_, hours, _), (_, doms, dom_any), (_, months, _), (_, dows, dow_any) = fields
+    dows = {d % 7 for d in dows}
+    times = sorted(h * 60 + m for h in hours for m in minutes)
+    start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    day = start.replace(hour=0, minute=0)
+    end = datetime(start.year + MAX_SEARCH_YEARS + 1, 1, 1)
+    while day < end:
+        if day.month in months:
+            dom_ok = day.day in doms
+            dow_ok = (day.weekday() + 1) % 7 in dows
+            if dom_any:
+                day_ok = dow_ok
+            elif dow_any:
+                day_ok = dom_ok
+            else:
+                day_ok = dom_ok or dow_ok
+            if day_ok:
+                floor = start.hour * 60 + start.minute if day.date() == start.date() else 0
+                for total in times:
+                    if total >= floor:
+                        return day + timedelta(minutes=total)
+        day += timedelta(days=1)
+    return None
+
+
+def test_next_fire_fuzz():
+    rng = random.Random(20240229)
+    checked = 0
+    for _ in range(FUZZ_CASES):
+        fields = [_random_field(rng, low, high) for low, high in FUZZ_RANGES]
+        expr = " ".join(text for text, _, _ in fields)
+        after = datetime(2023, 1, 1) + timedelta(minutes=rng.randint(0, 3 * 366 * 24 * 60), seconds=rng.randint(0, 59))
+        expected = _oracle_next_fire(fields, after)
+        try:
+            cron = CronExpression(expr)
+        except CronError:
+            # Chỉ được báo lỗi khi lịch thật sự không bao giờ chạy
+            assert expected is None, expr
+            continue
+        assert expected is not None, expr
+        assert cron.next_fire(after) == expected, (expr, after)
+        checked += 1
+    assert checked > FUZZ_CASES // 2
+
+
+def test_next_fires_strictly_increasing_fuzz():
+    rng = random.Random(7)
+    for _ in range(100):
+        fields = [_random_field(rng, low, high) for low, high in FUZZ_RANGES]
+        try:
+            cron = CronExpression(" ".join(text for text, _, _ in fields))
+        except CronError:
+            continue
+        fires = cron.next_fires(5, datetime(2024, 2, 28, 23, 59))
+        assert all(a < b for a, b in zip(fires, fires[1:]))
+        assert all(cron.matches(fire) for fire in fires)
+
+
+# ----------------------------- CRON -> schtasks -----------------------------
+@pytest.mark.parametrize("expr, expected", [
+    ("30 2 * * *", {"st": "02:30", "type": "DAILY"}),
+    ("*/15 * * * *", {"st": "00:00", "ri": "15", "du": "24:00", "type": "DAILY"}),
+    ("0 8-17 * * *", {"st": "08:00", "ri": "60", "du": "09:01", "type": "DAILY"}),
+    ("0 */2 * * 1-5", {"st": "00:00", "ri": "120", "du": "24:00", "type": "WEEKLY", "dlist": "MON,TUE,WED,THU,FRI"}),
+    ("30 2 * * 1,3,5", {"st": "02:30", "type": "WEEKLY", "dlist": "MON,WED,FRI"}),
+    ("0 0 * * 7", {"st": "00:00", "type": "WEEKLY", "dlist": "SUN"}),
+    ("0 2 1 * *", {"st": "02:00", "type": "MONTHLY", "dom": "1"}),
+    ("0 2 15 JAN,JUL *", {"st": "02:00", "type": "MONTHLY", "dom": "15", "months": "JAN,JUL"}),
+])
+def test_cron_to_schtasks_args(expr, expected):
+    assert cron_to_schtasks_args(expr) == expected
+
+
+@pytest.mark.parametrize("expr, message", [
+    ("0 8,9,11 * * *", "không cách đều"),
+    ("0 0 1 * MON", "đồng thời ngày-tháng và thứ"),
+    ("0 0 * JAN MON", "mọi tháng"),
+    ("0 0 1,15 * *", "1 ngày cố định"),
+    ("0 0 * JAN *", "1 số tháng"),
+    ("61 * * * *", "phút"),
+])
+def test_cron_to_schtasks_args_errors(expr, message):
+    with pytest.raises(ValueError, match=message):
+        cron_to_schtasks_args(expr)
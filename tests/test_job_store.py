@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử kho trạng thái lịch (schedule_work.job_store)
+- due_runs: bảng các trường hợp run_once / run_all / skip, cửa sổ chạy bù (grace) và giới hạn MAX_CATCHUP_RUNS.
+- JobStore: ghi nguyên tử ra đĩa, đọc lại khi khởi tạo, tệp hỏng thì bắt đầu lại từ đầu.
+"""
+from datetime import datetime
+
+import pytest
+
+from schedule_work.cron import CronExpression
+from schedule_work.job_store import (MAX_CATCHUP_RUNS, MISFIRE_RUN_ALL, MISFIRE_RUN_ONCE, MISFIRE_SKIP, JobStore,
+                                     due_runs)
+
+STEP = 600
+T = STEP * 100
+
+
+class Every:
+    """Lịch giả chạy mỗi STEP giây (tại các bội số của STEP), không phụ thuộc múi giờ."""
+
+    def next_timestamp(self, after):
+        return (after // STEP + 1) * STEP
+
+
+# ----------------------------- due_runs -----------------------------
+@pytest.mark.parametrize("policy, scheduled, now, grace, expected", [
+    # Chưa tới giờ / chưa từng lên lịch
+    (MISFIRE_RUN_ALL, None, T, None, []),
+    (MISFIRE_RUN_ALL, T + STEP, T, None, []),
+    # Đúng giờ: mọi chính sách đều chạy 1 lần
+    (MISFIRE_RUN_ALL, T, T, None, [T]),
+    (MISFIRE_RUN_ONCE, T, T + 30, None, [T]),
+    (MISFIRE_SKIP, T, T + 30, None, [T]),
+    # Lỡ 3 lần (T, T+600, T+1200)
+    (MISFIRE_RUN_ALL, T, T + 1500, None, [T, T + STEP, T + 2 * STEP]),
+    (MISFIRE_RUN_ONCE, T, T + 1500, None, [T + 2 * STEP]),
+    (MISFIRE_SKIP, T, T + 1500, None, []),                      # lần gần nhất trễ 300 giây > ON_TIME_SECONDS
+    (MISFIRE_SKIP, T, T + 2 * STEP + 60, None, [T + 2 * STEP]),  # trễ đúng ON_TIME_SECONDS vẫn là đúng giờ
+    (MISFIRE_SKIP, T, T + 2 * STEP + 61, None, []),
+    # Cửa sổ chạy bù: chỉ các lần trong [now - grace, now]
+    (MISFIRE_RUN_ALL, T, T + 3000, 1000, [T + 2400, T + 3000]),
+    (MISFIRE_RUN_ONCE, T, T + 3000, 1000, [T + 3000]),
+    (MISFIRE_RUN_ALL, T, T + 3000, 0, [T + 3000]),
+    (MISFIRE_RUN_ALL, T, T + 3100, 50, []),                     # mọi lần lỡ đều cũ hơn grace
+    (MISFIRE_RUN_ALL, T, T + 1200, 1200, [T, T + STEP, T + 2 * STEP]),  # lần cũ nhất vừa đúng mép cửa sổ
+])
+def test_due_runs(policy, scheduled, now, grace, expected):
+    assert due_runs(Every(), scheduled, now, policy, grace) == expected
+
+
+@pytest.mark.parametrize("missed", [MAX_CATCHUP_RUNS, MAX_CATCHUP_RUNS + 1, 3 * MAX_CATCHUP_RUNS])
+def test_run_all_keeps_newest_catchup_runs(missed):
+    now = T + (missed - 1) * STEP
+    fires = due_runs(Every(), T, now, MISFIRE_RUN_ALL, None)
+    assert len(fires) == MAX_CATCHUP_RUNS
+    assert fires[-1] == now
+    assert fires == [now - i * STEP for i in range(MAX_CATCHUP_RUNS - 1, -1, -1)]
+
+
+def test_run_once_after_long_sleep_runs_latest():
+    now = T + 10 * MAX_CATCHUP_RUNS * STEP + 10
+    assert due_runs(Every(), T, now, MISFIRE_RUN_ONCE, None) == [now - 10]
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        due_runs(Every(), T, T + STEP, "sometimes", None)
+    # Chưa tới giờ thì không cần kiểm tra chính sách
+    assert due_runs(Every(), T + STEP, T, "sometimes", None) == []
+
+
+def test_due_runs_with_cron_expression():
+    cron = CronExpression("0 * * * *")
+    start = datetime(2026, 1, 5, 10, 0).timestamp()
+    now = datetime(2026, 1, 5, 13, 10).timestamp()
+    fires = due_runs(cron, start, now, MISFIRE_RUN_ALL, None)
+    assert [datetime.fromtimestamp(t).hour for t in fires] == [10, 11, 12, 13]
+    assert due_runs(cron, start, now, MISFIRE_RUN_ALL, 2 * 3600) == fires[-2:]
+
+
+# ----------------------------- JobStore -----------------------------
+def test_store_persists_and_reloads(tmp_path):
+    path = str(tmp_path / "jobs.json")
+    store = JobStore(path)
+    store.upsert("full", cron="0 1 * * *", next_run=T, misfire_policy=MISFIRE_RUN_ONCE, grace_seconds=None)
+    store.record_run("full", last_run=T + 5, next_run=T + 86400, status="success", runs=2, skipped=1)
+    store.upsert("log", cron="*/15 * * * *", next_run=T)
+    assert store.remove("log") and not store.remove("log")
+
+    reloaded = JobStore(path)
+    record = reloaded.get("full")
+    assert record["cron"] == "0 1 * * *" and record["grace_seconds"] is None
+    assert (record["last_run"], record["next_run"], record["runs"], record["skipped"]) == (T + 5, T + 86400, 2, 1)
+    assert [r["id"] for r in reloaded.records()] == ["full"]
+    assert not (tmp_path / "jobs.json.tmp").exists()
+
+
+def test_get_returns_copy(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.json"))
+    store.upsert("full", cron="0 1 * * *")
+    store.get("full")["cron"] = "changed"
+    assert store.get("full")["cron"] == "0 1 * * *"
+
+
+@pytest.mark.parametrize("content", ["{not json", '{"jobs": []}'])
+def test_corrupt_file_starts_empty(tmp_path, content):
+    path = tmp_path / "jobs.json"
+    path.write_text(content, encoding="utf-8")
+    store = JobStore(str(path))
+    assert store.records() == []
+    store.upsert("full", cron="0 1 * * *")
+    assert JobStore(str(path)).get("full")["cron"] == "0 1 * * *"
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử hàng đợi gửi email (services.mail_spool) với sender giả (không cần máy chủ SMTP)
+- Làn ưu tiên: luồng 0 chỉ gửi critical, OTP không phải chờ sau email hàng loạt đang gửi.
+- dedupe_key: callback của lần gửi trùng được gắn vào email đang chờ / gọi ngay nếu đã gửi xong.
+- Phân loại lỗi: 4xx / mất kết nối gửi lại, 5xx / địa chỉ sai dừng ngay, hết số lần thử thì thất bại.
+- Khôi phục: email đang "sending" khi ứng dụng tắt được gửi lại; email critical không bao giờ nằm trên đĩa.
+- failed/ được dọn theo số tệp tối đa.
+"""
+import json
+import os
+import smtplib
+import threading
+import time
+
+import pytest
+
+from services import mail_spool
+from services.mail_spool import (PRIORITY_BULK, PRIORITY_CRITICAL, PRIORITY_NORMAL, STATUS_FAILED, STATUS_QUEUED,
+                                 STATUS_SENDING, STATUS_SENT, MailSpool, is_permanent_error)
+
+WAIT = 5.0
+
+
+class FakeSession:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSender:
+    """
+    Sender giả: ghi lại (người nhận, tên luồng) mỗi lần gửi.
+    errors[to_email]: danh sách lỗi ném ra ở các lần gửi đầu; gates[to_email]: Event chặn việc gửi tới khi được mở.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.delivered = []
+        self.attempts = {}
+        self.errors = {}
+        self.gates = {}
+        self.started = {}
+
+    def new_session(self):
+        return FakeSession()
+
+    def deliver(self, to_email, subject, body, signature, attachment_path, cc_email, session=None):
+        with self.lock:
+            self.attempts[to_email] = self.attempts.get(to_email, 0) + 1
+            errors = self.errors.get(to_email)
+            error = errors.pop(0) if errors else None
+        if to_email in self.started:
+            self.started[to_email].set()
+        if to_email in self.gates:
+            assert self.gates[to_email].wait(WAIT)
+        if error is not None:
+            raise error
+        with self.lock:
+            self.delivered.append((to_email, threading.current_thread().name))
+
+
+class Results:
+    """Thu kết quả callback(to_email, success) từ luồng gửi; wait(n) chờ đủ n lần gọi."""
+
+    def __init__(self):
+        self.items = []
+        self._cond = threading.Condition()
+
+    def callback(self, tag):
+        def record(to_email, success):
+            with self._cond:
+                self.items.append((tag, success))
+                self._cond.notify_all()
+        return record
+
+    def wait(self, count):
+        with self._cond:
+            assert self._cond.wait_for(lambda: len(self.items) >= count, WAIT)
+        return sorted(self.items)
+
+
+@pytest.fixture
+def sender():
+    return FakeSender()
+
+
+@pytest.fixture
+def make_spool(tmp_path):
+    spools = []
+
+    def factory(sender, **kwargs):
+        kwargs.setdefault("workers", 2)
+        kwargs.setdefault("base_delay", 0.01)
+        spool = MailSpool(sender, directory=str(tmp_path / "spool"), **kwargs)
+        spools.append(spool)
+        return spool
+
+    yield factory
+    for spool in spools:
+        spool.shutdown(timeout=WAIT)
+
+
+def _spool_files(spool, failed=False):
+    directory = spool.failed_directory if failed else spool.directory
+    return sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+
+
+# ----------------------------- Làn ưu tiên -----------------------------
+def test_critical_lane_not_blocked_by_bulk(sender, make_spool):
+    sender.gates["bulk@example.com"] = threading.Event()
+    sender.started["bulk@example.com"] = threading.Event()
+    spool = make_spool(sender)
+
+    spool.enqueue("bulk@example.com", "s", "b", priority=PRIORITY_BULK)
+    assert sender.started["bulk@example.com"].wait(WAIT)
+    # Luồng chung đang bận gửi email bulk: email normal phải chờ, OTP vẫn được luồng 0 gửi ngay
+    normal_id = spool.enqueue("normal@example.com", "s", "b", priority=PRIORITY_NORMAL)
+    otp_sent = threading.Event()
+    spool.enqueue("otp@example.com", "s", "b", priority=PRIORITY_CRITICAL, callback=lambda to, ok: otp_sent.set())
+
+    assert otp_sent.wait(WAIT)
+    assert sender.delivered == [("otp@example.com", "mail-spool-0")]
+    assert spool.status(normal_id)["status"] == STATUS_QUEUED
+
+    sender.gates["bulk@example.com"].set()
+    assert spool.wait_idle(WAIT)
+    assert {name for to, name in sender.delivered if to != "otp@example.com"} == {"mail-spool-1"}
+
+
+# ----------------------------- dedupe_key -----------------------------
+def test_dedupe_attaches_callback_to_pending_job(sender, make_spool):
+    spool = make_spool(sender, start=False)
+    results = Results()
+
+    first = spool.enqueue("a@example.com", "s", "b", dedupe_key="k", callback=results.callback("1"))
+    second = spool.enqueue("a@example.com", "s", "b", dedupe_key="k", callback=results.callback("2"))
+    assert first == second
+    assert spool.stats()["deduplicated"] == 1
+
+    spool.start()
+    assert results.wait(2) == [("1", True), ("2", True)]
+    assert sender.attempts == {"a@example.com": 1}
+
+    # Đã gửi xong trong cửa sổ dedupe: không gửi lại, callback được gọi ngay (trên luồng gọi enqueue)
+    third = spool.enqueue("a@example.com", "s", "b", dedupe_key="k", callback=results.callback("3"))
+    assert third == first
+    assert ("3", True) in results.items
+    assert sender.attempts == {"a@example.com": 1}
+
+
+def test_dedupe_key_reusable_after_failure(sender, make_spool):
+    sender.errors["a@example.com"] = [smtplib.SMTPDataError(554, b"rejected")]
+    spool = make_spool(sender)
+
+    first = spool.enqueue("a@example.com", "s", "b", dedupe_key="k")
+    assert spool.wait_idle(WAIT)
+    assert spool.status(first)["status"] == STATUS_FAILED
+
+    second = spool.enqueue("a@example.com", "s", "b", dedupe_key="k")
+    assert second != first
+    assert spool.wait_idle(WAIT)
+    assert spool.status(second)["status"] == STATUS_SENT
+
+
+# ----------------------------- Phân loại lỗi -----------------------------
+@pytest.mark.parametrize("error, permanent", [
+    (smtplib.SMTPDataError(451, b"try later"), False),
+    (smtplib.SMTPDataError(421, b"closing"), False),
+    (smtplib.SMTPServerDisconnected("gone"), False),
+    (ConnectionResetError(), False),
+    (smtplib.SMTPDataError(554, b"rejected"), True),
+    (smtplib.SMTPSenderRefused(550, b"no", "me@example.com"), True),
+    (smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"no such user")}), True),
+    (ValueError("địa chỉ không hợp lệ"), True),
+])
+def test_is_permanent_error(error, permanent):
+    assert is_permanent_error(error) is permanent
+
+
+def test_transient_error_is_retried(sender, make_spool):
+    sender.errors["a@example.com"] = [smtplib.SMTPDataError(451, b"try later"), smtplib.SMTPServerDisconnected("x")]
+    spool = make_spool(sender)
+
+    job_id = spool.enqueue("a@example.com", "s", "b")
+    assert spool.wait_idle(WAIT)
+    status = spool.status(job_id)
+    assert status["status"] == STATUS_SENT and status["attempts"] == 3
+    assert spool.stats()["retries"] == 2
+    assert _spool_files(spool) == [] and _spool_files(spool, failed=True) == []
+
+
+def test_permanent_error_fails_immediately(sender, make_spool):
+    sender.errors["a@example.com"] = [smtplib.SMTPDataError(554, b"rejected")]
+    spool = make_spool(sender)
+    results = Results()
+
+    job_id = spool.enqueue("a@example.com", "s", "b", callback=results.callback("a"))
+    assert results.wait(1) == [("a", False)]
+    status = spool.status(job_id)
+    assert status["status"] == STATUS_FAILED and status["attempts"] == 1
+    assert "554" in status["last_error"]
+    assert _spool_files(spool) == [] and _spool_files(spool, failed=True) == [f"{job_id}.json"]
+
+
+def test_gives_up_after_max_attempts(sender, make_spool):
+    sender.errors["a@example.com"] = [smtplib.SMTPDataError(451, b"try later")] * 10
+    spool = make_spool(sender, max_attempts=3)
+
+    job_id = spool.enqueue("a@example.com", "s", "b")
+    assert spool.wait_idle(WAIT)
+    assert spool.status(job_id)["status"] == STATUS_FAILED
+    assert sender.attempts == {"a@example.com": 3}
+
+
+# ----------------------------- Khôi phục / lưu trữ -----------------------------
+def test_sending_job_is_recovered_after_crash(sender, make_spool):
+    crashed = make_spool(sender, start=False)
+    job_id = crashed.enqueue("a@example.com", "s", "b")
+    # Giả lập ứng dụng tắt khi email đang gửi dở
+    path = crashed._path(job_id)
+    with open(path, "r", encoding="utf-8") as f:
+        job = json.load(f)
+    job["status"] = STATUS_SENDING
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(job, f)
+
+    spool = make_spool(sender)
+    assert spool.stats()["recovered"] == 1
+    assert spool.wait_idle(WAIT)
+    assert spool.status(job_id)["status"] == STATUS_SENT
+    assert sender.attempts == {"a@example.com": 1}
+    assert _spool_files(spool) == []
+
+
+def test_critical_jobs_never_touch_disk(sender, make_spool):
+    sender.errors["fail@example.com"] = [smtplib.SMTPDataError(554, b"rejected")]
+    spool = make_spool(sender, start=False)
+
+    spool.enqueue("otp@example.com", "OTP", "Mã OTP: 123456", priority=PRIORITY_CRITICAL)
+    spool.enqueue("fail@example.com", "OTP", "Mã OTP: 654321", priority=PRIORITY_CRITICAL)
+    assert _spool_files(spool) == []
+
+    spool.start()
+    assert spool.wait_idle(WAIT)
+    assert _spool_files(spool) == [] and _spool_files(spool, failed=True) == []
+
+
+def test_critical_files_from_older_versions_are_removed(sender, make_spool, tmp_path):
+    directory = tmp_path / "spool"
+    os.makedirs(directory / "failed")
+    job = {"id": "0000000000001-aaaaaaaa", "to_email": "otp@example.com", "subject": "OTP", "body": "123456",
+           "signature": "", "attachment_path": None, "cc_email": None, "priority": PRIORITY_CRITICAL,
+           "dedupe_key": None, "status": STATUS_QUEUED, "attempts": 0, "created_at": 0, "next_attempt_at": 0,
+           "last_error": None}
+    for folder in (directory, directory / "failed"):
+        with open(folder / f"{job['id']}.json", "w", encoding="utf-8") as f:
+            json.dump(job, f)
+
+    spool = make_spool(sender, start=False)
+    assert _spool_files(spool) == [] and _spool_files(spool, failed=True) == []
+    # Email vẫn được gửi từ bộ nhớ
+    spool.start()
+    assert spool.wait_idle(WAIT)
+    assert sender.attempts == {"otp@example.com": 1}
+
+
+def test_failed_directory_is_capped(sender, make_spool, monkeypatch):
+    monkeypatch.setattr(mail_spool, "MAIL_FAILED_KEEP", 2)
+    spool = make_spool(sender)
+    results = Results()
+
+    job_ids = []
+    for index in range(4):
+        to_email = f"user{index}@example.com"
+        sender.errors[to_email] = [smtplib.SMTPDataError(554, b"rejected")]
+        # failed/ được dọn trước khi callback báo thất bại
+        job_ids.append(spool.enqueue(to_email, "s", "b", callback=results.callback(index)))
+        results.wait(index + 1)
+        time.sleep(0.002)   # job_id bắt đầu bằng mili giây tạo -> thứ tự tệp trong failed/ đúng thứ tự gửi
+
+    assert _spool_files(spool, failed=True) == [f"{job_id}.json" for job_id in job_ids[-2:]]
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử bộ thực thi theo tài nguyên và độ ưu tiên (schedule_work.resource_executor)
+- Giới hạn theo tên chính xác và theo mẫu fnmatch (mỗi tên tài nguyên đếm riêng).
+- Lấy trọn gói tài nguyên: công việc chờ không giữ dở tài nguyên nào.
+- Thứ tự: LOG trước FULL đang chờ; aging nâng ưu tiên công việc chờ lâu; giữ chỗ tài nguyên khi bị đói.
+- shutdown(cancel_futures=True) hủy công việc đang chờ, công việc đang chạy vẫn chạy xong.
+"""
+import threading
+import time
+
+import pytest
+
+from schedule_work.resource_executor import (BACKUP_PRIORITIES, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL,
+                                             ResourceExecutor, backup_job_resources)
+
+WAIT = 5.0
+
+
+class Recorder:
+    """Công việc giả: ghi thứ tự bắt đầu, số công việc chạy đồng thời và chờ tới khi được mở (release)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.order = []
+        self.running = 0
+        self.max_running = 0
+        self.gates = {}
+        self.started = {}
+
+    def job(self, name, block=False):
+        self.started[name] = threading.Event()
+        if block:
+            self.gates[name] = threading.Event()
+
+        def run():
+            with self.lock:
+                self.order.append(name)
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            self.started[name].set()
+            try:
+                if name in self.gates:
+                    assert self.gates[name].wait(WAIT)
+                return name
+            finally:
+                with self.lock:
+                    self.running -= 1
+        return run
+
+    def release(self, name):
+        self.gates[name].set()
+
+    def wait_started(self, name):
+        assert self.started[name].wait(WAIT)
+
+
+@pytest.fixture
+def recorder():
+    return Recorder()
+
+
+@pytest.fixture
+def make_executor():
+    executors = []
+
+    def factory(**kwargs):
+        kwargs.setdefault("limits", {})
+        kwargs.setdefault("aging_seconds", 0)
+        kwargs.setdefault("starvation_seconds", 3600)
+        executor = ResourceExecutor(**kwargs)
+        executors.append(executor)
+        return executor
+
+    yield factory
+    for executor in executors:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# ----------------------------- Giới hạn tài nguyên -----------------------------
+@pytest.mark.parametrize("resource, expected", [
+    ("disk:D:", 1),                         # tên chính xác ưu tiên hơn mẫu
+    ("disk:E:", 3),
+    ("full@instance:SRV", 2),
+    ("log@instance:SRV", None),             # không khớp mẫu nào -> default_limit
+])
+def test_limit_of(resource, expected):
+    executor = ResourceExecutor(limits={"disk:*": 3, "disk:D:": 1, "full@instance:*": 2})
+    assert executor.limit_of(resource) == expected
+
+
+def test_backup_job_resources():
+    assert backup_job_resources("srv\\sqlexpress", "d:\\Backup", "FULL") == (
+        "instance:SRV\\SQLEXPRESS", "full@instance:SRV\\SQLEXPRESS", "disk:D:")
+    assert backup_job_resources("SRV", "\\\\nas\\share\\db", "LOG")[-1] == "disk:\\\\NAS\\SHARE"
+    assert backup_job_resources("SRV", None, "DIFF") == ("instance:SRV", "diff@instance:SRV")
+    assert BACKUP_PRIORITIES["LOG"] < BACKUP_PRIORITIES["DIFF"] < BACKUP_PRIORITIES["FULL"]
+
+
+def test_exact_name_limit(recorder, make_executor):
+    executor = make_executor(max_workers=4, limits={"disk:D:": 1})
+    futures = [executor.submit_job(recorder.job(f"job{i}"), resources=["disk:D:"]) for i in range(4)]
+    for future in futures:
+        future.result(WAIT)
+    assert recorder.max_running == 1
+
+
+def test_pattern_limit_counts_each_name(recorder, make_executor):
+    executor = make_executor(max_workers=4, limits={"full@instance:*": 2})
+    for name in ("a1", "a2", "a3"):
+        executor.submit_job(recorder.job(name, block=True), resources=["full@instance:A"])
+    executor.submit_job(recorder.job("b1", block=True), resources=["full@instance:B"])
+
+    for name in ("a1", "a2", "b1"):
+        recorder.wait_started(name)
+    assert not recorder.started["a3"].wait(0.1)
+    assert executor.stats()["in_use"] == {"full@instance:A": 2, "full@instance:B": 1}
+
+    recorder.release("a1")
+    recorder.wait_started("a3")
+    for name in ("a2", "a3", "b1"):
+        recorder.release(name)
+
+
+def test_all_or_nothing_acquisition(recorder, make_executor):
+    executor = make_executor(max_workers=3, limits={"a": 1, "b": 1})
+    executor.submit_job(recorder.job("hold_a", block=True), resources=["a"])
+    recorder.wait_started("hold_a")
+
+    both = executor.submit_job(recorder.job("both", block=True), resources=["a", "b"])
+    # "both" đang chờ "a" nhưng không giữ dở "b": công việc khác vẫn lấy được "b"
+    executor.submit_job(recorder.job("only_b"), resources=["b"]).result(WAIT)
+    assert not both.running() and "both" not in recorder.order
+
+    recorder.release("hold_a")
+    recorder.wait_started("both")
+    assert executor.stats()["in_use"] == {"a": 1, "b": 1}
+    recorder.release("both")
+    assert both.result(WAIT) == "both"
+    assert recorder.order == ["hold_a", "only_b", "both"]
+
+
+# ----------------------------- Thứ tự ưu tiên -----------------------------
+def test_log_dispatched_before_queued_full(recorder, make_executor):
+    executor = make_executor(max_workers=1)
+    executor.submit_job(recorder.job("busy", block=True))
+    recorder.wait_started("busy")
+
+    full = executor.submit_job(recorder.job("FULL"), priority=BACKUP_PRIORITIES["FULL"])
+    diff = executor.submit_job(recorder.job("DIFF"), priority=BACKUP_PRIORITIES["DIFF"])
+    log = executor.submit_job(recorder.job("LOG"), priority=BACKUP_PRIORITIES["LOG"])
+    recorder.release("busy")
+    for future in (full, diff, log):
+        future.result(WAIT)
+    assert recorder.order == ["busy", "LOG", "DIFF", "FULL"]
+
+
+def test_aging_promotes_long_waiting_job(recorder, make_executor):
+    executor = make_executor(max_workers=1, aging_seconds=0.05)
+    executor.submit_job(recorder.job("busy", block=True))
+    recorder.wait_started("busy")
+
+    old = executor.submit_job(recorder.job("old_low"), priority=PRIORITY_LOW)
+    time.sleep(0.2)     # chờ 4 chu kỳ aging -> ưu tiên hiệu dụng cao hơn HIGH
+    new = executor.submit_job(recorder.job("new_high"), priority=PRIORITY_HIGH)
+    recorder.release("busy")
+    old.result(WAIT)
+    new.result(WAIT)
+
+    assert recorder.order == ["busy", "old_low", "new_high"]
+    assert executor.stats()["aged_dispatches"] >= 1
+
+
+def test_without_aging_priority_wins(recorder, make_executor):
+    executor = make_executor(max_workers=1, aging_seconds=0)
+    executor.submit_job(recorder.job("busy", block=True))
+    recorder.wait_started("busy")
+
+    old = executor.submit_job(recorder.job("old_low"), priority=PRIORITY_LOW)
+    time.sleep(0.05)
+    new = executor.submit_job(recorder.job("new_high"), priority=PRIORITY_HIGH)
+    recorder.release("busy")
+    old.result(WAIT)
+    new.result(WAIT)
+    assert recorder.order == ["busy", "new_high", "old_low"]
+
+
+@pytest.mark.parametrize("starvation_seconds, later_runs_first", [(0.05, False), (3600, True)])
+def test_starving_job_reserves_its_resources(recorder, make_executor, starvation_seconds, later_runs_first):
+    executor = make_executor(max_workers=3, limits={"disk:D:": 1, "disk:E:": 1}, starvation_seconds=starvation_seconds)
+    executor.submit_job(recorder.job("hold_d", block=True), resources=["disk:D:"])
+    recorder.wait_started("hold_d")
+
+    starving = executor.submit_job(recorder.job("starving"), resources=["disk:D:", "disk:E:"], priority=PRIORITY_NORMAL)
+    time.sleep(0.1)
+    later = executor.submit_job(recorder.job("later"), resources=["disk:E:"], priority=PRIORITY_NORMAL)
+
+    # Bị đói: "later" không được lấy disk:E: mà "starving" đang giữ chỗ
+    assert recorder.started["later"].wait(0.2) is later_runs_first
+    recorder.release("hold_d")
+    starving.result(WAIT)
+    later.result(WAIT)
+    expected = ["hold_d", "later", "starving"] if later_runs_first else ["hold_d", "starving", "later"]
+    assert recorder.order == expected
+
+
+# ----------------------------- Dừng -----------------------------
+def test_shutdown_cancel_futures(recorder, make_executor):
+    executor = make_executor(max_workers=1)
+    running = executor.submit_job(recorder.job("running", block=True))
+    recorder.wait_started("running")
+    queued = [executor.submit_job(recorder.job(f"queued{i}")) for i in range(3)]
+
+    executor.shutdown(wait=False, cancel_futures=True)
+    assert all(future.cancelled() for future in queued)
+    with pytest.raises(RuntimeError):
+        executor.submit(recorder.job("late"))
+
+    recorder.release("running")
+    assert running.result(WAIT) == "running"
+    executor.shutdown(wait=True)
+    assert recorder.order == ["running"]
+    assert executor.stats()["cancelled"] == 3
+
+
+def test_shutdown_without_cancel_drains_queue(recorder, make_executor):
+    executor = make_executor(max_workers=1)
+    executor.submit_job(recorder.job("running", block=True))
+    recorder.wait_started("running")
+    queued = [executor.submit_job(recorder.job(f"queued{i}")) for i in range(2)]
+
+    recorder.release("running")
+    executor.shutdown(wait=True)
+    assert [future.result(0) for future in queued] == ["queued0", "queued1"]
+
+
+def test_failed_job_releases_resources(make_executor):
+    executor = make_executor(max_workers=1, limits={"disk:D:": 1})
+
+    def boom():
+        raise ValueError("lỗi")
+
+    with pytest.raises(ValueError):
+        executor.submit_job(boom, resources=["disk:D:"]).result(WAIT)
+    assert executor.submit_job(lambda: "ok", resources=["disk:D:"]).result(WAIT) == "ok"
+    stats = executor.stats()
+    assert stats["failed"] == 1 and stats["in_use"] == {}
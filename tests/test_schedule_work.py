@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử lịch có lưu trạng thái (schedule_work.schedule_work) với bộ hẹn giờ giả
+- rehydrate: khôi phục mọi lịch đã lưu trong JobStore trong 1 lượt, giữ lần chạy kế tiếp đã lưu và chính sách chạy bù.
+- Lượt chạy đầu tiên sau khi khôi phục chạy bù các lần đã lỡ rồi ghi kết quả vào JobStore.
+"""
+import time
+
+import pytest
+
+from schedule_work.cron import CronExpression
+from schedule_work.job_store import MISFIRE_RUN_ALL, MISFIRE_SKIP, JobStore
+from schedule_work.schedule_work import Schedule_Auto
+
+HOURLY = "0 * * * *"
+
+
+class FakeHandle:
+    def __init__(self, when, callback, args, kwargs):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+
+    def fire(self):
+        self.callback(*self.args)
+
+
+class FakeScheduler:
+    """Bộ hẹn giờ giả: chỉ ghi lại các lịch được đưa vào, test tự gọi fire()."""
+
+    thread = None
+
+    def __init__(self):
+        self.handles = []
+        self.cancelled = []
+
+    def call_at(self, when, callback, *args, **kwargs):
+        handle = FakeHandle(when, callback, args, kwargs)
+        self.handles.append(handle)
+        return handle
+
+    def cancel(self, handle):
+        self.cancelled.append(handle)
+        return True
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.json"))
+
+
+@pytest.fixture
+def scheduler():
+    return FakeScheduler()
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+
+
+def test_rehydrate_restores_saved_jobs_in_one_pass(store, scheduler):
+    missed_at = CronExpression(HOURLY).next_timestamp(time.time() - 3 * 3600)
+    store.upsert("full", cron=HOURLY, next_run=missed_at, misfire_policy=MISFIRE_RUN_ALL, grace_seconds=None)
+    # Lịch hằng ngày đúng vào lần đã lỡ: lần gần nhất luôn trễ vài giờ -> skip không chạy bù (không phụ thuộc giờ chạy test)
+    missed = time.localtime(missed_at)
+    store.upsert("log", cron=f"{missed.tm_min} {missed.tm_hour} * * *", next_run=missed_at,
+                 misfire_policy=MISFIRE_SKIP, grace_seconds=None)
+    store.upsert("orphan", cron=HOURLY, next_run=missed_at)        # không có trong tasks -> giữ nguyên
+    store.upsert("broken", cron="not a cron", next_run=missed_at)  # CRON hỏng -> bỏ qua, không làm hỏng lượt khôi phục
+    store.upsert("empty", next_run=missed_at)                      # chưa có CRON
+    full, log = Counter(), Counter()
+
+    auto = Schedule_Auto(scheduler=scheduler, store=store)
+    restored = auto.rehydrate({"full": full, "log": log, "broken": Counter(), "empty": Counter()},
+                              options={"full": {"resources": ("disk:D:",), "priority": 30}})
+
+    assert sorted(restored) == ["full", "log"]
+    full_job, full_stop = restored["full"]
+    assert (full_job.misfire_policy, full_job.grace_seconds) == (MISFIRE_RUN_ALL, None)
+    assert (full_job.resources, full_job.priority) == (("disk:D:",), 30)
+    assert not full_stop.is_set()
+    log_job, _ = restored["log"]
+    assert (log_job.misfire_policy, log_job.grace_seconds) == (MISFIRE_SKIP, None)
+
+    # Lần chạy đầu tiên là lần đã lỡ lưu trong JobStore (chạy bù ngay), không phải lần kế tiếp theo CRON
+    assert [handle.when for handle in scheduler.handles] == [missed_at, missed_at]
+    assert scheduler.handles[0].kwargs["executor_options"] == {"resources": ("disk:D:",), "priority": 30}
+    assert store.get("orphan")["next_run"] == missed_at
+
+    scheduler.handles[0].fire()
+    assert full.calls == 3
+    record = store.get("full")
+    assert record["runs"] == 3 and record["last_status"] == "success"
+    assert record["next_run"] > time.time()
+
+    scheduler.handles[1].fire()
+    assert log.calls == 0
+    assert store.get("log")["last_status"] == "skipped"
+
+
+def test_rehydrate_without_saved_next_run_waits_for_cron(store, scheduler):
+    store.upsert("full", cron=HOURLY, next_run=None)
+    before = time.time()
+    restored = Schedule_Auto(scheduler=scheduler, store=store).rehydrate({"full": Counter()})
+
+    assert list(restored) == ["full"]
+    assert scheduler.handles[0].when == CronExpression(HOURLY).next_timestamp(before)
+    assert store.get("full")["next_run"] == scheduler.handles[0].when
+
+
+def test_rehydrate_empty_store(store, scheduler):
+    assert Schedule_Auto(scheduler=scheduler, store=store).rehydrate({"full": Counter()}) == {}
+    assert scheduler.handles == []
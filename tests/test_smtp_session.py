@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử phiên SMTP dùng lại (services.smtp_session) trên máy chủ SMTP giả lập (benchmark.smtp_sink)
+- Nhiều email dùng chung 1 kết nối; đủ max_messages thì mở phiên mới.
+- 421 + ngắt kết nối: kết nối lại và gửi lại đúng 1 lần; 421 lần nữa thì ném lỗi.
+- Lỗi 4xx / 5xx khác được ném ra nguyên trạng và phiên vẫn dùng tiếp được.
+- NOOP trước khi dùng lại phiên rảnh; gửi theo luồng (sendmail_stream).
+"""
+import smtplib
+import socket
+
+import pytest
+
+from benchmark.smtp_sink import SMTPSink
+from services.smtp_session import SMTPSession, SMTPSessionError
+
+MESSAGE = b"Subject: test\r\n\r\nHello\r\n"
+
+
+class ScriptedSink(SMTPSink):
+    """SMTPSink trả lỗi theo kịch bản: faults[i] là lỗi của email thứ i (None = nhận bình thường)."""
+
+    def __init__(self, faults=()):
+        super().__init__()
+        self.faults = list(faults)
+
+    def _pick_fault(self):
+        with self._lock:
+            return self.faults.pop(0) if self.faults else None
+
+
+@pytest.fixture
+def sink():
+    server = ScriptedSink().start()
+    yield server
+    server.stop()
+
+
+def _session(sink, **kwargs):
+    kwargs.setdefault("keepalive_interval", 0)
+    return SMTPSession(lambda: smtplib.SMTP(sink.host, sink.port, timeout=5), **kwargs)
+
+
+def _send(session, count=1):
+    for _ in range(count):
+        assert session.sendmail("from@example.com", ["to@example.com"], MESSAGE) == {}
+
+
+# ----------------------------- Dùng lại / xoay vòng phiên -----------------------------
+def test_messages_share_one_connection(sink):
+    session = _session(sink)
+    _send(session, 5)
+    session.close()
+
+    assert sink.stats()["connections"] == 1
+    assert sink.stats()["messages"] == 5
+    stats = session.stats()
+    assert stats["connects"] == 1 and stats["messages"] == 5 and not stats["connected"]
+
+
+def test_session_recycled_after_max_messages(sink):
+    session = _session(sink, max_messages=2)
+    _send(session, 5)
+    stats = session.stats()
+    session.close()
+
+    assert stats["recycled"] == 2
+    assert stats["connects"] == 3
+    assert stats["messages_in_session"] == 1
+    assert sink.stats()["connections"] == 3
+
+
+# ----------------------------- Kết nối lại -----------------------------
+def test_reconnects_once_on_421(sink):
+    sink.faults = ["fault_disconnect"]
+    session = _session(sink)
+    _send(session)
+    stats = session.stats()
+    session.close()
+
+    assert stats["reconnects"] == 1
+    assert stats["connects"] == 2
+    assert sink.stats()["messages"] == 1 and sink.stats()["fault_disconnect"] == 1
+
+
+def test_second_421_is_raised(sink):
+    sink.faults = ["fault_disconnect", "fault_disconnect"]
+    session = _session(sink)
+
+    with pytest.raises(smtplib.SMTPDataError) as info:
+        _send(session)
+    assert info.value.smtp_code == 421
+    assert not session.connected
+
+    # Lần gửi sau mở phiên mới
+    _send(session)
+    session.close()
+    assert sink.stats()["messages"] == 1
+
+
+def test_reconnects_when_server_dropped_idle_session(sink):
+    session = _session(sink)
+    _send(session)
+    # Máy chủ đóng kết nối khi phiên đang rảnh
+    with sink._lock:
+        clients = list(sink._clients)
+    for client in clients:
+        client.shutdown(socket.SHUT_RDWR)
+    _send(session)
+    stats = session.stats()
+    session.close()
+
+    assert stats["reconnects"] == 1
+    assert stats["messages"] == 2
+
+
+# ----------------------------- Lỗi khác -----------------------------
+@pytest.mark.parametrize("fault, code", [("fault_4xx", 451), ("fault_5xx", 554)])
+def test_other_errors_raised_and_session_kept(sink, fault, code):
+    sink.faults = [fault]
+    session = _session(sink)
+
+    with pytest.raises(smtplib.SMTPDataError) as info:
+        _send(session)
+    assert info.value.smtp_code == code
+    assert session.connected
+
+    _send(session)
+    stats = session.stats()
+    session.close()
+    assert stats["connects"] == 1 and stats["reconnects"] == 0
+    assert sink.stats()["connections"] == 1 and sink.stats()["messages"] == 1
+
+
+def test_connect_failure_raises_session_error():
+    session = SMTPSession(lambda: None, keepalive_interval=0)
+    with pytest.raises(SMTPSessionError):
+        session.sendmail("from@example.com", ["to@example.com"], MESSAGE)
+
+
+# ----------------------------- NOOP / gửi theo luồng -----------------------------
+def test_noop_before_reusing_idle_session(sink):
+    session = _session(sink, noop_after=0)
+    _send(session, 3)
+    stats = session.stats()
+    session.close()
+
+    assert stats["noops"] == 2 and stats["noop_failures"] == 0
+    assert stats["connects"] == 1
+
+
+def test_sendmail_stream_replays_chunks_after_421(sink):
+    sink.faults = ["fault_disconnect"]
+    session = _session(sink)
+    calls = []
+
+    def make_chunks():
+        calls.append(1)
+        return iter([b"Subject: test\r\n", b"\r\n", b"Hello\r\n"])
+
+    assert session.sendmail_stream("from@example.com", "to@example.com", make_chunks) == {}
+    session.close()
+    assert len(calls) == 2
+    assert sink.stats()["messages"] == 1
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử các bước sao lưu không cần SQL Server (backup_service.sql_backup)
+- missing_files: chỉ cột "File Exists" của xp_fileexist quyết định tệp có hay không.
+- cleanup_backups: giữ trọn bộ FULL mới nhất (mọi stripe) dù đã quá số ngày giữ lại.
+"""
+import os
+import time
+
+import pytest
+
+from backup_service.sql_backup import cleanup_backups, missing_files
+
+DAY = 86400
+
+
+class FakeCursor:
+    """Cursor giả: trả lần lượt các dòng cho từng lệnh xp_fileexist."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def execute(self, sql, params=None):
+        self.current = self.rows.pop(0)
+
+    def fetchone(self):
+        return self.current
+
+
+# ----------------------------- missing_files -----------------------------
+@pytest.mark.parametrize("row, missing", [
+    ((1, 0, 1), False),
+    ((0, 0, 1), True),     # Thư mục cha có nhưng tệp không có
+    ((0, 0, 0), True),
+    (None, False),         # Không kiểm tra được -> coi như có
+])
+def test_missing_files_uses_file_exists_column(row, missing):
+    assert missing_files(FakeCursor([row]), ["X:\\a.bak"]) == (["X:\\a.bak"] if missing else [])
+
+
+# ----------------------------- cleanup_backups -----------------------------
+def _touch(root, relative, age_days, now):
+    path = os.path.join(root, *relative.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x")
+    os.utime(path, (now - age_days * DAY, now - age_days * DAY))
+    return path
+
+
+def _candidates(tmp_path, now, keep_days=14):
+    result = cleanup_backups(str(tmp_path), "DB", keep_days, dry_run=True, now=now)
+    return sorted(os.path.basename(p) for p in result["data"]["candidates"])
+
+
+def test_cleanup_keeps_every_stripe_of_newest_full(tmp_path):
+    now = time.time()
+    # Stripe 1 ghi xong sớm hơn stripe 2 vài phút, cả bộ đã quá 14 ngày
+    _touch(tmp_path, "DB/Full/20240101/DB_FULL_000000_1.bak", 20.01, now)
+    _touch(tmp_path, "DB/Full/20240101/DB_FULL_000000_2.bak", 20, now)
+    _touch(tmp_path, "DB/Full/20231201/DB_FULL_000000_1.bak", 50, now)
+    _touch(tmp_path, "DB/Log/20231201/DB_LOG_010000_1.trn", 49, now)
+    _touch(tmp_path, "DB/Log/20240101/DB_LOG_010000_1.trn", 19, now)
+
+    result = cleanup_backups(str(tmp_path), "DB", 14, dry_run=True, now=now)
+    assert sorted(os.path.relpath(p, str(tmp_path)).replace(os.sep, "/") for p in result["data"]["candidates"]) == [
+        "DB/Full/20231201/DB_FULL_000000_1.bak", "DB/Log/20231201/DB_LOG_010000_1.trn"]
+
+
+def test_cleanup_newest_set_includes_encrypted_and_unstriped_names(tmp_path):
+    now = time.time()
+    _touch(tmp_path, "DB/Full/20240101/DB_FULL_000000_1.bak.enc", 30.01, now)
+    _touch(tmp_path, "DB/Full/20240101/DB_FULL_000000_2.bak.enc", 30, now)
+    _touch(tmp_path, "DB/Full/manual/DB.bak", 40, now)
+
+    assert _candidates(tmp_path, now) == ["DB.bak"]
+
+
+def test_cleanup_recent_full_uses_keep_days(tmp_path):
+    now = time.time()
+    _touch(tmp_path, "DB/Full/new/DB_FULL_000000_1.bak", 1, now)
+    _touch(tmp_path, "DB/Full/old/DB_FULL_000000_1.bak", 20, now)
+    _touch(tmp_path, "DB/Diff/old/DB_DIFF_000000_1.dif", 10, now)
+
+    assert _candidates(tmp_path, now) == ["DB_FULL_000000_1.bak"]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử backend SQLite (services.sqlite_database) cho luồng đăng nhập Google/Facebook
+- Lần đầu: tạo user, link provider, tạo session.
+- Tài khoản provider đã link đổi email: vẫn là user cũ, session và LastLoginAt ghi cho user cũ.
+"""
+import pytest
+
+from services.sqlite_database import SQLiteDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = SQLiteDatabase(path=str(tmp_path / "app.db"))
+    yield database
+    database.close()
+
+
+def _column(db, query, params=()):
+    conn = db._connect()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def test_social_login_creates_and_links_user(db):
+    result = db.social_login("google", "gid-1", "a@example.com", "A", remember=True)
+
+    assert result["success"] and result["token"]
+    assert result["data"][0][1] == "a@example.com"
+    assert _column(db, "SELECT UserEmail FROM UserExternalLogin WHERE ProviderUserId = ?", ("gid-1",)) == ["a@example.com"]
+    assert _column(db, "SELECT UserEmail FROM UserSessions") == ["a@example.com"]
+
+
+def test_social_login_linked_account_with_new_email_keeps_user(db):
+    db.social_login("google", "gid-1", "a@example.com", "A")
+    result = db.social_login("google", "gid-1", "renamed@example.com", "A", remember=True)
+
+    assert result["success"] and result["token"]
+    assert result["data"][0][1] == "a@example.com"
+    assert _column(db, "SELECT Email FROM Users") == ["a@example.com"]
+    assert _column(db, "SELECT UserEmail FROM UserSessions") == ["a@example.com"]
+    assert db.get_user_by_session(result["token"])["data"][0][1] == "a@example.com"
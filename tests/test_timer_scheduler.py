@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm thử bộ hẹn giờ 1 luồng (schedule_work.timer_scheduler)
+- Heap có chỉ số: hủy / đổi lịch phần tử ở giữa heap vẫn giữ đúng tính chất heap và chỉ số vị trí.
+- Luồng hẹn giờ đang ngủ chờ hạn xa được đánh thức sớm khi có công việc mới đứng đầu heap.
+- _next_when: bỏ qua các lần lặp đã lỡ (máy ngủ lâu), dừng lặp khi next_fire không tăng / lỗi / trả None.
+"""
+import random
+import threading
+import time
+
+import pytest
+
+from schedule_work.timer_scheduler import TimerHandle, TimerScheduler
+
+FAR = 10 ** 6
+WAIT = 5.0
+
+
+class InlineExecutor:
+    """Executor chạy tác vụ ngay trên luồng hẹn giờ (kết quả xác định, không cần nhóm luồng)."""
+
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+    def shutdown(self, wait=True):
+        pass
+
+
+@pytest.fixture
+def scheduler():
+    timer = TimerScheduler(executor=InlineExecutor(), name="test-timer")
+    yield timer
+    timer.shutdown(timeout=WAIT)
+
+
+def _noop():
+    pass
+
+
+def _assert_heap(timer):
+    heap = timer._heap
+    for i, handle in enumerate(heap):
+        assert handle.index == i
+        for child in (2 * i + 1, 2 * i + 2):
+            if child < len(heap):
+                assert handle._key() <= heap[child]._key()
+
+
+def _handle(next_fire, name="job"):
+    return TimerHandle(1, 0.0, _noop, (), {}, next_fire, name)
+
+
+# ----------------------------- Heap có chỉ số -----------------------------
+def test_cancel_middle_elements_keeps_heap(scheduler):
+    base = time.time() + FAR
+    handles = [scheduler.call_at(base + offset, _noop, name=f"job{offset}") for offset in (5, 1, 9, 3, 7, 2, 8, 4, 6, 0)]
+    _assert_heap(scheduler)
+
+    middle = [h for h in handles if 0 < h.index < len(scheduler._heap) - 1][:3]
+    for handle in middle:
+        assert scheduler.cancel(handle)
+        assert not handle.scheduled
+        _assert_heap(scheduler)
+    assert not scheduler.cancel(middle[0])
+
+    expected = sorted(h.when for h in handles if h not in middle)
+    assert [job["next_run"] for job in scheduler.jobs()] == expected
+    assert scheduler.stats()["cancelled"] == 3
+
+
+def test_reschedule_middle_elements_keeps_heap(scheduler):
+    base = time.time() + FAR
+    handles = [scheduler.call_at(base + offset, _noop) for offset in range(15)]
+
+    target = handles[7]
+    assert scheduler.reschedule(target, base - 1)
+    assert scheduler._heap[0] is target
+    _assert_heap(scheduler)
+
+    assert scheduler.reschedule(target, base + 100)
+    assert scheduler._heap[0] is not target
+    _assert_heap(scheduler)
+    assert [job["next_run"] for job in scheduler.jobs()][-1] == base + 100
+
+    scheduler.cancel(handles[3])
+    assert not scheduler.reschedule(handles[3], base)
+
+
+def test_random_operations_keep_heap(scheduler):
+    rng = random.Random(7)
+    base = time.time() + FAR
+    live = []
+    for _ in range(500):
+        op = rng.random()
+        if op < 0.5 or not live:
+            live.append(scheduler.call_at(base + rng.randint(0, 50), _noop))
+        elif op < 0.75:
+            assert scheduler.cancel(live.pop(rng.randrange(len(live))))
+        else:
+            assert scheduler.reschedule(rng.choice(live), base + rng.randint(0, 50))
+        _assert_heap(scheduler)
+    assert sorted(h.id for h in scheduler._heap) == sorted(h.id for h in live)
+
+
+# ----------------------------- Đánh thức sớm -----------------------------
+def test_new_head_wakes_sleeping_thread(scheduler):
+    fired = threading.Event()
+    scheduler.call_at(time.time() + FAR, _noop)
+    time.sleep(0.05)    # luồng hẹn giờ đang ngủ chờ hạn xa (tối đa MAX_SLEEP_SECONDS)
+
+    started = time.monotonic()
+    scheduler.call_later(0.05, fired.set)
+    assert fired.wait(WAIT)
+    assert time.monotonic() - started < 2.0
+
+
+def test_reschedule_to_head_wakes_sleeping_thread(scheduler):
+    fired = threading.Event()
+    handle = scheduler.call_at(time.time() + FAR, fired.set)
+    time.sleep(0.05)
+
+    scheduler.reschedule(handle, time.time() + 0.05)
+    assert fired.wait(WAIT)
+    assert handle.runs == 1 and not handle.scheduled
+
+
+def test_cancel_before_fire(scheduler):
+    fired = threading.Event()
+    handle = scheduler.call_later(0.2, fired.set)
+    assert scheduler.cancel(handle)
+    assert not fired.wait(0.4)
+
+
+def test_repeating_job_is_requeued(scheduler):
+    count = threading.Semaphore(0)
+    handle = scheduler.call_every(0.02, count.release)
+    for _ in range(3):
+        assert count.acquire(timeout=WAIT)
+    assert handle.scheduled
+    scheduler.cancel(handle)
+
+
+# ----------------------------- _next_when -----------------------------
+def test_next_when_skips_missed_repeats(scheduler):
+    now = time.time()
+    handle = _handle(lambda last: last + 10)
+    # Máy ngủ 95 giây: 9 lần đã lỡ bị bỏ qua, lần kế tiếp là lần đầu tiên sau hiện tại
+    next_when = scheduler._next_when(handle, now - 95)
+    assert now < next_when <= now + 10
+    assert next_when == pytest.approx(now + 5)
+
+
+def test_next_when_future_value_returned_directly(scheduler):
+    now = time.time()
+    assert scheduler._next_when(_handle(lambda last: last + 60), now) == now + 60
+
+
+@pytest.mark.parametrize("next_fire", [
+    lambda last: None,                      # dừng lặp
+    lambda last: last,                      # không tăng -> vòng lặp vô hạn nếu không chặn
+    lambda last: last - 1,                  # lùi lại
+    lambda last: 1 / 0,                     # next_fire lỗi
+])
+def test_next_when_stops_repeating(scheduler, next_fire):
+    assert scheduler._next_when(_handle(next_fire), time.time() - 100) is None
+
+
+def test_non_increasing_next_fire_stops_job(scheduler):
+    fired = threading.Semaphore(0)
+    handle = scheduler.call_at(time.time() + 0.02, fired.release, next_fire=lambda last: last)
+    assert fired.acquire(timeout=WAIT)
+    time.sleep(0.05)
+    assert handle.runs == 1 and not handle.scheduled
+    assert scheduler.stats()["scheduled"] == 0